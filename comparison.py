@@ -49,7 +49,6 @@
    used for the linkage process.
 
    TODO:
-   - improve cache: how to remove oldest count-1 pair efficiently?
    - do caching timing test -> comparisonTiming.py module
    - improve value frequency based weight calculations
 
@@ -66,9 +65,11 @@
 # =============================================================================
 # Import necessary modules (Python standard modules first, then Febrl modules)
 
+import array
 import bz2
 import datetime
 import difflib
+import heapq
 import logging
 import math
 import time
@@ -76,7 +77,80 @@ import zlib
 
 import auxiliary
 import encode
+import lookup
 import mymath
+import stringcmp
+
+# =============================================================================
+# Key function to sort cache entries (tuples (cache key, [weight, count, time
+# of last use])) by their time of last use
+
+def lru_time_funct(cache_item):
+  return cache_item[1][2]
+
+# =============================================================================
+# Functions to parse date strings and to log why they could not be parsed (used
+# by the date and age field comparators)
+
+def parse_date_str(date_str, date_format):
+  """Remove separator characters (/:;,.) from the given date string and parse
+     it according to the given date format (one of 'ddmmyyyy', 'mmddyyyy',
+     'yyyymmdd', 'ddmmyy' or 'mmddyy').
+
+     Returns a tuple (date string without separators, error, date), with the
+     date being a datetime.date object and the error None if the date string
+     is valid. Otherwise the date is None and the error is one of 'length',
+     'month', 'day' or 'int' (the first check that failed).
+  """
+
+  for c in '/:;,.\\':
+    if c in date_str:
+      date_str = date_str.replace(c,'')
+
+  if (len(date_str) not in [6,8]):
+    return (date_str, 'length', None)
+
+  if (date_format in ['ddmmyyyy', 'ddmmyy']):
+    day, month, year = date_str[:2],date_str[2:4],date_str[4:]
+  elif (date_format in ['mmddyyyy','mmddyy']):
+    day, month, year = date_str[2:4],date_str[:2],date_str[4:]
+  elif (date_format == 'yyyymmdd'):
+    day, month, year = date_str[6:],date_str[4:6],date_str[:4]
+
+  if ((month < '01') or (month > '12')):
+    return (date_str, 'month', None)
+
+  if ((day < '01') or \
+      ((month in ['01','03','05','07','08','10','12']) and (day > '31')) or \
+      ((month in ['04','06','09','11']) and (day > '30')) or \
+      ((month == '02') and (day > '29'))):
+    return (date_str, 'day', None)
+
+  try:
+    int_day, int_month, int_year = int(day), int(month), int(year)
+  except:
+    return (date_str, 'int', None)
+
+  try:
+    date = datetime.date(int_year, int_month, int_day)
+  except ValueError:  # For example 29 February in a year that is not a leap
+    return (date_str, 'day', None)  # year
+
+  return (date_str, None, date)
+
+def log_date_error(date_str1, error1, date_str2, error2):
+  """Log a warning for the first check (as returned by parse_date_str()) that
+     one of the two given date strings failed.
+  """
+
+  for (error, error_str) in [('length', 'field values is not of correct ' + \
+                                        'length'),
+                             ('month', 'month values is out of range'),
+                             ('day', 'day values is out of range')]:
+    if (error in [error1, error2]):
+      logging.warn('At least one of the %s: %s / %s' % \
+                   (error_str, date_str1, date_str2))
+      return
 
 # =============================================================================
 
@@ -87,7 +161,8 @@ class RecordComparator:
 
   # ---------------------------------------------------------------------------
 
-  def __init__(self, dataset1, dataset2, field_comparator_list, descr = ''):
+  def __init__(self, dataset1, dataset2, field_comparator_list, descr = '',
+               do_timing = False):
     """Constructor.
 
        Has as arguments two data set objects and a list of field comparators,
@@ -98,11 +173,19 @@ class RecordComparator:
        The constructor checks if the field names are available in the two data
        sets and then generates an efficient list of comparison methods and
        field columns (into the data sets).
+
+       If 'do_timing' is set to True, the number of comparisons, the time
+       used, and the numbers of missing and exactly matching values and of
+       cache hits are counted for each field comparator (see the
+       get_timing_stats() method). Default is False.
     """
 
     auxiliary.check_is_string('description', descr)
     self.description = descr
 
+    auxiliary.check_is_flag('do_timing', do_timing)
+    self.do_timing = do_timing
+
     # Check if the input objects needed are lists
     #
     auxiliary.check_is_list('dataset1.field_list', dataset1.field_list)
@@ -115,6 +198,18 @@ class RecordComparator:
     self.field_comparator_list = field_comparator_list
     self.field_comparison_list = []  # Only compare methods and field columns
 
+    self.compare_method_list = []  # The compare methods of field comparators
+    self.field_index_list1 =   []  # Field columns compared in data set 1
+    self.field_index_list2 =   []  # Field columns compared in data set 2
+
+    self.field_cost_list =     []  # Comparison times and numbers of value
+                                   # pairs compared for each field comparator
+    self.num_pruned_rec_pairs = 0  # Record pairs not compared with all field
+                                   # comparators because of a cut-off threshold
+    self.field_timing_list =   []  # Numbers of comparisons, times, numbers of
+                                   # missing and exact values, cache hits and
+                                   # cache lookups for each field comparator
+
     # Extract field names from the two data set field name lists
     #
     dataset1_field_names = []
@@ -146,6 +241,13 @@ class RecordComparator:
 
       self.field_comparison_list.append(field_tuple)
 
+      self.compare_method_list.append(field_comp.compare)
+      self.field_index_list1.append(field_index1)
+      self.field_index_list2.append(field_index2)
+
+      self.field_cost_list.append([0.0, 0])
+      self.field_timing_list.append([0, 0.0, 0, 0, 0, 0])
+
     assert len(self.field_comparison_list) == len(self.field_comparator_list)
 
     # A log message - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -171,79 +273,364 @@ class RecordComparator:
 
   # ---------------------------------------------------------------------------
 
+  def prepare_record(self, rec, data_set_num):
+    """Return a prepared record for the given record (list of fields): a tuple
+       with one value per field comparator, being the lower case value of the
+       field compared (or an empty string if the record does not have this
+       field).
+
+       The data set number can be 0 (if the record is from the first data set)
+       or 1 (if it is from the second data set).
+
+       Preparing each record once, and then comparing the prepared records
+       with the compare_prepared() or compare_batch_prepared() methods, avoids
+       the normalisation of the same values for each record pair a record is
+       part of.
+    """
+
+    if (data_set_num == 0):
+      field_index_list = self.field_index_list1
+    else:
+      field_index_list = self.field_index_list2
+
+    try:
+      return tuple([rec[field_index].lower() for field_index in \
+                    field_index_list])
+
+    except IndexError:  # The record is shorter, use empty values
+      num_fields = len(rec)
+
+      prep_rec = []
+
+      for field_index in field_index_list:
+        if (field_index >= num_fields):
+          prep_rec.append('')
+        else:
+          prep_rec.append(rec[field_index].lower())
+
+      return tuple(prep_rec)
+
+  # ---------------------------------------------------------------------------
+
   def compare(self, rec1, rec2):
     """Compare two records (list of fields) and return a vector with weight
        values (floating-point numbers)
     """
 
-    weight_vector = []
+    return self.compare_prepared(self.prepare_record(rec1, 0),
+                                 self.prepare_record(rec2, 1))
 
-    # Compute a weight for each field comparator
-    #
-    for (comp_method,field_index1,field_index2) in self.field_comparison_list:
+  # ---------------------------------------------------------------------------
 
-      if (field_index1 >= len(rec1)):
-        val1 = ''
-      else:
-        val1 = rec1[field_index1]
+  def compare_prepared(self, prep_rec1, prep_rec2):
+    """Compare two prepared records (see the prepare_record() method) and
+       return a vector with weight values (floating-point numbers).
+    """
 
-      if (field_index2 >= len(rec2)):
-        val2 = ''
-      else:
-        val2 = rec2[field_index2]
+    if (self.do_timing == False):
+      return [comp_method(val1, val2) for (comp_method, val1, val2) in \
+              zip(self.compare_method_list, prep_rec1, prep_rec2)]
 
-      val1 = val1.lower()
-      val2 = val2.lower()
+    w_vec = []
 
-      w = comp_method(val1,val2)
-      weight_vector.append(w)
+    for i in range(len(self.compare_method_list)):
+      field_comp = self.field_comparator_list[i][0]
+      val1 = prep_rec1[i]
+      val2 = prep_rec2[i]
 
-    return weight_vector
+      cache_num_hits =   field_comp.cache_num_hits
+      cache_num_misses = field_comp.cache_num_misses
+      start_time = time.time()
+
+      w_vec.append(self.compare_method_list[i](val1, val2))
+
+      self.__update_field_timing__(i, [(val1, val2)], time.time()-start_time,
+                                   cache_num_hits, cache_num_misses)
+    return w_vec
 
   # ---------------------------------------------------------------------------
 
-  def get_cache_stats(self):
-    """Extract information about the cache size, maximum and average counts for
-       all the field comparators that have an activated cache.
+  def compare_batch(self, rec_pair_list):
+    """Compare a list of record pairs (tuples (rec1, rec2), with records being
+       lists of fields) and return the weight vectors of all pairs in one
+       array of floating-point numbers.
+
+       See the compare_batch_prepared() method for details.
     """
 
-    logging.info('Caching statistics for record comparator "%s"' % \
-                 (self.description))
+    prepare_funct = self.prepare_record  # Shorthand
 
-    # Go through field list and check if available
+    return self.compare_batch_prepared([(prepare_funct(rec1, 0),
+                                         prepare_funct(rec2, 1)) \
+                                        for (rec1, rec2) in rec_pair_list])
+
+  # ---------------------------------------------------------------------------
+
+  def compare_batch_prepared(self, prep_rec_pair_list):
+    """Compare a list of prepared record pairs (see the prepare_record()
+       method) and return the weight vectors of all pairs in one array of
+       floating-point numbers.
+
+       The array is stored row by row, i.e. the weight vector of the i-th
+       record pair is in elements [i*num_fields:(i+1)*num_fields], where
+       num_fields is the number of field comparators.
+
+       The values of each field are compared as one column using the
+       compare_batch() method of the field comparator.
+    """
+
+    num_fields = len(self.field_comparison_list)
+
+    weight_array = array.array('d', [0.0]) * \
+                   (len(prep_rec_pair_list)*num_fields)
+
+    if (prep_rec_pair_list == []):
+      return weight_array
+
+    for i in range(num_fields):
+      field_comp = self.field_comparator_list[i][0]
+
+      # Extract the column of value pairs for this field comparator
+      #
+      val_pair_list = [(prep_rec1[i], prep_rec2[i]) for \
+                       (prep_rec1, prep_rec2) in prep_rec_pair_list]
+
+      if (self.do_timing == True):
+        cache_num_hits =   field_comp.cache_num_hits
+        cache_num_misses = field_comp.cache_num_misses
+        start_time = time.time()
+
+      weight_array[i::num_fields] = \
+                      array.array('d', field_comp.compare_batch(val_pair_list))
+
+      if (self.do_timing == True):
+        self.__update_field_timing__(i, val_pair_list, time.time()-start_time,
+                                     cache_num_hits, cache_num_misses)
+
+    return weight_array
+
+  # ---------------------------------------------------------------------------
+
+  def compare_batch_threshold(self, prep_rec_pair_list, cut_off_threshold):
+    """Compare a list of prepared record pairs (see the prepare_record()
+       method) like the compare_batch_prepared() method, but only as long as a
+       record pair can still reach the given cut-off threshold with its summed
+       weight.
+
+       The field comparators are used in the order of their average
+       comparison time per value pair (as measured in earlier batches), so
+       cheap comparisons are done first. After each field comparator, the
+       record pairs whose summed weight plus the maximum weights of the field
+       comparators not used yet (see the get_max_weight() method of the field
+       comparators) is below the cut-off threshold are pruned and not compared
+       any further. Expensive field comparators are therefore only used on
+       record pairs that can still reach the threshold.
+
+       Returns a tuple (weight_array, pruned_list), with the weight array as
+       returned by compare_batch_prepared() and a list with one flag per
+       record pair, True if the record pair was pruned. The weight vectors of
+       pruned record pairs are incomplete (weights of field comparators not
+       used are 0.0), and their summed weights would be below the threshold.
+    """
+
+    auxiliary.check_is_number('Cut-off threshold', cut_off_threshold)
+
+    num_fields =    len(self.field_comparison_list)
+    num_rec_pairs = len(prep_rec_pair_list)
+
+    weight_array = array.array('d', [0.0]) * (num_rec_pairs*num_fields)
+
+    if (prep_rec_pair_list == []):
+      return (weight_array, [])
+
+    # Get the maximum weights, as they might have been changed by set_weights()
     #
+    max_weight_list = []
     for (field_comp, field_name1, field_name2) in self.field_comparator_list:
-      logging.info('  Field comparator: "%s"' % (field_comp.description))
+      max_weight_list.append(field_comp.get_max_weight())
 
-      if (field_comp.do_caching == False):
-        logging.info('    Caching is not activated')
+    # Order field comparators by their average time per value pair compared
+    #
+    field_cost_list = self.field_cost_list  # Shorthand
 
-      elif (field_comp.cache == {}):
-        logging.info('    Caching is activated but cache is empty')
+    field_order_list = range(num_fields)
+    field_order_list.sort(key = lambda i: field_cost_list[i][0] / \
+                                          max(field_cost_list[i][1], 1))
 
-      else:
-        cache_size = len(field_comp.cache)
+    # Allow for rounding errors, so only record pairs that are certainly below
+    # the threshold are pruned (all others are checked by the caller)
+    #
+    cut_off_limit = cut_off_threshold - 0.000001
 
-        cache_max_count = -1
-        cache_count_sum = 0.0
+    weight_sum_list =  [0.0]*num_rec_pairs
+    active_pos_list =  range(num_rec_pairs)  # Record pairs not pruned so far
 
-        for cache_key in field_comp.cache:  # Get all cache entries and counts
-          (cache_weight, access_count) = field_comp.cache[cache_key]
+    for order_pos in range(num_fields):
+      i = field_order_list[order_pos]
+      field_comp = self.field_comparator_list[i][0]
 
-          cache_max_count = max(cache_max_count, access_count)
-          cache_count_sum += access_count
+      # Maximum summed weight the remaining field comparators can add
+      #
+      max_rest_weight = sum([max_weight_list[j] for j in \
+                             field_order_list[order_pos+1:]])
 
-        cache_avrg_count = cache_count_sum / cache_size
+      val_pair_list = []
+      for pos in active_pos_list:
+        (prep_rec1, prep_rec2) = prep_rec_pair_list[pos]
+        val_pair_list.append((prep_rec1[i], prep_rec2[i]))
 
-        cache_size_str = '    Number of cache entries: %s' % (cache_size)
-        if (field_comp.max_cache_size == None):
-          cache_size_str += ' (Cache size is unlimited)'
-        else:
-          cache_size_str += ' (Cache size is limited to %d entries)' % \
-                            (field_comp.max_cache_size)
-        logging.info(cache_size_str)
-        logging.info('    Maximum and average cache entry count: %d / %.2f' % \
-                     (cache_max_count, cache_avrg_count))
+      cache_num_hits =   field_comp.cache_num_hits
+      cache_num_misses = field_comp.cache_num_misses
+      start_time = time.time()
+
+      field_weight_list = field_comp.compare_batch(val_pair_list)
+
+      used_time = time.time() - start_time
+      field_cost_list[i][0] += used_time
+      field_cost_list[i][1] += len(val_pair_list)
+
+      if (self.do_timing == True):
+        self.__update_field_timing__(i, val_pair_list, used_time,
+                                     cache_num_hits, cache_num_misses)
+
+      new_active_pos_list = []
+
+      for (pos, weight) in zip(active_pos_list, field_weight_list):
+        weight_array[pos*num_fields+i] = weight
+        weight_sum = weight_sum_list[pos] + weight
+        weight_sum_list[pos] = weight_sum
+
+        if (weight_sum + max_rest_weight >= cut_off_limit):
+          new_active_pos_list.append(pos)
+
+      active_pos_list = new_active_pos_list
+
+      if (active_pos_list == []):
+        break
+
+    pruned_list = [True]*num_rec_pairs
+    for pos in active_pos_list:
+      pruned_list[pos] = False
+
+    self.num_pruned_rec_pairs += num_rec_pairs - len(active_pos_list)
+
+    return (weight_array, pruned_list)
+
+  # ---------------------------------------------------------------------------
+
+  def __update_field_timing__(self, field_num, val_pair_list, used_time,
+                              cache_num_hits, cache_num_misses):
+    """Add the given value pairs compared by a field comparator, the time
+       used, and the cache hits and misses of the field comparator before the
+       comparisons to the timing statistics of this field comparator. Should
+       not be used from outside the module.
+    """
+
+    field_comp = self.field_comparator_list[field_num][0]
+    missing_values = field_comp.missing_values  # Shorthand
+
+    num_missing = 0
+    num_exact =   0
+
+    for (val1, val2) in val_pair_list:
+      if ((val1 in missing_values) or (val2 in missing_values)):
+        num_missing += 1
+      elif (val1 == val2):
+        num_exact += 1
+
+    num_hits = field_comp.cache_num_hits - cache_num_hits
+
+    field_timing = self.field_timing_list[field_num]
+
+    field_timing[0] += len(val_pair_list)
+    field_timing[1] += used_time
+    field_timing[2] += num_missing
+    field_timing[3] += num_exact
+    field_timing[4] += num_hits
+    field_timing[5] += num_hits + field_comp.cache_num_misses - \
+                       cache_num_misses
+
+  # ---------------------------------------------------------------------------
+
+  def get_timing_stats(self):
+    """Extract the timing statistics of all field comparators (only collected
+       if the record comparator was initialised with 'do_timing' set to True):
+       the number of value pairs compared, the total and average time used,
+       the percentage of the time used by all field comparators, and the rates
+       of value pairs with a missing value, of value pairs with the same
+       values (which most field comparators return without comparing them),
+       and of cache hits (of all cache lookups).
+
+       The statistics are logged and returned as a list with one dictionary
+       per field comparator, with the keys 'description', 'num_comp', 'time',
+       'avrg_time', 'time_perc', 'missing_rate', 'exact_rate' and
+       'cache_hit_rate'.
+    """
+
+    logging.info('Timing statistics for record comparator "%s"' % \
+                 (self.description))
+
+    if (self.do_timing == False):
+      logging.info('  Timing is not activated')
+
+    total_time = sum([field_timing[1] for field_timing in \
+                      self.field_timing_list])
+
+    timing_stats_list = []
+
+    for i in range(len(self.field_comparator_list)):
+      field_comp = self.field_comparator_list[i][0]
+
+      [num_comp, used_time, num_missing, num_exact, num_hits, num_lookups] = \
+                                                     self.field_timing_list[i]
+
+      num_comp_div = float(max(num_comp, 1))
+
+      timing_stats = {'description':field_comp.description,
+                      'num_comp':num_comp,
+                      'time':used_time,
+                      'avrg_time':used_time / num_comp_div,
+                      'time_perc':100.0*used_time / max(total_time, 0.000001),
+                      'missing_rate':num_missing / num_comp_div,
+                      'exact_rate':num_exact / num_comp_div,
+                      'cache_hit_rate':float(num_hits) / max(num_lookups, 1)}
+
+      if (self.do_timing == True):
+        logging.info('  Field comparator: "%s"' % (field_comp.description))
+        logging.info('    Value pairs compared: %d in %s (%s per pair, ' % \
+                     (num_comp, auxiliary.time_string(used_time),
+                      auxiliary.time_string(timing_stats['avrg_time'])) + \
+                     '%.2f%% of total time)' % (timing_stats['time_perc']))
+        logging.info('    Missing / exact value rates: %.2f%% / %.2f%%' % \
+                     (100.0*timing_stats['missing_rate'],
+                      100.0*timing_stats['exact_rate']))
+        logging.info('    Cache hit rate: %.2f%%' % \
+                     (100.0*timing_stats['cache_hit_rate']))
+
+      timing_stats_list.append(timing_stats)
+
+    return timing_stats_list
+
+  # ---------------------------------------------------------------------------
+
+  def get_cache_stats(self):
+    """Extract information about the cache size, maximum and average counts,
+       and the number of cache hits, misses and evictions for all the field
+       comparators.
+
+       Returns a list with one dictionary of cache statistics per field
+       comparator (see the get_cache_stats() method of the field comparators).
+    """
+
+    logging.info('Caching statistics for record comparator "%s"' % \
+                 (self.description))
+
+    cache_stats_list = []
+
+    for (field_comp, field_name1, field_name2) in self.field_comparator_list:
+      cache_stats_list.append(field_comp.get_cache_stats())
+
+    return cache_stats_list
 
 # =============================================================================
 
@@ -256,6 +643,29 @@ class FieldComparator:
        description      A string describing the field comparator.
        do_caching       A flag, True or False, to enable or disable caching.
        max_cache_size   The maximum number of comparisons to be cached.
+       cache_policy     The policy used to evict comparisons from the cache
+                        once it contains 'max_cache_size' comparisons. Possible
+                        are:
+                          'lru'      Evict the least recently used comparisons
+                                     (in batches of 10% of the cache size).
+                          'clock'    The CLOCK (second chance) approximation of
+                                     least recently used.
+                          'tinylfu'  CLOCK eviction, but a new comparison is
+                                     only put into the cache if its value pair
+                                     has been compared more often recently
+                                     than the one it would evict (TinyLFU
+                                     admission, using a count-min sketch of
+                                     value pair frequencies).
+                          'shared'   The comparisons are cached in a fixed-size
+                                     hash table with 'max_cache_size' slots in
+                                     shared memory (see the SharedHashTable
+                                     class in the mymath.py module), so all
+                                     processes forked after the field
+                                     comparator has been initialised use the
+                                     same cache. A new comparison replaces an
+                                     older one if no free slot is found near
+                                     its position.
+                        Default is 'lru'.
        cache            A dictionary with cached comparisons.
        missing_values   A list of one or more strings that correspond to
                         missing values.
@@ -279,10 +689,26 @@ class FieldComparator:
 
     self.do_caching =           False        # Caching disabled by default
     self.max_cache_size =       None         # None - no maximum cache size
-    self.cache =                {}           # Dictionary with cached values
+    self.cache_policy =         'lru'        # Eviction policy for full cache
+    self.cache =                {}           # Dictionary with cached values,
+                                             # entries are lists [weight,
+                                             # count, policy information]
     self.cache_num_not_cached = 0            # Number of comparisons not cached
+    self.cache_num_hits =       0            # Number of values pairs found in
+                                             # the cache
+    self.cache_num_misses =     0            # Number not found in the cache
+    self.cache_num_evictions =  0            # Number of evicted comparisons
+    self.cache_use_count =      0            # Time stamp for 'lru' policy
+    self.cache_clock_keys =     []           # Cache keys in CLOCK order
+    self.cache_clock_hand =     0            # Position of the CLOCK hand
+    self.cache_freq_sketch =    None         # Frequency sketch for 'tinylfu'
+    self.cache_freq_count =     0            # Number of sketch increments
+    self.shared_cache =         None         # Hash table for 'shared' policy
     self.cache_warn_counts =    [2,5,10,50]  # List of when warnings should be
                                              # given (minimum counts)
+    self.profile_cache =        {}           # Precomputed value profiles
+    self.max_profile_cache_size = 100000     # Profile cache is cleared when
+                                             # it has this many entries
     self.missing_values =  ['']
     self.missing_weight =  0.0
     self.agree_weight =    1.0
@@ -295,6 +721,8 @@ class FieldComparator:
     self.freq_max_weight = None  # A maximum weight value for frequency based
                                  # agreement values. If not provided it will be
                                  # set to the general agreement value
+    self.freq_weight_table = None  # Values in the frequency table and their
+                                   # agreement weights
 
     # Process base keyword arguments (all data set specific keywords were
     # processed in the derived class constructor)
@@ -317,6 +745,14 @@ class FieldComparator:
           auxiliary.check_is_not_negative('max_cache_size', value)
           self.max_cache_size = value
 
+      elif (keyword.startswith('cache_p')):
+        if (value not in ['lru', 'clock', 'tinylfu', 'shared']):
+          logging.exception('Illegal value for cache policy, must be one ' + \
+                            'of "lru", "clock", "tinylfu" or "shared": %s' % \
+                            (str(value)))
+          raise Exception
+        self.cache_policy = value
+
       elif (keyword.startswith('missing_v')):
         auxiliary.check_is_list('missing_values', value)
         self.missing_values = value
@@ -353,6 +789,16 @@ class FieldComparator:
     for i in self.cache_warn_counts:
       self.cache_warn_dict_counts[i] = 0  # No value pairs with count i so far
 
+    # Create the shared memory cache (before any worker processes are forked)
+    #
+    if ((self.cache_policy == 'shared') and (self.do_caching == True)):
+      if (self.max_cache_size in [None, 0]):
+        logging.exception('A shared cache needs a positive maximum cache ' + \
+                          'size: %s' % (str(self.max_cache_size)))
+        raise Exception
+
+      self.shared_cache = mymath.SharedHashTable(self.max_cache_size)
+
     # If a frequency table is given calculate the sum of all counts
     #
     if (self.val_freq_table != None):
@@ -373,6 +819,9 @@ class FieldComparator:
 
     self.__check_weights__()
 
+    if (self.val_freq_table != None):
+      self.__set_freq_weight_table__()
+
   # ---------------------------------------------------------------------------
 
   def __check_weights__(self):
@@ -412,11 +861,58 @@ class FieldComparator:
 
   # ---------------------------------------------------------------------------
 
+  def __set_freq_weight_table__(self):
+    """Set the table with the frequency based agreement weights of all values
+       in the frequency table (computed according to L. Gill (2001), page 66,
+       and not larger than the maximum frequency agreement weight). Should not
+       be used from outside the module.
+
+       Called when the field comparator is initialised and when its weights
+       are changed, so the weights are based on the frequency table and the
+       sum of its counts at that time.
+
+       If the frequency table is a frequency look-up table the weights are
+       kept in it, so they are calculated only once for all field comparators
+       using the same look-up table (and maximum frequency agreement weight).
+    """
+
+    if (isinstance(self.val_freq_table, lookup.FrequencyLookupTable)):
+      freq_weight_tables = self.val_freq_table.freq_weight_tables
+      table_key = (self.val_freq_sum, self.freq_max_weight)
+
+      freq_weight_table = freq_weight_tables.get(table_key)
+
+      if (freq_weight_table != None):
+        self.freq_weight_table = freq_weight_table
+        return
+
+    else:
+      freq_weight_tables = None
+
+    val_freq_sum =    float(self.val_freq_sum)  # Shorthands
+    freq_max_weight = self.freq_max_weight
+
+    freq_weight_table = {}
+
+    for (val, val_count) in self.val_freq_table.iteritems():
+      val_freq = float(val_count) / val_freq_sum
+
+      freq_weight_table[val] = min(math.log(1.0 / val_freq, 2),  # log_2
+                                   freq_max_weight)
+
+    if (freq_weight_tables != None):
+      freq_weight_tables[table_key] = freq_weight_table
+
+    self.freq_weight_table = freq_weight_table
+
+  # ---------------------------------------------------------------------------
+
   def __get_from_cache__(self, val1, val2):
     """Check if the given pair of values is in the cache, if so return cached
        similarity weight. Otherwise return None.
 
-       If found in the cache, the pair's count is increased by one.
+       If found in the cache, the pair's count is increased by one and the
+       information used by the cache policy is updated.
 
        warning messages are logged if the cache size is limited and all entries
        have certain counts (see numbers: self.cache_warn_counts).
@@ -435,17 +931,38 @@ class FieldComparator:
     else:
       cache_key = (val2, val1)
 
-    if cache_key not in self.cache:  # The values pair is not in the cache
+    if (self.shared_cache != None):  # Shared memory cache
+      weight = self.shared_cache.get(cache_key)
+      if (weight == None):
+        self.cache_num_misses += 1
+      else:
+        self.cache_num_hits += 1
+      return weight
+
+    if (self.cache_policy == 'tinylfu') and (self.max_cache_size != None):
+      self.__update_cache_freq__(cache_key)
+
+    cache_entry = self.cache.get(cache_key)
+
+    if (cache_entry == None):  # The values pair is not in the cache
+      self.cache_num_misses += 1
       return None
 
-    # Get weight and access count from cache, increase count, and put it back
+    self.cache_num_hits += 1
+
+    # Increase the count and update the entry in place
     #
-    (cache_weight, access_count) = self.cache[cache_key]
-    access_count += 1
-    self.cache[cache_key] = (cache_weight, access_count)
+    access_count = cache_entry[1] + 1
+    cache_entry[1] = access_count
 
     if (self.max_cache_size == None):
-      return cache_weight  # Unlimited cache size, simply return
+      return cache_entry[0]  # Unlimited cache size, simply return
+
+    if (self.cache_policy == 'lru'):
+      self.cache_use_count += 1
+      cache_entry[2] = self.cache_use_count  # Time of last use
+    else:
+      cache_entry[2] = 1  # Set reference bit of CLOCK
 
     if (access_count in self.cache_warn_counts):  # Check if warning needed
 
@@ -456,16 +973,18 @@ class FieldComparator:
         logging.warning('All cache entries have a count of %d' % \
                         (access_count))
 
-    return cache_weight
+    return cache_entry[0]
 
   # ---------------------------------------------------------------------------
 
   def __put_into_cache__(self, val1, val2, weight):
-    """If caching is enabled and there is room in the cache put the given pair
-       of values into the cache with the given similarity weight.
+    """If caching is enabled put the given pair of values into the cache with
+       the given similarity weight.
 
-       If the cache is full don't insert values pair but increase the number of
-       non-cached comparisons.
+       If the cache is full, comparisons are evicted according to the cache
+       policy. With the 'tinylfu' policy the new values pair might not be
+       inserted, in which case the number of non-cached comparisons is
+       increased.
 
        If caching is disabled do nothing.
     """
@@ -473,19 +992,6 @@ class FieldComparator:
     if (self.do_caching == False):
       return
 
-    # Check if the cache is full
-    #
-    if ((self.max_cache_size != None) and \
-        (len(self.cache) == self.max_cache_size)):
-
-      self.cache_num_not_cached += 1  # One more pair not cached
-
-      if (self.cache_num_not_cached in [100, 1000, 10000, 100000]):
-        logging.warning('Cache is full, %d comparisons cannot be cached' % \
-                        (self.cache_num_not_cached))
-
-      return
-
     # Comparisons have to be symmetric: Only one of the pairs (val1,val2) and
     # (val2,val1) should be stored in the cache, so sort them
     #
@@ -494,75 +1000,211 @@ class FieldComparator:
     else:
       cache_key = (val2, val1)
 
-    # Insert new pair into cache and list of pairs with count 1
+    if (self.shared_cache != None):  # Shared memory cache
+      if (self.shared_cache.put(cache_key, weight) == True):
+        self.cache_num_evictions += 1
+      return
+
+    if (self.max_cache_size == None):  # Unlimited cache size
+      self.cache[cache_key] = [weight, 1, None]
+      return
+
+    if (self.max_cache_size == 0):
+      self.cache_num_not_cached += 1
+      return
+
+    if (self.cache_policy == 'lru'):
+
+      if (len(self.cache) >= self.max_cache_size):  # Cache is full
+        self.__evict_lru__()
+
+      self.cache_use_count += 1
+      self.cache[cache_key] = [weight, 1, self.cache_use_count]
+
+    else:  # CLOCK based policies
+
+      if ((len(self.cache) < self.max_cache_size) and \
+          (len(self.cache_clock_keys) < self.max_cache_size)):
+        self.cache_clock_keys.append(cache_key)  # Still room in the cache
+
+      else:  # Find a position in the CLOCK and evict its comparison
+        clock_pos = self.__get_clock_victim__()
+        victim_key = self.cache_clock_keys[clock_pos]
+
+        if ((self.cache_policy == 'tinylfu') and (victim_key in self.cache)):
+          if (self.__get_cache_freq__(cache_key) <= \
+              self.__get_cache_freq__(victim_key)):
+            self.cache_num_not_cached += 1  # Not admitted into the cache
+            return
+
+        if (self.cache.pop(victim_key, None) != None):
+          self.cache_num_evictions += 1
+
+        self.cache_clock_keys[clock_pos] = cache_key
+        self.cache_clock_hand = (clock_pos+1) % len(self.cache_clock_keys)
+
+      self.cache[cache_key] = [weight, 1, 0]
+
+  # ---------------------------------------------------------------------------
+
+  def __evict_lru__(self):
+    """Evict the least recently used 10% of the comparisons from the cache.
+       Evicting in batches keeps the cost per inserted comparison low.
+    """
+
+    num_evict = max(1, len(self.cache) / 10)
+
+    for (cache_key, cache_entry) in heapq.nsmallest(num_evict,
+                                    self.cache.iteritems(), key=lru_time_funct):
+      del self.cache[cache_key]
+
+    self.cache_num_evictions += num_evict
+
+  # ---------------------------------------------------------------------------
+
+  def __get_clock_victim__(self):
+    """Advance the CLOCK hand until a position is found with a comparison
+       whose reference bit is not set (clearing the bits of the comparisons
+       passed), or with a key that is not in the cache anymore. Returns this
+       position.
+    """
+
+    cache = self.cache  # Shorthands
+    clock_keys = self.cache_clock_keys
+    num_keys = len(clock_keys)
+    clock_pos = self.cache_clock_hand
+
+    while (True):
+      cache_entry = cache.get(clock_keys[clock_pos])
+
+      if ((cache_entry == None) or (cache_entry[2] == 0)):
+        return clock_pos
+
+      cache_entry[2] = 0  # Second chance
+      clock_pos = (clock_pos+1) % num_keys
+
+  # ---------------------------------------------------------------------------
+
+  def __get_cache_freq_pos__(self, cache_key):
+    """Return the four positions of the given cache key in the count-min
+       sketch used by the 'tinylfu' cache policy.
+    """
+
+    sketch_width = len(self.cache_freq_sketch) / 4
+
+    # Mix the hash value (hash values of similar tuples differ in few bits)
     #
-    self.cache[cache_key] = (weight, 1)
+    mix_hash = (hash(cache_key) * 0x9E3779B97F4A7C15L) & 0xFFFFFFFFFFFFFFFFL
+    hash1 = int(mix_hash >> 32)
+    hash2 = int((mix_hash >> 11) & 0xFFFFFFFF) | 1
+
+    return [i*sketch_width + ((hash1 + i*hash2) % sketch_width) \
+            for i in range(4)]
 
   # ---------------------------------------------------------------------------
 
-  def __calc_freq_agree_weight__(self, val):
-    """Check if a frequency table is given and if so if the given value is in
-       there - in which case a frequency based agreement weight is calculated
-       and returned. Otherwise the general agreement weight is returned.
+  def __update_cache_freq__(self, cache_key):
+    """Increase the frequency of the given cache key in the count-min sketch.
+       After ten times the maximum cache size increases all counts are
+       halved, so the sketch reflects recent frequencies.
     """
 
-    if ((self.val_freq_table != None) and (val in self.val_freq_table)):
+    if (self.cache_freq_sketch == None):  # Create the sketch
+      sketch_width = max(16, self.max_cache_size)
+      self.cache_freq_sketch = array.array('H', [0]) * (4*sketch_width)
 
-      val_count = self.val_freq_table[val]
-      val_freq = float(val_count) / float(self.val_freq_sum)
+    freq_sketch = self.cache_freq_sketch
 
-      # Agreement weight, computed according to L. Gill (2001), page 66
-      #
-      freq_weight = math.log(1.0 / val_freq, 2)  # log_2
+    for pos in self.__get_cache_freq_pos__(cache_key):
+      if (freq_sketch[pos] < 65535):
+        freq_sketch[pos] += 1
 
-      # Make sure frequency weight is not larger than maximum frequency
-      # agreement weight
-      #
-      return min(freq_weight, self.freq_max_weight)
+    self.cache_freq_count += 1
 
-    else:
-      return self.agree_weight
+    if (self.cache_freq_count >= 10*max(1, self.max_cache_size)):  # Aging
+      for pos in xrange(len(freq_sketch)):
+        freq_sketch[pos] >>= 1
+      self.cache_freq_count = 0
 
   # ---------------------------------------------------------------------------
 
-  def __calc_freq_weights__(self, val1, val2):
-    """Check if a frequency table is given and if so if the given values are in
-       there - in which case frequency based agreement weights are calculated.
-       The minimum frequency based weight is then returned. Otherwise the
-       general agreement weight is returned.
+  def __get_cache_freq__(self, cache_key):
+    """Return the estimated recent frequency of the given cache key.
     """
 
-    if (self.val_freq_table == None):  # No frequency table given
-      return self.agree_weight
+    if (self.cache_freq_sketch == None):
+      return 0
 
-    if (val1 in self.val_freq_table):
+    freq_sketch = self.cache_freq_sketch
 
-      val1_count = self.val_freq_table[val1]
-      val1_freq = float(val1_count) / float(self.val_freq_sum)
+    return min([freq_sketch[pos] for pos in \
+                self.__get_cache_freq_pos__(cache_key)])
 
-      # Agreement weight, computed according to L. Gill (2001), page 66
-      #
-      freq1_weight = math.log(1.0 / val1_freq, 2)  # log_2
+  # ---------------------------------------------------------------------------
 
-      # Make sure frequency weight is not larger than maximum frequency
-      # agreement weight
-      #
-      freq1_weight = min(freq1_weight, self.freq_max_weight)
+  def __get_profile__(self, val):
+    """Return the profile of the given value, a representation of the value
+       precomputed for faster comparisons (for example its sorted list of
+       q-grams), as calculated by the __calc_profile__() method.
 
-    else:
-      freq1_weight =  self.agree_weight
+       As each value is usually compared with many other values the profiles
+       are kept in a dictionary, which is cleared once it contains
+       'max_profile_cache_size' profiles.
+    """
 
-    if (val2 in self.val_freq_table):
-      val2_count = self.val_freq_table[val2]
-      val2_freq = float(val2_count) / float(self.val_freq_sum)
+    profile = self.profile_cache.get(val)
 
-      freq2_weight = math.log(1.0 / val2_freq, 2)  # log_2
-      freq2_weight = min(freq2_weight, self.freq_max_weight)
+    if (profile == None):
+      if (len(self.profile_cache) >= self.max_profile_cache_size):
+        self.profile_cache = {}
 
-    else:
-      freq2_weight = self.agree_weight
+      profile = self.__calc_profile__(val)
+      self.profile_cache[val] = profile
+
+    return profile
+
+  # ---------------------------------------------------------------------------
+
+  def __calc_profile__(self, val):
+    """Calculate and return the profile of the given value. See
+       implementations in derived classes for details.
+    """
+
+    logging.exception('Override abstract method in derived class')
+    raise Exception
+
+  # ---------------------------------------------------------------------------
+
+  def __calc_freq_agree_weight__(self, val):
+    """Check if a frequency table is given and if so if the given value is in
+       there - in which case its frequency based agreement weight is returned
+       (see the __set_freq_weight_table__() method). Otherwise the general
+       agreement weight is returned.
+    """
+
+    if (self.freq_weight_table == None):  # No frequency table given
+      return self.agree_weight
+
+    return self.freq_weight_table.get(val, self.agree_weight)
+
+  # ---------------------------------------------------------------------------
+
+  def __calc_freq_weights__(self, val1, val2):
+    """Check if a frequency table is given and if so if the given values are in
+       there - in which case their frequency based agreement weights are used
+       (see the __set_freq_weight_table__() method). The minimum frequency
+       based weight is then returned. Otherwise the general agreement weight
+       is returned.
+    """
+
+    if (self.freq_weight_table == None):  # No frequency table given
+      return self.agree_weight
+
+    freq_weight_table = self.freq_weight_table  # Shorthand
+    agree_weight =      self.agree_weight
 
-    return min(freq1_weight, freq2_weight)
+    return min(freq_weight_table.get(val1, agree_weight),
+               freq_weight_table.get(val2, agree_weight))
 
   # ---------------------------------------------------------------------------
 
@@ -601,6 +1243,22 @@ class FieldComparator:
 
     self.__check_weights__()
 
+    if (self.val_freq_table != None):  # Maximum weight might have changed
+      self.__set_freq_weight_table__()
+
+  # ---------------------------------------------------------------------------
+
+  def get_max_weight(self):
+    """Return the largest weight the field comparator can return, i.e. the
+       agreement weight (or the maximum frequency agreement weight if a
+       frequency table is given).
+    """
+
+    if (self.val_freq_table != None):
+      return max(self.agree_weight, self.freq_max_weight)
+    else:
+      return self.agree_weight
+
   # ---------------------------------------------------------------------------
 
   def train(self):
@@ -624,6 +1282,34 @@ class FieldComparator:
 
   # ---------------------------------------------------------------------------
 
+  def compare_batch(self, val_pair_list):
+    """Compare a list of field value pairs (tuples (val1, val2)) and return a
+       list with their numerical weights.
+
+       This version calls the compare() method once for each distinct value
+       pair (the same value pair often occurs many times in a batch, for
+       example the same surname pair in many record pairs of a block), and
+       then scatters the weights back to all occurrences. Derived classes with
+       cheap comparisons can override it with a version that processes all
+       value pairs at once.
+    """
+
+    compare = self.compare  # Shorthand
+
+    uniq_val_pair_list = list(set(val_pair_list))
+
+    if (len(uniq_val_pair_list) == len(val_pair_list)):  # All are different
+      return [compare(val1, val2) for (val1, val2) in val_pair_list]
+
+    weight_dict = {}
+
+    for val_pair in uniq_val_pair_list:
+      weight_dict[val_pair] = compare(val_pair[0], val_pair[1])
+
+    return [weight_dict[val_pair] for val_pair in val_pair_list]
+
+  # ---------------------------------------------------------------------------
+
   def log(self, instance_var_list = None):
     """Write a log message with the basic field comparator instance variables
        plus the instance variable provided in the given input list (assumed to
@@ -635,6 +1321,7 @@ class FieldComparator:
     logging.info('  Do caching:          %s' % (str(self.do_caching)))
     if (self.max_cache_size != None):
       logging.info('  Maximum cache size:  %s' % (str(self.max_cache_size)))
+      logging.info('  Cache policy:        %s' % (self.cache_policy))
     else:
       logging.info('  Unlimited cache size')
     logging.info('    Warnings will be given once all cache entries have ' + \
@@ -666,41 +1353,78 @@ class FieldComparator:
   # ---------------------------------------------------------------------------
 
   def get_cache_stats(self):
-    """Extract information about the cache size, maximum and average counts.
+    """Extract information about the cache size, maximum and average counts,
+       and the number of cache hits, misses and evictions.
+
+       The statistics are logged and returned as a dictionary with the keys
+       'description', 'size', 'max_size', 'policy', 'hits', 'misses',
+       'evictions', 'not_cached', 'hit_rate', 'max_count' and 'avrg_count'.
     """
 
     logging.info('Field comparator: "%s"' % (self.description))
 
-    if (self.do_caching == False):
-      logging.info('  Caching is not activated')
-
-    elif (self.cache == {}):
-      logging.info('  Caching is activated but cache is empty')
-
+    if (self.shared_cache != None):  # No counts are kept in a shared cache
+      cache_size = len(self.shared_cache)
     else:
       cache_size = len(self.cache)
 
-      cache_max_count = -1
-      cache_count_sum = 0.0
+    cache_max_count = 0
+    cache_count_sum = 0.0
 
-      for cache_key in self.cache:  # Get all cache entries and extract counts
+    for cache_entry in self.cache.itervalues():  # Extract counts
 
-        (cache_weight, access_count) = self.cache[cache_key]
+      access_count = cache_entry[1]
 
-        cache_max_count = max(cache_max_count, access_count)
-        cache_count_sum += access_count
+      cache_max_count = max(cache_max_count, access_count)
+      cache_count_sum += access_count
 
+    if (cache_size > 0):
       cache_avrg_count = cache_count_sum / cache_size
+    else:
+      cache_avrg_count = 0.0
+
+    num_lookups = self.cache_num_hits + self.cache_num_misses
+    if (num_lookups > 0):
+      cache_hit_rate = float(self.cache_num_hits) / num_lookups
+    else:
+      cache_hit_rate = 0.0
+
+    if (self.do_caching == False):
+      logging.info('  Caching is not activated')
+
+    elif (cache_size == 0):
+      logging.info('  Caching is activated but cache is empty')
 
+    else:
       cache_size_str = '  Number of cache entries: %s' % (cache_size)
       if (self.max_cache_size == None):
         cache_size_str += ' (Cache size is unlimited)'
       else:
-        cache_size_str += ' (Cache size is limited to %d entries)' % \
-                          (self.max_cache_size)
+        cache_size_str += ' (Cache size is limited to %d entries, ' % \
+                          (self.max_cache_size) + '"%s" policy)' % \
+                          (self.cache_policy)
       logging.info(cache_size_str)
-      logging.info('  Maximum and average cache entry count: %d / %.2f' % \
-                   (cache_max_count, cache_avrg_count))
+      if (self.shared_cache == None):
+        logging.info('  Maximum and average cache entry count: %d / %.2f' % \
+                     (cache_max_count, cache_avrg_count))
+      logging.info('  Cache hits / misses: %d / %d (hit rate %.2f%%)' % \
+                   (self.cache_num_hits, self.cache_num_misses,
+                    100.0*cache_hit_rate))
+      if (self.max_cache_size != None):
+        logging.info('  Evicted / not cached comparisons: %d / %d' % \
+                     (self.cache_num_evictions, self.cache_num_not_cached))
+
+    return {'description':self.description,
+            'size':cache_size,
+            'max_size':self.max_cache_size,
+            'policy':self.cache_policy,
+            'hits':self.cache_num_hits,
+            'misses':self.cache_num_misses,
+            'evictions':self.cache_num_evictions,
+            'not_cached':self.cache_num_not_cached,
+            'hit_rate':cache_hit_rate,
+            'max_count':cache_max_count,
+            'avrg_count':cache_avrg_count}
 
 # =============================================================================
 
@@ -735,6 +1459,38 @@ class FieldComparatorExactString(FieldComparator):
     else:
       return self.disagree_weight
 
+  # ---------------------------------------------------------------------------
+
+  def compare_batch(self, val_pair_list):
+    """Compare a list of field value pairs using exact string comparator.
+    """
+
+    missing_value_set = set(self.missing_values)  # Shorthands
+    missing_weight =    self.missing_weight
+    disagree_weight =   self.disagree_weight
+
+    if (self.val_freq_table == None):  # Agreement weight is always the same
+      agree_weight = self.agree_weight
+
+      return [missing_weight if ((val1 in missing_value_set) or \
+                                 (val2 in missing_value_set)) else \
+              (agree_weight if (val1 == val2) else disagree_weight) \
+              for (val1, val2) in val_pair_list]
+
+    calc_freq_agree_weight = self.__calc_freq_agree_weight__
+
+    weight_list = []
+
+    for (val1, val2) in val_pair_list:
+      if (val1 in missing_value_set) or (val2 in missing_value_set):
+        weight_list.append(missing_weight)
+      elif (val1 == val2):
+        weight_list.append(calc_freq_agree_weight(val1))
+      else:
+        weight_list.append(disagree_weight)
+
+    return weight_list
+
 # =============================================================================
 
 class FieldComparatorContainsString(FieldComparator):
@@ -1164,17 +1920,82 @@ class FieldComparatorNumericAbs(FieldComparator):
     #
     abs_diff = abs(float_val1 - float_val2)
 
-    if (abs_diff > self.max_abs_diff):  # Absolute difference too large
-      return self.disagree_weight
+    if (abs_diff > self.max_abs_diff):  # Absolute difference too large
+      return self.disagree_weight
+
+    # Get general or frequency based agreement weight
+    #
+    agree_weight = self.__calc_freq_weights__(val1, val2)
+
+    # Calculate partial agreement weight
+    #
+    return agree_weight - (abs_diff / (self.max_abs_diff+1.0)) * \
+           (agree_weight + abs(self.disagree_weight))
+
+  # ---------------------------------------------------------------------------
+
+  def compare_batch(self, val_pair_list):
+    """Compare a list of numerical field value pairs and tolerate an absolute
+       difference. Each distinct value is only converted into a number once.
+    """
+
+    missing_value_set = set(self.missing_values)  # Shorthands
+    missing_weight =    self.missing_weight
+    disagree_weight =   self.disagree_weight
+    max_abs_diff =      self.max_abs_diff
+
+    calc_freq_agree_weight = self.__calc_freq_agree_weight__
+    calc_freq_weights =      self.__calc_freq_weights__
+
+    float_val_dict = {}  # Numbers of values (None if not a number)
+
+    weight_list = []
+
+    for (val1, val2) in val_pair_list:
+
+      if (val1 in missing_value_set) or (val2 in missing_value_set):
+        weight_list.append(missing_weight)
+        continue
+
+      elif (val1 == val2):
+        weight_list.append(calc_freq_agree_weight(val1))
+        continue
+
+      float_val_list = []
+      for val in (val1, val2):
+        if (val in float_val_dict):
+          float_val_list.append(float_val_dict[val])
+        else:
+          try:
+            float_val = float(val)
+          except:
+            float_val = None
+          float_val_dict[val] = float_val
+          float_val_list.append(float_val)
+
+      (float_val1, float_val2) = float_val_list
+
+      if (float_val1 == None) or (float_val2 == None):  # Not numbers
+        weight_list.append(disagree_weight)
+
+      elif (float_val1 == float_val2):
+        weight_list.append(calc_freq_agree_weight(val1))
+
+      elif (max_abs_diff == 0.0):
+        weight_list.append(disagree_weight)
+
+      else:
+        abs_diff = abs(float_val1 - float_val2)
 
-    # Get general or frequency based agreement weight
-    #
-    agree_weight = self.__calc_freq_weights__(val1, val2)
+        if (abs_diff > max_abs_diff):
+          weight_list.append(disagree_weight)
+        else:
+          agree_weight = calc_freq_weights(val1, val2)
 
-    # Calculate partial agreement weight
-    #
-    return agree_weight - (abs_diff / (self.max_abs_diff+1.0)) * \
-           (agree_weight + abs(self.disagree_weight))
+          weight_list.append(agree_weight - (abs_diff / (max_abs_diff+1.0)) * \
+                             (agree_weight + abs(disagree_weight)))
+
+    return weight_list
 
 # =============================================================================
 
@@ -1354,6 +2175,10 @@ class FieldComparatorDistance(FieldComparator):
        geocode_table  A reference to the geocode look-up table (a dictionary)
        max_distance   A positive number that gives the maximum distance (in
                       kilometers) tolerated.
+       cache_dist     A flag (True or False), if set to True the calculated
+                      distances of location pairs are cached (default is
+                      False). Useful for values with a small number of
+                      different locations (like postcodes).
 
      If the computed distance between the two field values is smaller or equal
      to 'max_distance', the partial agreement weight is calculated using the
@@ -1364,17 +2189,35 @@ class FieldComparatorDistance(FieldComparator):
 
      For field values that are not found in the geocode look-up table the
      missing weight is returned.
+
+     The locations of the values (in radians, taken from the look-up table if
+     it is a GeocodeLookupTable) are kept as value profiles. For locations
+     that are too far apart in latitude or longitude, the disagreement weight
+     is returned without calculating their distance.
+
+     The kept locations are removed whenever a GeocodeLookupTable is
+     modified. Modifications of other geocode tables (dictionaries) are not
+     detected, so these should not be modified once the field comparator is
+     used.
   """
 
   # ---------------------------------------------------------------------------
 
   def __init__(self, **kwargs):
-    """Constructor. Process the 'geocode_table' and 'max_distance' arguments
-       first, then call the base class constructor.
+    """Constructor. Process the 'geocode_table', 'max_distance' and
+       'cache_dist' arguments first, then call the base class constructor.
     """
 
     self.geocode_table = None
     self.max_distance =  None
+    self.cache_dist =    False
+
+    self.dist_cache =          {}  # Distances of location pairs, with integer
+                                   # keys made of location numbers
+    self.max_dist_cache_size = 1000000
+    self.num_locations =       0   # Number of locations in profiles
+    self.geocode_changes =     None  # Number of modifications of the geocode
+                                     # table when its locations were cached
 
     # Process all keyword arguments - - - - - - - - - - - - - - - - - - - - - -
     #
@@ -1391,6 +2234,10 @@ class FieldComparatorDistance(FieldComparator):
         auxiliary.check_is_not_negative('max_distance', value)
         self.max_distance = value
 
+      elif (keyword.startswith('cache_d')):
+        auxiliary.check_is_flag('cache_dist', value)
+        self.cache_dist = value
+
       else:
         base_kwargs[keyword] = value
 
@@ -1401,14 +2248,57 @@ class FieldComparatorDistance(FieldComparator):
     auxiliary.check_is_dictionary('geocode_table', self.geocode_table)
     auxiliary.check_is_not_negative('max_distance', self.max_distance)
 
+    if (isinstance(self.geocode_table, lookup.GeocodeLookupTable)):
+      self.geocode_changes = self.geocode_table.num_changes
+
     self.log([('Geocode table length',len(self.geocode_table)),
-              ('Maximum distance tolerated', self.max_distance)])
+              ('Maximum distance tolerated', self.max_distance),
+              ('Cache distances', self.cache_dist)])
 
     # Class constants
     #
     self.earth_radius =  6372.0  # Approximate radius of earth in kilometers
     self.deg2rad =       math.pi / 180.0  # Factor for degrees to radians
 
+    # Maximum angle (in radians) between two locations that can be within the
+    # maximum distance (plus one metre to allow for numerical issues)
+    #
+    self.max_angle = (self.max_distance + 0.001) / self.earth_radius
+
+  # ---------------------------------------------------------------------------
+
+  def __calc_profile__(self, val):
+    """Return a tuple (location, location number, longitude, latitude,
+       sin(latitude), cos(latitude), maximum longitude difference) with the
+       location of the given value and its coordinates in radians, or False if
+       the value is not in the geocode look-up table (None is not used, as it
+       marks values not in the profile cache).
+
+       The maximum longitude difference (in radians) is the largest difference
+       in longitude any location within the maximum distance can have.
+    """
+
+    loc = self.geocode_table.get(val, None)
+
+    if (loc == None):
+      return False
+
+    if (isinstance(self.geocode_table, lookup.GeocodeLookupTable)):
+      (long, lati, sin_lati, cos_lati) = self.geocode_table.get_radians(val)
+    else:
+      long, lati = loc[0]*self.deg2rad, loc[1]*self.deg2rad
+      sin_lati, cos_lati = math.sin(lati), math.cos(lati)
+
+    if ((abs(lati) + self.max_angle) >= 0.5*math.pi):
+      max_long_diff = math.pi  # A pole is within the maximum distance
+    else:
+      max_long_diff = math.asin(math.sin(self.max_angle) / cos_lati)
+
+    self.num_locations += 1  # Number the locations (never re-used)
+
+    return (loc, self.num_locations, long, lati, sin_lati, cos_lati,
+            max_long_diff)
+
   # ---------------------------------------------------------------------------
 
   def compare(self, val1, val2):
@@ -1430,27 +2320,67 @@ class FieldComparatorDistance(FieldComparator):
 
     # Calculate distance comparison value - - - - - - - - - - - - - - - - - - -
 
+    # Remove the cached locations if the geocode table has been modified
+    #
+    if ((self.geocode_changes != None) and \
+        (self.geocode_changes != self.geocode_table.num_changes)):
+      self.profile_cache = {}
+      self.dist_cache =    {}
+      self.geocode_changes = self.geocode_table.num_changes
+
     # Check if field values are in geocode look-up table
     #
-    loc1 = self.geocode_table.get(val1, None)
-    loc2 = self.geocode_table.get(val2, None)
+    profile1 = self.__get_profile__(val1)
+    profile2 = self.__get_profile__(val2)
 
-    if (loc1 == None) or (loc2 == None):
+    if (profile1 == False) or (profile2 == False):
       w = self.missing_weight  # One or both values are not in look-up table
 
     else:  # Check if both locations are the same
 
+      (loc1, num1, long1, lati1, sin_lati1, cos_lati1, max_long_diff1) = \
+                                                                    profile1
+      (loc2, num2, long2, lati2, sin_lati2, cos_lati2, max_long_diff2) = \
+                                                                    profile2
+
+      long_diff = abs(long1 - long2)
+      if (long_diff > math.pi):
+        long_diff = 2.0*math.pi - long_diff
+
       if (loc1 == loc2):
         w = self.__calc_freq_agree_weight__(val1)
 
+      # Check if the locations are too far apart in latitude or longitude
+      #
+      elif ((abs(lati1 - lati2) > self.max_angle) or \
+            (long_diff > max_long_diff1) or (long_diff > max_long_diff2)):
+        w = self.disagree_weight
+
       else:  # Calculate distance on Earth surface
-        long1, lati1 = loc1[0]*self.deg2rad, loc1[1]*self.deg2rad
-        long2, lati2 = loc2[0]*self.deg2rad, loc2[1]*self.deg2rad
 
-        alpha = math.cos(long1 - long2)
-        x     = alpha * math.cos(lati1)*math.cos(lati2) + \
-                        math.sin(lati1)*math.sin(lati2)
-        dist  = self.earth_radius * math.acos(x)
+        # Distances are symmetric: Only the distance of the location pair
+        # with the smaller location number first is calculated and cached
+        #
+        if (self.cache_dist == True):
+          if (num1 > num2):
+            (long1, cos_lati1, sin_lati1, long2, cos_lati2, sin_lati2) = \
+              (long2, cos_lati2, sin_lati2, long1, cos_lati1, sin_lati1)
+            num1, num2 = num2, num1
+
+          dist_key = (num1 << 32) | num2
+          dist = self.dist_cache.get(dist_key)
+        else:
+          dist = None
+
+        if (dist == None):
+          alpha = math.cos(long1 - long2)
+          x     = alpha * cos_lati1*cos_lati2 + sin_lati1*sin_lati2
+          dist  = self.earth_radius * math.acos(x)
+
+          if (self.cache_dist == True):
+            if (len(self.dist_cache) >= self.max_dist_cache_size):
+              self.dist_cache = {}
+            self.dist_cache[dist_key] = dist
 
         assert dist >= 0.0, 'Distance calculated is: %f' % (dist)
 
@@ -1485,7 +2415,8 @@ class FieldComparatorDate(FieldComparator):
      for a comparison are not a valid tuple of numbers.
 
      Separators (/:;,.) are automatically removed from the dates before they
-     are parsed.
+     are parsed. Each date value is only parsed once (the parsed dates are
+     kept as value profiles).
 
      The additional arguments (besides the base class arguments) which have to
      be set when this field comparator is initialised are:
@@ -1592,6 +2523,14 @@ class FieldComparatorDate(FieldComparator):
 
   # ---------------------------------------------------------------------------
 
+  def __calc_profile__(self, val):
+    """Parse the date value, see the parse_date_str() function.
+    """
+
+    return parse_date_str(val, self.date_format)
+
+  # ---------------------------------------------------------------------------
+
   def compare(self, val1, val2):
     """Compare two field values - assumed to be dates made of triplets (tuples)
        (day,month,year) - using the date comparator.
@@ -1610,102 +2549,19 @@ class FieldComparatorDate(FieldComparator):
     if (val1 == val2):
       return self.__calc_freq_agree_weight__(val1)
 
-    # Remove separator characters - - - - - - - - - - - - - - - - - - - - - - -
-    #
-    for c in '/:;,.\\':
-      if c in val1:
-        val1 = val1.replace(c,'')
-      if c in val2:
-        val2 = val2.replace(c,'')
-
-    # Parse values to be compared - - - - - - - - - - - - - - - - - - - - - - -
-    #
-    if ((len(val1) not in [6,8]) or (len(val2) not in [6,8])):
-      logging.warn('At least one of the field values is not of correct ' + \
-                   'length: %s / %s' % (val1, val2))
-      return self.disagree_weight
-
-    if (self.date_format in ['ddmmyyyy', 'ddmmyy']):
-      day1, month1, year1 = val1[:2],val1[2:4],val1[4:]
-      day2, month2, year2 = val2[:2],val2[2:4],val2[4:]
-    elif (self.date_format in ['mmddyyyy','mmddyy']):
-      day1, month1, year1 = val1[2:4],val1[:2],val1[4:]
-      day2, month2, year2 = val2[2:4],val2[:2],val2[4:]
-    elif (self.date_format == 'yyyymmdd'):
-      day1, month1, year1 = val1[6:],val1[4:6],val1[:4]
-      day2, month2, year2 = val2[6:],val2[4:6],val2[:4]
-
-    # Check values for validity - - - - - - - - - - - - - - - - - - - - - - - -
-    #
-    if ((month1 < '01') or (month1 > '12') or \
-        (month2 < '01') or (month2 > '12')):
-      logging.warn('At least one of the month values is out of range: ' + \
-                   '%s / %s' % (val1, val2))
-      return self.disagree_weight
-
-    days_ok = True
-
-    if ((day1 < '01') or (day2 < '01')):
-      days_ok = False
-    else:
-
-      if ((month1 in ['01','03','05','07','08','10','12']) and (day1 > '31')):
-        days_ok = False
-      elif ((month1 in ['04','06','09','11']) and (day1 > '30')):
-        days_ok = False
-      elif ((month1 == '02') and (day1 > '29')):
-        days_ok = False
-
-      if ((month2 in ['01','03','05','07','08','10','12']) and (day2 > '31')):
-        days_ok = False
-      elif ((month2 in ['04','06','09','11']) and (day2 > '30')):
-        days_ok = False
-      elif ((month2 == '02') and (day2 > '29')):
-        days_ok = False
-
-    if (days_ok == False):
-      logging.warn('At least one of the day values is out of range: ' + \
-                   '%s / %s' % (val1, val2))
-      return self.disagree_weight
-
-    # Convert into integer numbers - - - - - - - - - - - - - - - - - - - - - -
+    # Get the parsed dates (without separator characters) - - - - - - - - - -
     #
-    try:
-      int_day1 = int(day1)
-    except:
-      return self.disagree_weight
-    try:
-      int_month1 = int(month1)
-    except:
-      return self.disagree_weight
-    try:
-      int_year1 = int(year1)
-    except:
-      return self.disagree_weight
+    (val1, error1, date1) = self.__get_profile__(val1)
+    (val2, error2, date2) = self.__get_profile__(val2)
 
-    try:
-      int_day2 = int(day2)
-    except:
+    if ((error1 != None) or (error2 != None)):
+      log_date_error(val1, error1, val2, error2)
       return self.disagree_weight
-    try:
-      int_month2 = int(month2)
-    except:
-      return self.disagree_weight
-    try:
-      int_year2 = int(year2)
-    except:
-      return self.disagree_weight
-
-    # Create date objects
-    #
-    date1 = datetime.date(int_year1, int_month1, int_day1)
-    date2 = datetime.date(int_year2, int_month2, int_day2)
 
     if (date1 == date2):  # Same dates
       return self.__calc_freq_agree_weight__(val1)
 
-    date_diff = date2 - date1
-    day_diff =  date_diff.days
+    day_diff = date2.toordinal() - date1.toordinal()
 
     # Get general or frequency based agreement weight
     #
@@ -1759,7 +2615,8 @@ class FieldComparatorTime(FieldComparator):
      an error is triggered.
 
      The disagreement value will be returned if either of the two time strings
-     given for a comparison are not valid.
+     given for a comparison are not valid. Each time value is only parsed once
+     (the parsed times are kept as value profiles).
 
      The additional arguments (besides the base class arguments) which have to
      be set when this field comparator is initialised are:
@@ -1875,6 +2732,35 @@ class FieldComparatorTime(FieldComparator):
 
   # ---------------------------------------------------------------------------
 
+  def __calc_profile__(self, val):
+    """Parse the time value and return a tuple (time string without ':',
+       error, time in minutes). The error is None if the time value is valid
+       (otherwise the time is None), or one of 'string', 'length', 'digit' or
+       'range' (the first check that failed).
+    """
+
+    if (not isinstance(val,str)):
+      return (val, 'string', None)
+
+    if (len(val) == 5) and (':' in val):
+      time_str = val.replace(':','')
+    elif (len(val) == 4):
+      time_str = val
+    else:
+      return (val, 'length', None)
+
+    if (not time_str.isdigit()):
+      return (time_str, 'digit', None)
+
+    hrs,min = int(time_str[:2]),int(time_str[2:])
+
+    if (hrs < 0) or (hrs > 23) or (min < 0) or (min > 59):
+      return (time_str, 'range', None)
+
+    return (time_str, None, (hrs * 60) + min)  # Convert into minute value
+
+  # ---------------------------------------------------------------------------
+
   def compare(self, val1, val2):
     """Compare two field values using the time comparator.
     """
@@ -1892,52 +2778,33 @@ class FieldComparatorTime(FieldComparator):
     if (val1 == val2):
       return self.__calc_freq_agree_weight__(val1)
 
-    # Calculate time comparison value - - - - - - - - - - - - - - - - - - - - -
+    # Get the parsed times (in minutes) - - - - - - - - - - - - - - - - - - -
     #
-    if (isinstance(val1,str)):
-      if (len(val1) == 5) and (':' in val1):
-        time1str = val1.replace(':','')
-      elif (len(val1) == 4):
-        time1str = val1
-      else:
+    (time1str, error1, time1) = self.__get_profile__(val1)
+    (time2str, error2, time2) = self.__get_profile__(val2)
+
+    if ((error1 != None) or (error2 != None)):
+      if (error1 == 'string'):
+        logging.warn('Value 1 is not a string: "%s"' % (str(val1)))
+      elif (error1 == 'length'):
         logging.warn('Value 1 is not a string of length 4 or 5: "%s"' % \
                      (str(val1)))
-        return self.disagree_weight
-    else:
-      logging.warn('Value 1 is not a string: "%s"' % (str(val1)))
-      return self.disagree_weight
-
-    if (isinstance(val2,str)):
-      if (len(val2) == 5) and (':' in val2):
-        time2str = val2.replace(':','')
-      elif (len(val2) == 4):
-        time2str = val2
-      else:
+      elif (error2 == 'string'):
+        logging.exception('Value 2 is not a string: "%s"' % (str(val2)))
+      elif (error2 == 'length'):
         logging.warn('Value 2 is not a string of length 4 or 5: "%s"' % \
                      (str(val2)))
-        return self.disagree_weight
-    else:
-      logging.exception('Value 2 is not a string: "%s"' % (str(val2)))
-      return self.disagree_weight
-
-    if ((not time1str.isdigit()) or (not time2str.isdigit())):
-      logging.warn('At least one of the field values is not a string made ' + \
-                   'of digits only: %s / %s' % (str(time1str),str(time2str)))
-      return self.disagree_weight
-
-    hrs1,min1 = int(time1str[:2]),int(time1str[2:])
-    hrs2,min2 = int(time2str[:2]),int(time2str[2:])
+      elif ('digit' in [error1, error2]):
+        logging.warn('At least one of the field values is not a string ' + \
+                     'made of digits only: %s / %s' % \
+                     (str(time1str),str(time2str)))
+      elif (error1 == 'range'):
+        logging.warn('Time 1 value out of range: "%s"' % (time1str))
+      else:
+        logging.warn('Time 2 value out of range: "%s"' % (time2str))
 
-    if (hrs1 < 0) or (hrs1 > 23) or (min1 < 0) or (min1 > 59):
-      logging.warn('Time 1 value out of range: "%s"' % (time1str))
-      return self.disagree_weight
-    if (hrs2 < 0) or (hrs2 > 23) or (min2 < 0) or (min2 > 59):
-      logging.warn('Time 2 value out of range: "%s"' % (time2str))
       return self.disagree_weight
 
-    time1 = (hrs1 * 60) + min1  # Convert into minute values
-    time2 = (hrs2 * 60) + min2
-
     # Get general or frequency based agreement weight
     #
     agree_weight = self.__calc_freq_weights__(val1, val2)
@@ -2001,7 +2868,8 @@ class FieldComparatorAge(FieldComparator):
      for a comparison are not a valid tuple of numbers.
 
      Separators (/:;,.) are automatically removed from the dates before they
-     are parsed.
+     are parsed. Each date value is only parsed once (the parsed dates and
+     their ages are kept as value profiles).
 
      The additional arguments (besides the base class arguments) which have to
      be set when this field comparator is initialised are:
@@ -2099,6 +2967,20 @@ class FieldComparatorAge(FieldComparator):
 
   # ---------------------------------------------------------------------------
 
+  def __calc_profile__(self, val):
+    """Parse the date value (see the parse_date_str() function) and return a
+       tuple (date string without separators, error, date, age in days).
+    """
+
+    (date_str, error, date) = parse_date_str(val, self.date_format)
+
+    if (error != None):
+      return (date_str, error, None, None)
+
+    return (date_str, error, date, (self.fix_date_val - date).days)
+
+  # ---------------------------------------------------------------------------
+
   def compare(self, val1, val2):
     """Compare two field values - assumed to be dates made of triplets (tuples)
        (day,month,year) -  using the age comparator.
@@ -2117,103 +2999,18 @@ class FieldComparatorAge(FieldComparator):
     if (val1 == val2):
       return self.__calc_freq_agree_weight__(val1)
 
-    # Remove separator characters - - - - - - - - - - - - - - - - - - - - - - -
-    #
-    for c in '/:;,.\\':
-      if c in val1:
-        val1 = val1.replace(c,'')
-      if c in val2:
-        val2 = val2.replace(c,'')
-
-    # Parse values to be compared - - - - - - - - - - - - - - - - - - - - - - -
-    #
-    if ((len(val1) not in [6,8]) or (len(val2) not in [6,8])):
-      logging.warn('At least one of the field values is not of correct ' + \
-                   'length: %s / %s' % (val1, val2))
-      return self.disagree_weight
-
-    if (self.date_format in ['ddmmyyyy', 'ddmmyy']):
-      day1, month1, year1 = val1[:2],val1[2:4],val1[4:]
-      day2, month2, year2 = val2[:2],val2[2:4],val2[4:]
-    elif (self.date_format in ['mmddyyyy','mmddyy']):
-      day1, month1, year1 = val1[2:4],val1[:2],val1[4:]
-      day2, month2, year2 = val2[2:4],val2[:2],val2[4:]
-    elif (self.date_format == 'yyyymmdd'):
-      day1, month1, year1 = val1[6:],val1[4:6],val1[:4]
-      day2, month2, year2 = val2[6:],val2[4:6],val2[:4]
-
-    # Check values for validity - - - - - - - - - - - - - - - - - - - - - - - -
-    #
-    if ((month1 < '01') or (month1 > '12') or \
-        (month2 < '01') or (month2 > '12')):
-      logging.warn('At least one of the month values is out of range: ' + \
-                   '%s / %s' % (val1, val2))
-      return self.disagree_weight
-
-    days_ok = True
-
-    if ((day1 < '01') or (day2 < '01')):
-      days_ok = False
-    else:
-
-      if ((month1 in ['01','03','05','07','08','10','12']) and (day1 > '31')):
-        days_ok = False
-      elif ((month1 in ['04','06','09','11']) and (day1 > '30')):
-        days_ok = False
-      elif ((month1 == '02') and (day1 > '29')):
-        days_ok = False
-
-      if ((month2 in ['01','03','05','07','08','10','12']) and (day2 > '31')):
-        days_ok = False
-      elif ((month2 in ['04','06','09','11']) and (day2 > '30')):
-        days_ok = False
-      elif ((month2 == '02') and (day2 > '29')):
-        days_ok = False
-
-    if (days_ok == False):
-      logging.warn('At least one of the day values is out of range: ' + \
-                   '%s / %s' % (val1, val2))
-      return self.disagree_weight
-
-    # Convert into integer numbers - - - - - - - - - - - - - - - - - - - - - -
+    # Get the parsed dates (without separator characters) and ages - - - - -
     #
-    try:
-      int_day1 = int(day1)
-    except:
-      return self.disagree_weight
-    try:
-      int_month1 = int(month1)
-    except:
-      return self.disagree_weight
-    try:
-      int_year1 = int(year1)
-    except:
-      return self.disagree_weight
+    (val1, error1, date1, age1) = self.__get_profile__(val1)
+    (val2, error2, date2, age2) = self.__get_profile__(val2)
 
-    try:
-      int_day2 = int(day2)
-    except:
-      return self.disagree_weight
-    try:
-      int_month2 = int(month2)
-    except:
+    if ((error1 != None) or (error2 != None)):
+      log_date_error(val1, error1, val2, error2)
       return self.disagree_weight
-    try:
-      int_year2 = int(year2)
-    except:
-      return self.disagree_weight
-
-    # Create date objects
-    #
-    date1 = datetime.date(int_year1, int_month1, int_day1)
-    date2 = datetime.date(int_year2, int_month2, int_day2)
 
     if (date1 == date2):  # Same date
       return self.__calc_freq_agree_weight__(val1)
 
-    age1 = (self.fix_date_val - date1).days  # Get ages in days
-    age2 = (self.fix_date_val - date2).days
-
     # Check age values  - - - - - - - - - - - - - - - - - - - - - - - - - - - -
     #
     if (age1 < 0) or (age1 > 54750):  # Number of days in 150 years
@@ -2366,8 +3163,13 @@ class FieldComparatorJaro(FieldComparatorApproxString):
 
     self.log([('Threshold', self.threshold)])  # Log a message
 
-    self.JARO_MARKER_CHAR = chr(1)  # Special character used to mark assigned
-                                    # characters
+  # ---------------------------------------------------------------------------
+
+  def __calc_profile__(self, val):
+    """Return the positions of the characters of the given value as bit masks.
+    """
+
+    return stringcmp.jaro_profile(val)
 
   # ---------------------------------------------------------------------------
 
@@ -2391,34 +3193,25 @@ class FieldComparatorJaro(FieldComparatorApproxString):
     # Calculate Jaro similarity value - - - - - - - - - - - - - - - - - - - - -
     #
     len1, len2 = len(val1), len(val2)
-    halflen = max(len1,len2) / 2 - 1  # Or + 1?? PC 12/03/2009
 
-    ass1, ass2 = '', ''  # Characters assigned in string 1 and string 2
-    workstr1, workstr2 = val1, val2  # Copies of the original strings
+    # Maximum possible Jaro similarity with these string lengths
+    #
+    max_common = float(min(len1,len2))
+    max_w = 1./3.*(max_common / float(len1) + max_common / float(len2) + 1.0)
 
-    common1, common2 = 0.0, 0.0  # Number of common characters
+    if (max_w < self.threshold):
+      common1 = 0.0  # Similarity is smaller than threshold
 
-    for i in range(len1):  # Analyse the first string
-      start = max(0,i-halflen)
-      end   = min(i+halflen+1,len2)
-      index = workstr2.find(val1[i],start,end)
-      if (index > -1):  # Found common character
-        common1 += 1
-        ass1 = ass1 + val1[i]
-        workstr2 = workstr2[:index]+self.JARO_MARKER_CHAR+workstr2[index+1:]
+    else:  # Characters assigned in string 1 and string 2
+      ass1, ass2, free1, free2 = stringcmp.jaro_assign(val1, val2,
+                                                     self.__get_profile__(val1),
+                                                     self.__get_profile__(val2))
 
-    for i in range(len2):  # Analyse the second string
-      start = max(0,i-halflen)
-      end   = min(i+halflen+1,len1)
-      index = workstr1.find(val2[i],start,end)
-      if (index > -1):  # Found common character
-        common2 += 1
-        ass2 = ass2 + val2[i]
-        workstr1 = workstr1[:index]+self.JARO_MARKER_CHAR+workstr1[index+1:]
+      common1, common2 = float(len(ass1)), float(len(ass2))
 
-    assert (common1 == common2), 'Jaro: Different "common" values'
+      assert (common1 == common2), 'Jaro: Different "common" values'
 
-    if (common1 == 0.0):  # No characters in common
+    if (common1 == 0.0):  # No characters in common or below threshold
       w = self.disagree_weight
 
     else:  # Compute number of transpositions  - - - - - - - - - - - - - - - -
@@ -2528,9 +3321,6 @@ class FieldComparatorWinkler(FieldComparatorApproxString):
               ('Check initial same characters flag', self.check_init),
               ('Check long strings flag', self.check_long)])  # Log a message
 
-    self.JARO_MARKER_CHAR = chr(1)  # Special character used to mark assigned
-                                    # characters
-
     # Taken from US Census Bureau BigMatch C code 'stringcmp'
     #
     self.sim_char_pairs = frozenset([('a','e'),('e','a'),('a','i'),('i','a'),
@@ -2554,6 +3344,32 @@ class FieldComparatorWinkler(FieldComparatorApproxString):
                                      ('e',' '),(' ','e'),('y',' '),(' ','y'),
                                      ('s',' '),(' ','s')])
 
+    # For each character the characters it is similar to, i.e. all c1 where
+    # (c1,c2) is a similar character pair
+    #
+    self.sim_to_char_dict = {}
+    for (c1, c2) in self.sim_char_pairs:
+      self.sim_to_char_dict.setdefault(c2, []).append(c1)
+
+  # ---------------------------------------------------------------------------
+
+  def __calc_profile__(self, val):
+    """Return the positions of the characters of the given value as bit masks,
+       and for each character the positions of its similar characters in the
+       value as bit masks.
+    """
+
+    char_mask_dict = stringcmp.jaro_profile(val)
+
+    sim_mask_dict = {}
+
+    if (self.check_sim == True):
+      for (c2, mask) in char_mask_dict.iteritems():
+        for c1 in self.sim_to_char_dict.get(c2, []):
+          sim_mask_dict[c1] = sim_mask_dict.get(c1, 0) | mask
+
+    return (char_mask_dict, sim_mask_dict)
+
   # ---------------------------------------------------------------------------
 
   def __do_winkler__(self, val1, val2):
@@ -2567,34 +3383,29 @@ class FieldComparatorWinkler(FieldComparatorApproxString):
     if (len1 < 4) or (len2 < 4):  # Both strings must be at least 4 chars long
       return self.disagree_weight
 
-    halflen = max(len1,len2) / 2 - 1  # Or + 1?? PC 12/03/2009
+    # Check if the threshold can be reached with these string lengths. At most
+    # the characters of the shorter string can be common (also with similar
+    # characters), the basic weight w is then increased by less than
+    # 0.5*(1-w) by the initial characters and long strings adjustments.
+    #
+    max_common = float(min(len1,len2))
+    max_w = 1./3.*(max_common / float(len1) + max_common / float(len2) + 1.0)
 
-    ass1, ass2 = '', ''  # Characters assigned in string 1 and string 2
-    workstr1, workstr2 = val1, val2  # Copies of the original strings
+    if (self.check_init == True) or (self.check_long == True):
+      max_w += 0.5*(1.0 - max_w)
 
-    common1, common2 = 0.0, 0.0  # Number of common characters
+    if (max_w < self.threshold):
+      return self.disagree_weight
 
-    # Analyse the first string  - - - - - - - - - - - - - - - - - - - - - - - -
+    # Find characters assigned in string 1 and string 2 - - - - - - - - - - - -
     #
-    for i in range(len1):
-      start = max(0,i-halflen)
-      end   = min(i+halflen+1,len2)
-      index = workstr2.find(val1[i],start,end)
-      if (index > -1):  # Found common character
-        common1 += 1
-        ass1 = ass1 + val1[i]
-        workstr2 = workstr2[:index]+self.JARO_MARKER_CHAR+workstr2[index+1:]
+    profile2 = self.__get_profile__(val2)
 
-    # Analyse the second string - - - - - - - - - - - - - - - - - - - - - - - -
-    #
-    for i in range(len2):
-      start = max(0,i-halflen)
-      end   = min(i+halflen+1,len1)
-      index = workstr1.find(val2[i],start,end)
-      if (index > -1):  # Found common character
-        common2 += 1
-        ass2 = ass2 + val2[i]
-        workstr1 = workstr1[:index]+self.JARO_MARKER_CHAR+workstr1[index+1:]
+    ass1, ass2, free1, free2 = stringcmp.jaro_assign(val1, val2,
+                                                  self.__get_profile__(val1)[0],
+                                                  profile2[0])
+
+    common1, common2 = float(len(ass1)), float(len(ass2))
 
     assert (common1 == common2), 'Winkler: Different "common" values'
 
@@ -2604,8 +3415,8 @@ class FieldComparatorWinkler(FieldComparatorApproxString):
     # Compute number of transpositions  - - - - - - - - - - - - - - - - - - - -
     #
     transp = 0.0
-    for i in range(len(ass1)):
-      if (ass1[i] != ass2[i]):
+    for (c1, c2) in zip(ass1, ass2):
+      if (c1 != c2):
         transp += 0.5
 
     # Check for similarities in non-matched characters - - - - - - - - - - - -
@@ -2614,15 +3425,20 @@ class FieldComparatorWinkler(FieldComparatorApproxString):
 
       sim_weight = 0.0
 
-      workstr1 = workstr1.replace(self.JARO_MARKER_CHAR ,'')  # Remove assigned
-      workstr2 = workstr2.replace(self.JARO_MARKER_CHAR ,'')  # characters
+      # Each not assigned character in string 1 is paired with the left-most
+      # not assigned (and not yet paired) similar character in string 2
+      #
+      sim_mask_dict2 = profile2[1]
+
+      while (free1 != 0):
+        low_bit = free1 & -free1
+        free1 ^= low_bit
 
-      for c1 in workstr1:
-        for j in range(len(workstr2)):
-          if (c1,workstr2[j]) in self.sim_char_pairs:
-            sim_weight += 3
-            workstr2 = workstr2[:j]+self.JARO_MARKER_CHAR+workstr2[j+1:]
-            break       # Mark character as used
+        avail = sim_mask_dict2.get(val1[low_bit.bit_length()-1], 0) & free2
+
+        if (avail != 0):
+          sim_weight += 3
+          free2 ^= avail & -avail  # Mark character as used
 
       common1 += sim_weight / 10.0
 
@@ -2827,8 +3643,13 @@ class FieldComparatorQGram(FieldComparatorApproxString):
               ('Common divisor', self.common_divisor),
               ('Padded flag', self.padded)])  # Log a message
 
-    self.QGRAM_START_CHAR = chr(1)
-    self.QGRAM_END_CHAR =   chr(2)
+  # ---------------------------------------------------------------------------
+
+  def __calc_profile__(self, val):
+    """Return the sorted list of q-grams of the given value.
+    """
+
+    return stringcmp.qgram_profile(val, self.q, self.padded)
 
   # ---------------------------------------------------------------------------
 
@@ -2886,37 +3707,10 @@ class FieldComparatorQGram(FieldComparatorApproxString):
 
       else:
 
-        # Add start and end characters (padding) - - - - - - - - - - - - - - -
-        #
-        if (self.padded == True):
-          qgram_str1 = (q-1)*self.QGRAM_START_CHAR+val1+(q-1)* \
-                       self.QGRAM_END_CHAR
-          qgram_str2 = (q-1)*self.QGRAM_START_CHAR+val2+(q-1)* \
-                       self.QGRAM_END_CHAR
-        else:
-          qgram_str1 = val1
-          qgram_str2 = val2
-
-        # Make a list of q-grams for both strings - - - - - - - - - - - - - - -
-        #
-        qgram_list1 = [qgram_str1[i:i+q] for i in range(len(qgram_str1)-(q-1))]
-        qgram_list2 = [qgram_str2[i:i+q] for i in range(len(qgram_str2)-(q-1))]
-
-        # Get common q-grams  - - - - - - - - - - - - - - - - - - - - - - - - -
+        # Count common q-grams in the sorted q-gram lists of the values - - -
         #
-        common = 0
-
-        if (num_qgram1 < num_qgram2):  # Count using the shorter q-gram list
-          short_qgram_list = qgram_list1
-          long_qgram_list =  qgram_list2
-        else:
-          short_qgram_list = qgram_list2
-          long_qgram_list =  qgram_list1
-
-        for q_gram in short_qgram_list:
-          if (q_gram in long_qgram_list):
-            common += 1
-            long_qgram_list.remove(q_gram)  # Remove the counted q-gram
+        common = stringcmp.count_common_sorted(self.__get_profile__(val1),
+                                               self.__get_profile__(val2))
 
         w = float(common) / float(divisor)
 
@@ -3024,8 +3818,13 @@ class FieldComparatorPosQGram(FieldComparatorApproxString):
               ('Common divisor', self.common_divisor),
               ('Padded flag', self.padded)])  # Log a message
 
-    self.QGRAM_START_CHAR = chr(1)
-    self.QGRAM_END_CHAR =   chr(2)
+  # ---------------------------------------------------------------------------
+
+  def __calc_profile__(self, val):
+    """Return the positional q-gram profile of the given value.
+    """
+
+    return stringcmp.posqgram_profile(val, self.q, self.padded)
 
   # ---------------------------------------------------------------------------
 
@@ -3083,46 +3882,17 @@ class FieldComparatorPosQGram(FieldComparatorApproxString):
 
       else:
 
-        # Add start and end characters (padding) - - - - - - - - - - - - - - -
-        #
-        if (self.padded == True):
-          qgram_str1 = (q-1)*self.QGRAM_START_CHAR+val1+(q-1)* \
-                       self.QGRAM_END_CHAR
-          qgram_str2 = (q-1)*self.QGRAM_START_CHAR+val2+(q-1)* \
-                       self.QGRAM_END_CHAR
-        else:
-          qgram_str1 = val1
-          qgram_str2 = val2
-
-        # Make a list of q-grams for both strings - - - - - - - - - - - - - - -
-        #
-        qgram_list1 = \
-                  [(qgram_str1[i:i+q],i) for i in range(len(qgram_str1)-(q-1))]
-        qgram_list2 = \
-                  [(qgram_str2[i:i+q],i) for i in range(len(qgram_str2)-(q-1))]
-
-        # Get common q-grams  - - - - - - - - - - - - - - - - - - - - - - - - -
+        # Count common positional q-grams (using the shorter q-gram list
+        # first)
         #
-        common = 0
-
-        if (num_qgram1 < num_qgram2):  # Count using the shorter q-gram list
-          short_qgram_list = qgram_list1
-          long_qgram_list =  qgram_list2
+        if (num_qgram1 < num_qgram2):
+          common = stringcmp.count_common_posqgrams(self.__get_profile__(val1),
+                                                    self.__get_profile__(val2),
+                                                    self.max_dist)
         else:
-          short_qgram_list = qgram_list2
-          long_qgram_list =  qgram_list1
-
-        for pos_q_gram in short_qgram_list:
-          (q_gram,pos) = pos_q_gram
-
-          pos_range = range(max(pos-self.max_dist,0), pos+self.max_dist+1)
-
-          for test_pos in pos_range:
-            test_pos_q_gram = (q_gram,test_pos)
-            if (test_pos_q_gram in long_qgram_list):
-              common += 1
-              long_qgram_list.remove(test_pos_q_gram) # Remove counted q-gram
-              break
+          common = stringcmp.count_common_posqgrams(self.__get_profile__(val2),
+                                                    self.__get_profile__(val1),
+                                                    self.max_dist)
 
         w = float(common) / float(divisor)
 
@@ -3219,8 +3989,14 @@ class FieldComparatorSGram(FieldComparatorApproxString):
               ('Common divisor', self.common_divisor),
               ('Padded flag', self.padded)])  # Log a message
 
-    self.SGRAM_START_CHAR = chr(1)
-    self.SGRAM_END_CHAR =   chr(2)
+  # ---------------------------------------------------------------------------
+
+  def __calc_profile__(self, val):
+    """Return the sorted lists of s-grams of the given value, one list for
+       each gram class.
+    """
+
+    return stringcmp.sgram_profile(val, self.gram_class_list, self.padded)
 
   # ---------------------------------------------------------------------------
 
@@ -3243,31 +4019,15 @@ class FieldComparatorSGram(FieldComparatorApproxString):
 
     # Calculate s-gram similarity value - - - - - - - - - - - - - - - - - - - -
 
-    # Extend strings with start and end characters
-    #
-    if (self.padded == True):
-      tmp_str1 = self.SGRAM_START_CHAR+val1+self.SGRAM_END_CHAR
-      tmp_str2 = self.SGRAM_START_CHAR+val2+self.SGRAM_END_CHAR
-    else:
-      tmp_str1 = val1
-      tmp_str2 = val2
-
-    len1 = len(tmp_str1)
-    len2 = len(tmp_str2)
+    profile1 = self.__get_profile__(val1)  # Sorted s-gram lists of values
+    profile2 = self.__get_profile__(val2)
 
     common = 0.0   # Sum number of common s-grams over gram classes
     divisor = 0.0  # Sum of divisors over gram classes
 
-    for c in self.gram_class_list:  # Loop over all gram classes given - - - -
-
-      sgram_list1 = []
-      sgram_list2 = []
-
-      for s in c:  # Skip distances
-        for i in range(0,len1-s-1):
-          sgram_list1.append(tmp_str1[i]+tmp_str1[i+s+1])
-        for i in range(0,len2-s-1):
-          sgram_list2.append(tmp_str2[i]+tmp_str2[i+s+1])
+    # Loop over all gram classes given - - - - - - - - - - - - - - - - - - - -
+    #
+    for (sgram_list1, sgram_list2) in zip(profile1, profile2):
 
       num_sgram1 = len(sgram_list1)
       num_sgram2 = len(sgram_list2)
@@ -3279,21 +4039,7 @@ class FieldComparatorSGram(FieldComparatorApproxString):
       else:  # Longest
         this_divisor = max(num_sgram1,num_sgram2)
 
-      if (num_sgram1 < num_sgram2):  # Count using the shorter s-gram list
-        short_sgram_list = sgram_list1
-        long_sgram_list =  sgram_list2
-      else:
-        short_sgram_list = sgram_list2
-        long_sgram_list =  sgram_list1
-
-      this_common = 0  # Number of common s-grams for this gram class
-
-      for s_gram in short_sgram_list:
-        if (s_gram in long_sgram_list):
-          this_common += 1
-          long_sgram_list.remove(s_gram)  # Remove the counted s-gram
-
-      common +=  this_common
+      common +=  stringcmp.count_common_sorted(sgram_list1, sgram_list2)
       divisor += this_divisor
 
     if (divisor == 0):  # One string did not have any s-gram
@@ -3372,38 +4118,17 @@ class FieldComparatorEditDist(FieldComparatorApproxString):
     else: # Calculate the maximum distance possible with this threshold
       max_dist = (1.0-self.threshold)*max_len
 
-      if (n > m):  # Make sure n <= m, to use O(min(n,m)) space
-        str1 = val2
-        str2 = val1
-        n, m = m, n
+      if (n > m):  # Make sure n <= m, to use the shorter value as bit vectors
+        (dist, exceeded) = stringcmp.editdist_bitparallel(val2, val1, False,
+                                                          max_dist)
       else:
-        str1 = val1
-        str2 = val2
-
-      current = range(n+1)
+        (dist, exceeded) = stringcmp.editdist_bitparallel(val1, val2, False,
+                                                          max_dist)
 
-      w = -1  # Set weight to an illegal value (so it can be chacked later)
-
-      for i in range(1, m+1):
-        previous = current
-        current =  [i]+n*[0]
-        str2char = str2[i-1]
-
-        for j in range(1,n+1):
-          substitute = previous[j-1]
-          if (str1[j-1] != str2char):
-            substitute += 1
-
-          # Get minimum of insert, delete and substitute
-          #
-          current[j] = min(previous[j]+1, current[j-1]+1, substitute)
-
-        if (min(current) > max_dist):  # Distance is already too large
-          w = max(1.0 - float(max_dist+1) / float(max_len), 0.0)
-          break  # Exit loop
-
-      if (w == -1):  # Weight has not been calculated
-        w = 1.0 - float(current[n]) / float(max_len)
+      if (exceeded == True):  # Distance is too large
+        w = max(1.0 - float(max_dist+1) / float(max_len), 0.0)
+      else:
+        w = 1.0 - float(dist) / float(max_len)
 
       assert (w >= 0.0), 'Edit distance: Similarity weight < 0.0'
       assert (w <= 1.0), 'Edit distance: Similarity weight > 1.0'
@@ -3481,56 +4206,17 @@ class FieldComparatorDaLeDist(FieldComparatorApproxString):
     else: # Calculate the maximum distance possible with this threshold
       max_dist = (1.0-self.threshold)*max_len
 
-      if (n > m):  # Make sure n <= m, to use O(min(n,m)) space
-        str1 = val2
-        str2 = val1
-        n, m = m, n
+      if (n > m):  # Make sure n <= m, to use the shorter value as bit vectors
+        (dist, exceeded) = stringcmp.editdist_bitparallel(val2, val1, True,
+                                                          max_dist)
       else:
-        str1 = val1
-        str2 = val2
+        (dist, exceeded) = stringcmp.editdist_bitparallel(val1, val2, True,
+                                                          max_dist)
 
-      d = []  # Table with the full distance matrix
-
-      current = range(n+1)
-      d.append(current)
-
-      w = -1  # Set weight to an illegal value (so it can be chacked later)
-
-      for i in range(1,m+1):
-
-        previous = current
-        current =  [i]+n*[0]
-        str2char = str2[i-1]
-
-        for j in range(1,n+1):
-          substitute = previous[j-1]
-          if (str1[j-1] != str2char):
-            substitute += 1
-
-          if (i == 1) or (j == 1):  # First characters, no transp possible
-
-            # Get minimum of insert, delete and substitute
-            #
-            current[j] = min(previous[j]+1, current[j-1]+1, substitute)
-
-          else:
-            if (str1[j-2] == str2[i-1]) and (str1[j-1] == str2[i-2]):
-              transpose = d[i-2][j-2] + 1
-            else:
-              transpose = d[i-2][j-2] + 3
-
-            current[j] = min(previous[j]+1, current[j-1]+1, substitute, \
-                             transpose)
-
-        d.append(current)
-
-        if (min(current) > max_dist):  # Distance is already too large
-          w = max(1.0 - float(max_dist+1) / float(max_len), 0.0)
-          break  # Exit loop
-
-      if (w == -1):  # Weight has not been calculated
-
-        w = 1.0 - float(current[n]) / float(max_len)
+      if (exceeded == True):  # Distance is too large
+        w = max(1.0 - float(max_dist+1) / float(max_len), 0.0)
+      else:
+        w = 1.0 - float(dist) / float(max_len)
 
       assert (w >= 0.0), 'DaLe distance: Similarity weight < 0.0'
       assert (w <= 1.0), 'DaLe distance: Similarity weight > 1.0'
@@ -3727,57 +4413,90 @@ class FieldComparatorSWDist(FieldComparatorApproxString):
     else:  # Longest
       divisor = max(n,m)*self.match_score
 
+    match_score =       self.match_score
+    extension_penalty = self.extension_penalty
+    first_gap =         self.gap_penalty+extension_penalty
+
     best_score = 0  # Keep the best score while calculating table
 
-    d = []  # Table with the full distance matrix
+    # Only the previous and the current row of the table are kept, the best
+    # scores of gaps ending in a cell are kept as running maxima (col_gap for
+    # vertical gaps, row_gap for horizontal gaps)
+    #
+    current = [0]*(m+1)
+    col_gap = [0]*(m+1)
+
+    # Scores can increase by at most the match score per row, so stop as soon
+    # as the best reachable score is below the threshold
+    #
+    if (float(min(n,m)*match_score) / float(divisor) < self.threshold):
+      is_below_threshold = True
+    else:
+      is_below_threshold = False
+
+      for i in range(1,n+1):
+        previous = current
+        current =  [0]*(m+1)
+
+        vali1 = val1[i-1]
+        approx_match1 = self.approx_matches.get(vali1,-1)
+
+        row_gap = 0
 
-    for i in range(n+1):  # Initalise table
-      d.append([0.0]*(m+1))
+        for j in range(1,m+1):
+          valj2 = val2[j-1]
 
-    for i in range(1,n+1):
-      vali1 = val1[i-1]
-      approx_match1 = self.approx_matches.get(vali1,-1)
+          match = previous[j-1]
+
+          if (vali1 == valj2):
+            match += match_score
+          else:
+            approx_match2 = self.approx_matches.get(valj2,-1)
+
+            if (approx_match1 >= 0) and (approx_match2 >= 0) and \
+               (approx_match1 == approx_match2):
+              match += self.approx_score
+            else:
+              match += self.mismatch_score
 
-      for j in range(1,m+1):
-        valj2 = val2[j-1]
+          if (i > 1):
+            col_gap[j] = max(previous[j]-first_gap,
+                             col_gap[j]-extension_penalty)
+            insert = max(0, col_gap[j])
+          else:
+            insert = 0
 
-        match = d[i-1][j-1]
+          if (j > 1):
+            row_gap = max(current[j-1]-first_gap, row_gap-extension_penalty)
+            delete = max(0, row_gap)
+          else:
+            delete = 0
 
-        if (vali1 == valj2):
-          match += self.match_score
-        else:
-          approx_match2 = self.approx_matches.get(valj2,-1)
+          current[j] = max(match, insert, delete, 0)
 
-          if (approx_match1 >= 0) and (approx_match2 >= 0) and \
-             (approx_match1 == approx_match2):
-            match += self.approx_score
-          else:
-            match += self.mismatch_score
+        best_score = max(max(current), best_score)
 
-        insert = 0
-        for k in range(1,i):
-          score = d[i-k][j] - self.gap_penalty - k*self.extension_penalty
-          insert = max(insert, score)
+        max_score = best_score + (n-i)*match_score
+        if (float(max_score) / float(divisor) < self.threshold):
+          is_below_threshold = True
+          break
 
-        delete = 0
-        for l in range(1,j):
-          score = d[i][j-l] - self.gap_penalty - l*self.extension_penalty
-          delete = max(delete, score)
+    if (is_below_threshold == True):
+      w = self.disagree_weight
 
-        d[i][j] = max(match, insert, delete, 0)
-        best_score = max(d[i][j], best_score)
+    else:
 
-    # best_score can be min(len(str1),len)str2))*match_score (if one string is
-    # a sub-string of the other string)
-    #
-    # The lower best_score the less similar the sequences are.
-    #
-    w = float(best_score) / float(divisor)
+      # best_score can be min(len(str1),len)str2))*match_score (if one string
+      # is a sub-string of the other string)
+      #
+      # The lower best_score the less similar the sequences are.
+      #
+      w = float(best_score) / float(divisor)
 
-    assert (w >= 0.0), 'Smith-Waterman distance: Similarity weight < 0.0'
-    assert (w <= 1.0), 'Smith-Waterman distance: Similarity weight > 1.0'
+      assert (w >= 0.0), 'Smith-Waterman distance: Similarity weight < 0.0'
+      assert (w <= 1.0), 'Smith-Waterman distance: Similarity weight > 1.0'
 
-    w = self.__calc_partagree_weight__(val1, val2, w)
+      w = self.__calc_partagree_weight__(val1, val2, w)
 
     if (self.do_caching == True):  # Put values pair into the cache
       self.__put_into_cache__(val1, val2, w)
@@ -3807,6 +4526,10 @@ class FieldComparatorSyllAlDist(FieldComparatorApproxString):
        do_phonix       A flag, if set to True (the default) the Phonix sound
                        encoding transformation will be applied first to both
                        strings, otherwise the original strings will be used.
+
+     The syllable string of each value (with the beginning of each syllable as
+     an uppercase character) and its maximum possible alignment weight are
+     only calculated once (and kept as value profile).
   """
 
   # ---------------------------------------------------------------------------
@@ -3864,6 +4587,53 @@ class FieldComparatorSyllAlDist(FieldComparatorApproxString):
 
   # ---------------------------------------------------------------------------
 
+  def __calc_profile__(self, val):
+    """Return a tuple (syllable string, maximum alignment weight) for the
+       given value, with the beginning of each syllable in the (Phonix
+       transformed) value made an uppercase character.
+    """
+
+    if (self.do_phonix == True):
+      workstr = encode.phonix_transform(val)
+    else:
+      workstr = val
+
+    # Syllable scan, make beginning of each syllable an uppercase character
+    #
+    str_list = list(workstr)
+    str_list[0] = str_list[0].upper() # First char is start of 1st syllable
+    str_len = len(workstr)
+
+    for i in range(1, str_len):
+
+      if (str_list[i] not in 'aeiouyAEIOUY'):
+
+        if (i < (str_len-1)):  # Not last character
+          if (str_list[i+1] in 'aeiouyAEIOUYhrw'):
+            str_list[i] = str_list[i].upper()
+
+        elif (str_list[i] not in 'aeiouyAEIOUY'):
+          str_list[i] = str_list[i].upper()
+
+        if (str_list[i] in 'HRW') and (str_list[i-1] <= 'Z'):
+          str_list[i] = str_list[i].lower()
+
+    wstr = ''.join(str_list)  # Convert back to string
+
+    # Calculate maximum number of syllable starts and other characters to get
+    # maximum possible alignment weight
+    #
+    max_w = 0
+    for c in wstr:
+      if c.isupper():
+        max_w += self.s4  # Syllable start
+      else:
+        max_w += self.s1  # Other characters
+
+    return (wstr, max_w)
+
+  # ---------------------------------------------------------------------------
+
   def compare(self, val1, val2):
     """Compare two field values using the syllable alignment distance
        approximate string comparator.
@@ -3884,60 +4654,11 @@ class FieldComparatorSyllAlDist(FieldComparatorApproxString):
 
     # Calculate syllable alignment distance similarity value - - - - - - - - -
     #
-    if (self.do_phonix == True):
-      workstr1 = encode.phonix_transform(val1)
-      workstr2 = encode.phonix_transform(val2)
-    else:
-      workstr1 = val1
-      workstr2 = val2
-
-    # Syllable scan, make beginning of each syllable an uppercase character
-    #
-    syll_str_list = []  # List for the two syllable strings
-
-    for s in (workstr1, workstr2):
-      str_list = list(s)
-      str_list[0] = str_list[0].upper() # First char is start of 1st syllable
-      str_len = len(s)
-
-      for i in range(1, str_len):
-
-        if (str_list[i] not in 'aeiouyAEIOUY'):
-
-          if (i < (str_len-1)):  # Not last character
-            if (str_list[i+1] in 'aeiouyAEIOUYhrw'):
-              str_list[i] = str_list[i].upper()
-
-          elif (str_list[i] not in 'aeiouyAEIOUY'):
-            str_list[i] = str_list[i].upper()
-
-          if (str_list[i] in 'HRW') and (str_list[i-1] <= 'Z'):
-            str_list[i] = str_list[i].lower()
-
-      syll_str_list.append(''.join(str_list))  # Convert back to string
-
-    wstr1 = syll_str_list[0]
-    wstr2 = syll_str_list[1]
+    (wstr1, max_w1) = self.__get_profile__(val1)
+    (wstr2, max_w2) = self.__get_profile__(val2)
 
     n, m = len(wstr1), len(wstr2)
 
-    # Calculate maximum number of syllable starts and other characters to get
-    # maximum possible alignment weight
-    #
-    max_w1 = 0
-    for c in wstr1:
-      if c.isupper():
-        max_w1 += self.s4  # Syllable start
-      else:
-        max_w1 += self.s1  # Other characters
-
-    max_w2 = 0
-    for c in wstr2:
-      if c.isupper():
-        max_w2 += self.s4  # Syllable start
-      else:
-        max_w2 += self.s1  # Other characters
-
     # Calculate the divisor - - - - - - - - - - - - - - - - - - - - - - - - -
     #
     if (self.common_divisor == 'average'):
@@ -3947,55 +4668,77 @@ class FieldComparatorSyllAlDist(FieldComparatorApproxString):
     else:  # Longest
       divisor = max(max_w1,max_w2)
 
-    d = []  # Table with the full distance matrix
-
-    for i in range(n+1):  # Initalise table
-      d.append([0.0]*(m+1))
-
-    for i in range(1,n+1):  # First column
-      if (wstr1[i-1].isupper()):
-        d[i][0] = d[i-1][0]+self.g2
+    # Gap weights of all characters, and substitution weights of all
+    # characters in the first string with each different character in the
+    # second string
+    #
+    gap_list1 = []
+    for c in wstr1:
+      if (c.isupper()):
+        gap_list1.append(self.g2)
       else:
-        d[i][0] = d[i-1][0]+self.g1
+        gap_list1.append(self.g1)
 
-    for j in range(1,m+1):  # First row
-      if (wstr2[j-1].isupper()):
-        d[0][j] = d[0][j-1]+self.g2
+    gap_list2 = []
+    for c in wstr2:
+      if (c.isupper()):
+        gap_list2.append(self.g2)
       else:
-        d[0][j] = d[0][j-1]+self.g1
+        gap_list2.append(self.g1)
 
-    for j in range(1,m+1):  # Fill in rest of table
-      c2 = wstr2[j-1]
+    sub_dict = {}
 
-      for i in range(1,n+1):
-        c1 = wstr1[i-1]
+    for c2 in wstr2:
+      if (c2 not in sub_dict):
+        sub_list = []
 
-        if (c1.isupper()):
-          x = d[i-1][j]+self.g2
-        else:
-          x = d[i-1][j]+self.g1
+        for c1 in wstr1:
+          if (c1.isupper() and c2.isupper()):
+            if (c1 == c2):
+              sub_list.append(self.s4)
+            else:
+              sub_list.append(self.s5)
+          elif (c1.islower() and c2.islower()):
+            if (c1 == c2):
+              sub_list.append(self.s1)
+            else:
+              sub_list.append(self.s2)
+          else:
+            sub_list.append(self.s3)
 
-        if (c2.isupper()):
-          y = d[i][j-1]+self.g2
-        else:
-          y = d[i][j-1]+self.g1
+        sub_dict[c2] = sub_list
 
-        if (c1.isupper() and c2.isupper()):
-          if (c1 == c2):
-            z = d[i-1][j-1]+self.s4
-          else:
-            z = d[i-1][j-1]+self.s5
-        elif (c1.islower() and c2.islower()):
-          if (c1 == c2):
-            z = d[i-1][j-1]+self.s1
-          else:
-            z = d[i-1][j-1]+self.s2
-        else:
-          z = d[i-1][j-1]+self.s3
+    # Calculate the alignment weights column by column, only keeping the
+    # previous and the current column
+    #
+    prev_col = [0]*(n+1)
+    for i in range(n):  # First column
+      prev_col[i+1] = prev_col[i] + gap_list1[i]
+
+    curr_col = [0]*(n+1)
+
+    for j in range(m):  # Fill in rest of table
+      sub_list = sub_dict[wstr2[j]]
+      g =        gap_list2[j]
 
-        d[i][j] = max(x,y,z)
+      x = prev_col[0] + g  # First row
+      curr_col[0] = x
 
-    w = max(float(d[i][j]) / float(divisor), 0.0)
+      for i in range(n):
+        y = prev_col[i+1] + g
+        z = prev_col[i] + sub_list[i]
+        x += gap_list1[i]
+
+        if (y > x):
+          x = y
+        if (z > x):
+          x = z
+
+        curr_col[i+1] = x
+
+      prev_col, curr_col = curr_col, prev_col
+
+    w = max(float(prev_col[n]) / float(divisor), 0.0)
 
     assert (w >= 0.0), 'Syllable-alignment distance: Similarity weight < 0.0'
     assert (w <= 1.0), 'Syllable-alignment distance: Similarity weight > 1.0'
@@ -4095,33 +4838,6 @@ class FieldComparatorEditex(FieldComparatorApproxString):
 
     self.log([('Threshold', self.threshold)])  # Log a message
 
-    # Values for edit costs - - - - - - - - - - - - - - - - - - - - - - - - - -
-    #
-    self.BIG_COSTS = 3  # If characters are not in same group
-    self.SML_COSTS = 2  # If characters are in same group
-
-    # Mappings of letters into groups - - - - - - - - - - - - - - - - - - - - -
-    #
-    self.groupsof_dict = {'a':0,'b':1,'c':2,'d':3,'e':0,'f':1,'g':2,'h':7,
-                          'i':0,'j':2,'k':2,'l':4,'m':5,'n':5,'o':0,'p':1,
-                          'q':2,'r':6,'s':2,'t':3,'u':0,'v':1,'w':7,'x':2,
-                          'y':0,'z':2,'{':7}
-
-  # ---------------------------------------------------------------------------
-
-  def __delete_cost__(self, char1, char2):
-
-    if (char1 == char2):
-      return 0
-
-    code1 = self.groupsof_dict.get(char1,-1)  # -1 is not a char
-    code2 = self.groupsof_dict.get(char2,-2)  # -2 if not a char
-
-    if (code1 == code2) or (code2 == 7):  # Same or silent
-      return self.SML_COSTS  # Small difference costs
-    else:
-      return self.BIG_COSTS
-
   # ---------------------------------------------------------------------------
 
   def compare(self, val1, val2):
@@ -4143,75 +4859,31 @@ class FieldComparatorEditex(FieldComparatorApproxString):
 
     # Calculate editex similarity value - - - - - - - - - - - - - - - - - - - -
     #
-    n, m = len(val1), len(val2)
-
-    if (n > m):  # Make sure n <= m, to use O(min(n,m)) space
-      str1 = val2.lower()
-      str2 = val1.lower()
-      n, m = m, n
+    # Row minima of the cost matrix never decrease, so the calculation can be
+    # stopped once a row minimum gives a similarity below the threshold (only
+    # for a positive threshold, as negative similarities are set to 0.0)
+    #
+    if (self.threshold > 0.0):
+      min_threshold = self.threshold
     else:
-      str1 = val1.lower()
-      str2 = val2.lower()
-
-    if (' ' in str1):
-      str1 = str1.replace(' ','{')
-    if (' ' in str2):
-      str2 = str2.replace(' ','{')
-
-    row = [0]*(m+1)  # Generate empty cost matrix
-    F = []
-    for i in range(n+1):
-      F.append(row[:])
-
-    F[1][0] = self.BIG_COSTS  # Initialise first row and first column of
-    F[0][1] = self.BIG_COSTS  #   cost matrix
-
-    sum = self.BIG_COSTS
-    for i in range(2,n+1):
-      sum += self.__delete_cost__(str1[i-2], str1[i-1])
-      F[i][0] = sum
-
-    sum = self.BIG_COSTS
-    for j in range(2,m+1):
-      sum += self.__delete_cost__(str2[j-2], str2[j-1])
-      F[0][j] = sum
-
-    for i in range(1,n+1):
+      min_threshold = None
 
-      if (i == 1):
-        inc1 = self.BIG_COSTS
-      else:
-        inc1 = self.__delete_cost__(str1[i-2], str1[i-1])
-
-      for j in range(1,m+1):
-
-        if (j == 1):
-          inc2 = self.BIG_COSTS
-        else:
-          inc2 = self.__delete_cost__(str2[j-2], str2[j-1])
-
-        if (str1[i-1] == str2[j-1]):
-          diag = 0
-        else:
-          code1 = self.groupsof_dict.get(str1[i-1],-1)  # -1 is not a char
-          code2 = self.groupsof_dict.get(str2[j-1],-2)  # -2 if not a char
-
-          if (code1 == code2):  # Same phonetic group
-            diag = self.SML_COSTS
-          else:
-            diag = self.BIG_COSTS
+    (costs, max_costs) = stringcmp.editex_costs(val1.lower(), val2.lower(),
+                                                min_threshold)
 
-        F[i][j] = min(F[i-1][j]+inc1, F[i][j-1]+inc2, F[i-1][j-1]+diag)
+    if (costs == None):  # Similarity is below threshold
+      w = self.disagree_weight
 
-    w = 1.0 - float(F[n][m]) / float(max(F[0][m],F[n][0]))
+    else:
+      w = 1.0 - float(costs) / max_costs
 
-    if (w < 0.0):
-      w = 0.0
+      if (w < 0.0):
+        w = 0.0
 
-    assert (w >= 0.0), 'Editex: Similarity weight < 0.0'
-    assert (w <= 1.0), 'Editex: Similarity weight > 1.0'
+      assert (w >= 0.0), 'Editex: Similarity weight < 0.0'
+      assert (w <= 1.0), 'Editex: Similarity weight > 1.0'
 
-    w = self.__calc_partagree_weight__(val1, val2, w)
+      w = self.__calc_partagree_weight__(val1, val2, w)
 
     if (self.do_caching == True):  # Put values pair into the cache
       self.__put_into_cache__(val1, val2, w)
@@ -4295,65 +4967,6 @@ class FieldComparatorLCS(FieldComparatorApproxString):
 
   # ---------------------------------------------------------------------------
 
-  def __do_lcs__(self, str1, str2):
-    """Method to extract longest common substring from the two input strings.
-       Returns the common substring, its length, and the two input strings with
-       the common substring removed.
-
-       Should not be used from outside the module.
-    """
-
-    n = len(str1)
-    m = len(str2)
-
-    if (n > m):  # Make sure n <= m, to use O(min(n,m)) space
-      str1, str2 = str2, str1
-      n, m =       m, n
-      swapped = True
-    else:
-      swapped = False
-
-    current = (n+1)*[0]
-
-    com_len = 0
-    com_ans1 = -1
-    com_ans2 = -1
-
-    for i in range(m):
-      previous = current
-      current =  (n+1)*[0]
-
-      for j in range(n):
-        if (str1[j] != str2[i]):
-          current[j] = 0
-        else:
-          current[j] = previous[j-1]+1
-          if (current[j] > com_len):
-            com_len = current[j]
-            com_ans1 = j
-            com_ans2 = i
-
-    com1 = str1[com_ans1-com_len+1:com_ans1+1]
-    com2 = str2[com_ans2-com_len+1:com_ans2+1]
-
-    if (com1 != com2):
-      logging.exception('LCS: Different common substrings: %s / %s in ' % \
-                        (com1, com2) + 'original strings: %s / %s' % \
-                        (str1, str2))
-      raise Exception
-
-    # Remove common substring from input strings
-    #
-    str1 = str1[:com_ans1-com_len+1] + str1[1+com_ans1:]
-    str2 = str2[:com_ans2-com_len+1] + str2[1+com_ans2:]
-
-    if (swapped == True):
-      return com1, com_len, str2, str1
-    else:
-      return com1, com_len, str1, str2
-
-  # ---------------------------------------------------------------------------
-
   def compare(self, val1, val2):
     """Compare two field values using the longest common substring approximate
        string comparator.
@@ -4389,6 +5002,12 @@ class FieldComparatorLCS(FieldComparatorApproxString):
 
     w = float(max_common_len) / float(divisor)
 
+    if (w  >= self.threshold):  # Common substrings can only be made of the
+                                # characters common to both strings
+      max_common_len = stringcmp.count_common_chars(val1, val2)
+
+      w = float(max_common_len) / float(divisor)
+
     if (w  < self.threshold):  # Similariy is smaller than threshold
       w = self.disagree_weight
 
@@ -4396,16 +5015,24 @@ class FieldComparatorLCS(FieldComparatorApproxString):
       # Iterative calculation of longest common substring until strings to s
       #
       w = 0.0
+      is_below_threshold = False
 
       for (s1,s2) in [(val1,val2), (val2,val1)]:
 
-        com_str, com_len, s1, s2 = self.__do_lcs__(s1, s2) # Find initial LCS
+        if (s1 == val2):  # Second extraction, check if threshold reachable
+          max_w = (w + float(max_common_len) / float(divisor)) / 2.0
+          if (max_w < self.threshold):
+            is_below_threshold = True
+            break
+
+        com_str, com_len, s1, s2 = stringcmp.do_lcs(s1, s2) # Initial LCS
 
         total_com_str = com_str
         total_com_len = com_len
 
         while (com_len >= self.min_common_len):
-          com_str, com_len, s1n, s2n = self.__do_lcs__(s1, s2)
+          com_str, com_len, s1n, s2n = stringcmp.do_lcs(s1, s2,
+                                                         self.min_common_len)
 
           if (com_len >= self.min_common_len):
             total_com_str += com_str
@@ -4414,12 +5041,16 @@ class FieldComparatorLCS(FieldComparatorApproxString):
 
         w += float(total_com_len) / float(divisor)
 
-      w /= 2.0
+      if (is_below_threshold == True):
+        w = self.disagree_weight
 
-      assert (w >= 0.0), 'Longest common substring: Similarity weight < 0.0'
-      assert (w <= 1.0), 'Longest common substring: Similarity weight > 1.0'
+      else:
+        w /= 2.0
 
-      w = self.__calc_partagree_weight__(val1, val2, w)
+        assert (w >= 0.0), 'Longest common substring: Similarity weight < 0.0'
+        assert (w <= 1.0), 'Longest common substring: Similarity weight > 1.0'
+
+        w = self.__calc_partagree_weight__(val1, val2, w)
 
     if (self.do_caching == True):  # Put values pair into the cache
       self.__put_into_cache__(val1, val2, w)
@@ -4504,65 +5135,6 @@ class FieldComparatorOntoLCS(FieldComparatorApproxString):
 
   # ---------------------------------------------------------------------------
 
-  def __do_lcs__(self, str1, str2):
-    """Method to extract longest common substring from the two input strings.
-       Returns the common substring, its length, and the two input strings with
-       the common substring removed.
-
-       Should not be used from outside the module.
-    """
-
-    n = len(str1)
-    m = len(str2)
-
-    if (n > m):  # Make sure n <= m, to use O(min(n,m)) space
-      str1, str2 = str2, str1
-      n, m =       m, n
-      swapped = True
-    else:
-      swapped = False
-
-    current = (n+1)*[0]
-
-    com_len = 0
-    com_ans1 = -1
-    com_ans2 = -1
-
-    for i in range(m):
-      previous = current
-      current =  (n+1)*[0]
-
-      for j in range(n):
-        if (str1[j] != str2[i]):
-          current[j] = 0
-        else:
-          current[j] = previous[j-1]+1
-          if (current[j] > com_len):
-            com_len = current[j]
-            com_ans1 = j
-            com_ans2 = i
-
-    com1 = str1[com_ans1-com_len+1:com_ans1+1]
-    com2 = str2[com_ans2-com_len+1:com_ans2+1]
-
-    if (com1 != com2):
-      logging.exception('LCS: Different common substrings: %s / %s in ' % \
-                        (com1, com2) + 'original strings: %s / %s' % \
-                        (str1, str2))
-      raise Exception
-
-    # Remove common substring from input strings
-    #
-    str1 = str1[:com_ans1-com_len+1] + str1[1+com_ans1:]
-    str2 = str2[:com_ans2-com_len+1] + str2[1+com_ans2:]
-
-    if (swapped == True):
-      return com1, com_len, str2, str1
-    else:
-      return com1, com_len, str1, str2
-
-  # ---------------------------------------------------------------------------
-
   def compare(self, val1, val2):
     """Compare two field values using the longest common substring approximate
        string comparator.
@@ -4599,13 +5171,14 @@ class FieldComparatorOntoLCS(FieldComparatorApproxString):
 
     for (s1,s2) in [(val1,val2), (val2,val1)]:
 
-      com_str, com_len, s1, s2 = self.__do_lcs__(s1, s2) # Find initial LCS
+      com_str, com_len, s1, s2 = stringcmp.do_lcs(s1, s2) # Initial LCS
 
       total_com_str = com_str
       total_com_len = com_len
 
       while (com_len >= self.min_common_len):
-        com_str, com_len, s1n, s2n = self.__do_lcs__(s1, s2)
+        com_str, com_len, s1n, s2n = stringcmp.do_lcs(s1, s2,
+                                                       self.min_common_len)
 
         if (com_len >= self.min_common_len):
           total_com_str += com_str
@@ -4688,6 +5261,9 @@ class FieldComparatorCompress(FieldComparatorApproxString):
                    'zlib' (default) using the Python standard libray zlib.py
                                     compressor
                    'bz2' using the Python standard library bz2.py compressor
+
+     The compressed lengths of the single values are kept as value profiles,
+     so only the concatenated values of each pair need to be compressed.
   """
 
   # ---------------------------------------------------------------------------
@@ -4728,6 +5304,17 @@ class FieldComparatorCompress(FieldComparatorApproxString):
 
   # ---------------------------------------------------------------------------
 
+  def __calc_profile__(self, val):
+    """Return the length of the compressed value.
+    """
+
+    if (self.compressor == 'zlib'):
+      return float(len(zlib.compress(val)))
+    else:
+      return float(len(bz2.compress(val)))
+
+  # ---------------------------------------------------------------------------
+
   def compare(self, val1, val2):
     """Compare two field values using the compressor approximate string
        comparator.
@@ -4748,14 +5335,13 @@ class FieldComparatorCompress(FieldComparatorApproxString):
 
     # Calculate the compressor similarity value - - - - - - - - - - - - - - - -
     #
+    c1 = self.__get_profile__(val1)
+    c2 = self.__get_profile__(val2)
+
     if (self.compressor == 'zlib'):
-      c1 =  float(len(zlib.compress(val1)))
-      c2 =  float(len(zlib.compress(val2)))
       c12 = 0.5*(len(zlib.compress(val1+val2))+len(zlib.compress(val2+val1)))
 
     elif (self.compressor == 'bz2'):
-      c1 =  float(len(bz2.compress(val1)))
-      c2 =  float(len(bz2.compress(val2)))
       c12 = 0.5*(len(bz2.compress(val1+val2)) + len(bz2.compress(val2+val1)))
 
     # else:  # More to be added later
@@ -4797,6 +5383,24 @@ class FieldComparatorTokenSet(FieldComparatorApproxString):
        common_divisor  Method of how to calculate the divisor. Can be set to
                        'average','shortest', or 'longest', and is calculated
                        according to the lengths of the two input strings.
+
+     The token set of each value is only calculated once (and kept as value
+     profile).
+
+     If the field comparator is trained with a list of values (see the train()
+     method), the token sets are compared using the cosine similarity of their
+     IDF (inverse document frequency) weight vectors instead. The following
+     two optional arguments then allow tokens to be matched approximately
+     (soft TF-IDF, see 'A Comparison of String Distance Metrics for Name-
+     Matching Tasks' by W.W. Cohen, P. Ravikumar and S.E. Fienberg, IIWeb,
+     2003), which is useful for long values like addresses or business names:
+
+       comp_funct      The function used to compare individual tokens. Either
+                       the string 'equal' (default) or one of the string
+                       comparison functions available in the 'stringcmp'
+                       module.
+       min_threshold   Minimum similarity between 0 and 1 for two tokens to be
+                       matched. Must be set if 'comp_funct' is a function.
   """
 
   # ---------------------------------------------------------------------------
@@ -4808,6 +5412,11 @@ class FieldComparatorTokenSet(FieldComparatorApproxString):
 
     self.stop_word_list = []
     self.common_divisor = None
+    self.comp_funct =     'equal'
+    self.min_threshold =  None
+
+    self.token_idf_dict = None  # Token IDF values (once trained)
+    self.default_idf =    None  # IDF value of tokens not in training values
 
     # Process all keyword arguments - - - - - - - - - - - - - - - - - - - - - -
     #
@@ -4831,6 +5440,22 @@ class FieldComparatorTokenSet(FieldComparatorApproxString):
           raise Exception
         self.common_divisor = value
 
+      elif (keyword.startswith('comp_f')):
+        if (isinstance(value, str)):
+          if (value == 'equal'):
+            self.comp_funct = 'equal'
+          else:
+            logging.exception('Value of "comp_funct" must be a function or' + \
+                              ' the string "equal"')
+            raise Exception
+        else:
+          auxiliary.check_is_function_or_method('comp_funct', value)
+          self.comp_funct = value
+
+      elif (keyword.startswith('min_t')):
+        auxiliary.check_is_normalised('min_threshold', value)
+        self.min_threshold = value
+
       else:
         base_kwargs[keyword] = value
 
@@ -4840,9 +5465,128 @@ class FieldComparatorTokenSet(FieldComparatorApproxString):
     #
     auxiliary.check_is_string('common_divisor', self.common_divisor)
 
+    if ((self.comp_funct != 'equal') and (self.min_threshold == None)):
+      logging.exception('Comparison function is given but no minimal ' + \
+                        'threshold')
+      raise Exception
+
     self.log([('Threshold', self.threshold),
               ('Stop word list', self.stop_word_list),
-              ('Common divisor', self.common_divisor)])  # Log a message
+              ('Common divisor', self.common_divisor),
+              ('Comparison function', self.comp_funct),
+              ('Minimum threshold', self.min_threshold)])  # Log a message
+
+  # ---------------------------------------------------------------------------
+
+  def train(self, val_list):
+    """Calculate the IDF (inverse document frequency) values of all tokens in
+       the given list of values (for example all values of the compared field
+       in the data sets, each value being one document) as:
+
+         idf(token) = log((num_values + 1) / (num_values_with_token + 1)) + 1
+
+       Afterwards the token sets of two values are compared using the cosine
+       similarity of their IDF weight vectors, and the common divisor is not
+       used anymore.
+    """
+
+    auxiliary.check_is_list('val_list', val_list)
+
+    token_doc_freq = {}  # Number of values each token occurs in
+
+    for val in val_list:
+      if (val not in self.missing_values):
+        for token in self.__calc_profile__(val)[0]:
+          token_doc_freq[token] = token_doc_freq.get(token, 0) + 1
+
+    num_val_plus_one = len(val_list) + 1.0
+
+    self.token_idf_dict = {}
+    for (token, doc_freq) in token_doc_freq.iteritems():
+      self.token_idf_dict[token] = math.log(num_val_plus_one / (doc_freq+1)) + \
+                                   1.0
+
+    self.default_idf = math.log(num_val_plus_one) + 1.0
+
+    self.profile_cache = {}  # Profiles now also contain IDF vector lengths
+
+    logging.info('Trained token set comparator "%s" with %d values ' % \
+                 (self.description, len(val_list)) + '(%d distinct tokens)' % \
+                 (len(self.token_idf_dict)))
+
+  # ---------------------------------------------------------------------------
+
+  def __calc_profile__(self, val):
+    """Return a tuple (token set, length of IDF weight vector) for the value
+       with its stop words removed (the length is None if the field comparator
+       has not been trained).
+    """
+
+    for stop_word in self.stop_word_list:
+      if stop_word in val:
+        val = val.replace(stop_word, '')
+
+    token_list = val.split()
+
+    if (isinstance(val, str)):  # Interned tokens are faster to compare
+      token_list = [intern(token) for token in token_list]
+
+    token_set = frozenset(token_list)
+
+    if (self.token_idf_dict == None):
+      return (token_set, None)
+
+    idf_dict_get = self.token_idf_dict.get  # Shorthands
+    default_idf =  self.default_idf
+
+    idf_len = math.sqrt(sum([idf_dict_get(token, default_idf)**2 for token in \
+                             token_set]))
+
+    return (token_set, idf_len)
+
+  # ---------------------------------------------------------------------------
+
+  def __calc_idf_sim__(self, set1, idf_len1, set2, idf_len2):
+    """Calculate the cosine similarity of the IDF weight vectors of the two
+       given token sets, with tokens matched approximately if a comparison
+       function is given (soft TF-IDF, averaged over both directions). Should
+       not be used from outside the module.
+    """
+
+    idf_dict_get = self.token_idf_dict.get  # Shorthands
+    default_idf =  self.default_idf
+
+    if (self.comp_funct == 'equal'):
+      sim_sum = sum([idf_dict_get(token, default_idf)**2 for token in \
+                     set1.intersection(set2)])
+
+    else:
+      comp_funct =    self.comp_funct
+      min_threshold = self.min_threshold
+
+      sim_sum = 0.0
+
+      for (search_set, other_set) in [(set1, set2), (set2, set1)]:
+        for token1 in search_set:
+          if (token1 in other_set):
+            best_token = token1
+            best_sim =   1.0
+
+          else:
+            best_token = None
+            best_sim =   -1.0
+
+            for token2 in other_set:
+              tmp_sim = stringcmp.token_sim(comp_funct, token1, token2)
+              if ((tmp_sim >= min_threshold) and (tmp_sim > best_sim)):
+                best_token = token2
+                best_sim =   tmp_sim
+
+          if (best_token != None):
+            sim_sum += 0.5 * best_sim * idf_dict_get(token1, default_idf) * \
+                       idf_dict_get(best_token, default_idf)
+
+    return min(sim_sum / (idf_len1 * idf_len2), 1.0)
 
   # ---------------------------------------------------------------------------
 
@@ -4863,19 +5607,10 @@ class FieldComparatorTokenSet(FieldComparatorApproxString):
     if (val1 == val2):
       return self.__calc_freq_agree_weight__(val1)
 
-    # Remove all stop words - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # Get the token sets of the values (with all stop words removed) - - - - -
     #
-    clean_val1 = val1
-    clean_val2 = val2
-
-    for stop_word in self.stop_word_list:
-      if stop_word in clean_val1:
-        clean_val1 = clean_val1.replace(stop_word, '')
-      if stop_word in clean_val2:
-        clean_val2 = clean_val2.replace(stop_word, '')
-
-    set1 = set(clean_val1.split())  # Make the cleaned values a set of tokens
-    set2 = set(clean_val2.split())
+    (set1, idf_len1) = self.__get_profile__(val1)
+    (set2, idf_len2) = self.__get_profile__(val2)
 
     num_token1 = len(set1)
     num_token2 = len(set2)
@@ -4883,6 +5618,11 @@ class FieldComparatorTokenSet(FieldComparatorApproxString):
     if ((num_token1 == 0) or (num_token2 == 0)): # No tokens in one of the sets
       w = self.disagree_weight
 
+    elif (self.token_idf_dict != None):  # Compare IDF weight vectors
+      w = self.__calc_idf_sim__(set1, idf_len1, set2, idf_len2)
+
+      w = self.__calc_partagree_weight__(val1, val2, w)
+
     else:
       num_common_token = len(set1.intersection(set2))
 
@@ -5025,6 +5765,10 @@ class FieldComparatorTwoLevelJaro(FieldComparatorApproxString):
                       select the words that can match in the current window -
                       otherwise the 'best' match will be selected, even if it
                       has a very low similarity value.
+
+     The word list of each value is only calculated once (and kept as value
+     profile), and the similarities of word pairs are cached (see the
+     token_sim() function in the 'stringcmp' module).
   """
 
   # ---------------------------------------------------------------------------
@@ -5081,6 +5825,14 @@ class FieldComparatorTwoLevelJaro(FieldComparatorApproxString):
 
   # ---------------------------------------------------------------------------
 
+  def __calc_profile__(self, val):
+    """Return the list of words (whitespace separated) of the value.
+    """
+
+    return val.split()
+
+  # ---------------------------------------------------------------------------
+
   def compare(self, val1, val2):
     """Compare two field values using the two-level Jaro approximate string
        comparator.
@@ -5121,8 +5873,8 @@ class FieldComparatorTwoLevelJaro(FieldComparatorApproxString):
 
     # Convert values into lists of words (whitespace separated)
     #
-    list1 = val1.split()
-    list2 = val2.split()
+    list1 = self.__get_profile__(val1)
+    list2 = self.__get_profile__(val2)
 
     len1 = len(list1)
     len2 = len(list2)
@@ -5138,6 +5890,9 @@ class FieldComparatorTwoLevelJaro(FieldComparatorApproxString):
     common1 = 0  # Number of common characters
     common2 = 0
 
+    token_sim =  stringcmp.token_sim  # Shorthands
+    comp_funct = self.comp_funct
+
     # If 'equal' comparison function is given, then Jaro can be - - - - - - - -
     # directly applied at word level
     #
@@ -5181,7 +5936,7 @@ class FieldComparatorTwoLevelJaro(FieldComparatorApproxString):
         best_match_sim = -1
         word_ind = 0
         for word in work_list2[start:end]:
-          tmp_sim = self.comp_funct(search_word, word)
+          tmp_sim = token_sim(comp_funct, search_word, word)
           if (tmp_sim >= self.min_threshold):
             if (tmp_sim > best_match_sim):
               ind = word_ind
@@ -5200,7 +5955,7 @@ class FieldComparatorTwoLevelJaro(FieldComparatorApproxString):
         best_match_sim = -1
         word_ind = 0
         for word in work_list1[start:end]:
-          tmp_sim = self.comp_funct(search_word, word)
+          tmp_sim = token_sim(comp_funct, search_word, word)
           if (tmp_sim >= self.min_threshold):
             if (tmp_sim > best_match_sim):
               ind = word_ind
@@ -5242,7 +5997,7 @@ class FieldComparatorTwoLevelJaro(FieldComparatorApproxString):
           if (ass_list1[i] != ass_list2[i]):
             transposition += 1
         else:  # Again use approximate string comp. to calculate similarities
-          tmp_sim = self.comp_funct(ass_list1[i], ass_list2[i])
+          tmp_sim = token_sim(comp_funct, ass_list1[i], ass_list2[i])
           if (tmp_sim >= self.min_threshold):
             transposition += 1
 
@@ -260,6 +260,33 @@ class DataSet:
 
   # ---------------------------------------------------------------------------
 
+  def get_chunk_list(self, num_chunks):
+    """Split the data set into (up to) the given number of chunks that can be
+       read independently of each other (for example by different processes)
+       using the readchunk() method.
+
+       Returns a list of chunk definitions, or None if the data set can not be
+       split into chunks (the default for data set implementations that do not
+       support reading of chunks).
+    """
+
+    return None
+
+  # ---------------------------------------------------------------------------
+
+  def readchunk(self, chunk):
+    """An iterator which will return one record per call as a tuple (record
+       identifier, record field list) for all records in the given chunk (as
+       returned by the get_chunk_list() method).
+
+       See implementations in derived classes for details.
+    """
+
+    logging.exception('Override abstract method in derived class')
+    raise Exception
+
+  # ---------------------------------------------------------------------------
+
   def write(self, rec_dict):
     """Write one or more records into the data set.
        See implementations in derived classes for details.
@@ -1267,6 +1294,137 @@ class DataSetCSV(DataSet):
 
   # ---------------------------------------------------------------------------
 
+  def get_chunk_list(self, num_chunks):
+    """Split the CSV file into (up to) 'num_chunks' byte ranges of roughly
+       equal size, each starting at the beginning of a record.
+
+       Returns a list with one tuple (start position, end position, number of
+       first record) per chunk, or None if the file is GZIP compressed (as such
+       files can not be read starting from an arbitrary position).
+
+       The chunk boundaries are found by parsing the file with the CSV parser
+       (as used by the read() and readall() methods), so records with quoted
+       fields that span several lines are not split, and the numbers of the
+       first records in the chunks are record (not line) numbers.
+    """
+
+    if (self.file == None):
+      logging.exception('Data set not initialised')
+      raise Exception
+
+    if (self.access_mode != 'read'):
+      logging.exception('Data set not initialised for "read" access')
+      raise Exception
+
+    auxiliary.check_is_integer('num_chunks', num_chunks)
+    auxiliary.check_is_positive('num_chunks', num_chunks)
+
+    if (self.file_name.endswith('.gz')) or (self.file_name.endswith('.GZ')):
+      return None
+
+    file_size = os.path.getsize(self.file_name)
+
+    fp = open(self.file_name,'r')
+
+    file_pos = [0]  # Position after the lines given to the CSV parser so far
+
+    def file_lines():  # Generate the lines in the file and keep the position
+      for line in fp:
+        file_pos[0] += len(line)
+        yield line
+
+    csv_parser = csv.reader(file_lines(), delimiter = self.delimiter)
+
+    if (self.header_line == True):  # Skip over header line
+      csv_parser.next()
+    data_start_pos = file_pos[0]
+
+    # The CSV parser only reads the lines of one record at a time, so after a
+    # record has been parsed the position is at the start of the next record
+    #
+    chunk_list = []
+
+    chunk_start_pos = data_start_pos
+    chunk_start_rec = 0
+    next_chunk_pos =  data_start_pos + (file_size-data_start_pos) / num_chunks
+    rec_num =         0
+
+    for rec in csv_parser:
+      rec_num += 1
+      pos = file_pos[0]
+
+      if ((pos >= next_chunk_pos) and (pos < file_size)):
+        chunk_list.append((chunk_start_pos, pos, chunk_start_rec))
+
+        chunk_start_pos = pos
+        chunk_start_rec = rec_num
+        next_chunk_pos =  data_start_pos + (len(chunk_list)+1) * \
+                          (file_size-data_start_pos) / num_chunks
+
+    chunk_list.append((chunk_start_pos, file_size, chunk_start_rec))
+
+    fp.close()
+
+    return chunk_list
+
+  # ---------------------------------------------------------------------------
+
+  def readchunk(self, chunk):
+    """An iterator which will return one record per call as a tuple (record
+       identifier, record field list) for all records in the given chunk.
+
+       The chunk is read using its own file pointer, so the current position
+       in the data set (as used by read() and readall()) is not modified.
+    """
+
+    if (self.access_mode != 'read'):
+      logging.exception('Data set not initialised for "read" access')
+      raise Exception
+
+    (start_pos, end_pos, rec_num) = chunk
+
+    fp = open(self.file_name,'r')
+    fp.seek(start_pos)
+
+    def chunk_lines():  # Generate the lines in the chunk byte range
+      pos = start_pos
+      while (pos < end_pos):
+        line = fp.readline()
+        if (line == ''):
+          break
+        pos += len(line)
+        yield line
+
+    for rec in csv.reader(chunk_lines(), delimiter = self.delimiter):
+
+      if (self.strip_fields == True):  # Strip leading and trailing whitespace
+        rec = map(string.strip, rec)
+
+      if (self.miss_val != None):  # Check for missing values in record
+        clean_rec = []
+        miss_val_list = self.miss_val  # Faster reference access
+
+        for val in rec:
+          if (val in miss_val_list):  # Found a missing value
+            clean_rec.append('')  # Replace with empty string
+          else:
+            clean_rec.append(val)
+        rec = clean_rec
+
+      if (self.rec_ident_col == -1):  # Generate record identifier
+        rec_ident = self.rec_ident+'-%d' % (rec_num)
+
+      else:  # Get record identifier from the record itself
+        rec_ident = rec[self.rec_ident_col]
+
+      rec_num += 1
+
+      yield (rec_ident,rec)
+
+    fp.close()
+
+  # ---------------------------------------------------------------------------
+
   def write(self, rec_dict):
     """Write one or more records into the data set.
        The input dictionary with records is first sorted (according to the
@@ -130,6 +130,25 @@ index_def_dict =  {}
 indexing_dict =   {}
 result_dict =     {}
 
+# =============================================================================
+# The record caches of an index contain the records as prepared by the record
+# comparator, i.e. tuples with the lower case values of the compared fields in
+# the order of the field comparators (see RecordComparator.prepare_record()),
+# so entity identifiers have to be taken from these positions.
+
+def get_prep_rec_pos(fc_list, field_name):
+  """Return the position of the values of the given field in the prepared
+     records of a record comparator with the given field comparator list.
+  """
+
+  for i in range(len(fc_list)):
+    if (fc_list[i][1] == field_name):
+      return i
+
+  logging.exception('Field "%s" is not used by any field comparator' % \
+                    (field_name))
+  raise Exception
+
 # =============================================================================
 # Define original input data sets plus quality assessment functions, and index
 # definitions
@@ -189,15 +208,16 @@ census_rec_comp = comparison.RecordComparator(census_ds_A, census_ds_B,
                                               census_fc_list,
                                               'Census record comparator')
 
-# Function to be used to check for true matches and non-matches
+# Functions to be used to check for true matches and non-matches, and to
+# extract the entity identifier from a prepared record
 #
+census_id_pos = get_prep_rec_pos(census_fc_list, 'entity_id')
+
 def census_check_funct(rec1, rec2):
-  return (rec1[1] == rec2[1])
+  return (rec1[census_id_pos] == rec2[census_id_pos])
 
-# Function to be used to extract the record identifier from a raw record
-#
 def census_get_id_funct(rec):
-  return rec[1]
+  return rec[census_id_pos]
 
 # Insert into data set dictionary
 #
@@ -271,15 +291,16 @@ cora_fc_list = [(cora_paper_id_exact,       'paper_id',    'paper_id'),
 cora_rec_comp = comparison.RecordComparator(cora_ds, cora_ds, cora_fc_list,
                                             'Cora record comparator')
 
-# Function to be used to check for true matches and non-matches
+# Functions to be used to check for true matches and non-matches, and to
+# extract the entity identifier from a prepared record
 #
+cora_id_pos = get_prep_rec_pos(cora_fc_list, 'paper_id')
+
 def cora_check_funct(rec1, rec2):
-  return (rec1[1] == rec2[1])
+  return (rec1[cora_id_pos] == rec2[cora_id_pos])
 
-# Function to be used to extract the record identifier from a raw record
-#
 def cora_get_id_funct(rec):
-  return rec[1]
+  return rec[cora_id_pos]
 
 # Insert into data set dictionary
 #
@@ -356,15 +377,16 @@ rest_fc_list = [(rest_class_exact,  'class', 'class'),
 rest_rec_comp = comparison.RecordComparator(rest_ds, rest_ds, rest_fc_list,
                                             'Restaurant record comparator')
 
-# Function to be used to check for true matches and non-matches
+# Functions to be used to check for true matches and non-matches, and to
+# extract the entity identifier from a prepared record
 #
+rest_id_pos = get_prep_rec_pos(rest_fc_list, 'class')
+
 def rest_check_funct(rec1, rec2):
-  return (rec1[-1] == rec2[-1])
+  return (rec1[rest_id_pos] == rec2[rest_id_pos])
 
-# Function to be used to extract the record identifier from a raw record
-#
 def rest_get_id_funct(rec):
-  return rec[-1]
+  return rec[rest_id_pos]
 
 # Insert into data set dictionary
 #
@@ -443,15 +465,16 @@ cddb_fc_list = [(cddb_class_exact,     'identifier', 'identifier'),
 cddb_rec_comp = comparison.RecordComparator(cddb_ds, cddb_ds, cddb_fc_list,
                                             'CDDB record comparator')
 
-# Function to be used to check for true matches and non-matches
+# Functions to be used to check for true matches and non-matches, and to
+# extract the entity identifier from a prepared record
 #
+cddb_id_pos = get_prep_rec_pos(cddb_fc_list, 'identifier')
+
 def cddb_check_funct(rec1, rec2):
-  return (rec1[0] == rec2[0])
+  return (rec1[cddb_id_pos] == rec2[cddb_id_pos])
 
-# Function to be used to extract the record identifier from a raw record
-#
 def cddb_get_id_funct(rec):
-  return rec[0]
+  return rec[cddb_id_pos]
 
 # Insert into data set dictionary
 #
@@ -503,15 +526,19 @@ synth_fc_list = [(synth_rec_id_exact,       'rec_id',        'rec_id'),
                  (synth_given_name_winkler, 'given_name',    'given_name'),
                  (synth_suburb_winkler,     'suburb',        'suburb')]
 
-# Function to be used to check for true matches and non-matches
+# Functions to be used to check for true matches and non-matches, and to
+# extract the entity identifier from a prepared record
 #
+synth_id_pos = get_prep_rec_pos(synth_fc_list, 'rec_id')
+
 def synth_check_funct(rec1, rec2):
-    return ((rec1[0][:-1] == rec2[0][:-1]) and (rec1[0][-1] != rec2[0][-1]))
+  rec_id1 = rec1[synth_id_pos]
+  rec_id2 = rec2[synth_id_pos]
+
+  return ((rec_id1[:-1] == rec_id2[:-1]) and (rec_id1[-1] != rec_id2[-1]))
 
-# Function to be used to extract the record identifier from a raw record
-#
 def synth_get_id_funct(rec):
-  return rec[0][:-1]
+  return rec[synth_id_pos][:-1]
 
 # Loop over different data set sizes - - - - - - - - - - - - - - - - - - - - -
 #
@@ -289,6 +289,7 @@ class MainFebrlWindow:
                            'Seq-Match':'seqmatch', 'Long-Common-Seq':'lcs',
                            'Onto-LCS':'ontolcs', 'Editex':'editex',
                            'Perm-Winkler':'permwinkler',
+                           'Assign-Winkler':'assignwinkler',
                            'Sort-Winkler':'sortwinkler'}
 
     # A dictionary with the available string encoding methods (names and
@@ -9615,6 +9616,7 @@ class MainFebrlWindow:
                      'Long-Common-Seq':stringcmp.lcs,
                      'Onto-LCS':stringcmp.ontolcs, 'Editex':stringcmp.editex,
                      'Perm-Winkler':stringcmp.permwinkler,
+                     'Assign-Winkler':stringcmp.assignwinkler,
                      'Sort-Winkler':stringcmp.sortwinkler}[sim_funct_name]
 
         index = indexing.StringMapIndex(dataset1 = ds1,
@@ -115,18 +115,42 @@
 # =============================================================================
 # Import necessary modules (Python standard modules first, then Febrl modules)
 
+import array
+import bisect
 import csv
 import heapq
 import gc
+import itertools
 import logging
 import math
+import multiprocessing
 import random
 import shelve
+import sys
 import time
 
 import auxiliary
 import dataset
 import encode
+import mymath
+
+# =============================================================================
+# The index that is currently being built by a pool of worker processes. It is
+# set before the pool is created so the forked worker processes can access the
+# index (and its data sets) without these having to be pickled.
+
+parallel_build_index = None
+
+def build_index_chunk(chunk_args):
+  """Worker function for a parallel index build, reads and indexes one chunk
+     of a data set. The argument is a tuple (data set index, chunk, maximum
+     block size).
+  """
+
+  (ds_index, chunk, max_block_size) = chunk_args
+
+  return parallel_build_index.__index_record_chunk__(ds_index, chunk,
+                                                      max_block_size)
 
 # =============================================================================
 
@@ -220,6 +244,15 @@ class Indexing:
      In this example, two indices will be built according to the two index
      definitions provided.
 
+     Note that the record caches of an index (the dictionaries 'rec_cache1' and
+     'rec_cache2', with record identifiers as keys) do not contain the raw
+     records as read from the data sets, but the records as prepared by the
+     record comparator (see the prepare_record() method of the
+     RecordComparator class): tuples with the lower case values of the
+     compared fields, in the order of the field comparators (and not in the
+     order of the data set columns). Values of fields that are not compared by
+     any field comparator are therefore not available in the record caches.
+
      All index classed have the following instance variables, which can be set
      when an index is initialised:
 
@@ -254,6 +287,31 @@ class Indexing:
                         Default value is None, in which case the weight vectors
                         will not be written into a file but returned as a
                         dictionary.
+       num_processes    The number of processes used to read the records and
+                        extract their index key values when an inverted index
+                        is built. If larger than 1 (and a data set can be split
+                        into chunks, currently uncompressed CSV files only)
+                        then chunks of the data set are read and indexed in
+                        parallel. Default value is 1.
+       pair_filter_error
+                        If set to a number between 0 and 1, record pairs are
+                        not de-duplicated in a record pair dictionary when an
+                        index is compacted. Instead the blocks of record
+                        identifiers are kept and record pairs are generated
+                        from them in the run() method, where record pairs that
+                        occur in more than one block (for example because they
+                        are in the same block for several index definitions)
+                        are removed using a Bloom filter. The value given is
+                        the maximum false positive rate of the Bloom filter,
+                        i.e. the approximate percentage of unique record pairs
+                        that are wrongly removed and not compared. This
+                        requires much less memory than the record pair
+                        dictionary for large numbers of record pairs. Default
+                        value is None, in which case record pairs are
+                        de-duplicated exactly. Not used by indices that
+                        generate record pairs themselves (for example the
+                        SortingArrayIndex, FullIndex, BigMatchIndex and
+                        DedupIndex).
 
      Note that skip_missing cannot be set to False for certain index methods,
      see their documentation for more details.
@@ -280,6 +338,8 @@ class Indexing:
     self.progress_report = 10
     self.log_funct =       None
     self.weight_vec_file = None
+    self.num_processes =   1
+    self.pair_filter_error = None
 
     self.index_def_proc = None        # Processed version of the index
                                       # definition for faster access to field
@@ -291,8 +351,9 @@ class Indexing:
                                       # will be it's file name
     self.index2_shelve_name = None    # Same for data set 2
     self.rec_cache1 = {}              # A dictionary containing all records
-                                      # from data set 1 with only the fields
-                                      # needed for field comparisons
+                                      # from data set 1 as prepared by the
+                                      # record comparator (tuples with the
+                                      # lower case values to be compared)
     self.rec_cache2 = {}              # Same for data set 2
     self.rec_cache1_file_name = None  # If the record cache for data sets 1
                                       # should be file (shelve) based this will
@@ -307,7 +368,23 @@ class Indexing:
                                       # used by the record comparator (column
                                       # indices)
     self.comp_field_used2 = []        # Same for data set 2
-    self.rec_length_cache = {}        # Used in lenth filtering in run() method
+    self.rec_length_cache = {}        # Used in length filtering in run() method
+                                      # of the BigMatch and Dedup indices
+    self.rec_length_cache1 = {}       # Used in length filtering in run()
+                                      # method, for each record a tuple with
+                                      # its total length and the lengths of
+                                      # the field comparators' values
+    self.rec_length_cache2 = {}       # Same for data set 2
+    self.comp_batch_size = 10000      # Number of record pairs compared in one
+                                      # batch in the run() method
+    self.rec_block_list = []          # If a pair filter is used, the list of
+                                      # blocks (tuples of one or two record
+                                      # identifier lists) to generate record
+                                      # pairs from in the run() method
+    self.num_block_rec_pairs = 0      # Number of record pairs in these blocks
+    self.num_dupl_rec_pairs = 0       # Number of duplicate record pairs
+                                      # removed by the pair filter in the last
+                                      # run() method call
 
     # Process base keyword arguments (all data set specific keywords were
     # processed in the derived class constructor)
@@ -375,6 +452,21 @@ class Indexing:
           auxiliary.check_is_string('weight_vec_file', value)
         self.weight_vec_file = value
 
+      elif (keyword.startswith('num_proc')):
+        auxiliary.check_is_integer('num_processes', value)
+        auxiliary.check_is_positive('num_processes', value)
+        self.num_processes = value
+
+      elif (keyword.startswith('pair_f')):
+        if (value != None):
+          auxiliary.check_is_number('pair_filter_error', value)
+          if ((value <= 0.0) or (value >= 1.0)):
+            logging.exception('Illegal value for pair filter error, must ' + \
+                              'be None or between 0 and 1: "%s"' % \
+                              (str(value)))
+            raise Exception
+        self.pair_filter_error = value
+
       else:
         logging.exception('Illegal constructor argument keyword: '+keyword)
         raise Exception
@@ -532,7 +624,20 @@ class Indexing:
 
   # ---------------------------------------------------------------------------
 
-  def __records_into_inv_index__(self):
+  def __clear_rec_caches__(self):
+    """Clear the record caches and the record length caches calculated from
+       them (in the __compare_rec_pairs_from_dict__() method), so records and
+       lengths from a previous build are not used.
+    """
+
+    self.rec_cache1.clear()
+    self.rec_cache2.clear()
+    self.rec_length_cache1 = {}
+    self.rec_length_cache2 = {}
+
+  # ---------------------------------------------------------------------------
+
+  def __records_into_inv_index__(self, max_block_size = None):
     """Load the records from the data sets and put them into an inverted index
        data structure.
 
@@ -540,8 +645,20 @@ class Indexing:
        from one data set.
 
        This method builds an inverted index (one per index definition) as a
-       Python dictionary with the keys being the indexing values (as returned
-       by the _get_index_values__() method.
+       Python dictionary with the keys being the indexing keys (as returned
+       by the __get_index_keys__() method).
+
+       If 'max_block_size' is set to a positive integer, then an index entry
+       that would contain more than this number of records will be marked
+       with -1 (instead of the list of record identifiers), as used by the
+       suffix array based indices.
+
+       If the 'num_processes' attribute is larger than 1 and a data set can be
+       split into chunks (see the get_chunk_list() method in the dataset
+       module), the records in the chunks are read and indexed in a pool of
+       worker processes, and the resulting partial inverted indices and record
+       caches are then merged (in the order of the chunks, so the resulting
+       index is the same as when built with one process only).
     """
 
     logging.info('Started to build inverted index:')
@@ -554,74 +671,83 @@ class Indexing:
       self.index1[i] = {}  # Index for data set 1
       self.index2[i] = {}  # Index for data set 2
 
-    get_index_values_funct = self.__get_index_values__  # Shorthands
-    skip_missing =           self.skip_missing
+    self.__clear_rec_caches__()  # Remove records of a previous build
 
     # A list of data structures needed for the build process:
     # - the index data structure (dictionary)
     # - the record cache
     # - the data set to be read
-    # - the comparison fields which are used
     # - a list index (0 for data set 1, 1 for data set 2)
     #
-    build_list = [(self.index1, self.rec_cache1, self.dataset1,
-                   self.comp_field_used1, 0)] # For data set 1
+    build_list = [(self.index1, self.rec_cache1, self.dataset1, 0)] # Data set 1
 
     if (self.do_deduplication == False):  # If linkage append data set 2
-      build_list.append((self.index2, self.rec_cache2, self.dataset2,
-                   self.comp_field_used2, 1))
+      build_list.append((self.index2, self.rec_cache2, self.dataset2, 1))
 
     # Reading loop over all records in one or both data set(s) - - - - - - - -
     #
-    for (index,rec_cache,dataset,comp_field_used_list,ds_index) in build_list:
+    for (index, rec_cache, dataset, ds_index) in build_list:
 
-      # Calculate a counter for the progress report
+      start_time = time.time()
+
+      # Several chunks per process so the work is balanced between processes
       #
-      if (self.progress_report != None):
-        progress_report_cnt = max(1, int(dataset.num_records / \
-                                     (100.0 / self.progress_report)))
-      else:  # So no progress report is being logged
-        progress_report_cnt = dataset.num_records + 1
+      if (self.num_processes > 1):
+        chunk_list = dataset.get_chunk_list(self.num_processes*4)
+      else:
+        chunk_list = None
 
-      start_time = time.time()
+      if ((chunk_list == None) or (len(chunk_list) < 2)):  # Serial build - - -
 
-      rec_read = 0  # Number of records read from data set
+        self.__index_records__(dataset.readall(), index, rec_cache, ds_index,
+                               max_block_size, dataset.num_records, start_time)
 
-      for (rec_ident, rec) in dataset.readall(): # Read all records in data set
+      else:  # Parallel build over chunks of the data set - - - - - - - - - - -
 
-        # Extract record fields needed for comparisons (set all others to '')
-        #
-        comp_rec = []
+        logging.info('  Read and index %d chunks using %d processes' % \
+                     (len(chunk_list), self.num_processes))
 
-        field_ind = 0
-        for field in rec:
-          if (field_ind in comp_field_used_list):
-            comp_rec.append(field.lower())  # Make them lower case
-          else:
-            comp_rec.append('')
-          field_ind += 1
+        global parallel_build_index
+        parallel_build_index = self  # Accessed by the forked worker processes
 
-        rec_cache[rec_ident] = comp_rec  # Put into record cache
+        chunk_arg_list = []
+        for chunk in chunk_list:
+          chunk_arg_list.append((ds_index, chunk, max_block_size))
 
-        # Now get the index variable values for this record - - - - - - - - - -
-        #
-        rec_index_val_list = get_index_values_funct(rec, ds_index)
+        process_pool = multiprocessing.Pool(self.num_processes)
 
-        for i in range(num_indices):  # Put record identifier into all indices
+        rec_read = 0  # Number of records read from data set
 
-          this_index = index[i]  # Shorthand
+        all_chunks_done = False
 
-          block_val = rec_index_val_list[i]
+        try:
 
-          if ((block_val != '') or (skip_missing == False)):
-            block_val_rec_list = this_index.get(block_val, [])
-            block_val_rec_list.append(rec_ident)
-            this_index[block_val] = block_val_rec_list
+          # Merge the partial indices and record caches in order of the chunks
+          #
+          for (chunk_rec_cache, chunk_index) in \
+              process_pool.imap(build_index_chunk, chunk_arg_list):
 
-        rec_read += 1
+            rec_cache.update(chunk_rec_cache)
+            self.__merge_inv_index__(index, chunk_index, max_block_size)
 
-        if ((rec_read % progress_report_cnt) == 0):
-          self.__log_build_progress__(rec_read,dataset.num_records,start_time)
+            rec_read += len(chunk_rec_cache)
+
+            if (self.progress_report != None):
+              self.__log_build_progress__(rec_read, dataset.num_records,
+                                          start_time)
+            del chunk_rec_cache, chunk_index
+
+          all_chunks_done = True
+
+        finally:  # Also clean up the worker processes if a chunk failed
+
+          if (all_chunks_done == True):
+            process_pool.close()
+          else:
+            process_pool.terminate()
+          process_pool.join()
+
+          parallel_build_index = None
 
       used_sec_str = auxiliary.time_string(time.time()-start_time)
       rec_time_str = auxiliary.time_string((time.time()-start_time) / \
@@ -630,6 +756,149 @@ class Indexing:
                    (dataset.num_records, used_sec_str, rec_time_str))
       logging.info('')
 
+  # ---------------------------------------------------------------------------
+
+  def __index_records__(self, rec_iter, index, rec_cache, ds_index,
+                        max_block_size, num_records = None, start_time = None):
+    """Insert all records returned by the given record iterator into the given
+       record cache and inverted index (a dictionary with one dictionary per
+       index definition).
+
+       If 'num_records' is given a progress report will be logged (if
+       activated).
+    """
+
+    num_indices = len(self.index_def)
+
+    get_index_keys_funct = self.__get_index_keys__  # Shorthands
+    prepare_rec_funct =    self.__prepare_record__
+
+    # Calculate a counter for the progress report
+    #
+    if ((self.progress_report != None) and (num_records != None)):
+      progress_report_cnt = max(1, int(num_records / \
+                                   (100.0 / self.progress_report)))
+    else:  # So no progress report is being logged
+      progress_report_cnt = None
+
+    rec_read = 0  # Number of records read from data set
+
+    for (rec_ident, rec) in rec_iter: # Read all records
+
+      # Prepare the record fields needed for comparisons and cache them
+      #
+      rec_cache[rec_ident] = prepare_rec_funct(rec, ds_index)
+
+      # Now get the index keys for this record - - - - - - - - - - - - - - - - -
+      #
+      rec_index_key_list = get_index_keys_funct(rec, ds_index)
+
+      for i in range(num_indices):  # Put record identifier into all indices
+
+        this_index = index[i]  # Shorthand
+
+        for index_key in rec_index_key_list[i]:
+
+          index_key_rec_list = this_index.get(index_key, [])
+
+          if (max_block_size == None):
+            index_key_rec_list.append(rec_ident)
+            this_index[index_key] = index_key_rec_list
+
+          elif (index_key_rec_list != -1):  # Not too many records yet
+
+            # Check if max_block records had this index key before
+            #
+            if (len(index_key_rec_list) < max_block_size):
+              index_key_rec_list.append(rec_ident)
+              this_index[index_key] = index_key_rec_list
+            else:  # Too many records have this value
+              this_index[index_key] = -1  # Mark as being too frequent
+
+      rec_read += 1
+
+      if ((progress_report_cnt != None) and \
+          ((rec_read % progress_report_cnt) == 0)):
+        self.__log_build_progress__(rec_read, num_records, start_time)
+
+    return rec_read
+
+  # ---------------------------------------------------------------------------
+
+  def __prepare_record__(self, rec, ds_index):
+    """Return the prepared record (see the prepare_record() method of the
+       record comparator) to be put into the record cache of the given data
+       set (0 for data set 1, 1 for data set 2).
+
+       For a deduplication where some field comparators compare different
+       fields of the two records, the prepared values of the second record are
+       appended (see the __compare_rec_pairs_from_dict__() method).
+    """
+
+    rec_comparator = self.rec_comparator  # Shorthand
+
+    prep_rec = rec_comparator.prepare_record(rec, ds_index)
+
+    if ((self.do_deduplication == True) and \
+        (rec_comparator.field_index_list1 != rec_comparator.field_index_list2)):
+      prep_rec += rec_comparator.prepare_record(rec, 1)
+
+    return prep_rec
+
+  # ---------------------------------------------------------------------------
+
+  def __index_record_chunk__(self, ds_index, chunk, max_block_size):
+    """Read and index the records in the given chunk of a data set (0 for data
+       set 1, 1 for data set 2) into a partial inverted index and record cache.
+
+       Returns a tuple (record cache, inverted index) with both being
+       dictionaries. Called in the worker processes of a parallel build.
+    """
+
+    if (ds_index == 0):
+      dataset = self.dataset1
+    else:
+      dataset = self.dataset2
+
+    chunk_index = {}
+    for i in range(len(self.index_def)):
+      chunk_index[i] = {}
+
+    chunk_rec_cache = {}
+
+    self.__index_records__(dataset.readchunk(chunk), chunk_index,
+                           chunk_rec_cache, ds_index, max_block_size)
+
+    return (chunk_rec_cache, chunk_index)
+
+  # ---------------------------------------------------------------------------
+
+  def __merge_inv_index__(self, index, chunk_index, max_block_size):
+    """Merge a partial inverted index (as built for one chunk of a data set)
+       into the given inverted index. Record identifiers from the chunk are
+       appended to the existing record identifier lists.
+    """
+
+    for i in chunk_index:
+
+      this_index = index[i]  # Shorthand
+
+      for (index_key, chunk_rec_list) in chunk_index[i].iteritems():
+
+        index_key_rec_list = this_index.get(index_key, None)
+
+        if (index_key_rec_list == None):  # New index key
+          this_index[index_key] = chunk_rec_list
+
+        elif (index_key_rec_list != -1):  # Not too many records yet
+
+          if ((chunk_rec_list == -1) or ((max_block_size != None) and \
+              (len(index_key_rec_list)+len(chunk_rec_list) > max_block_size))):
+            this_index[index_key] = -1  # Mark as being too frequent
+          else:
+            index_key_rec_list += chunk_rec_list
+            this_index[index_key] = index_key_rec_list
+
   # ---------------------------------------------------------------------------
   # Get sub-list functions are used for the q-gram and BigMatch index
 
@@ -743,12 +1012,24 @@ class Indexing:
 
        This version does not modify the input record identifier list. It does
        create a local copy of the record identifer list which is then sorted.
+
+       If a pair filter is used the sorted record identifier list is only
+       appended to the list of blocks, and the record pairs are generated in
+       the run() method.
     """
 
     rec_cnt = 1  # Counter for second record identifier
 
     this_rec_id_list = rec_id_list[:]
     this_rec_id_list.sort()
+
+    if (self.pair_filter_error != None):
+      num_recs = len(this_rec_id_list)
+      if (num_recs > 1):
+        self.rec_block_list.append((this_rec_id_list, None))
+        self.num_block_rec_pairs += num_recs*(num_recs-1)/2
+      return
+
     for rec_ident1 in this_rec_id_list:
 
       rec_ident2_set = rec_pair_dict.get(rec_ident1, set())
@@ -770,8 +1051,18 @@ class Indexing:
   def __link_rec_pairs__(self, rec_id_list1, rec_id_list2, rec_pair_dict):
     """Create record pairs for a linkage using the given two record identifier
        lists and insert them into the given record pair dictionary.
+
+       If a pair filter is used copies of the two record identifier lists are
+       only appended to the list of blocks, and the record pairs are generated
+       in the run() method.
     """
 
+    if (self.pair_filter_error != None):
+      if ((len(rec_id_list1) > 0) and (len(rec_id_list2) > 0)):
+        self.rec_block_list.append((list(rec_id_list1), list(rec_id_list2)))
+        self.num_block_rec_pairs += len(rec_id_list1)*len(rec_id_list2)
+      return
+
     for rec_ident1 in rec_id_list1:
       for rec_ident2 in rec_id_list2:
 
@@ -822,6 +1113,16 @@ class Indexing:
        So if the value of 'length_filter_perc' is set to 20 this record pair
        will be filtered out and not compared.
 
+       Alternatively 'length_filter_perc' can be a list with one percentage
+       value (or None) per field comparator of the record comparator, in
+       which case the lengths of the values compared by each field comparator
+       are filtered separately. Empty (missing) values are not filtered.
+
+       The record lengths are calculated once for all records in the record
+       caches, and the record pairs of each record from the first data set are
+       filtered in bulk (using the range of lengths that pass the filter)
+       before any record pair is compared.
+
        Default value for 'length_filter_perc' is None, which means no length
        filtering will be performed. For more information about filtering in the
        record linkage process please refer to:
@@ -835,7 +1136,10 @@ class Indexing:
        value less than this threshold will not be stored in the weight vector
        dictionary. Default value for 'cut_off_threshold' is None, which means
        all compared record pairs will be stored in the weight vector
-       dictionary.
+       dictionary. With a cut-off threshold, record pairs are only compared
+       with their remaining fields as long as they can still reach the
+       threshold (see the compare_batch_threshold() method of the record
+       comparator), and pruned record pairs are counted as below threshold.
     """
 
     # Check if weight vector file should be written - - - - - - - - - - - - - -
@@ -854,6 +1158,8 @@ class Indexing:
       weight_vec_header_line = ['rec_id1', 'rec_id2'] + \
                                 self.__get_field_names_list__()
       weight_vec_writer.writerow(weight_vec_header_line)
+    else:
+      weight_vec_writer = None
 
     # Calculate a counter for the progress report - - - - - - - - - - - - - - -
     #
@@ -867,91 +1173,140 @@ class Indexing:
     comp_done =       0   # Number of comparisons done
 
     rec_cache1 =       self.rec_cache1  # Shorthands to make program faster
-    rec_pair_dict =    self.rec_pair_dict
-    rec_comp =         self.rec_comparator.compare
-    rec_length_cache = self.rec_length_cache
 
     # Check length filter and cut-off threshold arguments - - - - - - - - - - -
     #
     if (length_filter_perc != None):
-      auxiliary.check_is_percentage('Length filter percentage',
-                                    length_filter_perc)
-      logging.info('  Length filtering set to %.1f%%' % (length_filter_perc))
-      length_filter_perc /= 100.0  # Normalise
+      length_filter_list = self.__get_length_filter_list__(length_filter_perc)
+
+      if (self.rec_length_cache1 == {}):  # Calculate record lengths only once
+        self.rec_length_cache1 = self.__get_rec_lengths__(self.rec_cache1, 0)
+        if (self.do_deduplication == False):
+          self.rec_length_cache2 = self.__get_rec_lengths__(self.rec_cache2,1)
+
+      rec_length_cache1 = self.rec_length_cache1
+      if (self.do_deduplication == True):
+        rec_length_cache2 = self.rec_length_cache1
+      else:
+        rec_length_cache2 = self.rec_length_cache2
+
+      length_bounds_cache = {}  # Length ranges for record lengths
 
     if (cut_off_threshold != None):
       auxiliary.check_is_number('Cut-off threshold', cut_off_threshold)
       logging.info('  Cut-off threshold set to: %.2f' % (cut_off_threshold))
 
+      num_pruned_rec_pairs = self.rec_comparator.num_pruned_rec_pairs
+
     num_rec_pairs_filtered =    0  # Count number of removed record pairs
     num_rec_pairs_below_thres = 0
 
     # Set shorthand depending upon deduplication or linkage - - - - - - - - - -
     #
     if (self.do_deduplication == True):  # A deduplication run
-      rec_cache2 = self.rec_cache1
+      rec_comparator = self.rec_comparator
+
+      if (rec_comparator.field_index_list1 == rec_comparator.field_index_list2):
+        rec_cache2 = self.rec_cache1
+      else:  # Second records need the prepared values of data set 2 fields
+        num_fields = len(rec_comparator.field_index_list1)
+        rec_cache2 = {}
+        for (rec_ident, prep_rec) in self.rec_cache1.iteritems():
+          rec_cache2[rec_ident] = prep_rec[num_fields:]
     else:
       rec_cache2 = self.rec_cache2
 
     start_time = time.time()
 
-    for rec_ident1 in rec_pair_dict:
+    next_progress_report = progress_report_cnt
 
-      rec1 = rec_cache1[rec_ident1]  # Get the actual first record
+    # Record pairs are compared in batches, the final empty group makes sure
+    # the last batch is compared
+    #
+    comp_batch_size =      self.comp_batch_size
+    batch_rec_ident_list = []  # Record identifier pairs in current batch
+    batch_rec_pair_list =  []  # Record pairs in current batch
 
-      if (length_filter_perc != None):
-        rec1_len = len(''.join(rec1))  # Get length in characters for record
+    for (rec_ident1, rec_ident2_list) in \
+        itertools.chain(self.__get_rec_pair_groups__(), [(None, [])]):
 
-      for rec_ident2 in rec_pair_dict[rec_ident1]:
+      if (rec_ident1 != None):
+        rec1 = rec_cache1[rec_ident1]  # Get the actual first record
 
-        rec2 = rec_cache2[rec_ident2]  # Get actual second record
+      if ((length_filter_perc != None) and (rec_ident1 != None)):
+        num_rec_pairs = len(rec_ident2_list)  # Remove record pairs in bulk
+        rec1_len_tuple = rec_length_cache1[rec_ident1]
 
-        do_comp = True  # Flag, specify if comparison should be done
+        for (len_pos, length_filter) in length_filter_list:
+          rec1_len = rec1_len_tuple[len_pos]
 
-        if (length_filter_perc != None):
-          if (rec_ident2 in rec_length_cache):  # Length is cached
-            rec2_len = rec_length_cache[rec_ident2]
-          else:
-            rec2_len = len(''.join(rec2))
-            rec_length_cache[rec_ident2] = rec2_len
+          if ((len_pos > 0) and (rec1_len == 0)):
+            continue  # Don't filter on a missing field value
 
-          perc_diff = float(abs(rec1_len - rec2_len)) / max(rec1_len, rec2_len)
+          length_bounds = length_bounds_cache.get((len_pos, rec1_len))
+          if (length_bounds == None):
+            length_bounds = self.__get_length_bounds__(rec1_len, length_filter)
+            length_bounds_cache[(len_pos, rec1_len)] = length_bounds
+          (min_len, max_len) = length_bounds
 
-          if (perc_diff > length_filter_perc):
-            do_comp = False  # Difference too large, don't do comparison
-            num_rec_pairs_filtered += 1
+          if (len_pos == 0):
+            rec_ident2_list = [rec_ident2 for rec_ident2 in rec_ident2_list if \
+                   (min_len <= rec_length_cache2[rec_ident2][0] <= max_len)]
+          else:
+            rec_ident2_list = [rec_ident2 for rec_ident2 in rec_ident2_list if \
+                   (min_len <= rec_length_cache2[rec_ident2][len_pos] <= \
+                    max_len) or (rec_length_cache2[rec_ident2][len_pos] == 0)]
 
-        if (do_comp == True):
-          w_vec = rec_comp(rec1, rec2)  # Compare them
+        num_rec_pairs_filtered += num_rec_pairs - len(rec_ident2_list)
+        comp_done += num_rec_pairs - len(rec_ident2_list)
 
-          if (cut_off_threshold == None) or (sum(w_vec) >= cut_off_threshold):
+      for rec_ident2 in rec_ident2_list:  # Add record pairs to current batch
+        batch_rec_ident_list.append((rec_ident1, rec_ident2))
+        batch_rec_pair_list.append((rec1, rec_cache2[rec_ident2]))
 
-            # Put result into weight vector dictionary
-            #
-            if (self.weight_vec_file == None):
-              weight_vec_dict[(rec_ident1, rec_ident2)] = w_vec
-            else:
-              weight_vec_writer.writerow([rec_ident1, rec_ident2]+w_vec)
+      if ((len(batch_rec_pair_list) >= comp_batch_size) or \
+          (rec_ident1 == None)):
 
-          else:
-            num_rec_pairs_below_thres += 1
+        num_rec_pairs_below_thres += self.__compare_rec_pair_batch__( \
+                                     batch_rec_ident_list, batch_rec_pair_list,
+                                     cut_off_threshold, weight_vec_dict,
+                                     weight_vec_writer)
+
+        # Count all record pair comparisons (even if filtered)
+        #
+        comp_done += len(batch_rec_pair_list)
 
-        comp_done += 1  # Count all record pair comparisons (even if not done)
+        batch_rec_ident_list = []
+        batch_rec_pair_list =  []
 
-        if ((comp_done % progress_report_cnt) == 0):
+        if (comp_done >= next_progress_report):
           self.__log_comparison_progress__(comp_done, start_time)
+          next_progress_report = (comp_done / progress_report_cnt + 1) * \
+                                 progress_report_cnt
+
+    if (self.rec_block_list != []):  # Duplicate record pairs were removed
+      self.num_rec_pairs = comp_done
 
     used_sec_str = auxiliary.time_string(time.time()-start_time)
     rec_time_str = auxiliary.time_string((time.time()-start_time) / \
                                          self.num_rec_pairs)
     logging.info('Compared %d record pairs in %s (%s per pair)' % \
                  (self.num_rec_pairs, used_sec_str,rec_time_str))
+    if (self.rec_block_list != []):
+      logging.info('  Pair filter removed %d duplicate record pairs' % \
+                   (self.num_dupl_rec_pairs))
     if (length_filter_perc != None):
-      logging.info('  Length filtering (set to %.1f%%) filtered %d record ' % \
-                   (length_filter_perc*100, num_rec_pairs_filtered) + 'pairs')
+      logging.info('  Length filtering filtered %d record pairs' % \
+                   (num_rec_pairs_filtered))
     if (cut_off_threshold != None):
       logging.info('  %d record pairs had summed weights below threshold ' % \
                    (num_rec_pairs_below_thres) + '%.2f' % (cut_off_threshold))
+      logging.info('    (of these, %d were pruned before all fields were ' % \
+                   (self.rec_comparator.num_pruned_rec_pairs - \
+                    num_pruned_rec_pairs) + 'compared)')
+
+    if (self.rec_comparator.do_timing == True):
+      self.rec_comparator.get_timing_stats()
 
     memory_usage_str = auxiliary.get_memory_usage()
     if (memory_usage_str != None):
@@ -965,6 +1320,227 @@ class Indexing:
 
   # ---------------------------------------------------------------------------
 
+  def __compare_rec_pair_batch__(self, rec_ident_pair_list, rec_pair_list,
+                                 cut_off_threshold, weight_vec_dict,
+                                 weight_vec_writer):
+    """Compare a batch of prepared record pairs using the batch comparison of
+       the record comparator, and put the resulting weight vectors into the
+       given weight vector dictionary, or write them into a weight vector file
+       if the writer is not None.
+
+       Returns the number of record pairs with a summed weight below the given
+       cut-off threshold (if it is not None), including the record pairs that
+       were pruned by the record comparator before all their fields were
+       compared.
+    """
+
+    if (rec_pair_list == []):
+      return 0
+
+    num_fields =  len(self.rec_comparator.field_comparison_list)
+
+    if (cut_off_threshold == None):
+      weight_list = \
+          self.rec_comparator.compare_batch_prepared(rec_pair_list).tolist()
+      pruned_list = [False]*len(rec_pair_list)
+    else:
+      (weight_array, pruned_list) = \
+          self.rec_comparator.compare_batch_threshold(rec_pair_list,
+                                                      cut_off_threshold)
+      weight_list = weight_array.tolist()
+
+    num_rec_pairs_below_thres = 0
+
+    w_vec_start = 0
+
+    for (rec_ident_pair, is_pruned) in zip(rec_ident_pair_list, pruned_list):
+
+      w_vec = weight_list[w_vec_start:w_vec_start+num_fields]
+      w_vec_start += num_fields
+
+      if (is_pruned == False) and ((cut_off_threshold == None) or \
+                                   (sum(w_vec) >= cut_off_threshold)):
+
+        # Put result into weight vector dictionary
+        #
+        if (weight_vec_writer == None):
+          weight_vec_dict[rec_ident_pair] = w_vec
+        else:
+          weight_vec_writer.writerow(list(rec_ident_pair)+w_vec)
+
+      else:
+        num_rec_pairs_below_thres += 1
+
+    return num_rec_pairs_below_thres
+
+  # ---------------------------------------------------------------------------
+
+  def __get_length_filter_list__(self, length_filter_perc):
+    """Check the given length filter percentage (a single value or a list with
+       one value per field comparator) and return a list of tuples (position,
+       normalised percentage) with the positions in the record length tuples
+       the filters are applied on (0 is the total record length, 1 the length
+       of the value of the first field comparator, etc.).
+    """
+
+    num_field_comp = len(self.rec_comparator.field_comparison_list)
+
+    if (isinstance(length_filter_perc, list)):
+      if (len(length_filter_perc) != num_field_comp):
+        logging.exception('Length filter list must contain one value per ' + \
+                          'field comparator (%d): %s' % \
+                          (num_field_comp, str(length_filter_perc)))
+        raise Exception
+
+      length_filter_list = []
+
+      for i in range(num_field_comp):
+        if (length_filter_perc[i] != None):
+          auxiliary.check_is_percentage('Length filter percentage',
+                                        length_filter_perc[i])
+          length_filter_list.append((i+1, length_filter_perc[i] / 100.0))
+
+      logging.info('  Length filtering set to %s%% per field comparator' % \
+                   (str(length_filter_perc)))
+    else:
+      auxiliary.check_is_percentage('Length filter percentage',
+                                    length_filter_perc)
+      logging.info('  Length filtering set to %.1f%%' % (length_filter_perc))
+
+      length_filter_list = [(0, length_filter_perc / 100.0)]  # Normalise
+
+    return length_filter_list
+
+  # ---------------------------------------------------------------------------
+
+  def __get_rec_lengths__(self, rec_cache, data_set_num):
+    """Return a dictionary with a tuple of lengths (in characters) for each
+       record in the given record cache. The first element in a tuple is the
+       length of the concatenated values of all fields compared, followed by
+       the length of the value compared by each field comparator.
+
+       The data set number can be 0 (if the record cache is from the first
+       data set) or 1 (if it is from the second data set).
+    """
+
+    if (data_set_num == 0):
+      field_index_list = self.rec_comparator.field_index_list1
+    else:
+      field_index_list = self.rec_comparator.field_index_list2
+
+    num_fields = len(field_index_list)
+
+    # Positions in prepared records of the first value of each field (a field
+    # can be compared by several field comparators)
+    #
+    uniq_pos_list = []
+    for pos in range(num_fields):
+      if (field_index_list[pos] not in field_index_list[:pos]):
+        uniq_pos_list.append(pos)
+
+    rec_length_dict = {}
+
+    for (rec_ident, prep_rec) in rec_cache.iteritems():
+      val_len_list = [len(val) for val in prep_rec[:num_fields]]
+
+      rec_length_dict[rec_ident] = tuple([sum([val_len_list[pos] for pos in \
+                                           uniq_pos_list])] + val_len_list)
+
+    return rec_length_dict
+
+  # ---------------------------------------------------------------------------
+
+  def __get_length_bounds__(self, rec_len, length_filter):
+    """Return the minimum and maximum lengths of a second record that pass
+       the length filter (a normalised percentage value between 0 and 1) for a
+       first record of the given length, i.e. the lengths where:
+
+          |rec_len - len2| / max(rec_len, len2) <= length_filter
+
+       The bounds are first estimated and then corrected to give exactly the
+       same results as the above condition.
+    """
+
+    def pass_filter(len2):
+      max_len = max(rec_len, len2)
+      if (max_len == 0):
+        return True
+      return (float(abs(rec_len - len2)) / max_len <= length_filter)
+
+    if (length_filter >= 1.0):  # All lengths pass
+      return (0, sys.maxint)
+
+    min_len = max(0, int(math.ceil(rec_len * (1.0 - length_filter))))
+    while ((min_len > 0) and pass_filter(min_len-1)):
+      min_len -= 1
+    while (not pass_filter(min_len)):
+      min_len += 1
+
+    max_len = max(rec_len, int(math.floor(rec_len / (1.0 - length_filter))))
+    while (not pass_filter(max_len)):
+      max_len -= 1
+    while (pass_filter(max_len+1)):
+      max_len += 1
+
+    return (min_len, max_len)
+
+  # ---------------------------------------------------------------------------
+
+  def __get_rec_pair_groups__(self):
+    """Generator which returns the record pairs to be compared as tuples
+       (rec_ident1, rec_ident2_list), first from the record pair dictionary
+       and then (if a pair filter is used) from the kept blocks of record
+       identifiers.
+
+       Record pairs generated from the blocks are checked against a Bloom
+       filter (sized for the number of record pairs in all blocks), and record
+       pairs that have (probably) been generated before are skipped. Their
+       number is kept in 'num_dupl_rec_pairs'.
+    """
+
+    rec_pair_dict = self.rec_pair_dict
+
+    for rec_ident1 in rec_pair_dict:
+      yield (rec_ident1, rec_pair_dict[rec_ident1])
+
+    self.num_dupl_rec_pairs = 0
+
+    if (self.rec_block_list == []):
+      return
+
+    pair_filter = mymath.BloomFilter(self.num_block_rec_pairs,
+                                     self.pair_filter_error)
+    pair_seen = pair_filter.add  # Shorthand
+
+    for (rec_id_list1, rec_id_list2) in self.rec_block_list:
+
+      if (rec_id_list2 == None):  # A sorted deduplication block
+        for i in xrange(len(rec_id_list1)-1):
+          rec_ident1 = rec_id_list1[i]
+
+          rec_ident2_list = [rec_ident2 for rec_ident2 in rec_id_list1[i+1:] \
+                             if (pair_seen((rec_ident1, rec_ident2)) == False)]
+          self.num_dupl_rec_pairs += len(rec_id_list1)-i-1 - \
+                                     len(rec_ident2_list)
+
+          if (rec_ident2_list != []):
+            yield (rec_ident1, rec_ident2_list)
+
+      else:  # A linkage block
+        for rec_ident1 in rec_id_list1:
+
+          rec_ident2_list = [rec_ident2 for rec_ident2 in rec_id_list2 \
+                             if (pair_seen((rec_ident1, rec_ident2)) == False)]
+          self.num_dupl_rec_pairs += len(rec_id_list2) - len(rec_ident2_list)
+
+          if (rec_ident2_list != []):
+            yield (rec_ident1, rec_ident2_list)
+
+    logging.info('  Pair filter used %d bytes for %d record pairs' % \
+                 (pair_filter.get_size(), len(pair_filter)))
+
+  # ---------------------------------------------------------------------------
+
   def __find_closest__(self, sorted_list, elem):
     """Binary search of the given element 'elem' in the given sorted list, and
        return index of exact match or closest match (before where the element
@@ -973,22 +1549,12 @@ class Indexing:
        Used in BigMatch and Dedup indexing methods.
     """
 
-    start = 0
-    end =   len(sorted_list)-1
-
-    while 1:
-      if (end < start):
-        return end  # Not found
+    pos = bisect.bisect_left(sorted_list, elem)
 
-      middle = (start + end) / 2
-      middle_val = sorted_list[middle]  # Get the element from the middle
-
-      if (middle_val == elem):  # Found the key value
-        return middle
-      elif (elem < middle_val):
-        end = middle - 1
-      else:
-        start = middle + 1
+    if ((pos < len(sorted_list)) and (sorted_list[pos] == elem)):
+      return pos  # Found the key value
+    else:
+      return pos-1  # Not found
 
   # ---------------------------------------------------------------------------
 
@@ -1091,6 +1657,29 @@ class Indexing:
 
   # ---------------------------------------------------------------------------
 
+  def __get_index_keys__(self, rec, data_set_num):
+    """For the given record (list of fields) return a list with one list of
+       keys per index definition under which the record will be inserted into
+       the inverted index.
+
+       In the base class these are the index variable values themselves (if
+       they are not empty or 'skip_missing' is set to False). Can be overridden
+       in derived classes that insert records under several keys.
+    """
+
+    index_key_list = []
+
+    for index_val in self.__get_index_values__(rec, data_set_num):
+
+      if ((index_val != '') or (self.skip_missing == False)):
+        index_key_list.append([index_val])
+      else:
+        index_key_list.append([])
+
+    return index_key_list
+
+  # ---------------------------------------------------------------------------
+
   def __open_shelve_file__(self, shelve_file_name):
     """Open a shelve with the given file name, and clear all it's content.
 
@@ -1194,6 +1783,10 @@ class Indexing:
                  (str(self.comp_field_used2)))
     logging.info('  Skip missing:           %s' % (str(self.skip_missing)))
     logging.info('  Index separator string: "%s"' % (self.index_sep_str))
+    if (self.num_processes > 1):
+      logging.info('  Number of build processes: %d' % (self.num_processes))
+    if (self.pair_filter_error != None):
+      logging.info('  Pair filter error rate: %f' % (self.pair_filter_error))
 
     if (self.num_rec_pairs == None):
       logging.info('  Number of record pairs: Not known yet')
@@ -1637,6 +2230,9 @@ class BlockingIndex(Indexing):
                         # as keys and sets of identifiers from data set 2 as
                         # values
 
+    self.rec_block_list =      []  # Blocks of a previous compaction are not
+    self.num_block_rec_pairs = 0   # kept
+
     for i in range(num_indices):
 
       istart_time = time.time()
@@ -1713,6 +2309,7 @@ class BlockingIndex(Indexing):
 
     for rec_ident2_set in self.rec_pair_dict.itervalues():
       self.num_rec_pairs += len(rec_ident2_set)
+    self.num_rec_pairs += self.num_block_rec_pairs  # Pairs in kept blocks
 
     logging.info('Compacted blocking index in %s' % \
                  (auxiliary.time_string(time.time()-start_time)))
@@ -1862,6 +2459,9 @@ class SortingIndex(Indexing):
                         # as keys and sets of identifiers from data set 2 as
                         # values
 
+    self.rec_block_list =      []  # Blocks of a previous compaction are not
+    self.num_block_rec_pairs = 0   # kept
+
     for i in range(num_indices):
 
       istart_time = time.time()
@@ -2042,6 +2642,7 @@ class SortingIndex(Indexing):
 
     for rec_ident2_set in self.rec_pair_dict.itervalues():
       self.num_rec_pairs += len(rec_ident2_set)
+    self.num_rec_pairs += self.num_block_rec_pairs  # Pairs in kept blocks
 
     logging.info('Compacted sorting index in %s' % \
                  (auxiliary.time_string(time.time()-start_time)))
@@ -2168,6 +2769,10 @@ class SortingArrayIndex(Indexing):
 
        Make a dictionary of all record pairs over all indices, which removes
        duplicate record pairs.
+
+       The sorted array is kept as a list of record identifiers with parallel
+       compact arrays of the record sources and of the block end offsets, so
+       moving the window does not need any list of records to be built.
     """
 
     NUM_BLOCK_PROGRESS_REPORT = 1000
@@ -2194,88 +2799,57 @@ class SortingArrayIndex(Indexing):
                         # as keys and sets of identifiers from data set 2 as
                         # values
 
+    self.rec_block_list =      []  # Blocks of a previous compaction are not
+    self.num_block_rec_pairs = 0   # kept
+
     for i in range(num_indices):
 
       istart_time = time.time()
 
       num_blocks_done = 0
 
+      # The sorted array is held in parallel arrays: the record identifiers,
+      # a compact array with the source (data set 1 or 2) of each record, and
+      # the offsets into these arrays where the blocks of records with the same
+      # sorted index key value end (used for the progress report)
+      #
+      rec_sorted_array = []  # The sorted array with the record identifiers
+                             # of all records
+      rec_source_array = array.array('b')  # Source of records, 1 or 2
+      block_end_array =  array.array('l')
+
       if (self.do_deduplication == True):  # A deduplication - - - - - - - - -
 
         this_index = self.index1[i]  # Shorthand
 
-        rec_sorted_array = []  # The sorted array with the record identifiers
-                               # of all records
-
         # Sorting the unique blocking key values is faster than sorting all
         # values once they are in the sorted array
         #
         block_val_list = this_index.keys()  # Get all blocking values
         block_val_list.sort()
 
-        num_block_vals = len(block_val_list)
-
         # Loop over all blocks in the inverted index
         #
         for block_key_val in block_val_list:
 
-          rec_id_list = this_index[block_key_val]
-          rec_sorted_array += rec_id_list
+          rec_sorted_array += this_index[block_key_val]
+          block_end_array.append(len(rec_sorted_array))
 
         # Can be shorter if empty blocking key values occur that
         #
         assert len(rec_sorted_array) <= self.dataset1.num_records
 
-        # Now generate record pairs from the sliding window
-        #
-        for j in range(0, len(rec_sorted_array)-w+1):
-
-          # Get record identifiers in the current window
-          #
-          win_rec_id_list = rec_sorted_array[j:j+w][:]
-          assert len(win_rec_id_list) == w, \
-                 (j,w,self.dataset1.num_records,win_rec_id_list)
-          win_rec_id_list.sort()
-
-          ## Possibly improvement: Win pos 1 and all others separate code
-          rec_cnt = 1
-          for rec_ident1 in win_rec_id_list:
-            rec_ident2_set = rec_pair_dict.get(rec_ident1, set())
-            for rec_ident2 in win_rec_id_list[rec_cnt:]:
-              assert rec_ident1 != rec_ident2
-              rec_ident2_set.add(rec_ident2)
-            rec_pair_dict[rec_ident1] = rec_ident2_set
-            rec_cnt += 1
-
-          num_blocks_done += 1
-
-          # Log progress report every XXX blocks processed - - - - - - - - - -
-          #
-          if ((num_blocks_done % NUM_BLOCK_PROGRESS_REPORT) == 0):
-            logging.info('    Processed %d of %d blocks' % \
-                         (num_blocks_done, num_block_vals))
-            memory_usage_str = auxiliary.get_memory_usage()
-            if (memory_usage_str != None):
-              logging.info('      '+memory_usage_str)
-
-        del rec_sorted_array
-
       else:  # A linkage - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
         this_index1 = self.index1[i]  # Shorthands
         this_index2 = self.index2[i]
 
-        rec_sorted_array = []  # The sorted array with the record identifiers
-                               # of all records
-
         # Get all unique blocking key values from both indices
         #
         block_val_set = set(this_index1.keys()+this_index2.keys())
         block_val_list = list(block_val_set)
         block_val_list.sort()
 
-        num_block_vals = len(block_val_list)
-
         # Loop over all blocks in the inverted indices
         #
         for block_key_val in block_val_list:
@@ -2317,15 +2891,18 @@ class SortingArrayIndex(Indexing):
             assert len(merge_list) == len(rec_id_list1)+len(rec_id_list2)
 
             for (val, rec_ident, src_index) in merge_list:
-              rec_sorted_array.append((rec_ident, src_index))
+              rec_sorted_array.append(rec_ident)
+              rec_source_array.append(int(src_index))
 
           elif (rec_id_list1 == []):
-            for rec_ident in rec_id_list2:
-              rec_sorted_array.append((rec_ident, '2'))  # From index 2
+            rec_sorted_array += rec_id_list2
+            rec_source_array.extend([2]*len(rec_id_list2))  # From index 2
 
           elif (rec_id_list2 == []):
-            for rec_ident in rec_id_list1:
-              rec_sorted_array.append((rec_ident, '1'))  # From index 1
+            rec_sorted_array += rec_id_list1
+            rec_source_array.extend([1]*len(rec_id_list1))  # From index 1
+
+          block_end_array.append(len(rec_sorted_array))
 
         # Can be shorter if empty blocking key values occur
         #
@@ -2333,33 +2910,63 @@ class SortingArrayIndex(Indexing):
                                          self.dataset2.num_records), \
           (len(rec_sorted_array), (self.dataset1.num_records + \
                                          self.dataset2.num_records))
+        assert len(rec_sorted_array) == len(rec_source_array)
+
+      num_block_vals = len(block_end_array)
+      num_sorted_recs = len(rec_sorted_array)
+
+      # Now generate record pairs from the sliding window. Each pair of records
+      # that are less than the window size apart in the sorted array is covered
+      # by at least one window position, so instead of building the list of
+      # records in each window (and the pairs in the overlap of consecutive
+      # windows again and again), each record is paired once with the records
+      # following it within the window. (If the sorted array is shorter than
+      # the window there is no window position, and no record pairs.)
+      #
+      if (num_sorted_recs < w):
+        num_sorted_recs = 0
 
-        # Now generate record pairs from the sliding window
-        #
-        for j in range(0, len(rec_sorted_array)-w+1):
-
-          # Get record identifiers in the current window
-          #
-          win_rec_id_list = rec_sorted_array[j:j+w][:]
-          assert len(win_rec_id_list) == w, \
-                 (j,w,self.dataset1.num_records,win_rec_id_list)
+      for j in xrange(num_sorted_recs):
 
-          rec_id_list1 = []  # Record identifiers from index 1
-          rec_id_list2 = []  # Record identifiers from index 2
+        rec_ident1 = rec_sorted_array[j]
+        win_end = min(j+w, num_sorted_recs)
 
-          for (rec_ident, source_index) in win_rec_id_list:
-            if (source_index == '1'):
-              rec_id_list1.append(rec_ident)
-            else:
-              rec_id_list2.append(rec_ident)
+        if (self.do_deduplication == True):
 
-          for rec_ident1 in rec_id_list1:
-            for rec_ident2 in rec_id_list2:
+          for k in xrange(j+1, win_end):
+            rec_ident2 = rec_sorted_array[k]
+            assert rec_ident1 != rec_ident2
 
+            if (rec_ident1 < rec_ident2):
               rec_ident2_set = rec_pair_dict.get(rec_ident1, set())
               rec_ident2_set.add(rec_ident2)
               rec_pair_dict[rec_ident1] = rec_ident2_set
+            else:
+              rec_ident2_set = rec_pair_dict.get(rec_ident2, set())
+              rec_ident2_set.add(rec_ident1)
+              rec_pair_dict[rec_ident2] = rec_ident2_set
+
+        else:
+          source1 = rec_source_array[j]
+
+          for k in xrange(j+1, win_end):
+            if (rec_source_array[k] != source1):
 
+              if (source1 == 1):
+                rec_ident2_set = rec_pair_dict.get(rec_ident1, set())
+                rec_ident2_set.add(rec_sorted_array[k])
+                rec_pair_dict[rec_ident1] = rec_ident2_set
+              else:
+                rec_ident2 = rec_sorted_array[k]
+                rec_ident2_set = rec_pair_dict.get(rec_ident2, set())
+                rec_ident2_set.add(rec_ident1)
+                rec_pair_dict[rec_ident2] = rec_ident2_set
+
+        # Count the blocks whose records have all been processed, i.e. the
+        # blocks ending with record j
+        #
+        while ((num_blocks_done < num_block_vals) and \
+               (block_end_array[num_blocks_done] <= j+1)):
           num_blocks_done += 1
 
           # Log progress report every XXX blocks processed - - - - - - - - - -
@@ -2371,7 +2978,7 @@ class SortingArrayIndex(Indexing):
             if (memory_usage_str != None):
               logging.info('      '+memory_usage_str)
 
-        del rec_sorted_array
+      del rec_sorted_array, rec_source_array, block_end_array
 
       logging.info('  Compacted sorting index %d in %s' % \
                    (i, auxiliary.time_string(time.time()-istart_time)))
@@ -2448,16 +3055,22 @@ class AdaptSortingIndex(Indexing):
      values, and blocks are generated where two adjacent values have an
      approximate string similarity below a given threshold.
 
-     The initial implementation is a simplified  version of the above
-     description that compares all adjacent index key values in a liner fashion.
-
-     The additional argument (besides the base class arguments) which has to be
-     set when this index is initialised is:
-
-       str_cmp_funct  A function to compare two strings (as implemented in the
-                      stringcmp module).
-       str_cmp_thres  The threshold for the string comparison function, must
-                      be in (0..1).
+     The block boundaries are found with the accumulative adaptive algorithm
+     of the above paper, i.e. an exponentially growing window followed by a
+     binary search for the boundary pair, so only a logarithmic number of
+     index key values have to be compared per block (instead of all adjacent
+     index key values). Similarities of index key values are kept in a bounded
+     cache.
+
+     The additional arguments (besides the base class arguments) which can be
+     set when this index is initialised are:
+
+       str_cmp_funct   A function to compare two strings (as implemented in the
+                       stringcmp module).
+       str_cmp_thres   The threshold for the string comparison function, must
+                       be in (0..1).
+       sim_cache_size  The maximum number of index key similarities kept in
+                       the cache. Default value is 100000.
   """
 
   # ---------------------------------------------------------------------------
@@ -2467,8 +3080,13 @@ class AdaptSortingIndex(Indexing):
        base class constructor.
     """
 
-    self.str_cmp_funct = None
-    self.str_cmp_thres = None
+    self.str_cmp_funct =  None
+    self.str_cmp_thres =  None
+    self.sim_cache_size = 100000
+
+    self.key_sim_cache =       {}  # Cache with index key value similarities
+    self.num_key_comp =        0   # Number of index key value comparisons
+    self.num_key_comp_cached = 0   # Number of these taken from the cache
 
     base_kwargs = {}  # Dictionary, will contain unprocessed arguments for base
                       # class constructor
@@ -2483,6 +3101,11 @@ class AdaptSortingIndex(Indexing):
         auxiliary.check_is_normalised('str_cmp_thres', value)
         self.str_cmp_thres = value
 
+      elif (keyword.startswith('sim_cache')):
+        auxiliary.check_is_integer('sim_cache_size', value)
+        auxiliary.check_is_positive('sim_cache_size', value)
+        self.sim_cache_size = value
+
       else:
         base_kwargs[keyword] = value
 
@@ -2496,7 +3119,8 @@ class AdaptSortingIndex(Indexing):
     # A log a message
     #
     self.log([('String comparison function',  self.str_cmp_funct),
-              ('String comparison threshold', self.str_cmp_thres)])
+              ('String comparison threshold', self.str_cmp_thres),
+              ('Similarity cache size',       self.sim_cache_size)])
 
   # ---------------------------------------------------------------------------
 
@@ -2555,13 +3179,13 @@ class AdaptSortingIndex(Indexing):
     dedup_rec_pair_funct = self.__dedup_rec_pairs__  # Shorthands
     link_rec_pair_funct =  self.__link_rec_pairs__
 
-    str_cmp_funct =  self.str_cmp_funct
-    str_cmp_thres =  self.str_cmp_thres
-
     rec_pair_dict = {}  # A dictionary with record identifiers from data set 1
                         # as keys and sets of identifiers from data set 2 as
                         # values
 
+    self.rec_block_list =      []  # Blocks of a previous compaction are not
+    self.num_block_rec_pairs = 0   # kept
+
     for i in range(num_indices):
 
       istart_time = time.time()
@@ -2575,125 +3199,6 @@ class AdaptSortingIndex(Indexing):
         index_val_list = this_index.keys()  # Sort all unique index key values
         index_val_list.sort()
 
-        num_index_vals = len(index_val_list)
-
-#        win_start_index = 0  # Position in the index key value list of the
-#                             # start of the current window
-#        win_end_index =   0  # Make sure it works even if there is one index
-#                             # key value only
-#
-#        while (win_end_index < num_index_vals):
-#
-#          first_val = index_val_list[win_start_index]
-#          last_val =  index_val_list[win_end_index]
-#
-#          # Increase window size as long as index values are similar
-#          #
-#          while ((str_cmp_funct(first_val, last_val) > str_cmp_thres) and \
-#                 (win_end_index < num_index_vals-1)):
-#            win_end_index += 1
-#            last_val =  index_val_list[win_end_index]
-#
-#          # Generate the list of record identifiers from this window
-#          #
-#          curr_win_record_set = set()
-#          for this_val in index_val_list[win_start_index:win_end_index+1]:
-#
-#            curr_rec_id_list = this_index[this_val]
-#
-#            curr_win_record_set = \
-#                               curr_win_record_set.union(set(curr_rec_id_list))
-#
-#          if (len(curr_win_record_set) > 1):
-#
-#            dedup_rec_pair_funct(list(curr_win_record_set), rec_pair_dict)
-#
-#          win_end_index += 1
-#          win_start_index = win_end_index
-
-        # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-        # The code below follows algorithm 2 from the above mentioned paper. It
-        # is more efficient than the above simple linear scan.
-        #
-        # The notation given in this algorithm will be used as much as possible.
-        #
-        block_start_index = 0
-
-        while (block_start_index < num_index_vals):
-
-          w_first = block_start_index
-          w = 1  # To make sure this works even with one single index key value
-          w_last = w_first + w
-
-          # Get the first and last index key values in the current window
-          #
-          first_val = index_val_list[w_first]
-          last_val =  index_val_list[w_last-1]
-
-          # Enlargement phase: Move the window forward as long as index key
-          # values are similar
-          #
-          while ((str_cmp_funct(first_val, last_val) > str_cmp_thres) and
-                 (w_last < num_index_vals)):
-            w_first = w_last-1  # Make sure the windows overlap
-            w *= 2              # Geometric increase in the window size
-            w_last += w-1       # Adjust for overlap
-            if (w_last > num_index_vals):
-              w_last = num_index_vals  # Reached end of array
-
-            first_val = last_val
-            last_val =  index_val_list[w_last-1]
-
-          # Retrenchment phase: Find the boundary pair (use simple linear scan)
-          # (the retrenchment phase as described in the above mentioned paper is
-          # yet to be implementd)
-          #
-          tmp_pos = block_start_index
-
-          # Take care of special case where last block is 1 index key value only
-          #
-          if (tmp_pos+1 == num_index_vals):
-            block_end_index = tmp_pos+1
-
-          else:
-            first_val =  index_val_list[tmp_pos]
-            second_val = index_val_list[tmp_pos+1]
-
-            while ((str_cmp_funct(first_val, second_val) > str_cmp_thres) and
-                   ((tmp_pos+1) < num_index_vals)):
-              tmp_pos += 1
-              first_val =  second_val
-              second_val = index_val_list[tmp_pos]
-
-            block_end_index = tmp_pos+1
-
-          # Generate the list of record identifiers from this block
-          #
-          curr_win_record_set = set()
-          for this_val in index_val_list[block_start_index:block_end_index]:
-            curr_rec_id_list = this_index[this_val]
-
-            curr_win_record_set = \
-                                curr_win_record_set.union(set(curr_rec_id_list))
-
-          if (len(curr_win_record_set) > 1):
-            dedup_rec_pair_funct(list(curr_win_record_set), rec_pair_dict)
-
-          block_start_index = block_end_index
-
-          num_blocks_done += 1
-
-          del curr_win_record_set
-
-          # Log progress report every XXX blocks processed - - - - - - - - - -
-          #
-          if ((num_blocks_done % NUM_BLOCK_PROGRESS_REPORT) == 0):
-            logging.info('    Processed %d of %d blocks' % \
-                         (num_blocks_done, num_index_vals))
-            memory_usage_str = auxiliary.get_memory_usage()
-            if (memory_usage_str != None):
-              logging.info('      '+memory_usage_str)
-
       else:  # A linkage - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
         this_index1 = self.index1[i]  # Shorthands
@@ -2705,151 +3210,58 @@ class AdaptSortingIndex(Indexing):
         index_val_list = list(index_val_set)
         index_val_list.sort()
 
-        num_index_vals = len(index_val_list)
+      num_index_vals = len(index_val_list)
 
-#        win_start_index = 0  # Position in the index key value list of the
-#                             # start of the current window
-#        win_end_index =   0  # Make sure it works even if there is one index
-#                             # key value only
-#
-#        while (win_end_index < num_index_vals):
-#
-#          first_val = index_val_list[win_start_index]
-#          last_val =  index_val_list[win_end_index]
-#
-#          # Increase window size as long as index values are similar
-#          #
-#          while ((str_cmp_funct(first_val, last_val) > str_cmp_thres) and \
-#                 (win_end_index < num_index_vals-1)):
-#            win_end_index += 1
-#            last_val =  index_val_list[win_end_index]
-#
-#          # Generate the lists of record identifiers from this window
-#          #
-#          curr_win_record_set1 = set()
-#          curr_win_record_set2 = set()
-#
-#          for this_val in index_val_list[win_start_index:win_end_index+1]:
-#
-#            if (this_val in this_index1):
-#              curr_rec_id_list1 = this_index1[this_val]
-#
-#              curr_win_record_set1 = \
-#                             curr_win_record_set1.union(set(curr_rec_id_list1))
-#
-#            if (this_val in this_index2):
-#              curr_rec_id_list2 = this_index2[this_val]
-#
-#              curr_win_record_set2 = \
-#                             curr_win_record_set2.union(set(curr_rec_id_list2))
-#
-#          if ((len(curr_win_record_set1) > 0) and \
-#              (len(curr_win_record_set2) > 0)):
-#
-#            link_rec_pair_funct(list(curr_win_record_set1),
-#                                list(curr_win_record_set2), rec_pair_dict)
-#
-#          win_end_index += 1
-#          win_start_index = win_end_index
+      for (block_start_index, block_end_index) in \
+          self.__get_adaptive_blocks__(index_val_list):
 
-        # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-        # The code below follows algorithm 2 from the above mentioned paper. It
-        # is more efficient than the above simple linear scan.
-        #
-        # The notation given in this algorithm will be used as much as possible.
+        # Generate the list(s) of record identifiers from this block
         #
-        block_start_index = 0
-
-        while (block_start_index < num_index_vals):
-
-          w_first = block_start_index
-          w = 1  # To make sure this works even with one single index key value
-          w_last = w_first + w
-
-          # Get the first and last index key values in the current window
-          #
-          first_val = index_val_list[w_first]
-          last_val =  index_val_list[w_last-1]
-
-          # Enlargement phase: Move the window forward as long as index key
-          # values are similar
-          #
-          while ((str_cmp_funct(first_val, last_val) > str_cmp_thres) and
-                 (w_last < num_index_vals)):
-            w_first = w_last-1  # Make sure the windows overlap
-            w *= 2              # Geometric increase in the window size
-            w_last += w-1       # Adjust for overlap
-            if (w_last > num_index_vals):
-              w_last = num_index_vals  # Reached end of array
-
-            first_val = last_val
-            last_val =  index_val_list[w_last-1]
-
-          # Retrenchment phase: Find the boundary pair (use simple linear scan)
-          # (the retrenchment phase as described in the above mentioned paper is
-          # yet to be implementd)
-          #
-          #
-          tmp_pos = block_start_index
-
-          # Take care of special case where last block is 1 index key value only
-          #
-          if (tmp_pos+1 == num_index_vals):
-            block_end_index = tmp_pos+1
+        if (self.do_deduplication == True):
+          curr_win_record_set = set()
 
-          else:
-            first_val =  index_val_list[tmp_pos]
-            second_val = index_val_list[tmp_pos+1]
+          for this_val in index_val_list[block_start_index:block_end_index]:
+            curr_win_record_set.update(this_index[this_val])
 
-            while ((str_cmp_funct(first_val, second_val) > str_cmp_thres) and
-                   ((tmp_pos+1) < num_index_vals)):
-              tmp_pos += 1
-              first_val =  second_val
-              second_val = index_val_list[tmp_pos]
+          if (len(curr_win_record_set) > 1):
+            dedup_rec_pair_funct(list(curr_win_record_set), rec_pair_dict)
 
-            block_end_index = tmp_pos+1
+          del curr_win_record_set
 
-          # Generate the list of record identifiers from this block
-          #
+        else:
           curr_win_record_set1 = set()
           curr_win_record_set2 = set()
 
           for this_val in index_val_list[block_start_index:block_end_index]:
 
             if (this_val in this_index1):
-              curr_rec_id_list1 = this_index1[this_val]
-
-              curr_win_record_set1 = \
-                             curr_win_record_set1.union(set(curr_rec_id_list1))
+              curr_win_record_set1.update(this_index1[this_val])
 
             if (this_val in this_index2):
-              curr_rec_id_list2 = this_index2[this_val]
-
-              curr_win_record_set2 = \
-                             curr_win_record_set2.union(set(curr_rec_id_list2))
+              curr_win_record_set2.update(this_index2[this_val])
 
           if ((len(curr_win_record_set1) > 0) and \
               (len(curr_win_record_set2) > 0)):
             link_rec_pair_funct(list(curr_win_record_set1),
                                 list(curr_win_record_set2), rec_pair_dict)
 
-          block_start_index = block_end_index
-
-          num_blocks_done += 1
-
           del curr_win_record_set1, curr_win_record_set2
 
-          # Log progress report every XXX blocks processed - - - - - - - - - -
-          #
-          if ((num_blocks_done % NUM_BLOCK_PROGRESS_REPORT) == 0):
-            logging.info('    Processed %d of %d blocks' % \
-                         (num_blocks_done, num_index_vals))
-            memory_usage_str = auxiliary.get_memory_usage()
-            if (memory_usage_str != None):
-              logging.info('      '+memory_usage_str)
+        num_blocks_done += 1
+
+        # Log progress report every XXX blocks processed - - - - - - - - - - -
+        #
+        if ((num_blocks_done % NUM_BLOCK_PROGRESS_REPORT) == 0):
+          logging.info('    Processed %d blocks (%d index key values)' % \
+                       (num_blocks_done, num_index_vals))
+          memory_usage_str = auxiliary.get_memory_usage()
+          if (memory_usage_str != None):
+            logging.info('      '+memory_usage_str)
 
       logging.info('  Compacted sorting index %d in %s' % \
                    (i, auxiliary.time_string(time.time()-istart_time)))
+      logging.info('    Generated %d blocks from %d index key values' % \
+                   (num_blocks_done, num_index_vals))
 
       self.index1[i].clear()  # Not needed anymore
       self.index2[i].clear()
@@ -2861,12 +3273,18 @@ class AdaptSortingIndex(Indexing):
       if (memory_usage_str != None):
         logging.info('      '+memory_usage_str)
 
+    logging.info('  Number of index key comparisons: %d (%d taken from ' % \
+                 (self.num_key_comp, self.num_key_comp_cached) + 'cache)')
+
+    self.key_sim_cache.clear()  # Not needed anymore
+
     self.rec_pair_dict = rec_pair_dict
 
     self.num_rec_pairs = 0  # Count lengths of all record identifier sets - - -
 
     for rec_ident2_set in self.rec_pair_dict.itervalues():
       self.num_rec_pairs += len(rec_ident2_set)
+    self.num_rec_pairs += self.num_block_rec_pairs  # Pairs in kept blocks
 
     logging.info('Compacted sorting index in %s' % \
                  (auxiliary.time_string(time.time()-start_time)))
@@ -2876,6 +3294,120 @@ class AdaptSortingIndex(Indexing):
 
   # ---------------------------------------------------------------------------
 
+  def __get_key_sim__(self, val1, val2):
+    """Return the similarity of the two given index key values as calculated
+       by the string comparison function, using a bounded cache of previously
+       calculated similarities. The cache is cleared once it contains
+       'sim_cache_size' entries.
+    """
+
+    self.num_key_comp += 1
+
+    key_pair = (val1, val2)
+
+    key_sim = self.key_sim_cache.get(key_pair, None)
+
+    if (key_sim != None):
+      self.num_key_comp_cached += 1
+
+    else:
+      key_sim = self.str_cmp_funct(val1, val2)
+
+      if (len(self.key_sim_cache) >= self.sim_cache_size):
+        self.key_sim_cache.clear()
+
+      self.key_sim_cache[key_pair] = key_sim
+
+    return key_sim
+
+  # ---------------------------------------------------------------------------
+
+  def __get_adaptive_blocks__(self, index_val_list):
+    """Generate the blocks from the given sorted list of index key values
+       following the accumulative adaptive sorted neighbourhood algorithm from
+       the paper given above, and return them as a list of tuples (block start
+       index, block end index) into the index key value list.
+
+       Each block is generated in two phases (using the notation of the
+       paper):
+       - Enlargement phase: Starting at the first index key value of the
+         block, a window is moved forward while doubling its size each step,
+         as long as the first and last index key values in the window are
+         similar (more similar than the threshold).
+       - Retrenchment phase: The first and last index key values in the last
+         window are not similar, so the boundary pair (two adjacent index key
+         values that are not similar) is searched for using a binary search
+         within this last window.
+    """
+
+    get_key_sim_funct = self.__get_key_sim__  # Shorthands
+    str_cmp_thres =     self.str_cmp_thres
+
+    num_index_vals = len(index_val_list)
+
+    block_list = []
+
+    block_start_index = 0
+
+    while (block_start_index < num_index_vals):
+
+      w_first = block_start_index
+      w = 1  # To make sure this works even with one single index key value
+      w_last = w_first + w
+
+      # Get the first and last index key values in the current window
+      #
+      first_val = index_val_list[w_first]
+      last_val =  index_val_list[w_last-1]
+
+      is_similar = (get_key_sim_funct(first_val, last_val) > str_cmp_thres)
+
+      # Enlargement phase: Move the window forward as long as index key values
+      # are similar
+      #
+      while (is_similar and (w_last < num_index_vals)):
+        w_first = w_last-1  # Make sure the windows overlap
+        w *= 2              # Geometric increase in the window size
+        w_last += w-1       # Adjust for overlap
+        if (w_last > num_index_vals):
+          w_last = num_index_vals  # Reached end of array
+
+        first_val = last_val
+        last_val =  index_val_list[w_last-1]
+
+        is_similar = (get_key_sim_funct(first_val, last_val) > str_cmp_thres)
+
+      if (is_similar == True):  # All remaining index key values are similar
+        block_end_index = num_index_vals
+
+      else:
+
+        # Retrenchment phase: Binary search for the boundary pair, the
+        # index key value at 'low' is similar to the first value in the last
+        # window, the value at 'high' is not
+        #
+        low =  w_first
+        high = w_last-1
+
+        while ((high - low) > 1):
+          middle = (low + high) / 2
+
+          if (get_key_sim_funct(first_val, index_val_list[middle]) > \
+              str_cmp_thres):
+            low = middle
+          else:
+            high = middle
+
+        block_end_index = low+1
+
+      block_list.append((block_start_index, block_end_index))
+
+      block_start_index = block_end_index
+
+    return block_list
+
+  # ---------------------------------------------------------------------------
+
   def run(self, length_filter_perc = None, cut_off_threshold = None):
     """Iterate over all blocks in the index.
 
@@ -3151,6 +3683,9 @@ class QGramIndex(Indexing):
                         # as keys and sets of identifiers from data set 2 as
                         # values
 
+    self.rec_block_list =      []  # Blocks of a previous compaction are not
+    self.num_block_rec_pairs = 0   # kept
+
     for i in range(num_indices):
 
       istart_time = time.time()
@@ -3263,6 +3798,7 @@ class QGramIndex(Indexing):
 
     for rec_ident2_set in self.rec_pair_dict.itervalues():
       self.num_rec_pairs += len(rec_ident2_set)
+    self.num_rec_pairs += self.num_block_rec_pairs  # Pairs in kept blocks
 
     logging.info('Compacted %d-gram index in %s' % \
                  (self.q, auxiliary.time_string(time.time()-start_time)))
@@ -3544,16 +4080,17 @@ class CanopyIndex(Indexing):
     get_qgram_list_funct =     self.__get_qgram_list__
     qgram_list_to_dict_funct = self.__qgram_list_to_dict__
 
+    self.__clear_rec_caches__()  # Remove records of a previous build
+
     # Reference to data set 1 and record cache 1
     #
-    build_list = [(self.dataset1, self.rec_cache1, self.comp_field_used1, 0)]
+    build_list = [(self.dataset1, self.rec_cache1, 0)]
     if (do_dedup == False):  # If linkage append data set 2
-      build_list.append((self.dataset2, self.rec_cache2,
-                          self.comp_field_used2, 1))
+      build_list.append((self.dataset2, self.rec_cache2, 1))
 
     # Step 1: Read data set(s) and build basic inverted index - - - - - - - - -
     #
-    for (dataset, rec_cache, comp_field_used, ds_index) in build_list:
+    for (dataset, rec_cache, ds_index) in build_list:
 
       # Calculate a counter for the progress report
       #
@@ -3569,19 +4106,9 @@ class CanopyIndex(Indexing):
 
       for (rec_ident, rec) in dataset.readall(): # Read all records in data set
 
-        # Extract record fields needed for comparisons - - - - - - - - - - - -
+        # Prepare record fields needed for comparisons - - - - - - - - - - - -
         #
-        comp_rec = []
-
-        field_ind = 0
-        for field in rec:
-          if (field_ind in comp_field_used):
-            comp_rec.append(field.lower())
-          else:
-            comp_rec.append('')  # Set not needed fields to ''
-          field_ind += 1
-
-        rec_cache[rec_ident] = comp_rec  # Put into record cache
+        rec_cache[rec_ident] = self.__prepare_record__(rec, ds_index)
 
         # Now get the index variable values for this record - - - - - - - - - -
         #
@@ -3895,6 +4422,9 @@ class CanopyIndex(Indexing):
                         # as keys and sets of identifiers from data set 2 as
                         # values
 
+    self.rec_block_list =      []  # Blocks of a previous compaction are not
+    self.num_block_rec_pairs = 0   # kept
+
     # Select get canopy function according to canopy method
     #
     if (self.canopy_method[0] == 'tfidf'):  # Only needed for TF-IDF
@@ -3980,7 +4510,9 @@ class CanopyIndex(Indexing):
             else:
               canopy_recs2.append(ds_rec_ident[1:])
 
+          if ((len(canopy_recs1) > 0) and (len(canopy_recs2) > 0)):
             link_rec_pair_funct(canopy_recs1, canopy_recs2, rec_pair_dict)
+
           del canopy_recs1
           del canopy_recs2
 
@@ -4023,6 +4555,7 @@ class CanopyIndex(Indexing):
 
     for rec_ident2_set in rec_pair_dict.itervalues():
       num_rec_pairs += len(rec_ident2_set)
+    num_rec_pairs += self.num_block_rec_pairs  # Pairs in kept blocks
 
     self.rec_pair_dict = rec_pair_dict  # Save for later used in run()
     self.num_rec_pairs = num_rec_pairs
@@ -4974,6 +5507,9 @@ class StringMapIndex(Indexing):
                         # as keys and sets of identifiers from data set 2 as
                         # values
 
+    self.rec_block_list =      []  # Blocks of a previous compaction are not
+    self.num_block_rec_pairs = 0   # kept
+
     for i in range(num_indices):
 
       istart_time = time.time()
@@ -5331,6 +5867,7 @@ class StringMapIndex(Indexing):
 
     for rec_ident2_set in rec_pair_dict.itervalues():
       num_rec_pairs += len(rec_ident2_set)
+    num_rec_pairs += self.num_block_rec_pairs  # Pairs in kept blocks
 
     self.rec_pair_dict = rec_pair_dict  # Save for later used in run()
     self.num_rec_pairs = num_rec_pairs
@@ -5494,154 +6031,21 @@ class SuffixArrayIndex(Indexing):
 
     num_indices = len(self.index_def)
 
-    # Index data structure for blocks is one dictionary per index - - - - - - -
-    # (a suffix array, with suffix strings as keys and record
-    # identifiers as lists)
-    #
-    for i in range(num_indices):
-      self.index1[i] = {}  # Index for data set 1
-      self.index2[i] = {}  # Index for data set 2
-
-    get_index_values_funct = self.__get_index_values__  # Shorthands
-    skip_missing =           self.skip_missing
-    start_char =             self.START_CHAR
-    end_char =               self.END_CHAR
-    padded =                 self.padded
-    min_suffix_len =         self.block_method[0]
-    max_block_size =         self.block_method[1]
+    max_block_size = self.block_method[1]
 
-    # Set a flag for the way suffix array values are generated
+    # Read the records and insert them into the suffix arrays (one dictionary
+    # per index, with suffix strings as keys and record identifiers as lists,
+    # see __get_index_keys__() below)
     #
-    if (self.suffix_method == 'allsubstr'):
-      do_all_suffix_str = True
-    else:
-      do_all_suffix_str = False
+    self.__records_into_inv_index__(max_block_size)
 
     max_suff_str_len = [0]*num_indices  # Record longest suffix strings
 
-    # A list of data structures needed for the build process:
-    # - the index data structure (dictionary)
-    # - the record cache
-    # - the data set to be read
-    # - the comparison fields which are used
-    # - a list index (0 for data set 1, 1 for data set 2)
-    #
-    build_list = [(self.index1, self.rec_cache1, self.dataset1,
-                   self.comp_field_used1, 0)] # For data set 1
-
-    if (self.do_deduplication == False):  # If linkage append data set 2
-      build_list.append((self.index2, self.rec_cache2, self.dataset2,
-                   self.comp_field_used2, 1))
-
-    # Reading loop over all records in one or both data set(s) - - - - - - - -
-    #
-    for (index,rec_cache,dataset,comp_field_used_list,ds_index) in build_list:
-
-      # Calculate a counter for the progress report
-      #
-      if (self.progress_report != None):
-        progress_report_cnt = max(1, int(dataset.num_records / \
-                                     (100.0 / self.progress_report)))
-      else:  # So no progress report is being logged
-        progress_report_cnt = dataset.num_records + 1
-
-      istart_time = time.time()
-
-      rec_read = 0  # Number of records read from data set
-
-      for (rec_ident, rec) in dataset.readall(): # Read all records in data set
-
-        # Extract record fields needed for comparisons (set all others to '')
-        #
-        comp_rec = []
-
-        field_ind = 0
-        for field in rec:
-          if (field_ind in comp_field_used_list):
-            comp_rec.append(field.lower())
-          else:
-            comp_rec.append('')
-          field_ind += 1
-
-        rec_cache[rec_ident] = comp_rec  # Put into record cache
-
-        # Now get the index variable values for this record - - - - - - - - - -
-        #
-        rec_index_val_list = get_index_values_funct(rec, ds_index)
-
-        for i in range(num_indices):  # Put record identifier into all indices
-
-          this_index = index[i]  # Shorthand
-
-          index_val = rec_index_val_list[i]
-
-          if ((index_val != '') or (skip_missing == False)):
-
-            if (padded == True):  # Add start and end characters
-              index_val = '%s%s%s' % (start_char, index_val, end_char)
-
-            index_val_len = len(index_val)
-
-            max_suff_str_len[i] = max(max_suff_str_len[i], index_val_len)
-
-            # Create all suffix strings (up to minimum length) and insert them
-            # into the index
-
-            # A set of all suffix string values for this index value
-            #
-            this_suffix_str_set = set()
-            this_suffix_str_set.add(index_val)  # Even if shorter than min_len
-
-            if (do_all_suffix_str == True):  # Create all sub-string
-
-              # According to Akiko Aizawa (e-mail 8/03/2007) not only suffix
-              # strings are generated in their approach, but all sub-strings
-              # down to length min_suffix_len
-
-              # Outer loop over all sub-string length
-              #
-              #for s1 in range(index_val_len-1, min_suffix_len-1, -1):
-              for s1 in range(min_suffix_len, index_val_len+1):
-                # Inner loop over all possible sub-strings with this length
-                #
-                for s2 in range(index_val_len-s1+1):
-                  this_suffix_str = index_val[s2:s2+s1]
-                  this_suffix_str_set.add(this_suffix_str)
-            else:  # Only create the true suffixes of the index value string
-
-              for s in range(index_val_len-min_suffix_len+1):
-                this_suffix_str = index_val[s:]
-                this_suffix_str_set.add(this_suffix_str)
-
-            # Now insert all suffix strings into index
-            #
-            for this_suffix_str in this_suffix_str_set:
-
-              suffix_str_rec_list = this_index.get(this_suffix_str, [])
-
-              if (suffix_str_rec_list != -1):  # Not too many records yet
-
-                # Check if max_block records had this string value before
-                #
-                if (len(suffix_str_rec_list) < max_block_size):
-                  suffix_str_rec_list.append(rec_ident)
-                  this_index[this_suffix_str] = suffix_str_rec_list
-                else:  # Too many records have this value
-                  this_index[this_suffix_str] = -1 # Mark as being too frequent
-
-            del this_suffix_str_set
-
-        rec_read += 1
-
-        if ((rec_read % progress_report_cnt) == 0):
-          self.__log_build_progress__(rec_read,dataset.num_records,start_time)
-
-      used_sec_str = auxiliary.time_string(time.time()-istart_time)
-      rec_time_str = auxiliary.time_string((time.time()-istart_time) / \
-                                           dataset.num_records)
-      logging.info('Read and indexed %d records in %s (%s per record)' % \
-                   (dataset.num_records, used_sec_str, rec_time_str))
-      logging.info('')
+    for i in range(num_indices):
+      for suffix_str in self.index1[i]:
+        max_suff_str_len[i] = max(max_suff_str_len[i], len(suffix_str))
+      for suffix_str in self.index2[i]:
+        max_suff_str_len[i] = max(max_suff_str_len[i], len(suffix_str))
 
     # Now remove unneeded entries in suffix array strings - - - - - - - - - - -
     #
@@ -5729,6 +6133,58 @@ class SuffixArrayIndex(Indexing):
 
   # ---------------------------------------------------------------------------
 
+  def __get_index_keys__(self, rec, data_set_num):
+    """For the given record return a list with one set of suffix strings per
+       index definition (either the true suffixes or all sub-strings of the
+       possibly padded index variable values, down to the minimum suffix
+       length).
+    """
+
+    min_suffix_len = self.block_method[0]
+
+    index_key_list = []
+
+    for index_val in self.__get_index_values__(rec, data_set_num):
+
+      if ((index_val == '') and (self.skip_missing == True)):
+        index_key_list.append([])
+        continue
+
+      if (self.padded == True):  # Add start and end characters
+        index_val = '%s%s%s' % (self.START_CHAR, index_val, self.END_CHAR)
+
+      index_val_len = len(index_val)
+
+      # A set of all suffix string values for this index value
+      #
+      this_suffix_str_set = set()
+      this_suffix_str_set.add(index_val)  # Even if shorter than min_len
+
+      if (self.suffix_method == 'allsubstr'):  # Create all sub-string
+
+        # According to Akiko Aizawa (e-mail 8/03/2007) not only suffix
+        # strings are generated in their approach, but all sub-strings
+        # down to length min_suffix_len
+
+        # Outer loop over all sub-string length
+        #
+        for s1 in range(min_suffix_len, index_val_len+1):
+          # Inner loop over all possible sub-strings with this length
+          #
+          for s2 in range(index_val_len-s1+1):
+            this_suffix_str_set.add(index_val[s2:s2+s1])
+
+      else:  # Only create the true suffixes of the index value string
+
+        for s in range(index_val_len-min_suffix_len+1):
+          this_suffix_str_set.add(index_val[s:])
+
+      index_key_list.append(this_suffix_str_set)
+
+    return index_key_list
+
+  # ---------------------------------------------------------------------------
+
   def compact(self):
     """Method to compact an index data structure.
 
@@ -5760,6 +6216,9 @@ class SuffixArrayIndex(Indexing):
                         # as keys and sets of identifiers from data set 2 as
                         # values
 
+    self.rec_block_list =      []  # Blocks of a previous compaction are not
+    self.num_block_rec_pairs = 0   # kept
+
     for i in range(num_indices):
 
       istart_time = time.time()
@@ -5868,6 +6327,7 @@ class SuffixArrayIndex(Indexing):
 
     for rec_ident2_set in self.rec_pair_dict.itervalues():
       self.num_rec_pairs += len(rec_ident2_set)
+    self.num_rec_pairs += self.num_block_rec_pairs  # Pairs in kept blocks
 
     logging.info('Compacted suffix array index in %s' % \
                  (auxiliary.time_string(time.time()-start_time)))
@@ -6020,132 +6480,21 @@ class RobustSuffixArrayIndex(Indexing):
 
     num_indices = len(self.index_def)
 
-    # Index data structure for blocks is one dictionary per index - - - - - - -
-    # (a suffix array, with suffix strings as keys and record
-    # identifiers as lists)
-    #
-    for i in range(num_indices):
-      self.index1[i] = {}  # Index for data set 1
-      self.index2[i] = {}  # Index for data set 2
-
-    get_index_values_funct = self.__get_index_values__  # Shorthands
-    skip_missing =           self.skip_missing
-    start_char =             self.START_CHAR
-    end_char =               self.END_CHAR
-    padded =                 self.padded
-    min_suffix_len =         self.block_method[0]
-    max_block_size =         self.block_method[1]
-
-    max_suff_str_len = [0]*num_indices  # Record longest suffix strings
-
-    # A list of data structures needed for the build process:
-    # - the index data structure (dictionary)
-    # - the record cache
-    # - the data set to be read
-    # - the comparison fields which are used
-    # - a list index (0 for data set 1, 1 for data set 2)
-    #
-    build_list = [(self.index1, self.rec_cache1, self.dataset1,
-                   self.comp_field_used1, 0)] # For data set 1
-
-    if (self.do_deduplication == False):  # If linkage append data set 2
-      build_list.append((self.index2, self.rec_cache2, self.dataset2,
-                   self.comp_field_used2, 1))
+    max_block_size = self.block_method[1]
 
-    # Reading loop over all records in one or both data set(s) - - - - - - - -
+    # Read the records and insert them into the suffix arrays (one dictionary
+    # per index, with suffix strings as keys and record identifiers as lists,
+    # see __get_index_keys__() below)
     #
-    for (index,rec_cache,dataset,comp_field_used_list,ds_index) in build_list:
-
-      # Calculate a counter for the progress report
-      #
-      if (self.progress_report != None):
-        progress_report_cnt = max(1, int(dataset.num_records / \
-                                     (100.0 / self.progress_report)))
-      else:  # So no progress report is being logged
-        progress_report_cnt = dataset.num_records + 1
+    self.__records_into_inv_index__(max_block_size)
 
-      istart_time = time.time()
-
-      rec_read = 0  # Number of records read from data set
-
-      for (rec_ident, rec) in dataset.readall(): # Read all records in data set
-
-        # Extract record fields needed for comparisons (set all others to '')
-        #
-        comp_rec = []
-
-        field_ind = 0
-        for field in rec:
-          if (field_ind in comp_field_used_list):
-            comp_rec.append(field.lower())
-          else:
-            comp_rec.append('')
-          field_ind += 1
-
-        rec_cache[rec_ident] = comp_rec  # Put into record cache
-
-        # Now get the index variable values for this record - - - - - - - - - -
-        #
-        rec_index_val_list = get_index_values_funct(rec, ds_index)
-
-        for i in range(num_indices):  # Put record identifier into all indices
-
-          this_index = index[i]  # Shorthand
-
-          index_val = rec_index_val_list[i]
-
-          if ((index_val != '') or (skip_missing == False)):
-
-            if (padded == True):  # Add start and end characters
-              index_val = '%s%s%s' % (start_char, index_val, end_char)
-
-            index_val_len = len(index_val)
-
-            max_suff_str_len[i] = max(max_suff_str_len[i], index_val_len)
-
-            # Create all suffix strings (up to minimum length) and insert them
-            # into the index
-
-            # A set of all suffix string values for this index value
-            #
-            this_suffix_str_set = set()
-            this_suffix_str_set.add(index_val)  # Even if shorter than min_len
-
-            # Create the true suffixes of the index value string
-            #
-            for s in range(index_val_len-min_suffix_len+1):
-              this_suffix_str = index_val[s:]
-              this_suffix_str_set.add(this_suffix_str)
-
-            # Now insert all suffix strings into index
-            #
-            for this_suffix_str in this_suffix_str_set:
-
-              suffix_str_rec_list = this_index.get(this_suffix_str, [])
-
-              if (suffix_str_rec_list != -1):  # Not too many records yet
-
-                # Check if max_block records had this string value before
-                #
-                if (len(suffix_str_rec_list) < max_block_size):
-                  suffix_str_rec_list.append(rec_ident)
-                  this_index[this_suffix_str] = suffix_str_rec_list
-                else:  # Too many records have this value
-                  this_index[this_suffix_str] = -1 # Mark as being too frequent
-
-            del this_suffix_str_set
-
-        rec_read += 1
-
-        if ((rec_read % progress_report_cnt) == 0):
-          self.__log_build_progress__(rec_read,dataset.num_records,start_time)
+    max_suff_str_len = [0]*num_indices  # Record longest suffix strings
 
-      used_sec_str = auxiliary.time_string(time.time()-istart_time)
-      rec_time_str = auxiliary.time_string((time.time()-istart_time) / \
-                                           dataset.num_records)
-      logging.info('Read and indexed %d records in %s (%s per record)' % \
-                   (dataset.num_records, used_sec_str, rec_time_str))
-      logging.info('')
+    for i in range(num_indices):
+      for suffix_str in self.index1[i]:
+        max_suff_str_len[i] = max(max_suff_str_len[i], len(suffix_str))
+      for suffix_str in self.index2[i]:
+        max_suff_str_len[i] = max(max_suff_str_len[i], len(suffix_str))
 
     # Now remove unneeded entries in suffix array strings - - - - - - - - - - -
     #
@@ -6233,6 +6582,39 @@ class RobustSuffixArrayIndex(Indexing):
 
   # ---------------------------------------------------------------------------
 
+  def __get_index_keys__(self, rec, data_set_num):
+    """For the given record return a list with one set of suffix strings per
+       index definition (the true suffixes of the possibly padded index
+       variable values, down to the minimum suffix length).
+    """
+
+    min_suffix_len = self.block_method[0]
+
+    index_key_list = []
+
+    for index_val in self.__get_index_values__(rec, data_set_num):
+
+      if ((index_val == '') and (self.skip_missing == True)):
+        index_key_list.append([])
+        continue
+
+      if (self.padded == True):  # Add start and end characters
+        index_val = '%s%s%s' % (self.START_CHAR, index_val, self.END_CHAR)
+
+      # A set of all suffix string values for this index value
+      #
+      this_suffix_str_set = set()
+      this_suffix_str_set.add(index_val)  # Even if shorter than min_len
+
+      for s in range(len(index_val)-min_suffix_len+1):
+        this_suffix_str_set.add(index_val[s:])
+
+      index_key_list.append(this_suffix_str_set)
+
+    return index_key_list
+
+  # ---------------------------------------------------------------------------
+
   def compact(self):
     """Method to compact an index data structure.
 
@@ -6272,6 +6654,9 @@ class RobustSuffixArrayIndex(Indexing):
                         # as keys and sets of identifiers from data set 2 as
                         # values
 
+    self.rec_block_list =      []  # Blocks of a previous compaction are not
+    self.num_block_rec_pairs = 0   # kept
+
     for i in range(num_indices):
 
       istart_time = time.time()
@@ -6476,6 +6861,7 @@ class RobustSuffixArrayIndex(Indexing):
 
     for rec_ident2_set in self.rec_pair_dict.itervalues():
       self.num_rec_pairs += len(rec_ident2_set)
+    self.num_rec_pairs += self.num_block_rec_pairs  # Pairs in kept blocks
 
     logging.info('Compacted suffix array index in %s' % \
                  (auxiliary.time_string(time.time()-start_time)))
@@ -7152,6 +7538,9 @@ class BigMatchIndex(Indexing):
       logging.info('  %d record pairs had summed weights below threshold ' % \
                    (num_rec_pairs_below_thres) + '%.2f' % (cut_off_threshold))
 
+    if (self.rec_comparator.do_timing == True):
+      self.rec_comparator.get_timing_stats()
+
     memory_usage_str = auxiliary.get_memory_usage()
     if (memory_usage_str != None):
       logging.info('  '+memory_usage_str)
@@ -7616,6 +8005,9 @@ class DedupIndex(Indexing):
       logging.info('  %d record pairs had summed weights below threshold ' % \
                    (num_rec_pairs_below_thres) + '%.2f' % (cut_off_threshold))
 
+    if (self.rec_comparator.do_timing == True):
+      self.rec_comparator.get_timing_stats()
+
     memory_usage_str = auxiliary.get_memory_usage()
     if (memory_usage_str != None):
       logging.info('  '+memory_usage_str)
@@ -52,6 +52,7 @@
 # Import necessary modules (Python standard modules first, then Febrl modules)
 
 import logging
+import math
 
 import auxiliary
 
@@ -297,6 +298,12 @@ class TagLookupTable(LookupTable):
 
 class FrequencyLookupTable(LookupTable):
   """A look-up table class for look-up tables with words and frequencies.
+
+     Field comparators using a frequency look-up table keep the frequency
+     based agreement weights of its words in the look-up table (in the
+     'freq_weight_tables' dictionary, see the comparison module), so they are
+     shared by all field comparators using the same look-up table. These
+     weights are removed whenever the look-up table is modified.
   """
 
   # ---------------------------------------------------------------------------
@@ -308,6 +315,10 @@ class FrequencyLookupTable(LookupTable):
     self.sum = None  # The sum of all frequency counts
     self.default = 1
 
+    self.freq_weight_tables = {}  # Agreement weights of the words, with keys
+                                  # (sum of counts, maximum frequency
+                                  # agreement weight)
+
     # A log message - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
     #
     logging.info('Initialised frequency look-up table "%s"' % \
@@ -393,6 +404,35 @@ class FrequencyLookupTable(LookupTable):
     logging.info('  Number of entries: %i' % (self.length))
     logging.info('  Sum of all value:  %i' % (self.sum))
 
+  # ---------------------------------------------------------------------------
+
+  def __setitem__(self, key, val):
+    """Set the frequency count of the given word, and remove the agreement
+       weights calculated from the previous counts.
+    """
+
+    dict.__setitem__(self, key, val)
+    self.freq_weight_tables.clear()
+
+  # ---------------------------------------------------------------------------
+
+  def __delitem__(self, key):
+    """Remove the given word, and the agreement weights calculated from the
+       previous counts.
+    """
+
+    dict.__delitem__(self, key)
+    self.freq_weight_tables.clear()
+
+  # ---------------------------------------------------------------------------
+
+  def clear(self):
+    """Remove all words, and the agreement weights calculated from them.
+    """
+
+    dict.clear(self)
+    self.freq_weight_tables.clear()
+
 # =============================================================================
 
 class GeocodeLookupTable(LookupTable):
@@ -403,6 +443,13 @@ class GeocodeLookupTable(LookupTable):
 
      For each entry, the key is the name of the locality, and the value is a
      list with the two entries [longitude,latitude].
+
+     For fast distance calculations, the locations of all entries are also
+     kept in radians, together with the sine and cosine of their latitudes
+     (see the get_radians() method). These are updated whenever the look-up
+     table is modified, and the number of modifications is counted (in
+     'num_changes'), so field comparators can detect when the locations they
+     have cached are not valid anymore.
   """
 
   # ---------------------------------------------------------------------------
@@ -413,6 +460,10 @@ class GeocodeLookupTable(LookupTable):
 
     self.default = []
 
+    self.radian_dict = {}  # Locations in radians, with tuples (longitude,
+                           # latitude, sin(latitude), cos(latitude)) as values
+    self.num_changes = 0   # Number of modifications of the look-up table
+
     # A log message - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
     #
     logging.info('Initialised geocode look-up table "%s"' % \
@@ -508,6 +559,8 @@ class GeocodeLookupTable(LookupTable):
 
           self.__setitem__(key, val)
 
+          self.radian_dict[key] = self.calc_radians(val)
+
     self.length = self.__len__()  # Get number of elements in the look-up table
 
     # A log message - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -516,6 +569,68 @@ class GeocodeLookupTable(LookupTable):
     logging.info('  From files:        %s' % (str(self.file_names)))
     logging.info('  Number of entries: %i' % (self.length))
 
+  # ---------------------------------------------------------------------------
+
+  def calc_radians(self, loc):
+    """Return a tuple (longitude, latitude, sin(latitude), cos(latitude))
+       with the given location [longitude,latitude] converted into radians.
+    """
+
+    long = math.radians(loc[0])
+    lati = math.radians(loc[1])
+
+    return (long, lati, math.sin(lati), math.cos(lati))
+
+  # ---------------------------------------------------------------------------
+
+  def get_radians(self, key):
+    """Return the location of the entry with the given key in radians as a
+       tuple (longitude, latitude, sin(latitude), cos(latitude)), or None if
+       the key is not in the look-up table.
+    """
+
+    rad_loc = self.radian_dict.get(key)
+
+    if (rad_loc == None):  # Entry not loaded from a file
+      loc = dict.get(self, key)
+
+      if (loc != None):
+        rad_loc = self.calc_radians(loc)
+        self.radian_dict[key] = rad_loc
+
+    return rad_loc
+
+  # ---------------------------------------------------------------------------
+
+  def __setitem__(self, key, val):
+    """Set the location of the given entry, and remove its location in radians
+       calculated from the previous location.
+    """
+
+    dict.__setitem__(self, key, val)
+    self.radian_dict.pop(key, None)
+    self.num_changes += 1
+
+  # ---------------------------------------------------------------------------
+
+  def __delitem__(self, key):
+    """Remove the given entry and its location in radians.
+    """
+
+    dict.__delitem__(self, key)
+    self.radian_dict.pop(key, None)
+    self.num_changes += 1
+
+  # ---------------------------------------------------------------------------
+
+  def clear(self):
+    """Remove all entries and their locations in radians.
+    """
+
+    dict.clear(self)
+    self.radian_dict.clear()
+    self.num_changes += 1
+
 # =============================================================================
 
 class CorrectionList(list):
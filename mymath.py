@@ -53,7 +53,9 @@
 
 import logging
 import math
+import mmap
 import random
+import struct
 
 # =============================================================================
 
@@ -426,6 +428,298 @@ def random_expo(n):  # Return expnential distribution
 
   return r
 
+# =============================================================================
+
+def mix_hash64(key):
+  """Return a 64-bit hash value for the given key (any hashable Python object).
+     The Python hash value is mixed using the 64-bit finaliser of MurmurHash3,
+     as hash values of similar tuples and strings differ only in few bits.
+  """
+
+  h = hash(key) & 0xFFFFFFFFFFFFFFFFL
+
+  h ^= h >> 33
+  h = (h * 0xFF51AFD7ED558CCDL) & 0xFFFFFFFFFFFFFFFFL
+  h ^= h >> 33
+  h = (h * 0xC4CEB9FE1A85EC53L) & 0xFFFFFFFFFFFFFFFFL
+  h ^= h >> 33
+
+  return h
+
+# =============================================================================
+# A scalable Bloom filter for approximate set membership
+
+class BloomFilter:
+  """A scalable Bloom filter (Almeida et al., 2007) that holds keys (any
+     hashable Python object) in a compact bit array.
+
+     A Bloom filter never reports a key that has been added as absent, but it
+     can report a key that has not been added as present (a false positive).
+     The filter is initially sized for the given estimated number of keys.
+     If more keys are added, a new sub-filter with a larger capacity and a
+     tighter error rate is appended, so that the overall false positive rate
+     stays below the given error rate.
+  """
+
+  def __init__(self, capacity, error_rate=0.001, growth=2, tightening=0.5):
+    """Constructor. Capacity is the estimated number of keys, error_rate the
+       maximum false positive rate (a number between 0 and 1).
+    """
+
+    if (error_rate <= 0.0) or (error_rate >= 1.0):
+      logging.exception('Error rate must be between 0 and 1: %s' % \
+                        (str(error_rate)))
+      raise Exception
+
+    self.capacity =   max(int(capacity), 1)
+    self.error_rate = error_rate
+    self.growth =     growth
+    self.tightening = tightening
+
+    self.num_keys =     0   # Number of keys added
+    self.filter_list = []   # List of (bit array, size, num hashes, capacity)
+    self.filter_keys =  0   # Number of keys in the current sub-filter
+
+    # The overall error rate is bounded by the geometric series of the
+    # sub-filter error rates
+    #
+    self.__add_filter__(self.capacity, error_rate*(1.0-tightening))
+
+  # ---------------------------------------------------------------------------
+
+  def __add_filter__(self, capacity, error_rate):
+    """Append a new sub-filter with optimal bit array size and number of hash
+       functions for the given capacity and error rate.
+    """
+
+    num_bits = int(math.ceil(-capacity*math.log(error_rate) / \
+                             (math.log(2.0)**2)))
+    num_bits = max(num_bits, 1024)  # Avoid too small bit arrays
+    num_hash = max(int(round(-math.log(error_rate, 2))), 1)
+
+    self.filter_list.append((bytearray((num_bits+7) / 8), num_bits, num_hash,
+                             capacity, error_rate))
+    self.filter_keys = 0
+
+  # ---------------------------------------------------------------------------
+
+  def __get_hashes__(self, key):
+    """Return two 32-bit hash values for the given key as used for double
+       hashing (the two halves of the mixed 64-bit hash value).
+    """
+
+    h = mix_hash64(key)
+
+    return (int(h & 0xFFFFFFFF), int(h >> 32))
+
+  # ---------------------------------------------------------------------------
+
+  def __contains__(self, key):
+    """Return True if the key is (probably) in the filter, False otherwise.
+    """
+
+    (hash1, hash2) = self.__get_hashes__(key)
+
+    for (bit_array, num_bits, num_hash, capacity, error_rate) in \
+        self.filter_list:
+      bit_pos = hash1 % num_bits
+      bit_step = hash2 % num_bits
+      for i in xrange(num_hash):
+        if (not (bit_array[bit_pos >> 3] & (1 << (bit_pos & 7)))):
+          break
+        bit_pos =  (bit_pos + bit_step) % num_bits  # Enhanced double hashing
+        bit_step = (bit_step + i + 1) % num_bits
+      else:
+        return True  # All bits set in this sub-filter
+
+    return False
+
+  # ---------------------------------------------------------------------------
+
+  def add(self, key):
+    """Add a key into the filter. Returns True if the key was (probably)
+       already in the filter, and False if it was added.
+    """
+
+    if (key in self):
+      return True
+
+    (bit_array, num_bits, num_hash, capacity, error_rate) = \
+                                                        self.filter_list[-1]
+    if (self.filter_keys >= capacity):  # Current sub-filter is full
+      self.__add_filter__(capacity*self.growth, error_rate*self.tightening)
+      (bit_array, num_bits, num_hash, capacity, error_rate) = \
+                                                        self.filter_list[-1]
+
+    (hash1, hash2) = self.__get_hashes__(key)
+
+    bit_pos = hash1 % num_bits
+    bit_step = hash2 % num_bits
+    for i in xrange(num_hash):
+      bit_array[bit_pos >> 3] |= (1 << (bit_pos & 7))
+      bit_pos =  (bit_pos + bit_step) % num_bits
+      bit_step = (bit_step + i + 1) % num_bits
+
+    self.filter_keys += 1
+    self.num_keys +=    1
+
+    return False
+
+  # ---------------------------------------------------------------------------
+
+  def __len__(self):
+    """Return the number of keys added into the filter.
+    """
+
+    return self.num_keys
+
+  # ---------------------------------------------------------------------------
+
+  def get_size(self):
+    """Return the total memory used by the bit arrays of the filter in bytes.
+    """
+
+    return sum([len(sub_filter[0]) for sub_filter in self.filter_list])
+
+# =============================================================================
+# A fixed-size hash table of numbers in shared memory
+
+class SharedHashTable:
+  """A fixed-size open-addressing hash table that maps keys (any hashable
+     Python object) to floating-point numbers, held in an anonymous shared
+     memory map.
+
+     A table created before processes are forked (for example by a
+     multiprocessing pool) is shared by all these processes: numbers put into
+     the table by one process can be read by all others. Keys are only
+     represented by their 64-bit hash value, so all processes must calculate
+     the same hash values (which is the case for forked processes).
+
+     Each slot contains two 64-bit words: the check word (the hash value of
+     the key XOR the bits of the number) and the bits of the number. A slot
+     written concurrently by two processes will then almost always fail the
+     check when read, so no locking is needed (a failed check is simply a
+     miss). Keys are looked up in at most 'num_probes' consecutive slots, if
+     all of them are taken by other keys the key replaces the one in its first
+     slot.
+  """
+
+  def __init__(self, num_slots, num_probes=8):
+    """Constructor. The table has space for 'num_slots' keys.
+    """
+
+    if (num_slots < 1):
+      logging.exception('Number of slots must be positive: %s' % \
+                        (str(num_slots)))
+      raise Exception
+
+    self.num_slots =  int(num_slots)
+    self.num_probes = min(max(int(num_probes), 1), self.num_slots)
+
+    self.table = mmap.mmap(-1, 16*self.num_slots)  # Initialised with zeros
+
+  # ---------------------------------------------------------------------------
+
+  def __get_key_hash__(self, key):
+    """Return the 64-bit hash value of the given key. Zero is not used as
+       hash value, as an empty slot (two zero words) would match it.
+    """
+
+    h = mix_hash64(key)
+
+    if (h == 0):
+      h = 1
+
+    return h
+
+  # ---------------------------------------------------------------------------
+
+  def get(self, key):
+    """Return the number stored for the given key, or None if the key is not
+       in the table.
+    """
+
+    key_hash = self.__get_key_hash__(key)
+
+    table = self.table  # Shorthands
+    num_slots = self.num_slots
+
+    slot_pos = key_hash % num_slots
+
+    for i in xrange(self.num_probes):
+      (check_word, data_word) = struct.unpack_from('<QQ', table, 16*slot_pos)
+
+      if ((check_word ^ data_word) == key_hash):
+        return struct.unpack('<d', struct.pack('<Q', data_word))[0]
+
+      if ((check_word == 0) and (data_word == 0)):  # Empty slot
+        return None
+
+      slot_pos = (slot_pos+1) % num_slots
+
+    return None
+
+  # ---------------------------------------------------------------------------
+
+  def put(self, key, value):
+    """Store the given number for the given key. Returns True if another key
+       was replaced, and False otherwise.
+    """
+
+    key_hash = self.__get_key_hash__(key)
+    data_word = struct.unpack('<Q', struct.pack('<d', value))[0]
+
+    table = self.table  # Shorthands
+    num_slots = self.num_slots
+
+    first_pos = key_hash % num_slots
+    slot_pos =  first_pos
+    replaced =  True
+
+    for i in xrange(self.num_probes):
+      (slot_check, slot_data) = struct.unpack_from('<QQ', table, 16*slot_pos)
+
+      if (((slot_check == 0) and (slot_data == 0)) or \
+          ((slot_check ^ slot_data) == key_hash)):
+        replaced = False  # Empty slot or same key
+        break
+
+      slot_pos = (slot_pos+1) % num_slots
+
+    else:  # All probed slots taken by other keys
+      slot_pos = first_pos
+
+    struct.pack_into('<QQ', table, 16*slot_pos, key_hash ^ data_word,
+                     data_word)
+
+    return replaced
+
+  # ---------------------------------------------------------------------------
+
+  def __len__(self):
+    """Return the number of keys in the table (scans the whole table).
+    """
+
+    table = self.table  # Shorthand
+
+    num_keys = 0
+
+    for slot_pos in xrange(self.num_slots):
+      if (struct.unpack_from('<QQ', table, 16*slot_pos) != (0, 0)):
+        num_keys += 1
+
+    return num_keys
+
+  # ---------------------------------------------------------------------------
+
+  def clear(self):
+    """Remove all keys from the table.
+    """
+
+    self.table.seek(0)
+    self.table.write('\x00'*(16*self.num_slots))
+    self.table.seek(0)
+
 # =============================================================================
 #
 # Following code taken from Rational.py module
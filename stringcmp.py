@@ -71,6 +71,8 @@ Comparison methods provided:
                  substring, Hamacher product and Winkler heuristics.
   permwinkler    Winkler combined with permutations of words, improves results
                  for swapped words
+  assignwinkler  Winkler with words aligned by an assignment of words with the
+                 largest word similarities (fast alternative to permwinkler)
   sortwinkler    Winkler with sorted words (if more than one), improves results
                  for swapped words
   editex         Phonetic aware edit-distance (Zobel et al. 1996)
@@ -79,6 +81,9 @@ Comparison methods provided:
   charhistogram  Get histogram of characters for both strings and calculate the
                  cosine similarity between the two histogram vectors
 
+Many string pairs can be compared at once with batch_stringcmp(), which uses
+NumPy array operations for several methods if the NumPy module is available.
+
 See doc strings of individual functions for detailed documentation.
 
 If called from command line, a test routine is run which prints example
@@ -99,6 +104,12 @@ import encode  # For Phonix transformation routine (used in syllable alignment
                # distance)
 import mymath  # Contains arithmetic coder
 
+try:
+  import numpy  # Used for the batch comparison of many string pairs
+  imp_numpy = True
+except ImportError:
+  imp_numpy = False
+
 # =============================================================================
 # Special character used in the Jaro, Winkler and q-gram comparions functions.
 # Thanks to Luca Montecchiani (luca.mon@aliceposta.it).
@@ -107,6 +118,48 @@ JARO_MARKER_CHAR = chr(1)
 QGRAM_START_CHAR = chr(1)
 QGRAM_END_CHAR =   chr(2)
 
+# =============================================================================
+# Lengths of compressed single strings used in the compression comparison
+# function, with tuples (compressor, string) as keys. The dictionary is cleared
+# once it contains MAX_COMPRESSED_LEN_CACHE_SIZE entries.
+#
+compressed_len_cache = {}
+MAX_COMPRESSED_LEN_CACHE_SIZE = 100000
+
+# =============================================================================
+# Similarities of word (token) pairs calculated with a word level comparison
+# function, with tuples (comparison function, word 1, word 2) as keys. The
+# dictionary is cleared once it contains MAX_TOKEN_SIM_CACHE_SIZE entries.
+#
+token_sim_cache = {}
+MAX_TOKEN_SIM_CACHE_SIZE = 100000
+
+# =============================================================================
+# Maximum number of words in a string for which the assignment Winkler
+# comparison function finds the optimal word assignment (for strings with more
+# words a greedy assignment is used).
+#
+MAX_OPTIMAL_ASSIGN_WORDS = 8
+
+# Maximum number of words in both strings for which the assignment Winkler
+# comparison function compares all permutations of words (like permwinkler),
+# so that for such strings both functions return the same values.
+#
+MAX_PERM_ASSIGN_WORDS = 3
+
+# =============================================================================
+# Edit costs and mappings of letters into phonetic groups used in the editex
+# comparison function (a whitespace is replaced with '{' and handled like a
+# silent sound).
+#
+EDITEX_BIG_COSTS = 3  # If characters are not in same group
+EDITEX_SML_COSTS = 2  # If characters are in same group
+
+EDITEX_GROUP_DICT = {'a':0, 'b':1, 'c':2, 'd':3, 'e':0, 'f':1, 'g':2, 'h':7,
+                     'i':0, 'j':2, 'k':2, 'l':4, 'm':5, 'n':5, 'o':0, 'p':1,
+                     'q':2, 'r':6, 's':2, 't':3, 'u':0, 'v':1, 'w':7, 'x':2,
+                     'y':0, 'z':2, '{':7}
+
 # =============================================================================
 
 def do_stringcmp(cmp_method, str1, str2, min_threshold = None):
@@ -225,6 +278,8 @@ def do_stringcmp(cmp_method, str1, str2, min_threshold = None):
                      substrings 3, and divisor is longest string length
     permwinkler      Winkler combined with permutations of words, improves
                      results for swapped words
+    assignwinkler    Winkler with words aligned by a word assignment, a fast
+                     alternative to permwinkler for strings with many words
     sortwinkler      Winkler with sorted words (if more than one), improves
                      results for swapped words
 
@@ -343,6 +398,10 @@ def do_stringcmp(cmp_method, str1, str2, min_threshold = None):
     start_time = time.time()
     sim_weight = permwinkler(str1, str2, min_threshold)
     time_used = time.time() - start_time
+  elif (cmp_method.startswith('assignwinkler')):
+    start_time = time.time()
+    sim_weight = assignwinkler(str1, str2, min_threshold)
+    time_used = time.time() - start_time
 
   elif (cmp_method.startswith('editex')):
     start_time = time.time()
@@ -377,6 +436,102 @@ def exact(str1, str2):
 
 # =============================================================================
 
+def jaro_profile(str1):
+  """Return a dictionary with the positions of each character in the given
+     string as a bit mask (bit i set for position i), as used by the
+     jaro_assign() function.
+
+  USAGE:
+    profile = jaro_profile(str1)
+  """
+
+  char_mask_dict = {}
+
+  bit = 1
+  for ch in str1:
+    char_mask_dict[ch] = char_mask_dict.get(ch, 0) | bit
+    bit <<= 1
+
+  return char_mask_dict
+
+# =============================================================================
+
+def jaro_assign(str1, str2, profile1 = None, profile2 = None):
+  """Find the characters the two strings have in common within the Jaro match
+     window.
+
+  USAGE:
+    ass1, ass2, free1, free2 = jaro_assign(str1, str2, profile1, profile2)
+
+  ARGUMENTS:
+    str1      The first string
+    str2      The second string
+    profile1  The character position profile of the first string as returned
+              by jaro_profile(), or None (then it is calculated)
+    profile2  The character position profile of the second string, or None
+
+  DESCRIPTION:
+    Each character of one string is assigned to the left-most not yet
+    assigned same character within the match window in the other string (this
+    is done for both directions). Instead of marking assigned characters in
+    copies of the strings, the not assigned positions are kept as bits of an
+    integer, so that the left-most free position of a character in the match
+    window is found with a few bit operations.
+
+    Returns the assigned characters of the first string and of the second
+    string (in order), as well as bit masks of the positions in the first and
+    second string which were not assigned.
+  """
+
+  if (profile1 == None):
+    profile1 = jaro_profile(str1)
+  if (profile2 == None):
+    profile2 = jaro_profile(str2)
+
+  len1 = len(str1)
+  len2 = len(str2)
+
+  halflen = max(len1,len2) / 2 - 1  # Or + 1?? PC 12/03/2009
+
+  ass_list =  []
+  free_list = []
+
+  for (s1, char_mask_dict, len2) in [(str1, profile2, len2),
+                                     (str2, profile1, len1)]:
+
+    free2 = (1 << len2) - 1  # All positions in the other string are free
+
+    # Bits of positions at or after the start of the match window, and the
+    # bit of the position at the end of the match window
+    #
+    start_mask = -(1 << max(0, -halflen))
+    end_bit =    1 << (halflen+1)
+
+    ass1 = ''
+    i = 0
+
+    for ch in s1:
+      avail = char_mask_dict.get(ch, 0) & free2 & start_mask
+
+      if (avail != 0):
+        low_bit = avail & -avail  # Left-most free position
+
+        if (low_bit < end_bit):  # Found common character
+          free2 ^= low_bit
+          ass1 += ch
+
+      if (i >= halflen):
+        start_mask <<= 1
+      end_bit <<= 1
+      i += 1
+
+    ass_list.append(ass1)
+    free_list.append(free2)
+
+  return ass_list[0], ass_list[1], free_list[1], free_list[0]
+
+# =============================================================================
+
 def jaro(str1, str2, min_threshold = None):
   """Return approximate string comparator measure (between 0.0 and 1.0)
 
@@ -386,12 +541,16 @@ def jaro(str1, str2, min_threshold = None):
   ARGUMENTS:
     str1           The first string
     str2           The second string
-    min_threshold  Minimum threshold between 0 and 1 (currently not used)
+    min_threshold  Minimum threshold between 0 and 1
 
   DESCRIPTION:
     As desribed in 'An Application of the Fellegi-Sunter Model of
     Record Linkage to the 1990 U.S. Decennial Census' by William E. Winkler
     and Yves Thibaudeau.
+
+    If a minimum threshold is given and the similarity of two strings with
+    their lengths can not reach it (not more characters than in the shorter
+    string can be common) then 0.0 is returned.
   """
 
   # Quick check if the strings are empty or the same - - - - - - - - - - - - -
@@ -404,38 +563,30 @@ def jaro(str1, str2, min_threshold = None):
   len1 = len(str1)
   len2 = len(str2)
 
-  halflen = max(len1,len2) / 2 - 1  # Or + 1?? PC 12/03/2009
+  # Use string lengths to quickly check for minimum threshold - - - - - - - -
+  #
+  if (min_threshold != None):
+    if (isinstance(min_threshold, float)) and (min_threshold > 0.0) and \
+       (min_threshold < 1.0):
 
-  ass1 = ''  # Characters assigned in str1
-  ass2 = ''  # Characters assigned in str2
+      max_common = float(min(len1,len2))
 
-  workstr1 = str1  # Copy of original string
-  workstr2 = str2
+      w = 1./3.*(max_common / float(len1) + max_common / float(len2) + 1.0)
 
-  common1 = 0  # Number of common characters
-  common2 = 0
+      if (w  < min_threshold):
+        return 0.0  # Similariy is smaller than minimum threshold
 
-  # Analyse the first string  - - - - - - - - - - - - - - - - - - - - - - - - -
-  #
-  for i in range(len1):
-    start = max(0,i-halflen)
-    end   = min(i+halflen+1,len2)
-    index = workstr2.find(str1[i],start,end)
-    if (index > -1):  # Found common character
-      common1 += 1
-      ass1 = ass1 + str1[i]
-      workstr2 = workstr2[:index]+JARO_MARKER_CHAR+workstr2[index+1:]
+    else:
+      logging.exception('Illegal value for minimum threshold (not between' + \
+                        ' 0 and 1): %f' % (min_threshold))
+      raise Exception
 
-  # Analyse the second string - - - - - - - - - - - - - - - - - - - - - - - - -
+  # Assign common characters in both strings - - - - - - - - - - - - - - - - -
   #
-  for i in range(len2):
-    start = max(0,i-halflen)
-    end   = min(i+halflen+1,len1)
-    index = workstr1.find(str2[i],start,end)
-    if (index > -1):  # Found common character
-      common2 += 1
-      ass2 = ass2 + str2[i]
-      workstr1 = workstr1[:index]+JARO_MARKER_CHAR+workstr1[index+1:]
+  ass1, ass2, free1, free2 = jaro_assign(str1, str2)
+
+  common1 = len(ass1)  # Number of common characters
+  common2 = len(ass2)
 
   if (common1 != common2):
     logging.error('Jaro: Wrong common values for strings "%s" and "%s"' % \
@@ -529,12 +680,218 @@ def winkler(str1, str2, min_threshold = None):
   """For backwards compatibility, call Jaro followed by Winkler modification.
   """
 
-  jaro_weight = jaro(str1, str2, min_threshold)
+  # Use string lengths to quickly check for minimum threshold (the Winkler
+  # modification, including the long string adjustment, increases a Jaro
+  # weight w by at most 0.5*(1-w))
+  #
+  if (min_threshold != None) and (str1 != '') and (str2 != '') and \
+     (str1 != str2):
+    len1 = len(str1)
+    len2 = len(str2)
+    max_common = float(min(len1,len2))
+
+    w = 1./3.*(max_common / float(len1) + max_common / float(len2) + 1.0)
+    w += 0.5*(1.0 - w)
+
+    if (w  < min_threshold):
+      return 0.0  # Similariy is smaller than minimum threshold
+
+  jaro_weight = jaro(str1, str2)
 
   return winklermod(str1, str2, jaro_weight)
 
 # =============================================================================
 
+def qgram_profile(str1, q=2, padded=True):
+  """Return the q-gram profile of a string: a sorted list of its q-grams.
+
+  USAGE:
+    profile = qgram_profile(str1, q, padded)
+
+  DESCRIPTION:
+    The number of common q-grams of two strings can be counted with a single
+    linear merge of their profiles (see the count_common_sorted() function).
+    Profiles can be kept for values that are compared many times, so their
+    q-grams are only calculated once (as done in the q-gram field
+    comparator).
+  """
+
+  if (padded == True):
+    qgram_str = (q-1)*QGRAM_START_CHAR+str1+(q-1)*QGRAM_END_CHAR
+  else:
+    qgram_str = str1
+
+  qgram_list = [qgram_str[i:i+q] for i in range(len(qgram_str) - (q-1))]
+  qgram_list.sort()
+
+  return qgram_list
+
+# =============================================================================
+
+def posqgram_profile(str1, q=2, padded=True):
+  """Return the positional q-gram profile of a string: a tuple made of the
+     list of its (q-gram, position) pairs (in the order of the positions) and
+     a dictionary with q-grams as keys and the sorted list of their positions
+     as values.
+
+  USAGE:
+    profile = posqgram_profile(str1, q, padded)
+
+  DESCRIPTION:
+    See the posqgram() function and the count_common_posqgrams() function.
+  """
+
+  if (padded == True):
+    qgram_str = (q-1)*QGRAM_START_CHAR+str1+(q-1)*QGRAM_END_CHAR
+  else:
+    qgram_str = str1
+
+  qgram_list = [(qgram_str[i:i+q],i) for i in range(len(qgram_str) - (q-1))]
+
+  qgram_pos_dict = {}
+
+  for (q_gram, pos) in qgram_list:  # Positions are added in increasing order
+    pos_list = qgram_pos_dict.get(q_gram, [])
+    pos_list.append(pos)
+    qgram_pos_dict[q_gram] = pos_list
+
+  return (qgram_list, qgram_pos_dict)
+
+# =============================================================================
+
+def sgram_profile(str1, gc, padded=True):
+  """Return the s-gram profile of a string: a list with one sorted list of
+     s-grams for each gram class in the given gram class list.
+
+  USAGE:
+    profile = sgram_profile(str1, gc, padded)
+
+  DESCRIPTION:
+    See the sgram() function.
+  """
+
+  if (padded == True):
+    tmp_str = QGRAM_START_CHAR+str1+QGRAM_END_CHAR
+  else:
+    tmp_str = str1
+
+  str_len = len(tmp_str)
+
+  profile = []
+
+  for c in gc:
+    sgram_list = []
+    for s in c:  # Skip distances
+      for i in range(0,str_len-s-1):
+        sgram_list.append(tmp_str[i]+tmp_str[i+s+1])
+    sgram_list.sort()
+
+    profile.append(sgram_list)
+
+  return profile
+
+# =============================================================================
+
+def count_common_sorted(list1, list2):
+  """Return the number of common elements of two sorted lists (counting each
+     element as often as it occurs in both lists), using a linear merge.
+
+  USAGE:
+    common = count_common_sorted(list1, list2)
+  """
+
+  len1 = len(list1)
+  len2 = len(list2)
+
+  common = 0
+  i = 0
+  j = 0
+
+  while (i < len1) and (j < len2):
+    elem1 = list1[i]
+    elem2 = list2[j]
+
+    if (elem1 == elem2):
+      common += 1
+      i += 1
+      j += 1
+    elif (elem1 < elem2):
+      i += 1
+    else:
+      j += 1
+
+  return common
+
+# =============================================================================
+
+def count_common_posqgrams(short_profile, long_profile, max_dist):
+  """Return the number of common positional q-grams of two positional q-gram
+     profiles (see the posqgram_profile() function) with positions at most
+     'max_dist' apart.
+
+  USAGE:
+    common = count_common_posqgrams(short_profile, long_profile, max_dist)
+
+  DESCRIPTION:
+    The q-grams of the first profile are matched in order of their positions.
+    Each is matched with the not yet matched occurrence of the same q-gram in
+    the second profile that has the smallest position within the maximum
+    distance.
+  """
+
+  long_qgram_pos_dict = long_profile[1]
+
+  common = 0
+  used_set = set()  # Matched (q-gram, position) pairs of the second profile
+
+  for (q_gram, pos) in short_profile[0]:
+    pos_list = long_qgram_pos_dict.get(q_gram)
+
+    if (pos_list != None):
+      min_pos = pos-max_dist
+      max_pos = pos+max_dist
+
+      for test_pos in pos_list:
+        if (test_pos > max_pos):
+          break
+        if ((test_pos >= min_pos) and ((q_gram,test_pos) not in used_set)):
+          common += 1
+          used_set.add((q_gram,test_pos))
+          break
+
+  return common
+
+# =============================================================================
+
+def count_common_chars(str1, str2):
+  """Return the number of characters the two strings have in common when they
+     are seen as bags (multisets) of characters.
+
+  USAGE:
+    common = count_common_chars(str1, str2)
+
+  DESCRIPTION:
+    The number of common characters is an upper bound on the total length of
+    all common substrings that can be extracted from the two strings.
+  """
+
+  char_count_dict = {}
+
+  for ch in str1:
+    char_count_dict[ch] = char_count_dict.get(ch, 0) + 1
+
+  common = 0
+
+  for ch in str2:
+    count = char_count_dict.get(ch, 0)
+    if (count > 0):
+      common += 1
+      char_count_dict[ch] = count-1
+
+  return common
+
+# =============================================================================
+
 def qgram(str1, str2, q=2, common_divisor = 'average', min_threshold = None,
           padded=True):
   """Return approximate string comparator measure (between 0.0 and 1.0)
@@ -626,35 +983,10 @@ def qgram(str1, str2, q=2, common_divisor = 'average', min_threshold = None,
                         ' 0 and 1): %f' % (min_threshold))
       raise Exception
 
-  # Add start and end characters (padding) - - - - - - - - - - - - - - - - - -
-  #
-  if (padded == True):
-    qgram_str1 = (q-1)*QGRAM_START_CHAR+str1+(q-1)*QGRAM_END_CHAR
-    qgram_str2 = (q-1)*QGRAM_START_CHAR+str2+(q-1)*QGRAM_END_CHAR
-  else:
-    qgram_str1 = str1
-    qgram_str2 = str2
-
-  # Make a list of q-grams for both strings - - - - - - - - - - - - - - - - - -
-  #
-  qgram_list1 = [qgram_str1[i:i+q] for i in range(len(qgram_str1) - (q-1))]
-  qgram_list2 = [qgram_str2[i:i+q] for i in range(len(qgram_str2) - (q-1))]
-
-  # Get common q-grams  - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+  # Get the sorted q-gram lists of both strings and count common q-grams - - -
   #
-  common = 0
-
-  if (num_qgram1 < num_qgram2):  # Count using the shorter q-gram list
-    short_qgram_list = qgram_list1
-    long_qgram_list =  qgram_list2
-  else:
-    short_qgram_list = qgram_list2
-    long_qgram_list =  qgram_list1
-
-  for q_gram in short_qgram_list:
-    if (q_gram in long_qgram_list):
-      common += 1
-      long_qgram_list.remove(q_gram)  # Remove the counted q-gram
+  common = count_common_sorted(qgram_profile(str1, q, padded),
+                               qgram_profile(str2, q, padded))
 
   w = float(common) / float(divisor)
 
@@ -782,42 +1114,16 @@ def posqgram(str1, str2, q=2, max_dist = 2, common_divisor = 'average',
                         ' 0 and 1): %f' % (min_threshold))
       raise Exception
 
-  # Add start and end characters (padding) - - - - - - - - - - - - - - - - - -
+  # Get positional q-grams of both strings and count common q-grams - - - - -
+  # (using the shorter q-gram list first)
   #
-  if (padded == True):
-    qgram_str1 = (q-1)*QGRAM_START_CHAR+str1+(q-1)*QGRAM_END_CHAR
-    qgram_str2 = (q-1)*QGRAM_START_CHAR+str2+(q-1)*QGRAM_END_CHAR
-  else:
-    qgram_str1 = str1
-    qgram_str2 = str2
-
-  # Make a list of q-grams for both strings - - - - - - - - - - - - - - - - - -
-  #
-  qgram_list1 = [(qgram_str1[i:i+q],i) for i in range(len(qgram_str1) - (q-1))]
-  qgram_list2 = [(qgram_str2[i:i+q],i) for i in range(len(qgram_str2) - (q-1))]
+  profile1 = posqgram_profile(str1, q, padded)
+  profile2 = posqgram_profile(str2, q, padded)
 
-  # Get common q-grams  - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-  #
-  common = 0
-
-  if (num_qgram1 < num_qgram2):  # Count using the shorter q-gram list
-    short_qgram_list = qgram_list1
-    long_qgram_list =  qgram_list2
+  if (num_qgram1 < num_qgram2):
+    common = count_common_posqgrams(profile1, profile2, max_dist)
   else:
-    short_qgram_list = qgram_list2
-    long_qgram_list =  qgram_list1
-
-  for pos_q_gram in short_qgram_list:
-    (q_gram,pos) = pos_q_gram
-
-    pos_range = range(max(pos-max_dist,0), pos+max_dist+1)
-
-    for test_pos in pos_range:
-      test_pos_q_gram = (q_gram,test_pos)
-      if (test_pos_q_gram in long_qgram_list):
-        common += 1
-        long_qgram_list.remove(test_pos_q_gram)  # Remove the counted q-gram
-        break
+    common = count_common_posqgrams(profile2, profile1, max_dist)
 
   w = float(common) / float(divisor)
 
@@ -877,34 +1183,17 @@ def sgram(str1, str2, gc, common_divisor = 'average', min_threshold = None,
                       (common_divisor))
     raise Exception
 
-  # Extend strings with start and end characters
+  # Get the sorted s-gram lists of both strings for all gram classes - - - - -
   #
-  if (padded == True):
-    tmp_str1 = QGRAM_START_CHAR+str1+QGRAM_END_CHAR
-    tmp_str2 = QGRAM_START_CHAR+str2+QGRAM_END_CHAR
-  else:
-    tmp_str1 = str1
-    tmp_str2 = str2
-
-  len1 = len(tmp_str1)
-  len2 = len(tmp_str2)
+  profile1 = sgram_profile(str1, gc, padded)
+  profile2 = sgram_profile(str2, gc, padded)
 
   common = 0.0   # Sum number of common s-grams over gram classes
   divisor = 0.0  # Sum of divisors over gram classes
 
   # Loop over all gram classes given - - - - - - - - - - - - - - - - - - - - -
   #
-  for c in gc:
-
-    sgram_list1 = []
-    sgram_list2 = []
-
-    for s in c:  # Skip distances
-
-      for i in range(0,len1-s-1):
-        sgram_list1.append(tmp_str1[i]+tmp_str1[i+s+1])
-      for i in range(0,len2-s-1):
-        sgram_list2.append(tmp_str2[i]+tmp_str2[i+s+1])
+  for (sgram_list1, sgram_list2) in zip(profile1, profile2):
 
     num_sgram1 = len(sgram_list1)
     num_sgram2 = len(sgram_list2)
@@ -916,21 +1205,7 @@ def sgram(str1, str2, gc, common_divisor = 'average', min_threshold = None,
     else:  # Longest
       this_divisor = max(num_sgram1,num_sgram2)
 
-    if (num_sgram1 < num_sgram2):  # Count using the shorter s-gram list
-      short_sgram_list = sgram_list1
-      long_sgram_list =  sgram_list2
-    else:
-      short_sgram_list = sgram_list2
-      long_sgram_list =  sgram_list1
-
-    this_common = 0  # Number of common s-grams for this gram class
-
-    for s_gram in short_sgram_list:
-      if (s_gram in long_sgram_list):
-        this_common += 1
-        long_sgram_list.remove(s_gram)  # Remove the counted s-gram
-
-    common +=  this_common
+    common +=  count_common_sorted(sgram_list1, sgram_list2)
     divisor += this_divisor
 
   if (divisor == 0):  # One string did not have any s-grams
@@ -948,6 +1223,110 @@ def sgram(str1, str2, gc, common_divisor = 'average', min_threshold = None,
 
 # =============================================================================
 
+def editdist_bitparallel(str1, str2, transpose = False, max_dist = None):
+  """Calculate the edit (or Levenshtein) distance between two strings using a
+     bit-parallel algorithm.
+
+  USAGE:
+    (dist, exceeded) = editdist_bitparallel(str1, str2, transpose, max_dist)
+
+  ARGUMENTS:
+    str1       The first string (best the shorter one)
+    str2       The second string
+    transpose  If set to True transpositions of two adjacent characters are
+               counted as one operation (the restricted Damerau-Levenshtein
+               distance as calculated in the mod_editdist function), if False
+               (default) the Levenshtein distance is calculated.
+    max_dist   A maximum distance or None (default).
+
+  DESCRIPTION:
+    Returns the distance and a flag which is True if the distances of all
+    prefixes of 'str1' with 'str2' are larger than 'max_dist' (the condition
+    under which the dynamic programming versions of the edit distance stop
+    early), and False otherwise (always False if 'max_dist' is None).
+
+    One column of the dynamic programming matrix is held as two bit vectors
+    of positive and negative vertical differences, which are updated for each
+    character of 'str2' with a few bit operations, see:
+
+      "A bit-vector algorithm for computing Levenshtein and Damerau edit
+       distances", H. Hyyro, Nordic Journal of Computing, 10(1), 2003.
+
+    Python integers have no fixed size, so strings of any length are held in
+    one bit vector.
+  """
+
+  n = len(str1)
+  m = len(str2)
+
+  if (n == 0):
+    return (m, (max_dist != None) and (m > max_dist))
+
+  # Bit vectors with the positions of each character in the first string
+  #
+  pattern_eq_dict = {}
+
+  bit = 1
+  for c in str1:
+    pattern_eq_dict[c] = pattern_eq_dict.get(c, 0) | bit
+    bit <<= 1
+
+  mask =     bit - 1
+  high_bit = bit >> 1
+
+  vert_pos = mask  # Vertical differences in the first column are all +1
+  vert_neg = 0
+  dist =     n
+
+  prev_eq =   0
+  prev_diag = 0
+
+  for c in str2:
+    eq = pattern_eq_dict.get(c, 0)
+
+    diag = (((eq & vert_pos) + vert_pos) ^ vert_pos) | eq | vert_neg
+
+    if (transpose == True):  # Add transpositions
+      diag = (diag | ((((~prev_diag) & eq) << 1) & prev_eq)) & mask
+      prev_eq =   eq
+      prev_diag = diag
+
+    horiz_pos = vert_neg | (mask & ~(diag | vert_pos))
+    horiz_neg = vert_pos & diag
+
+    if (horiz_pos & high_bit):  # Distance in the last row
+      dist += 1
+    elif (horiz_neg & high_bit):
+      dist -= 1
+
+    horiz_pos = (horiz_pos << 1) | 1
+    vert_neg =  horiz_pos & diag
+    vert_pos =  ((horiz_neg << 1) | ~(horiz_pos | diag)) & mask
+
+  # Check if the distances of all prefixes are larger than the maximum
+  # distance (only possible if the distance itself is larger)
+  #
+  exceeded = False
+
+  if (max_dist != None) and (dist > max_dist):
+    prefix_dist = m  # Distance of the empty prefix
+    exceeded = (prefix_dist > max_dist)
+
+    j = 0
+    while (exceeded == True) and (j < n):
+      if ((vert_pos >> j) & 1):
+        prefix_dist += 1
+      elif ((vert_neg >> j) & 1):
+        prefix_dist -= 1
+
+      if (prefix_dist <= max_dist):
+        exceeded = False
+      j += 1
+
+  return (dist, exceeded)
+
+# =============================================================================
+
 def editdist(str1, str2, min_threshold = None):
   """Return approximate string comparator measure (between 0.0 and 1.0)
      using the edit (or Levenshtein) distance.
@@ -997,33 +1376,21 @@ def editdist(str1, str2, min_threshold = None):
                         ' 0 and 1): %f' % (min_threshold))
       raise Exception
 
-  if (n > m):  # Make sure n <= m, to use O(min(n,m)) space
+  else:
+    max_dist = None
+
+  if (n > m):  # Make sure n <= m, to use the shorter string as bit vectors
     str1, str2 = str2, str1
     n, m =       m, n
 
-  current = range(n+1)
+  (dist, exceeded) = editdist_bitparallel(str1, str2, False, max_dist)
 
-  for i in range(1, m+1):
+  if (exceeded == True):
+    return 1.0 - float(max_dist+1) / float(max_len)
 
-    previous = current
-    current =  [i]+n*[0]
-    str2char = str2[i-1]
+  w = 1.0 - float(dist) / float(max_len)
 
-    for j in range(1,n+1):
-      substitute = previous[j-1]
-      if (str1[j-1] != str2char):
-        substitute += 1
-
-      # Get minimum of insert, delete and substitute
-      #
-      current[j] = min(previous[j]+1, current[j-1]+1, substitute)
-
-    if (min_threshold != None) and (min(current) > max_dist):
-      return 1.0 - float(max_dist+1) / float(max_len)
-
-  w = 1.0 - float(current[n]) / float(max_len)
-
-  assert (w >= 0.0) and (w <= 1.0), 'Similarity weight outside 0-1: %f' % (w)
+  assert (w >= 0.0) and (w <= 1.0), 'Similarity weight outside 0-1: %f' % (w)
 
   # A log message - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
   #
@@ -1087,46 +1454,19 @@ def mod_editdist(str1, str2, min_threshold = None):
                         ' 0 and 1): %f' % (min_threshold))
       raise Exception
 
-  if (n > m):  # Make sure n <= m, to use O(min(n,m)) space
+  else:
+    max_dist = None
+
+  if (n > m):  # Make sure n <= m, to use the shorter string as bit vectors
     str1, str2 = str2, str1
     n, m =       m, n
 
-  d = []  # Table with the full distance matrix
-
-  current = range(n+1)
-  d.append(current)
-
-  for i in range(1,m+1):
-
-    previous = current
-    current =  [i]+n*[0]
-    str2char = str2[i-1]
-
-    for j in range(1,n+1):
-      substitute = previous[j-1]
-      if (str1[j-1] != str2char):
-        substitute += 1
-
-      if (i == 1) or (j == 1):  # First characters, no transposition possible
-
-        # Get minimum of insert, delete and substitute
-        #
-        current[j] = min(previous[j]+1, current[j-1]+1, substitute)
-
-      else:
-        if (str1[j-2] == str2[i-1]) and (str1[j-1] == str2[i-2]):
-          transpose = d[i-2][j-2] + 1
-        else:
-          transpose = d[i-2][j-2] + 3
-
-        current[j] = min(previous[j]+1, current[j-1]+1, substitute, transpose)
+  (dist, exceeded) = editdist_bitparallel(str1, str2, True, max_dist)
 
-    d.append(current)
-
-    if (min_threshold != None) and (min(current) > max_dist):
-      return 1.0 - float(max_dist+1) / float(max_len)
+  if (exceeded == True):
+    return 1.0 - float(max_dist+1) / float(max_len)
 
-  w = 1.0 - float(current[n]) / float(max_len)
+  w = 1.0 - float(dist) / float(max_len)
 
   assert (w >= 0.0) and (w <= 1.0), 'Similarity weight outside 0-1: %f' % (w)
 
@@ -1330,6 +1670,11 @@ def swdist(str1, str2, common_divisor = 'average', min_threshold = None):
 
     "The field matching problem: Algorithms and applications"
     by A.E. Monge and C.P. Elkan, 1996.
+
+    The best gap scores ending in a cell are kept as running maxima (as in
+    Gotoh's algorithm), so the table is calculated in O(n*m) time. If a
+    minimum threshold is given, then the calculation stops and 0.0 is returned
+    as soon as the best score still reachable is below the threshold.
   """
 
   # Quick check if the strings are empty or the same - - - - - - - - - - - - -
@@ -1364,6 +1709,22 @@ def swdist(str1, str2, common_divisor = 'average', min_threshold = None):
   else:  # Longest
     divisor = max(n,m)*match_score
 
+  # Use string lengths to quickly check for minimum threshold - - - - - - - -
+  #
+  if (min_threshold != None):
+    if (isinstance(min_threshold, float)) and (min_threshold > 0.0) and \
+       (min_threshold < 1.0):
+
+      w = float(min(n,m)*match_score) / float(divisor)
+
+      if (w < min_threshold):
+        return 0.0  # Similariy is smaller than minimum threshold
+
+    else:
+      logging.exception('Illegal value for minimum threshold (not between' + \
+                        ' 0 and 1): %f' % (min_threshold))
+      raise Exception
+
   # Dictionary with approximate match characters mapped into numbers
   # {a,e,i,o,u} -> 0, {d,t} -> 1, {g,j} -> 2, {l,r} -> 3, {m,n} -> 4,
   # {b,p,v} -> 5
@@ -1373,20 +1734,31 @@ def swdist(str1, str2, common_divisor = 'average', min_threshold = None):
 
   best_score = 0  # Keep the best score while calculating table
 
-  d = []  # Table with the full distance matrix
+  # Only the previous and the current row of the table are kept. The best
+  # score of a vertical gap ending in a cell is kept per column (col_gap), the
+  # best score of a horizontal gap ending in a cell in row_gap.
+  #
+  first_gap = gap_penalty+extension_penalty
 
-  for i in range(n+1):  # Initalise table
-    d.append([0.0]*(m+1))
+  current = [0]*(m+1)
+  col_gap = [0]*(m+1)
 
   for i in range(1,n+1):
+    previous = current
+    current =  [0]*(m+1)
+
+    str1char = str1[i-1]
+    approx_match1 = approx_matches.get(str1char,-1)
+
+    row_gap = 0
+
     for j in range(1,m+1):
 
-      match = d[i-1][j-1]
+      match = previous[j-1]
 
-      if (str1[i-1] == str2[j-1]):
+      if (str1char == str2[j-1]):
         match += match_score
       else:
-        approx_match1 = approx_matches.get(str1[i-1],-1)
         approx_match2 = approx_matches.get(str2[j-1],-1)
 
         if (approx_match1 >= 0) and (approx_match2 >= 0) and \
@@ -1395,18 +1767,29 @@ def swdist(str1, str2, common_divisor = 'average', min_threshold = None):
         else:
           match += mismatch_score
 
-      insert = 0
-      for k in range(1,i):
-        score = d[i-k][j] - gap_penalty - k*extension_penalty
-        insert = max(insert, score)
+      if (i > 1):  # Best vertical gap from one of the rows above
+        col_gap[j] = max(previous[j]-first_gap, col_gap[j]-extension_penalty)
+        insert = max(0, col_gap[j])
+      else:
+        insert = 0
+
+      if (j > 1):  # Best horizontal gap from one of the columns to the left
+        row_gap = max(current[j-1]-first_gap, row_gap-extension_penalty)
+        delete = max(0, row_gap)
+      else:
+        delete = 0
+
+      current[j] = max(match, insert, delete, 0)
 
-      delete = 0
-      for l in range(1,j):
-        score = d[i][j-l] - gap_penalty - l*extension_penalty
-        delete = max(delete, score)
+    best_score = max(max(current), best_score)
+
+    # Scores can increase by at most the match score in each following row
+    #
+    if (min_threshold != None):
+      max_score = best_score + (n-i)*match_score
 
-      d[i][j] = max(match, insert, delete, 0)
-      best_score = max(d[i][j], best_score)
+      if (float(max_score) / float(divisor) < min_threshold):
+        return 0.0  # Similariy is smaller than minimum threshold
 
   # best_score can be min(len(str1),len)str2))*match_score (if one string is
   # a sub-string ofd the other string).
@@ -1541,55 +1924,76 @@ def syllaligndist(str1, str2, common_divisor = 'average', min_threshold = None,
   else:  # Longest
     divisor = max(max_w1,max_w2)
 
-  d = []  # Table with the full distance matrix
-
-  for i in range(n+1):  # Initalise table
-    d.append([0.0]*(m+1))
-
-  for i in range(1,n+1):  # First column
-    if (wstr1[i-1].isupper()):
-      d[i][0] = d[i-1][0]+g2
+  # Gap weights of all characters, and substitution weights of all characters
+  # in the first string with each different character in the second string
+  #
+  gap_list1 = []
+  for c in wstr1:
+    if (c.isupper()):
+      gap_list1.append(g2)
     else:
-      d[i][0] = d[i-1][0]+g1
+      gap_list1.append(g1)
 
-  for j in range(1,m+1):  # First row
-    if (wstr2[j-1].isupper()):
-      d[0][j] = d[0][j-1]+g2
+  gap_list2 = []
+  for c in wstr2:
+    if (c.isupper()):
+      gap_list2.append(g2)
     else:
-      d[0][j] = d[0][j-1]+g1
+      gap_list2.append(g1)
+
+  sub_dict = {}
+
+  for c2 in wstr2:
+    if (c2 not in sub_dict):
+      sub_list = []
+
+      for c1 in wstr1:
+        if (c1.isupper() and c2.isupper()):
+          if (c1 == c2):
+            sub_list.append(s4)
+          else:
+            sub_list.append(s5)
+        elif (c1.islower() and c2.islower()):
+          if (c1 == c2):
+            sub_list.append(s1)
+          else:
+            sub_list.append(s2)
+        else:
+          sub_list.append(s3)
 
-  for j in range(1,m+1):  # Fill in rest of table
-    c2 = wstr2[j-1]
+      sub_dict[c2] = sub_list
 
-    for i in range(1,n+1):
-      c1 = wstr1[i-1]
+  # Calculate the alignment weights column by column, only keeping the
+  # previous and the current column
+  #
+  prev_col = [0]*(n+1)
+  for i in range(n):  # First column
+    prev_col[i+1] = prev_col[i] + gap_list1[i]
 
-      if (c1.isupper()):
-        x = d[i-1][j]+g2
-      else:
-        x = d[i-1][j]+g1
+  curr_col = [0]*(n+1)
 
-      if (c2.isupper()):
-        y = d[i][j-1]+g2
-      else:
-        y = d[i][j-1]+g1
+  for j in range(m):  # Fill in rest of table
+    sub_list = sub_dict[wstr2[j]]
+    g =        gap_list2[j]
 
-      if (c1.isupper() and c2.isupper()):
-        if (c1 == c2):
-          z = d[i-1][j-1]+s4
-        else:
-          z = d[i-1][j-1]+s5
-      elif (c1.islower() and c2.islower()):
-        if (c1 == c2):
-          z = d[i-1][j-1]+s1
-        else:
-          z = d[i-1][j-1]+s2
-      else:
-        z = d[i-1][j-1]+s3
+    x = prev_col[0] + g  # First row
+    curr_col[0] = x
+
+    for i in range(n):
+      y = prev_col[i+1] + g
+      z = prev_col[i] + sub_list[i]
+      x += gap_list1[i]
+
+      if (y > x):
+        x = y
+      if (z > x):
+        x = z
 
-      d[i][j] = max(x,y,z)
+      curr_col[i+1] = x
 
-  w = float(d[i][j]) / float(divisor)
+    prev_col, curr_col = curr_col, prev_col
+
+  w = float(prev_col[n]) / float(divisor)
 
   if (w < 0.0):
     w = 0.0
@@ -1647,6 +2051,42 @@ def seqmatch(str1, str2, min_threshold = None):
 
 # =============================================================================
 
+def compressed_len(str1, compressor = 'zlib'):
+  """Return the length of the given string when compressed with the given
+     compressor ('zlib' or 'bz2').
+
+  USAGE:
+    length = compressed_len(str1, compressor)
+
+  ARGUMENTS:
+    str1        The string to be compressed
+    compressor  The compressor to be used, 'zlib' (default) or 'bz2'
+
+  DESCRIPTION:
+    As each string is usually compared with many other strings, the lengths
+    are kept in the compressed_len_cache dictionary, so the compression
+    comparison only needs to compress the concatenated strings of each pair.
+  """
+
+  cache_key = (compressor, str1)
+
+  c = compressed_len_cache.get(cache_key)
+
+  if (c == None):
+    if (len(compressed_len_cache) >= MAX_COMPRESSED_LEN_CACHE_SIZE):
+      compressed_len_cache.clear()
+
+    if (compressor == 'zlib'):
+      c = len(zlib.compress(str1))
+    else:
+      c = len(bz2.compress(str1))
+
+    compressed_len_cache[cache_key] = c
+
+  return c
+
+# =============================================================================
+
 def compression(str1, str2, compressor='zlib', min_threshold = None):
   """Return approximate string comparator measure (between 0.0 and 1.0)
      using the zlib compression library.
@@ -1677,6 +2117,9 @@ def compression(str1, str2, compressor='zlib', min_threshold = None):
 
     - http://aspn.activestate.com/ASPN/Cookbook/Python/Recipe/306626
       for details about the arithmetic coder.
+
+    With the 'zlib' and 'bz2' compressors the compressed lengths of the single
+    strings are cached (see the compressed_len() function).
   """
 
   if (compressor not in ['zlib','arith','bz2']):
@@ -1692,13 +2135,13 @@ def compression(str1, str2, compressor='zlib', min_threshold = None):
     return 1.0
 
   if (compressor == 'zlib'):
-    c1 =  float(len(zlib.compress(str1)))
-    c2 =  float(len(zlib.compress(str2)))
+    c1 =  float(compressed_len(str1, 'zlib'))
+    c2 =  float(compressed_len(str2, 'zlib'))
     c12 = 0.5 * (len(zlib.compress(str1+str2)) + len(zlib.compress(str2+str1)))
 
   elif (compressor == 'bz2'):
-    c1 =  float(len(bz2.compress(str1)))
-    c2 =  float(len(bz2.compress(str2)))
+    c1 =  float(compressed_len(str1, 'bz2'))
+    c2 =  float(compressed_len(str2, 'bz2'))
     c12 = 0.5 * (len(bz2.compress(str1+str2)) + len(bz2.compress(str2+str1)))
 
   else:  # Arithmetic compressor
@@ -1818,6 +2261,16 @@ def lcs(str1, str2, min_common_len = 2, common_divisor = 'average',
       if (w  < min_threshold):
         return 0.0  # Similariy is smaller than minimum threshold
 
+      # No more characters than the two strings have in common can be
+      # extracted as common substrings
+      #
+      max_common_len = count_common_chars(str1, str2)
+
+      w = float(max_common_len) / float(divisor)
+
+      if (w  < min_threshold):
+        return 0.0  # Similariy is smaller than minimum threshold
+
     else:
       logging.exception('Illegal value for minimum threshold (not between' + \
                         ' 0 and 1): %f' % (min_threshold))
@@ -1826,6 +2279,12 @@ def lcs(str1, str2, min_common_len = 2, common_divisor = 'average',
   w = 0.0
 
   for (s1,s2) in [(str1,str2),(str2,str1)]:
+
+    if (min_threshold != None) and (s1 == str2):  # Second extraction
+      max_w = (w + float(max_common_len) / float(divisor)) / 2.0
+
+      if (max_w < min_threshold):
+        return 0.0  # Similariy is smaller than minimum threshold
     #print '0:', s1, s2
 
     com_str, com_len, s1, s2 = do_lcs(s1, s2)  # Find initial LCS on input
@@ -1835,7 +2294,7 @@ def lcs(str1, str2, min_common_len = 2, common_divisor = 'average',
     total_com_len = com_len
 
     while (com_len >= min_common_len): # As long as there are common substrings
-      com_str, com_len, s1n, s2n = do_lcs(s1, s2)
+      com_str, com_len, s1n, s2n = do_lcs(s1, s2, min_common_len)
 
       if (com_len >= min_common_len):
         #print ' 2:',com_str, com_len, (s1, s2)
@@ -1861,60 +2320,87 @@ def lcs(str1, str2, min_common_len = 2, common_divisor = 'average',
 
 # -----------------------------------------------------------------------------
 
-def do_lcs(str1, str2):
+def do_lcs(str1, str2, min_common_len = 1):
   """Subroutine to extract longest common substring from the two input strings.
      Returns the common substring, its length, and the two input strings with
      the common substring removed.
+
+     If the two strings do not have a common substring of at least length
+     'min_common_len', an empty common substring of length 0 and the two
+     unchanged input strings are returned.
+
+     The length of the longest common substring is found with a binary search,
+     checking if the sets of all substrings of a certain length of the two
+     strings intersect. Of all longest common substrings the one ending first
+     in the longer string is extracted (and within the shorter string the
+     first occurrence).
   """
 
   n = len(str1)
   m = len(str2)
 
-  if (n > m):  # Make sure n <= m, to use O(min(n,m)) space
+  if (n > m):  # Make sure n <= m
     str1, str2 = str2, str1
     n, m =       m, n
     swapped = True
   else:
     swapped = False
 
-  current = (n+1)*[0]
+  # Binary search for the length of the longest common substring, with the
+  # substring set of the last successful length kept
+  #
+  com_len =   0
+  com_set =   None
+  low_len =   max(min_common_len, 1)
+  high_len =  n
+  check_len = low_len  # First check if there is a long enough substring
 
-  com_len = 0
-  com_ans1 = -1
-  com_ans2 = -1
+  while (low_len <= high_len):
 
-  for i in range(m):
-    previous = current
-    current =  (n+1)*[0]
+    sub_set = set([str1[j:j+check_len] for j in xrange(n-check_len+1)])
 
-    for j in range(n):
-      if (str1[j] != str2[i]):
-        current[j] = 0
-      else:
-        current[j] = previous[j-1]+1
-        if (current[j] > com_len):
-          com_len = current[j]
-          com_ans1 = j
-          com_ans2 = i
-
-  com1 = str1[com_ans1-com_len+1:com_ans1+1]
-  com2 = str2[com_ans2-com_len+1:com_ans2+1]
-
-  if (com1 != com2):
-    logging.exception('LCS: Different common substrings: %s / %s in ' % \
-                      (com1, com2) + 'original strings: %s / %s' % \
-                      (str1, str2))
-    raise Exception
+    for i in xrange(m-check_len+1):
+      if (str2[i:i+check_len] in sub_set):
+        break
+    else:
+      i = -1
+
+    if (i >= 0):  # A common substring of this length exists
+      com_len =  check_len
+      com_set =  sub_set
+      low_len =  check_len+1
+    elif (com_len == 0):
+      break  # No common substring of the minimum length
+    else:
+      high_len = check_len-1
+
+    check_len = (low_len+high_len+1) / 2
+
+  if (com_len == 0):
+    if (swapped == True):
+      return '', 0, str2, str1
+    else:
+      return '', 0, str1, str2
+
+  # Find the first occurrence of a longest common substring in the longer
+  # string, and its first occurrence in the shorter string
+  #
+  for com_start2 in xrange(m-com_len+1):
+    com_str = str2[com_start2:com_start2+com_len]
+    if (com_str in com_set):
+      break
+
+  com_start1 = str1.find(com_str)
 
   # Remove common substring from input strings
   #
-  str1 = str1[:com_ans1-com_len+1] + str1[1+com_ans1:]
-  str2 = str2[:com_ans2-com_len+1] + str2[1+com_ans2:]
+  str1 = str1[:com_start1] + str1[com_start1+com_len:]
+  str2 = str2[:com_start2] + str2[com_start2+com_len:]
 
   if (swapped == True):
-    return com1, com_len, str2, str1
+    return com_str, com_len, str2, str1
   else:
-    return com1, com_len, str1, str2
+    return com_str, com_len, str1, str2
 
 # =============================================================================
 
@@ -1984,7 +2470,7 @@ def ontolcs(str1, str2, min_common_len = 2, common_divisor = 'average',
     total_com_len = com_len
 
     while (com_len >= min_common_len): # As long as there are common substrings
-      com_str, com_len, s1n, s2n = do_lcs(s1, s2)
+      com_str, com_len, s1n, s2n = do_lcs(s1, s2, min_common_len)
 
       if (com_len >= min_common_len):
         total_com_str += com_str
@@ -2093,6 +2579,147 @@ def permwinkler(str1, str2, min_threshold = None):
 
 # =============================================================================
 
+def assignwinkler(str1, str2, min_threshold = None):
+  """Return approximate string comparator measure (between 0.0 and 1.0) using
+     the Winkler string comparator on the input strings with their words
+     aligned according to an assignment of words with the largest Winkler
+     similarities, which improves the results for swapped words.
+
+  USAGE:
+    score = assignwinkler(str1, str2, min_threshold)
+
+  ARGUMENTS:
+    str1            The first string
+    str2            The second string
+    min_threshold   Minimum threshold between 0 and 1 (only used if both
+                    strings contain one word only)
+
+  DESCRIPTION:
+    If both input strings contain at most MAX_PERM_ASSIGN_WORDS words then
+    permwinkler is used, so the same value is returned (and if both input
+    strings contain one word only then the standard Winkler string comparator
+    is used).
+
+    For strings with more words, instead of comparing all permutations of
+    words (like permwinkler, with a number of comparisons growing factorially
+    with the number of words), the Winkler similarities of all word pairs are
+    calculated once and the words of the string with less words are assigned
+    to distinct words of the other string such that the sum of their
+    similarities is maximal (optimal assignment for strings with up to
+    MAX_OPTIMAL_ASSIGN_WORDS words, greedy assignment otherwise).
+
+    The words of both strings are then aligned according to this assignment
+    (with not assigned words appended at the end), and the maximum of the
+    standard Winkler values of the original strings and the aligned string
+    pairs is returned.
+  """
+
+  # Quick check if the strings are empty or the same - - - - - - - - - - - - -
+  #
+  if (str1 == '') or (str2 == ''):
+    return 0.0
+  elif (str1 == str2):
+    return 1.0
+
+  str_list1 = str1.split(' ')
+  str_list2 = str2.split(' ')
+
+  if (max(len(str_list1), len(str_list2)) <= MAX_PERM_ASSIGN_WORDS):
+    w = permwinkler(str1, str2, min_threshold)  # Few permutations only
+
+  else:  # At least one of the strings contains more words
+
+    # Make sure the first word list is the shorter one (and the order does not
+    # depend upon the order of the input strings)
+    #
+    if ((len(str_list1), str1) > (len(str_list2), str2)):
+      str_list1, str_list2 = str_list2, str_list1
+
+    num_words1 = len(str_list1)
+    num_words2 = len(str_list2)
+
+    # Calculate the Winkler similarities of all word pairs
+    #
+    sim_matrix = []
+    for word1 in str_list1:
+      sim_matrix.append([token_sim(winkler, word1, word2) for word2 in \
+                         str_list2])
+
+    if (num_words2 <= MAX_OPTIMAL_ASSIGN_WORDS):
+
+      # Optimal assignment, with the best partial assignments of the first i
+      # words kept for each set of assigned words (a bit mask of word indices)
+      #
+      best_assign_dict = {0:(0.0, [])}
+
+      for i in range(num_words1):
+        sim_row = sim_matrix[i]
+        next_assign_dict = {}
+
+        for (mask, (sim_sum, assign_list)) in best_assign_dict.iteritems():
+          for j in range(num_words2):
+            if (not (mask & (1 << j))):
+              next_mask = mask | (1 << j)
+              next_sum =  sim_sum + sim_row[j]
+              if ((next_mask not in next_assign_dict) or \
+                  (next_sum > next_assign_dict[next_mask][0])):
+                next_assign_dict[next_mask] = (next_sum, assign_list+[j])
+
+        best_assign_dict = next_assign_dict
+
+      assign_list = max(best_assign_dict.values())[1]
+
+    else:  # Greedy assignment, starting with the most similar word pair
+
+      sim_pair_list = []
+      for i in range(num_words1):
+        for j in range(num_words2):
+          sim_pair_list.append((-sim_matrix[i][j], i, j))
+      sim_pair_list.sort()
+
+      assign_list = [None]*num_words1
+      assigned_set = set()
+
+      for (neg_sim, i, j) in sim_pair_list:
+        if ((assign_list[i] == None) and (j not in assigned_set)):
+          assign_list[i] = j
+          assigned_set.add(j)
+
+    # Align the assigned words of both strings, ordered according to the first
+    # string, the second string, and decreasing word similarities (which
+    # moves the most similar words to the start of the strings, where the
+    # Winkler modification gives them most weight)
+    #
+    pair_list = [(i, assign_list[i]) for i in range(num_words1)]
+
+    not_assigned_list = [str_list2[j] for j in range(num_words2) if \
+                         j not in assign_list]
+
+    w = winkler(' '.join(str_list1), ' '.join(str_list2))
+
+    sim_order_list = sorted(pair_list, key=lambda p: -sim_matrix[p[0]][p[1]])
+
+    for order_list in [pair_list, sorted(pair_list, key=lambda p: p[1]),
+                       sim_order_list]:
+      align_str1 = ' '.join([str_list1[i] for (i, j) in order_list])
+      align_str2 = ' '.join([str_list2[j] for (i, j) in order_list] + \
+                            not_assigned_list)
+
+      w = max(w, winkler(align_str1, align_str2))
+
+    logging.debug('Assignment Winkler word assignment: %s' % \
+                  (str(assign_list)))
+
+  assert (w >= 0.0) and (w <= 1.0), 'Similarity weight outside 0-1: %f' % (w)
+
+  # A log message - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+  #
+  logging.debug('Assignment Winkler comparator string "%s" with "%s" value:' \
+                % (str1, str2) + ' %.3f' % (w))
+  return w
+
+# =============================================================================
+
 def sortwinkler(str1, str2, min_threshold = None):
   """Return approximate string comparator measure (between 0.0 and 1.0) using
      the Winkler string comparator on the word-sorted input strings (if there
@@ -2145,162 +2772,305 @@ def sortwinkler(str1, str2, min_threshold = None):
 
 # =============================================================================
 
-def editex(str1, str2, min_threshold = None):
-  """Return approximate string comparator measure (between 0.0 and 1.0)
-     using the editex distance.
+def editex_char_costs(char1, char2):
+  """Return a tuple (substitution costs, deletion costs) for the two given
+     characters as used in the editex comparison function: The costs of
+     replacing the first with the second character, and of deleting the second
+     character if it follows the first character.
+  """
 
-  USAGE:
-    score = editex(str1, str2, min_threshold)
+  if (char1 == char2):
+    return (0, 0)
 
-  ARGUMENTS:
-    str1           The first string
-    str2           The second string
-    min_threshold  Minimum threshold between 0 and 1
+  code1 = EDITEX_GROUP_DICT.get(char1,-1)  # -1 is not a char
+  code2 = EDITEX_GROUP_DICT.get(char2,-2)  # -2 if not a char
 
-  DESCRIPTION:
-    Based on ideas described in:
+  if (code1 == code2):  # Same phonetic group
+    return (EDITEX_SML_COSTS, EDITEX_SML_COSTS)
+  elif (code2 == 7):  # Deleting a silent character
+    return (EDITEX_BIG_COSTS, EDITEX_SML_COSTS)
+  else:
+    return (EDITEX_BIG_COSTS, EDITEX_BIG_COSTS)
 
-    "Phonetic String Matching: Lessons Learned from Information Retrieval"
-    by Justin Zobel and Philip Dart, SIGIR 1995.
+# -----------------------------------------------------------------------------
 
-    Important: This function assumes that the input strings only contain
-    letters and whitespace, but no other characters. A whitespace is handled
-    like a slient sounds.
+def build_editex_cost_tables():
+  """Return two lists with the editex substitution and deletion costs of all
+     pairs of characters with codes 0 to 255, indexed with:
+
+       (ord(char1) << 8) | ord(char2)
   """
 
-  # Quick check if the strings are empty or the same - - - - - - - - - - - - -
-  #
-  if (str1 == '') or (str2 == ''):
-    return 0.0
-  elif (str1 == str2):
-    return 1.0
+  sub_cost_table = []
+  del_cost_table = []
 
-  n = len(str1)
-  m = len(str2)
+  big_costs = EDITEX_BIG_COSTS  # Shorthands
+  sml_costs = EDITEX_SML_COSTS
 
-  # Values for edit costs - - - - - - - - - - - - - - - - - - - - - - - - - - -
+  # Groups of all characters, -1 or -2 if a character is not in a group (so
+  # different characters not in a group are never in the same group)
   #
-  BIG_COSTS = 3  # If characters are not in same group
-  SML_COSTS = 2  # If characters are in same group
+  group_list1 = [EDITEX_GROUP_DICT.get(chr(code), -1) for code in range(256)]
+  group_list2 = [EDITEX_GROUP_DICT.get(chr(code), -2) for code in range(256)]
 
-  # Mappings of letters into groups - - - - - - - - - - - - - - - - - - - - - -
+  # Costs if the second character is silent, or in no or another group
   #
-  groupsof_dict = {'a':0, 'b':1, 'c':2, 'd':3, 'e':0, 'f':1, 'g':2, 'h':7,
-                   'i':0, 'j':2, 'k':2, 'l':4, 'm':5, 'n':5, 'o':0, 'p':1,
-                   'q':2, 'r':6, 's':2, 't':3, 'u':0, 'v':1, 'w':7, 'x':2,
-                   'y':0, 'z':2, '{':7}
+  big_sub_row = [big_costs]*256
+  big_del_row = [big_costs]*256
 
-  # Function to calculate cost of a deletion - - - - - - - - - - - - - - - - -
-  #
-  def delcost(char1, char2, groupsof_dict):
+  for code2 in range(256):
+    if (group_list2[code2] == 7):
+      big_del_row[code2] = sml_costs
 
-    if (char1 == char2):
-      return 0
+  for code1 in range(256):
+    group1 = group_list1[code1]
 
-    code1 = groupsof_dict.get(char1,-1)  # -1 is not a char
-    code2 = groupsof_dict.get(char2,-2)  # -2 if not a char
+    sub_row = big_sub_row[:]
+    del_row = big_del_row[:]
 
-    if (code1 == code2) or (code2 == 7):  # Same or silent
-      return SML_COSTS  # Small difference costs
-    else:
-      return BIG_COSTS
+    for code2 in range(256):
+      if (group_list2[code2] == group1):  # Same phonetic group
+        sub_row[code2] = sml_costs
+        del_row[code2] = sml_costs
+
+    sub_row[code1] = 0  # Same characters
+    del_row[code1] = 0
+
+    sub_cost_table += sub_row
+    del_cost_table += del_row
 
-  # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+  return sub_cost_table, del_cost_table
+
+editex_sub_cost_table, editex_del_cost_table = build_editex_cost_tables()
+
+# -----------------------------------------------------------------------------
+
+def editex_costs(str1, str2, min_threshold = None):
+  """Return a tuple (editex costs, maximum costs) for the two given strings,
+     with the similarity of the strings being 1.0 - costs / maximum costs.
+
+     Whitespaces are handled like silent sounds. If a minimum threshold is
+     given, the calculation is stopped and None is returned as editex costs
+     as soon as a row minimum of the cost matrix is too large for the
+     similarity to reach the threshold (the row minimum never decreases from
+     one row to the next).
+
+     The costs are calculated row by row, only keeping the previous and the
+     current row of the cost matrix. The costs of characters in strings
+     without unicode characters (with codes larger than 255) are looked up in
+     the precomputed editex cost tables.
+  """
 
   if (' ' in str1):
     str1 = str1.replace(' ','{')
   if (' ' in str2):
     str2 = str2.replace(' ','{')
 
+  n = len(str1)
+  m = len(str2)
+
   if (n > m):  # Make sure n <= m, to use O(min(n,m)) space
     str1, str2 = str2, str1
     n, m =       m, n
 
-  row = [0]*(m+1)  # Generate empty cost matrix
-  F = []
-  for i in range(n+1):
-    F.append(row[:])
+  codes1 = map(ord, str1)
+  codes2 = map(ord, str2)
 
-  F[1][0] = BIG_COSTS   # Initialise first row and first column of cost matrix
-  F[0][1] = BIG_COSTS
+  if ((max(codes1) < 256) and (max(codes2) < 256)):
+    sub_cost_table = editex_sub_cost_table
+    del_cost_table = editex_del_cost_table
 
-  sum = BIG_COSTS
-  for i in range(2,n+1):
-    sum += delcost(str1[i-2], str1[i-1], groupsof_dict)
-    F[i][0] = sum
+    del_list1 = [EDITEX_BIG_COSTS] + \
+                [del_cost_table[(codes1[i-1] << 8) | codes1[i]] for i in \
+                 xrange(1,n)]
+    del_list2 = [EDITEX_BIG_COSTS] + \
+                [del_cost_table[(codes2[j-1] << 8) | codes2[j]] for j in \
+                 xrange(1,m)]
 
-  sum = BIG_COSTS
-  for j in range(2,m+1):
-    sum += delcost(str2[j-2], str2[j-1], groupsof_dict)
-    F[0][j] = sum
+  else:  # Calculate costs of unicode characters directly
+    sub_cost_table = None
 
-  for i in range(1,n+1):
+    del_list1 = [EDITEX_BIG_COSTS] + \
+                [editex_char_costs(str1[i-1], str1[i])[1] for i in xrange(1,n)]
+    del_list2 = [EDITEX_BIG_COSTS] + \
+                [editex_char_costs(str2[j-1], str2[j])[1] for j in xrange(1,m)]
 
-    if (i == 1):
-      inc1 = BIG_COSTS
-    else:
-      inc1 = delcost(str1[i-2], str1[i-1], groupsof_dict)
+  # Initialise first row of the cost matrix, and the maximum costs (the costs
+  # of deleting all characters of the longer string)
+  #
+  prev_row = [0]*(m+1)
+  for j in xrange(m):
+    prev_row[j+1] = prev_row[j] + del_list2[j]
 
-    for j in range(1,m+1):
-      if (j == 1):
-        inc2 = BIG_COSTS
-      else:
-        inc2 = delcost(str2[j-2], str2[j-1], groupsof_dict)
+  max_costs = float(max(prev_row[m], sum(del_list1)))
+
+  curr_row = [0]*(m+1)
 
-      if (str1[i-1] == str2[j-1]):
-        diag = 0
+  sub_list_dict = {}  # Substitution costs of a character with all characters
+                      # of the second string
+
+  for i in xrange(n):
+    inc1 = del_list1[i]
+
+    sub_list = sub_list_dict.get(str1[i])
+    if (sub_list == None):
+      if (sub_cost_table != None):
+        code1 = codes1[i] << 8
+        sub_list = [sub_cost_table[code1 | code2] for code2 in codes2]
       else:
-        code1 = groupsof_dict.get(str1[i-1],-1)  # -1 is not a char
-        code2 = groupsof_dict.get(str2[j-1],-2)  # -2 if not a char
+        sub_list = [editex_char_costs(str1[i], char2)[0] for char2 in str2]
+      sub_list_dict[str1[i]] = sub_list
 
-        if (code1 == code2):  # Same phonetic group
-          diag = SML_COSTS
-        else:
-          diag = BIG_COSTS
+    x = prev_row[0] + inc1  # First column
+    curr_row[0] = x
 
-      F[i][j] = min(F[i-1][j]+inc1, F[i][j-1]+inc2, F[i-1][j-1]+diag)
+    for j in xrange(m):
+      y = prev_row[j+1] + inc1
+      z = prev_row[j] + sub_list[j]
+      x += del_list2[j]
 
-  w = 1.0 - float(F[n][m]) / float(max(F[0][m],F[n][0]))
+      if (y < x):
+        x = y
+      if (z < x):
+        x = z
 
-  if (w < 0.0):
-    w = 0.0
+      curr_row[j+1] = x
 
-  assert (w >= 0.0) and (w <= 1.0), 'Similarity weight outside 0-1: %f' % (w)
+    if (min_threshold != None):  # Final costs are at least the row minimum
+      if ((1.0 - float(min(curr_row)) / max_costs) < min_threshold):
+        return None, max_costs  # Similarity is smaller than minimum threshold
 
-  # A log message - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-  #
-  logging.debug('Editex comparator string "%s" with "%s" value: %.3f' \
-                % (str1, str2, w))
-  return w
+    prev_row, curr_row = curr_row, prev_row
 
-# =============================================================================
+  return prev_row[m], max_costs
 
-def twoleveljaro(str1, str2, comp_funct = 'equal', min_threshold = None):
+# -----------------------------------------------------------------------------
+
+def editex(str1, str2, min_threshold = None):
   """Return approximate string comparator measure (between 0.0 and 1.0)
+     using the editex distance.
 
   USAGE:
-    score = jaro(str1, str2, comp_funct, min_threshold)
+    score = editex(str1, str2, min_threshold)
 
   ARGUMENTS:
     str1           The first string
     str2           The second string
-    comp_funct     The function used to compare individual words. Either the
-                   string 'equal' (default) or one of the string comparison
-                   functions available in this module (i.e. a function which
-                   takes two strings as input and returns a similarity value
-                   between 0 and 1)
-    min_threshold  Minimum threshold between 0 and 1 (currently not used)
+    min_threshold  Minimum threshold between 0 and 1
 
   DESCRIPTION:
-    This function applies Jaro comparator at word level, and additionally
-    allows the comparison of individual words to be done using an approximate
-    comparison function.
+    Based on ideas described in:
 
-    If an approximate string comparison function is used for 'comp_funct' then
-    the 'min_threshold' needs to be set as well in order to select the number
+    "Phonetic String Matching: Lessons Learned from Information Retrieval"
+    by Justin Zobel and Philip Dart, SIGIR 1995.
+
+    Important: This function assumes that the input strings only contain
+    letters and whitespace, but no other characters. A whitespace is handled
+    like a slient sounds.
+
+    The minimum of a row in the cost matrix never decreases from one row to
+    the next. If a minimum threshold is given, then the calculation stops and
+    0.0 is returned as soon as a row minimum is too large for the similarity
+    to reach the threshold.
+  """
+
+  # Quick check if the strings are empty or the same - - - - - - - - - - - - -
+  #
+  if (str1 == '') or (str2 == ''):
+    return 0.0
+  elif (str1 == str2):
+    return 1.0
+
+  if (min_threshold != None):
+    if (not isinstance(min_threshold, float)) or (min_threshold <= 0.0) or \
+       (min_threshold >= 1.0):
+      logging.exception('Illegal value for minimum threshold (not between' + \
+                        ' 0 and 1): %f' % (min_threshold))
+      raise Exception
+
+  (costs, max_costs) = editex_costs(str1, str2, min_threshold)
+
+  if (costs == None):
+    return 0.0  # Similariy is smaller than minimum threshold
+
+  w = 1.0 - float(costs) / max_costs
+
+  if (w < 0.0):
+    w = 0.0
+
+  assert (w >= 0.0) and (w <= 1.0), 'Similarity weight outside 0-1: %f' % (w)
+
+  # A log message - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+  #
+  logging.debug('Editex comparator string "%s" with "%s" value: %.3f' \
+                % (str1, str2, w))
+  return w
+
+# =============================================================================
+
+def token_sim(comp_funct, word1, word2):
+  """Return the similarity of two words calculated with the given comparison
+     function (one of the string comparison functions available in this
+     module).
+
+  USAGE:
+    score = token_sim(comp_funct, word1, word2)
+
+  ARGUMENTS:
+    comp_funct  The function used to compare the two words
+    word1       The first word
+    word2       The second word
+
+  DESCRIPTION:
+    Comparators working at word level (like the two-level Jaro comparator)
+    compare the same words many times, so the similarities of word pairs are
+    kept in the token_sim_cache dictionary and shared by all calls.
+  """
+
+  cache_key = (comp_funct, word1, word2)
+
+  w = token_sim_cache.get(cache_key)
+
+  if (w == None):
+    if (len(token_sim_cache) >= MAX_TOKEN_SIM_CACHE_SIZE):
+      token_sim_cache.clear()
+
+    w = comp_funct(word1, word2)
+    token_sim_cache[cache_key] = w
+
+  return w
+
+# =============================================================================
+
+def twoleveljaro(str1, str2, comp_funct = 'equal', min_threshold = None):
+  """Return approximate string comparator measure (between 0.0 and 1.0)
+
+  USAGE:
+    score = jaro(str1, str2, comp_funct, min_threshold)
+
+  ARGUMENTS:
+    str1           The first string
+    str2           The second string
+    comp_funct     The function used to compare individual words. Either the
+                   string 'equal' (default) or one of the string comparison
+                   functions available in this module (i.e. a function which
+                   takes two strings as input and returns a similarity value
+                   between 0 and 1)
+    min_threshold  Minimum threshold between 0 and 1 (currently not used)
+
+  DESCRIPTION:
+    This function applies Jaro comparator at word level, and additionally
+    allows the comparison of individual words to be done using an approximate
+    comparison function.
+
+    If an approximate string comparison function is used for 'comp_funct' then
+    the 'min_threshold' needs to be set as well in order to select the number
     of words that can match in the current window - otherwise the 'best' match
     will be selected, even if it has a very low similarity value.
 
+    The similarities of the word pairs compared with an approximate comparison
+    function are cached (see the token_sim() function).
+
     For a description of the Jaro string comparator see 'An Application of the
     Fellegi-Sunter Model of Record Linkage to the 1990 U.S. Decennial Census'
     by William E. Winkler and Yves Thibaudeau.
@@ -2424,7 +3194,7 @@ def twoleveljaro(str1, str2, comp_funct = 'equal', min_threshold = None):
       best_match_sim = -1
       word_ind = 0
       for word in work_list2[start:end]:
-        tmp_sim = comp_funct(search_word, word)
+        tmp_sim = token_sim(comp_funct, search_word, word)
         if (tmp_sim >= min_threshold):
           if (tmp_sim > best_match_sim):
             ind = word_ind
@@ -2451,7 +3221,7 @@ def twoleveljaro(str1, str2, comp_funct = 'equal', min_threshold = None):
       best_match_sim = -1
       word_ind = 0
       for word in work_list1[start:end]:
-        tmp_sim = comp_funct(search_word, word)
+        tmp_sim = token_sim(comp_funct, search_word, word)
         if (tmp_sim >= min_threshold):
           if (tmp_sim > best_match_sim):
             ind = word_ind
@@ -2500,7 +3270,7 @@ def twoleveljaro(str1, str2, comp_funct = 'equal', min_threshold = None):
         transposition += 1
 
     else:  # Again use approximate stringcomparison to calculate similarities
-      tmp_sim = comp_funct(ass_list1[i], ass_list2[i])
+      tmp_sim = token_sim(comp_funct, ass_list1[i], ass_list2[i])
       if (tmp_sim >= min_threshold):
 #        print tmp_sim, ass_list1[i], ass_list2[i]
         transposition += 1
@@ -2597,6 +3367,588 @@ def charhistogram(str1, str2, min_threshold = None):
 
   return cos_sim
 
+# =============================================================================
+#
+# Comparison of many string pairs at once
+#
+def batch_stringcmp(cmp_method, str_list1, str_list2, min_threshold = None,
+                    chunk_size = 10000):
+  """Compare the string pairs given in two lists with the selected comparison
+     method.
+
+  USAGE:
+    sim_list = batch_stringcmp(cmp_method, str_list1, str_list2,
+                               min_threshold, chunk_size)
+
+  ARGUMENTS:
+    cmp_method     A comparison method as accepted by do_stringcmp()
+    str_list1      A list with the first strings of the pairs
+    str_list2      A list with the second strings of the pairs, must be of the
+                   same length as 'str_list1'
+    min_threshold  Minimum threshold between 0 and 1
+    chunk_size     The number of string pairs compared at once (default is
+                   10000), this limits the memory used by the array based
+                   comparison functions.
+
+  DESCRIPTION:
+    Returns a list with the similarity value of each string pair, which is
+    the same value as returned by do_stringcmp() for the pair.
+
+    If the NumPy module is available, then the methods 'jaro', 'winkler',
+    'editdist', 'bagdist' and the q-gram methods (like 'qgram2avrg' or
+    'qgram3shortP') are calculated with array operations over all pairs in a
+    chunk (see the batch_*() functions). Pairs are sorted by their string
+    lengths before they are split into chunks, so that the strings in a chunk
+    have similar lengths. All other methods, and chunks that contain Unicode
+    strings which can not be converted into byte strings, are compared pair
+    by pair.
+  """
+
+  num_pairs = len(str_list1)
+
+  if (len(str_list2) != num_pairs):
+    logging.exception('Batch comparison: String lists of different ' + \
+                      'lengths: %d / %d' % (num_pairs, len(str_list2)))
+    raise Exception
+
+  if (not isinstance(chunk_size, int)) or (chunk_size < 1):
+    logging.exception('Batch comparison: Chunk size must be a positive ' + \
+                      'integer: %s' % (str(chunk_size)))
+    raise Exception
+
+  # Select the array based comparison function (if there is one) - - - - - - -
+  #
+  batch_funct = None
+
+  if (imp_numpy == True) and (not cmp_method.endswith('-winkler')):
+
+    if (cmp_method.startswith('jaro')):
+      batch_funct = lambda l1, l2: batch_jaro(l1, l2, min_threshold)
+    elif (cmp_method.startswith('winkler')):
+      batch_funct = lambda l1, l2: batch_winkler(l1, l2, min_threshold)
+    elif (cmp_method.startswith('editdist')):
+      batch_funct = lambda l1, l2: batch_editdist(l1, l2, min_threshold)
+    elif (cmp_method.startswith('bagdist')):
+      batch_funct = lambda l1, l2: batch_bagdist(l1, l2, min_threshold)
+
+    elif (cmp_method.startswith('qgram')):
+      q = int(cmp_method[5])
+
+      if ('short' in cmp_method):  # Same divisor and padding as do_stringcmp
+        divisor = 'shortest'
+      elif ('long' in cmp_method):
+        divisor = 'longest'
+      elif ('avrg' in cmp_method):
+        divisor = 'average'
+      else:
+        divisor = None
+
+      padded = ('P' in cmp_method)
+
+      batch_funct = lambda l1, l2: batch_qgram(l1, l2, q, divisor,
+                                               min_threshold, padded)
+
+  if (batch_funct == None):  # Compare pair by pair - - - - - - - - - - - - -
+    sim_list = []
+
+    for i in xrange(num_pairs):
+      sim_list.append(do_stringcmp(cmp_method, str_list1[i], str_list2[i],
+                                   min_threshold)[0])
+
+    return sim_list
+
+  # Sort pairs by their longer string, then compare chunk by chunk - - - - - -
+  #
+  max_len_list = map(max, map(len, str_list1), map(len, str_list2))
+
+  pair_order = range(num_pairs)
+  pair_order.sort(key = max_len_list.__getitem__)
+
+  sim_array = numpy.zeros(num_pairs, dtype=numpy.float64)
+
+  for start in xrange(0, num_pairs, chunk_size):
+    chunk_order = pair_order[start:start+chunk_size]
+
+    chunk_list1 = [str_list1[i] for i in chunk_order]
+    chunk_list2 = [str_list2[i] for i in chunk_order]
+
+    try:
+      chunk_sim_list = batch_funct(chunk_list1, chunk_list2)
+
+    except UnicodeError:  # Strings that can not be converted into bytes
+      chunk_sim_list = []
+      for (str1, str2) in zip(chunk_list1, chunk_list2):
+        chunk_sim_list.append(do_stringcmp(cmp_method, str1, str2,
+                                           min_threshold)[0])
+
+    sim_array[chunk_order] = chunk_sim_list
+
+  return sim_array.tolist()
+
+# -----------------------------------------------------------------------------
+
+def str_list_to_array(str_list, width):
+  """Return the characters of the strings in the given list as a NumPy array
+     of 8-bit codes with one row per string, padded with zeros to the given
+     width, as well as an array with the string lengths.
+
+  USAGE:
+    (code_array, len_array) = str_list_to_array(str_list, width)
+  """
+
+  len_array = numpy.array(map(len, str_list), dtype=numpy.int64)
+
+  code_array = numpy.array(str_list, dtype='S%d' % (width))
+  code_array = code_array.view(numpy.uint8).reshape(len(str_list), width)
+
+  return code_array, len_array
+
+# -----------------------------------------------------------------------------
+
+def check_batch_args(str_list1, str_list2):
+  """Check the arguments given to a batch_*() function and return the
+     characters and lengths of both string lists as NumPy arrays (with the
+     same width), as well as arrays of flags for pairs where one string is
+     empty and for pairs with the same strings.
+
+  USAGE:
+    (code_array1, len_array1, code_array2, len_array2, is_empty, is_same) = \
+      check_batch_args(str_list1, str_list2)
+  """
+
+  if (imp_numpy == False):
+    logging.exception('Batch comparison: NumPy module is not available')
+    raise Exception
+
+  if (len(str_list1) != len(str_list2)):
+    logging.exception('Batch comparison: String lists of different ' + \
+                      'lengths: %d / %d' % (len(str_list1), len(str_list2)))
+    raise Exception
+
+  width = max([1]+map(len, str_list1)+map(len, str_list2))
+
+  code_array1, len_array1 = str_list_to_array(str_list1, width)
+  code_array2, len_array2 = str_list_to_array(str_list2, width)
+
+  is_empty = (len_array1 == 0) | (len_array2 == 0)
+  is_same =  (len_array1 == len_array2) & \
+             (code_array1 == code_array2).all(axis=1)
+
+  return code_array1, len_array1, code_array2, len_array2, is_empty, is_same
+
+# -----------------------------------------------------------------------------
+
+def batch_jaro(str_list1, str_list2, min_threshold = None):
+  """Return a list with the Jaro similarity values of all string pairs (as
+     returned by the jaro() function) calculated using NumPy array operations.
+
+  USAGE:
+    sim_list = batch_jaro(str_list1, str_list2, min_threshold)
+
+  DESCRIPTION:
+    For each character position of the first strings, the left-most not yet
+    assigned same character within the match window of the second strings is
+    found for all pairs at once (and the same for the second strings).
+  """
+
+  c1, len1, c2, len2, is_empty, is_same = check_batch_args(str_list1,
+                                                            str_list2)
+
+  if (min_threshold != None):
+    if (not isinstance(min_threshold, float)) or (min_threshold <= 0.0) or \
+       (min_threshold >= 1.0):
+      logging.exception('Illegal value for minimum threshold (not between' + \
+                        ' 0 and 1): %f' % (min_threshold))
+      raise Exception
+
+  num_pairs, width = c1.shape
+
+  f_len1 = numpy.maximum(len1, 1).astype(numpy.float64)
+  f_len2 = numpy.maximum(len2, 1).astype(numpy.float64)
+
+  halflen = numpy.maximum(len1, len2) / 2 - 1
+
+  # Assign common characters in both directions - - - - - - - - - - - - - - -
+  #
+  pos_array = numpy.arange(width)
+  row_array = numpy.arange(num_pairs)
+
+  ass_flags_list = []
+
+  for (s1, s2, l1, l2) in [(c1, c2, len1, len2), (c2, c1, len2, len1)]:
+    is_free =  pos_array[None,:] < l2[:,None]  # Not assigned positions in s2
+    is_ass1 =  numpy.zeros((num_pairs, width), dtype=bool)
+
+    for i in xrange(max(l1.max(), 0)):
+      start = numpy.maximum(0, i-halflen)
+      end   = numpy.minimum(i+halflen+1, l2)
+
+      is_cand = (s2 == s1[:,i][:,None]) & is_free & \
+                (pos_array[None,:] >= start[:,None]) & \
+                (pos_array[None,:] < end[:,None])
+      is_cand &= (i < l1)[:,None]
+
+      has_cand = is_cand.any(axis=1)
+      cand_pos = is_cand.argmax(axis=1)  # Left-most candidate position
+
+      is_free[row_array[has_cand], cand_pos[has_cand]] = False
+      is_ass1[:,i] = has_cand
+
+    ass_flags_list.append(is_ass1)
+
+  is_ass1, is_ass2 = ass_flags_list
+
+  common1 = is_ass1.sum(axis=1)
+  common2 = is_ass2.sum(axis=1)
+
+  # Compute number of transpositions from the assigned characters in order - -
+  #
+  ass1 = numpy.take_along_axis(c1, numpy.argsort(~is_ass1, axis=1,
+                                                 kind='mergesort'), axis=1)
+  ass2 = numpy.take_along_axis(c2, numpy.argsort(~is_ass2, axis=1,
+                                                 kind='mergesort'), axis=1)
+
+  transposition = ((ass1 != ass2) & \
+                   (pos_array[None,:] < common1[:,None])).sum(axis=1)
+  transposition = transposition / 2.0
+
+  common = common1.astype(numpy.float64)
+
+  old_settings = numpy.seterr(divide='ignore', invalid='ignore')
+
+  w = 1./3.*(common / f_len1 + common / f_len2 + \
+             (common-transposition) / common)
+  w[common1 == 0] = 0.0
+
+  if (min_threshold != None):
+    max_common = numpy.minimum(len1, len2).astype(numpy.float64)
+
+    max_w = 1./3.*(max_common / f_len1 + max_common / f_len2 + 1.0)
+    w[max_w < min_threshold] = 0.0
+
+  numpy.seterr(**old_settings)
+
+  w[is_same] = 1.0
+  w[is_empty] = 0.0
+
+  sim_list = w.tolist()
+
+  # Pairs with different numbers of common characters are compared with the
+  # jaro() function (which handles them as a special case)
+  #
+  for i in numpy.nonzero((common1 != common2) & (~is_empty) & \
+                         (~is_same))[0]:
+    sim_list[i] = jaro(str_list1[i], str_list2[i], min_threshold)
+
+  return sim_list
+
+# -----------------------------------------------------------------------------
+
+def batch_winkler(str_list1, str_list2, min_threshold = None):
+  """Return a list with the Winkler similarity values of all string pairs (as
+     returned by the winkler() function) calculated using NumPy array
+     operations.
+
+  USAGE:
+    sim_list = batch_winkler(str_list1, str_list2, min_threshold)
+  """
+
+  c1, len1, c2, len2, is_empty, is_same = check_batch_args(str_list1,
+                                                            str_list2)
+
+  w = numpy.array(batch_jaro(str_list1, str_list2), dtype=numpy.float64)
+
+  # Number of same characters at the beginning (up to four) - - - - - - - - -
+  #
+  prefix_len = min(4, c1.shape[1])
+  min_len =    numpy.minimum(len1, len2)
+
+  is_same_prefix = (c1[:,:prefix_len] == c2[:,:prefix_len]) & \
+                   (numpy.arange(prefix_len)[None,:] < min_len[:,None])
+  same = numpy.cumprod(is_same_prefix, axis=1).sum(axis=1)
+
+  w = w + same*0.1 * (1.0 - w)
+
+  # Use string lengths to quickly check for minimum threshold - - - - - - - -
+  #
+  if (min_threshold != None):
+    f_len1 = numpy.maximum(len1, 1).astype(numpy.float64)
+    f_len2 = numpy.maximum(len2, 1).astype(numpy.float64)
+    max_common = min_len.astype(numpy.float64)
+
+    max_w = 1./3.*(max_common / f_len1 + max_common / f_len2 + 1.0)
+    max_w += 0.5*(1.0 - max_w)
+
+    w[max_w < min_threshold] = 0.0
+
+  w[is_same] = 1.0
+  w[is_empty] = 0.0
+
+  return w.tolist()
+
+# -----------------------------------------------------------------------------
+
+def batch_editdist(str_list1, str_list2, min_threshold = None):
+  """Return a list with the edit distance similarity values of all string
+     pairs (as returned by the editdist() function) calculated using NumPy
+     array operations.
+
+  USAGE:
+    sim_list = batch_editdist(str_list1, str_list2, min_threshold)
+
+  DESCRIPTION:
+    The rows of the dynamic programming matrices of all pairs are calculated
+    at once (with the shorter string of each pair along the row). Within a
+    row, the costs of inserts are propagated with a cumulative minimum.
+  """
+
+  c1, len1, c2, len2, is_empty, is_same = check_batch_args(str_list1,
+                                                            str_list2)
+
+  if (min_threshold != None):
+    if (not isinstance(min_threshold, float)) or (min_threshold <= 0.0) or \
+       (min_threshold >= 1.0):
+      logging.exception('Illegal value for minimum threshold (not between' + \
+                        ' 0 and 1): %f' % (min_threshold))
+      raise Exception
+
+  num_pairs, width = c1.shape
+
+  is_swapped = len1 > len2  # Make the first string the shorter one
+
+  short_str = numpy.where(is_swapped[:,None], c2, c1)
+  long_str =  numpy.where(is_swapped[:,None], c1, c2)
+  n = numpy.minimum(len1, len2)
+  m = numpy.maximum(len1, len2)
+
+  col_array = numpy.arange(width+1)
+
+  prev_row = numpy.tile(col_array, (num_pairs, 1))
+  curr_row = numpy.empty((num_pairs, width+1), dtype=numpy.int64)
+
+  for i in xrange(1, max(m.max(), 0)+1):
+
+    # Minimum of substitution and delete costs for columns 1 to width
+    #
+    cost = (short_str != long_str[:,i-1][:,None])
+    diag_del = numpy.minimum(prev_row[:,:-1] + cost, prev_row[:,1:] + 1)
+
+    # Column j then is: j + min(i, min_{k<=j}(diag_del[k] - k))
+    #
+    curr_row[:,0] =  i
+    curr_row[:,1:] = diag_del - col_array[1:]
+    curr_row = numpy.minimum.accumulate(curr_row, axis=1) + col_array
+
+    prev_row = numpy.where((i <= m)[:,None], curr_row, prev_row)
+
+  dist = prev_row[numpy.arange(num_pairs), n]
+
+  max_len = numpy.maximum(m, 1).astype(numpy.float64)
+
+  w = 1.0 - dist / max_len
+
+  if (min_threshold != None):
+    len_w = 1.0 - (m-n) / max_len
+
+    max_dist = (1.0-min_threshold)*max_len
+
+    # Minimum distance of the prefixes of the shorter string
+    #
+    min_dist = numpy.where(col_array[None,:] <= n[:,None], prev_row,
+                           width+1).min(axis=1)
+
+    w = numpy.where(min_dist > max_dist, 1.0 - (max_dist+1) / max_len, w)
+    w[len_w < min_threshold] = 0.0
+
+  w[is_same] = 1.0
+  w[is_empty] = 0.0
+
+  return w.tolist()
+
+# -----------------------------------------------------------------------------
+
+def batch_bagdist(str_list1, str_list2, min_threshold = None):
+  """Return a list with the bag distance similarity values of all string pairs
+     (as returned by the bagdist() function) calculated using NumPy array
+     operations.
+
+  USAGE:
+    sim_list = batch_bagdist(str_list1, str_list2, min_threshold)
+  """
+
+  c1, len1, c2, len2, is_empty, is_same = check_batch_args(str_list1,
+                                                            str_list2)
+
+  num_pairs, width = c1.shape
+
+  pos_array = numpy.arange(width)
+
+  is_valid1 = pos_array[None,:] < len1[:,None]
+  is_valid2 = pos_array[None,:] < len2[:,None]
+
+  # Character histograms of all strings (over the characters that occur)
+  #
+  chars1 = c1[is_valid1]
+  chars2 = c2[is_valid2]
+
+  is_char = numpy.zeros(256, dtype=bool)  # Number the occuring characters
+  is_char[chars1] = True
+  is_char[chars2] = True
+  char_num = numpy.cumsum(is_char)-1
+  num_chars = max(is_char.sum(), 1)
+
+  rows1 = numpy.nonzero(is_valid1)[0]
+  rows2 = numpy.nonzero(is_valid2)[0]
+
+  histo1 = numpy.bincount(rows1*num_chars + char_num[chars1],
+                          minlength=num_pairs*num_chars)
+  histo2 = numpy.bincount(rows2*num_chars + char_num[chars2],
+                          minlength=num_pairs*num_chars)
+
+  diff = (histo1 - histo2).reshape(num_pairs, num_chars)
+
+  b = numpy.maximum(numpy.maximum(diff, 0).sum(axis=1),
+                    numpy.maximum(-diff, 0).sum(axis=1))
+
+  w = 1.0 - b / numpy.maximum(numpy.maximum(len1, len2), 1).astype(float)
+
+  w[is_same] = 1.0
+  w[is_empty] = 0.0
+
+  return w.tolist()
+
+# -----------------------------------------------------------------------------
+
+def batch_qgram(str_list1, str_list2, q=2, common_divisor = 'average',
+                min_threshold = None, padded=True):
+  """Return a list with the q-gram similarity values of all string pairs (as
+     returned by the qgram() function) calculated using NumPy array
+     operations.
+
+  USAGE:
+    sim_list = batch_qgram(str_list1, str_list2, q, common_divisor,
+                           min_threshold, padded)
+
+  DESCRIPTION:
+    The q-grams of all strings are numbered, and the common q-grams of each
+    pair are counted by matching the sorted (pair number, q-gram number) keys
+    of the two string lists.
+  """
+
+  if (q < 1):
+    logging.exception('Illegal value for q: %d (must be at least 1)' % (q))
+    raise Exception
+
+  if (common_divisor not in ['average','shortest','longest']):
+    logging.exception('Illegal value for common divisor: %s' % \
+                      (common_divisor))
+    raise Exception
+
+  if (min_threshold != None):
+    if (not isinstance(min_threshold, float)) or (min_threshold <= 0.0) or \
+       (min_threshold >= 1.0):
+      logging.exception('Illegal value for minimum threshold (not between' + \
+                        ' 0 and 1): %f' % (min_threshold))
+      raise Exception
+
+  c1, len1, c2, len2, is_empty, is_same = check_batch_args(str_list1,
+                                                            str_list2)
+
+  num_pairs, width = c1.shape
+
+  # Padded strings of both lists (with start and end characters) - - - - - - -
+  #
+  codes = numpy.concatenate((c1, c2)).astype(numpy.int64)
+  lens =  numpy.concatenate((len1, len2))
+
+  if (padded == True):
+    pad_width = width+2*(q-1)
+    pos_array = numpy.arange(pad_width)
+
+    pad_codes = numpy.zeros((2*num_pairs, pad_width), dtype=numpy.int64)
+    pad_codes[:,q-1:q-1+width] = codes
+    pad_codes[:,:q-1] = ord(QGRAM_START_CHAR)
+
+    is_end = (pos_array[None,:] >= (lens+q-1)[:,None]) & \
+             (pos_array[None,:] < (lens+2*(q-1))[:,None])
+    pad_codes[is_end] = ord(QGRAM_END_CHAR)
+
+    num_qgram = lens+q-1
+
+  else:
+    pad_width = width
+    pad_codes = codes
+
+    num_qgram = numpy.maximum(lens-(q-1), 0)
+
+  # Number the q-grams of all strings (if the numbers of q-grams in pairs
+  # become too large they are renumbered to the q-grams that occur)
+  #
+  num_pos = max(pad_width-(q-1), 0)
+
+  qgram_num = pad_codes[:,:num_pos]
+  num_qgram_num = 256
+
+  for k in xrange(1, q):
+    qgram_num = qgram_num*256 + pad_codes[:,k:k+num_pos]
+    num_qgram_num *= 256
+
+    if (num_qgram_num*num_pairs > 2**56) and (qgram_num.size > 0):
+      qgram_num = numpy.unique(qgram_num,
+                               return_inverse=True)[1].reshape(2*num_pairs,
+                                                               num_pos)
+      num_qgram_num = qgram_num.max()+1
+
+  is_valid = numpy.arange(num_pos)[None,:] < num_qgram[:,None]
+
+  keys = numpy.arange(2*num_pairs)[:,None] % num_pairs * num_qgram_num + \
+         qgram_num
+
+  is_valid1, is_valid2 = is_valid[:num_pairs], is_valid[num_pairs:]
+  keys1, keys2 = keys[:num_pairs][is_valid1], keys[num_pairs:][is_valid2]
+
+  # Count the common q-grams of each pair - - - - - - - - - - - - - - - - - -
+  #
+  keys1, counts1 = numpy.unique(keys1, return_counts=True)
+  keys2, counts2 = numpy.unique(keys2, return_counts=True)
+
+  index2 = numpy.minimum(numpy.searchsorted(keys2, keys1), len(keys2)-1)
+  is_common = (keys2[index2] == keys1) if (len(keys2) > 0) else \
+              numpy.zeros(len(keys1), dtype=bool)
+
+  common = numpy.bincount(keys1[is_common] / num_qgram_num,
+                          weights=numpy.minimum(counts1[is_common],
+                                                counts2[index2[is_common]]),
+                          minlength=num_pairs)
+
+  num_qgram1, num_qgram2 = num_qgram[:num_pairs], num_qgram[num_pairs:]
+
+  if (common_divisor == 'average'):
+    divisor = 0.5*(num_qgram1+num_qgram2)
+  elif (common_divisor == 'shortest'):
+    divisor = numpy.minimum(num_qgram1,num_qgram2).astype(numpy.float64)
+  else:  # Longest
+    divisor = numpy.maximum(num_qgram1,num_qgram2).astype(numpy.float64)
+
+  old_settings = numpy.seterr(divide='ignore', invalid='ignore')
+
+  w = common / divisor
+
+  if (min_threshold != None):
+    max_common_qgram = numpy.minimum(num_qgram1,num_qgram2)
+
+    w[max_common_qgram / divisor < min_threshold] = 0.0
+
+  numpy.seterr(**old_settings)
+
+  if (padded == False):
+    w[numpy.minimum(num_qgram1, num_qgram2) == 0] = 0.0
+
+  w[is_same] = 1.0
+  w[is_empty] = 0.0
+
+  return w.tolist()
+
 # =============================================================================
 #
 # Do some tests if called from command line
@@ -2639,8 +3991,8 @@ if (__name__ == '__main__'):
 
   msg.append('     String 1      String 2  Jaro  J-W  1gram 2gram 3gram' + \
              ' 1pqgr 2pqgr 3pqgr Sgram eDist meDis bDist Editx SeqMa ComBZ' + \
-             ' ComZL ComAC LCS2  LCS3  OLCS2 OLCS3 P-Win S-Win SWDis SyADi' + \
-             ' Histo 2LJaro 2LJaroA')
+             ' ComZL ComAC LCS2  LCS3  OLCS2 OLCS3 P-Win A-Win S-Win SWDis' + \
+             ' SyADi Histo 2LJaro 2LJaroA')
 
   for i in range(len(strings[0])):
     str1 = strings[0][i]
@@ -2669,6 +4021,7 @@ if (__name__ == '__main__'):
     s += ' %.3f' % (ontolcs(str1,str2,2))
     s += ' %.3f' % (ontolcs(str1,str2,3))
     s += ' %.3f' % (permwinkler(str1,str2))
+    s += ' %.3f' % (assignwinkler(str1,str2))
     s += ' %.3f' % (sortwinkler(str1,str2))
     s += ' %.3f' % (swdist(str1,str2))
     s += ' %.3f' % (syllaligndist(str1,str2))
@@ -2692,6 +4045,49 @@ if (__name__ == '__main__'):
     if (editdist(str1, str2) > mod_editdist(str1,str2)):
       msg.append('  Error: EditD > Modified EditD')
 
+  # Benchmark assignment Winkler against permutation Winkler on strings made
+  # of random words taken from the test strings above
+  #
+  import random
+
+  random.seed(42)
+
+  word_list = []
+  for str_list in strings:
+    for word_str in str_list:
+      word_list += word_str.split(' ')
+
+  msg.append('')
+  msg.append('  Words   Pairs  P-Win time  A-Win time  Different values')
+
+  for (num_words, num_pairs) in [(2,1000), (3,1000), (4,100), (5,10)]:
+    pair_list = []
+    for i in range(num_pairs):
+      str1 = ' '.join([random.choice(word_list) for j in range(num_words)])
+      str2 = ' '.join([random.choice(word_list) for j in range(num_words)])
+      pair_list.append((str1, str2))
+
+    start_time = time.time()
+    perm_list = [permwinkler(str1,str2) for (str1, str2) in pair_list]
+    perm_time = time.time() - start_time
+
+    token_sim_cache.clear()  # Do not use word similarities calculated before
+
+    start_time = time.time()
+    assign_list = [assignwinkler(str1,str2) for (str1, str2) in pair_list]
+    assign_time = time.time() - start_time
+
+    num_diff = 0
+    for i in range(num_pairs):
+      if (perm_list[i] != assign_list[i]):
+        num_diff += 1
+
+    msg.append('  %5d  %6d  %8.3f s  %8.3f s  %16d' % \
+               (num_words, num_pairs, perm_time, assign_time, num_diff))
+
+    if ((num_words <= MAX_PERM_ASSIGN_WORDS) and (num_diff > 0)):
+      msg.append('  Error: A-Win != P-Win')
+
   for m in msg:
     print m
 
@@ -49,12 +49,17 @@
 # =============================================================================
 # Import necessary modules (Python standard modules first, then Febrl modules)
 
+import array
+import datetime
 import logging
+import math
+import os
 import sys
 import unittest
 sys.path.append('..')
 
 import comparison
+import lookup
 import stringcmp
 
 log_level = logging.WARNING  # logging.INFO
@@ -1652,8 +1657,67 @@ class TestCase(unittest.TestCase):
                                         missing_v = self.missing_values_list,
                                         desc = 'FieldComparatorDistance',
                                         do_cache = True)
+      dfcd = comparison.FieldComparatorDistance(max_d = d,
+                                        geocode = self.geo_lookup_table,
+                                        missing_v = self.missing_values_list,
+                                        desc = 'FieldComparatorDistance',
+                                        cache_dist = True)
       self.doDistanceFieldComparisonTest(dfc)
       self.doDistanceFieldComparisonTest(dfcc)  # Use cache
+      self.doDistanceFieldComparisonTest(dfcd)  # Cache distances
+
+    # Geocode look-up tables provide locations in radians - - - - - - - - - -
+    #
+    geo_lookup_table = lookup.GeocodeLookupTable(desc = 'test locations')
+    for (key, loc) in self.geo_lookup_table.items():
+      geo_lookup_table[key] = loc
+
+    assert geo_lookup_table.get_radians('9999') == None
+    assert geo_lookup_table.get_radians('2000')[:2] == \
+           (math.radians(151.20710), math.radians(-33.87060))
+
+    for d in [0.1, 10, 300, 1000, 20000]:
+      dfc = comparison.FieldComparatorDistance(max_d = d,
+                                        geocode = self.geo_lookup_table,
+                                        agree_w = 5.0, disagree_w = -5.0)
+      dfcl = comparison.FieldComparatorDistance(max_d = d,
+                                        geocode = geo_lookup_table,
+                                        agree_w = 5.0, disagree_w = -5.0,
+                                        cache_dist = True)
+
+      for val1 in self.geo_lookup_table:
+        for val2 in self.geo_lookup_table:
+          w = dfc.compare(val1, val2)
+          assert abs(w - dfcl.compare(val1, val2)) < 0.00000001, (d, val1, val2)
+
+          # Locations outside the latitude or longitude range (one degree is
+          # at least 85 kilometres here) have to disagree
+          #
+          loc1 = self.geo_lookup_table[val1]
+          loc2 = self.geo_lookup_table[val2]
+          if (max(abs(loc1[0]-loc2[0]), abs(loc1[1]-loc2[1]))*85.0 > d):
+            assert w == -5.0, (d, val1, val2)
+
+    assert len(dfcl.dist_cache) > 0
+
+    # Modified locations are used once the geocode table is modified
+    #
+    w = dfcl.compare('2000', '2010')
+    assert dfcl.compare('2000', '2020') == dfc.compare('2000', '2020')
+
+    geo_lookup_table['2020'] = self.geo_lookup_table['2010']
+    assert geo_lookup_table.get_radians('2020') == \
+           geo_lookup_table.get_radians('2010')
+    assert dfcl.compare('2000', '2020') == w
+
+    del geo_lookup_table['2020']
+    assert geo_lookup_table.get_radians('2020') == None
+    assert dfcl.compare('2000', '2020') == dfcl.missing_weight
+    assert dfcl.profile_cache['2020'] == False  # Cached as not in table
+
+    geo_lookup_table.clear()
+    assert geo_lookup_table.radian_dict == {}
+    assert dfcl.compare('2000', '2010') == dfcl.missing_weight
 
   def testDateComparison(self):  # - - - - - - - - - - - - - - - - - - - - - -
 
@@ -1673,6 +1737,28 @@ class TestCase(unittest.TestCase):
         self.doDateFieldComparisonTest(dfc)
         self.doDateFieldComparisonTest(dfcc)  # Use cache
 
+    # Date values are parsed once into value profiles
+    #
+    assert comparison.parse_date_str('09/11/2006', 'ddmmyyyy') == \
+           ('09112006', None, datetime.date(2006,11,9))
+    assert comparison.parse_date_str('11.09.06', 'mmddyy') == \
+           ('110906', None, datetime.date(6,11,9))
+    assert comparison.parse_date_str('20061109', 'yyyymmdd') == \
+           ('20061109', None, datetime.date(2006,11,9))
+    assert comparison.parse_date_str('0911200', 'ddmmyyyy')[1] == 'length'
+    assert comparison.parse_date_str('09132006', 'ddmmyyyy')[1] == 'month'
+    assert comparison.parse_date_str('31112006', 'ddmmyyyy')[1] == 'day'
+    assert comparison.parse_date_str('29021999', 'ddmmyyyy')[1] == 'day'
+    assert comparison.parse_date_str('0a112006', 'ddmmyyyy')[1] == 'int'
+
+    dfc = comparison.FieldComparatorDate(max_day1=3, max_day2 = 3,
+                                         date_format = 'ddmmyyyy',
+                                         desc = 'FieldComparatorDate')
+    assert dfc.compare('09112006', '10/11/2006') == \
+           dfc.compare('09:11:2006', '10112006')
+    assert dfc.profile_cache['09:11:2006'] == dfc.profile_cache['09112006']
+    assert dfc.compare('29021999', '28021999') == dfc.disagree_weight
+
   def testTimeComparison(self):  # - - - - - - - - - - - - - - - - - - - - - -
 
     for tp in [(1,1),(1,3),(3,1),(3,3),(15,15),(7,9),(17,5),(10,23),(23,10)]:
@@ -1826,6 +1912,110 @@ class TestCase(unittest.TestCase):
                  'Winkler wrong frequency weight calculations for values: ' + \
                  '%s / %s' % (val1,val2)
 
+    # Frequency based agreement weights are precomputed for each comparator -
+    #
+    freq_sum = float(sum(self.freq_table.values()))
+
+    efc1 = comparison.FieldComparatorExactString(val_freq_table = \
+                                                   self.freq_table,
+                                                 agree_w = 10.0,
+                                                 freq_max_w = 3.0)
+    efc2 = comparison.FieldComparatorExactString(val_freq_table = \
+                                                   self.freq_table,
+                                                 agree_w = 10.0,
+                                                 freq_max_w = 3.0)
+    assert efc1.freq_weight_table == efc2.freq_weight_table
+
+    for val in self.freq_table:
+      freq_weight = min(math.log(freq_sum / self.freq_table[val], 2), 3.0)
+      assert abs(efc1.compare(val, val) - freq_weight) < 0.000001
+    assert efc1.compare('peter', 'peter') == 10.0
+
+    efc2.set_weights(freq_max_w = 2.0)
+    assert efc1.freq_weight_table != efc2.freq_weight_table
+    assert efc1.compare('meyer', 'meyer') < 3.0
+    assert efc2.compare('johns', 'johns') == 2.0
+    assert efc1.compare('johns', 'johns') == 3.0
+
+    # Comparators using the same frequency look-up table share the weights -
+    #
+    freq_lookup_table = lookup.FrequencyLookupTable()
+    for (val, val_count) in self.freq_table.items():
+      freq_lookup_table[val] = val_count
+
+    efc3 = comparison.FieldComparatorExactString(val_freq_table = \
+                                                   freq_lookup_table,
+                                                 agree_w = 10.0,
+                                                 freq_max_w = 3.0)
+    efc4 = comparison.FieldComparatorExactString(val_freq_table = \
+                                                   freq_lookup_table,
+                                                 agree_w = 10.0,
+                                                 freq_max_w = 3.0)
+    assert efc3.freq_weight_table is efc4.freq_weight_table
+    assert efc3.freq_weight_table == efc1.freq_weight_table
+    assert len(freq_lookup_table.freq_weight_tables) == 1
+
+    efc4.set_weights(freq_max_w = 2.0)
+    assert efc3.freq_weight_table is not efc4.freq_weight_table
+    assert efc4.freq_weight_table == efc2.freq_weight_table
+    assert len(freq_lookup_table.freq_weight_tables) == 2
+
+    freq_lookup_table['johns'] = 3  # Modified counts, weights are removed
+    assert freq_lookup_table.freq_weight_tables == {}
+
+  # ---------------------------------------------------------------------------
+  # Test trained token set comparators
+
+  def testTrainedTokenSet(self):  # - - - - - - - - - - - - - - - - - - - - - -
+    """Test token set comparators trained with IDF word weights"""
+
+    train_val_list = ['42 miller street', '7 smith road', '42 main street',
+                      '13 miller avenue', '1 park road', '99 smith street']
+
+    tfc = comparison.FieldComparatorTokenSet(threshold = 0.0,
+                                             common_divisor = 'average',
+                                             agree_weight = 10.0,
+                                             disagree_weight = -5.0)
+    tfcs = comparison.FieldComparatorTokenSet(threshold = 0.0,
+                                              common_divisor = 'average',
+                                              comp_funct = stringcmp.winkler,
+                                              min_threshold = 0.8,
+                                              agree_weight = 10.0,
+                                              disagree_weight = -5.0)
+
+    w_untrained = tfc.compare('42 miller street', '42 miller road')
+    assert len(tfc.profile_cache) == 2
+
+    tfc.train(train_val_list)
+    tfcs.train(train_val_list)
+    assert tfc.profile_cache == {}
+    assert tfc.token_idf_dict['street'] < tfc.token_idf_dict['miller']
+    assert tfc.token_idf_dict['miller'] < tfc.token_idf_dict['main']
+
+    for (val1, val2) in [('42 miller street', '42 miller road'),
+                         ('42 miller street', '42 millar street'),
+                         ('7 smith road', 'smith 7 road'),
+                         ('1 park road', '99 queen street'),
+                         ('unknown values', 'unknown value')]:
+      for fc in [tfc, tfcs]:
+        w = fc.compare(val1, val2)
+        assert w >= -5.0 and w <= 10.0, (val1, val2, w)
+        assert w == fc.compare(val2, val1), (val1, val2, w)
+
+    assert tfc.compare('7 smith road', 'smith 7 road') == 10.0
+    assert tfc.compare('1 park road', '99 queen street') == -5.0
+    assert tfc.compare('42 miller street', '42 miller road') != w_untrained
+
+    # Rare tokens in common count more than frequent ones
+    #
+    assert tfc.compare('42 miller street', '13 miller road') > \
+           tfc.compare('42 miller street', '99 smith street')
+
+    # Approximately matching tokens only count with soft TF-IDF
+    #
+    assert tfcs.compare('42 miller street', '42 millar street') > \
+           tfc.compare('42 miller street', '42 millar street')
+
   # ---------------------------------------------------------------------------
   # Test caching
 
@@ -2016,6 +2206,131 @@ class TestCase(unittest.TestCase):
 
       jfc.get_cache_stats()
 
+  def testCachePolicies(self):  # - - - - - - - - - - - - - - - - - - - - - - -
+    """Test bounded caches with different eviction policies"""
+
+    for cache_policy in ['lru', 'clock', 'tinylfu']:
+
+      jfc = comparison.FieldComparatorJaro(threshold = 0.5,
+                                          missing_v = self.missing_values_list,
+                                          desc = 'FieldComparatorJaro',
+                                          do_cache = True,
+                                          max_cache_size = 20,
+                                          cache_policy = cache_policy)
+      assert jfc.cache_policy == cache_policy
+
+      # A frequent (hot) value pair compared in between many rare pairs
+      #
+      num_comp = 0
+      for i in range(500):
+        for (val1, val2) in [('peter','pete'), ('x%d' % (i), 'y%d' % (i))]:
+          w = jfc.compare(val1, val2)
+          assert w == stringcmp.jaro(val1, val2) or \
+                 w == jfc.__calc_partagree_weight__(val1, val2,
+                                                    stringcmp.jaro(val1, val2))
+          num_comp += 1
+
+          assert len(jfc.cache) <= 20, (cache_policy, len(jfc.cache))
+
+      assert ('pete','peter') in jfc.cache, cache_policy
+      assert jfc.cache_num_hits + jfc.cache_num_misses == num_comp
+      assert jfc.cache_num_hits >= 450, (cache_policy, jfc.cache_num_hits)
+
+      cache_stats = jfc.get_cache_stats()
+      assert cache_stats['policy'] == cache_policy
+      assert cache_stats['hits'] == jfc.cache_num_hits
+      assert cache_stats['misses'] == jfc.cache_num_misses
+      assert cache_stats['size'] == len(jfc.cache)
+      assert cache_stats['max_size'] == 20
+      assert cache_stats['hit_rate'] == float(cache_stats['hits']) / num_comp
+
+      if (cache_policy == 'tinylfu'):  # Rare pairs are mostly not admitted
+        assert cache_stats['not_cached'] > 0
+        assert cache_stats['evictions'] + cache_stats['not_cached'] + \
+               cache_stats['size'] == cache_stats['misses']
+      else:
+        assert cache_stats['evictions'] + cache_stats['size'] == \
+               cache_stats['misses']
+
+      # Clearing the cache from outside must not break eviction
+      #
+      jfc.cache = {}
+      for i in range(50):
+        jfc.compare('a%d' % (i), 'b%d' % (i))
+        assert len(jfc.cache) <= 20
+
+    # Statistics for all field comparators of a record comparator
+    #
+    efc = comparison.FieldComparatorExactString(desc = 'Exact')
+    wfc = comparison.FieldComparatorWinkler(threshold = 0.5, do_cache = True,
+                                            desc = 'Winkler')
+
+    rc = comparison.RecordComparator(self.test_data_set1,self.test_data_set2,
+                                     [(efc, 'gname', 'given_name'),
+                                      (wfc, 'surname', 'sname')])
+    for r1 in self.recs1:
+      for r2 in self.recs2:
+        rc.compare(r1, r2)
+        rc.compare(r1, r2)
+
+    cache_stats_list = rc.get_cache_stats()
+    assert len(cache_stats_list) == 2
+    assert cache_stats_list[0]['description'] == 'Exact'
+    assert cache_stats_list[0]['hits'] == 0
+    assert cache_stats_list[1]['description'] == 'Winkler'
+    assert cache_stats_list[1]['hits'] > 0
+    assert cache_stats_list[1]['misses'] >= cache_stats_list[1]['size']
+    assert cache_stats_list[1]['max_size'] == None
+    assert cache_stats_list[1]['evictions'] == 0
+
+  # ---------------------------------------------------------------------------
+  # Test the cache in shared memory
+  #
+  def testSharedCache(self):  # - - - - - - - - - - - - - - - - - - - - - - - -
+    """Test the cache in shared memory used by several processes"""
+
+    wfc = comparison.FieldComparatorWinkler(threshold = 0.0,
+                                            desc = 'Winkler',
+                                            do_cache = True,
+                                            max_cache_size = 1000,
+                                            cache_policy = 'shared')
+    assert wfc.shared_cache != None
+    no_cache_wfc = comparison.FieldComparatorWinkler(threshold = 0.0)
+
+    val_pair_list = [('peter','pete'), ('christen','christensen'),
+                     ('miller','muller'), ('jones','johns')]
+
+    pid = os.fork()  # The child process fills the cache
+    if (pid == 0):
+      for (val1, val2) in val_pair_list:
+        wfc.compare(val1, val2)
+      os._exit(0)
+    os.waitpid(pid, 0)
+
+    for (val1, val2) in val_pair_list:  # Now all comparisons are cache hits
+      w = wfc.compare(val2, val1)
+      assert w == wfc.compare(val1, val2)
+      assert w == no_cache_wfc.compare(val1, val2)
+    assert wfc.cache_num_hits == 2*len(val_pair_list)
+    assert wfc.cache_num_misses == 0
+    assert wfc.cache == {}
+
+    cache_stats = wfc.get_cache_stats()
+    assert cache_stats['size'] == len(val_pair_list)
+    assert cache_stats['policy'] == 'shared'
+
+    # A shared cache needs a maximum cache size
+    #
+    for max_cache_size in [None, 0]:
+      try:
+        comparison.FieldComparatorWinkler(do_cache = True,
+                                          max_cache_size = max_cache_size,
+                                          cache_policy = 'shared')
+      except Exception:
+        pass
+      else:
+        assert False, 'Shared cache without size accepted'
+
   # ---------------------------------------------------------------------------
   # Test record comparator
   #
@@ -2091,6 +2406,202 @@ class TestCase(unittest.TestCase):
 
       rc.get_cache_stats()
 
+      # Timing statistics of the field comparators - - - - - - - - - - - - - -
+      #
+      for timing_stats in rc.get_timing_stats():
+        assert timing_stats['num_comp'] == 0  # Timing is not activated
+
+      trc = comparison.RecordComparator(self.test_data_set1,
+                                        self.test_data_set2, field_comp_list,
+                                        'Test timing', do_timing = True)
+
+      rec_pair_list = []
+      for r1 in self.recs1:
+        for r2 in self.recs2:
+          assert trc.compare(r1, r2) == rc.compare(r1, r2)
+          rec_pair_list.append((r1, r2))
+
+      assert trc.compare_batch(rec_pair_list) == rc.compare_batch(rec_pair_list)
+
+      timing_stats_list = trc.get_timing_stats()
+      assert len(timing_stats_list) == len(field_comp_list)
+
+      for i in range(len(field_comp_list)):
+        timing_stats = timing_stats_list[i]
+
+        num_missing = 0
+        num_exact =   0
+        for (r1, r2) in rec_pair_list:
+          val1 = trc.prepare_record(r1, 0)[i]
+          val2 = trc.prepare_record(r2, 1)[i]
+          if ((val1 in self.missing_values_list) or \
+              (val2 in self.missing_values_list)):
+            num_missing += 1
+          elif (val1 == val2):
+            num_exact += 1
+
+        num_comp = 2*len(rec_pair_list)
+        assert timing_stats['description'] == field_comp_list[i][0].description
+        assert timing_stats['num_comp'] == num_comp
+        assert timing_stats['time'] >= 0.0
+        assert timing_stats['avrg_time'] == timing_stats['time'] / num_comp
+        assert timing_stats['missing_rate'] == 2.0*num_missing / num_comp
+        assert timing_stats['exact_rate'] == 2.0*num_exact / num_comp
+        assert 0.0 <= timing_stats['cache_hit_rate'] <= 1.0
+
+      assert sn_wfcc.do_caching == True
+      assert timing_stats_list[1]['cache_hit_rate'] > 0.0  # Cached comparisons
+      if (sum([timing_stats['time'] for timing_stats in \
+               timing_stats_list]) > 0.001):
+        assert abs(sum([timing_stats['time_perc'] for timing_stats in \
+                        timing_stats_list]) - 100.0) < 0.001
+
+  def testCompareBatch(self):  # - - - - - - - - - - - - - - - - - - - - - - -
+    """Test batch comparison of field values and records"""
+
+    freq_table = {'whiteway':10,'astley':20,'2611':5,'2905':2}
+
+    field_comp_list = \
+      [(comparison.FieldComparatorExactString(missing_v = \
+                                                 self.missing_values_list,
+                                              desc = 'Givenname exact'),
+        'gname', 'given_name'),
+       (comparison.FieldComparatorExactString(missing_v = \
+                                                 self.missing_values_list,
+                                              val_freq_table = freq_table,
+                                              desc = 'Surname exact freq'),
+        'surname', 'sname'),
+       (comparison.FieldComparatorWinkler(threshold = 0.5,
+                                          missing_v = self.missing_values_list,
+                                          do_cache = True,
+                                          desc = 'Surname Winkler'),
+        'surname', 'sname'),
+       (comparison.FieldComparatorNumericAbs(max_abs_diff = 10,
+                                             missing_v = \
+                                               self.missing_values_list,
+                                             desc = 'Street number abs'),
+        'streetnumb', 'street'),
+       (comparison.FieldComparatorNumericAbs(max_abs_diff = 100,
+                                             missing_v = \
+                                               self.missing_values_list,
+                                             val_freq_table = freq_table,
+                                             desc = 'Postcode abs freq'),
+        'postcode', 'zipcode'),
+       (comparison.FieldComparatorKeyDiff(max_key_di = 2,
+                                          missing_v = self.missing_values_list,
+                                          desc = 'Postcode KeyDiff'),
+        'postcode', 'zipcode')]
+
+    for (mw, daw, aw) in self.weight_values:
+
+      for (field_comp, field_name1, field_name2) in field_comp_list:
+        field_comp.set_weights(missing_w = mw, agree_w = aw, disagree_w = daw)
+
+      rc = comparison.RecordComparator(self.test_data_set1,self.test_data_set2,
+                                     field_comp_list, 'Test record comparator')
+
+      rec_pair_list = []
+      for r1 in self.recs1 + [['rec-4-org','james','astley']]:
+        for r2 in self.recs2 + [['','rec-4-dup','white way','','n/a']]:
+          rec_pair_list.append((r1, r2))
+
+      weight_array = rc.compare_batch(rec_pair_list)
+
+      num_fields = len(field_comp_list)
+      assert len(weight_array) == len(rec_pair_list)*num_fields
+
+      for i in range(len(rec_pair_list)):
+        (r1, r2) = rec_pair_list[i]
+        assert list(weight_array[i*num_fields:(i+1)*num_fields]) == \
+               rc.compare(r1, r2), (r1, r2)
+
+      assert len(rc.compare_batch([])) == 0
+
+      # Prepared records contain the lower case values of compared fields
+      #
+      prep_rec_pair_list = []
+      for (r1, r2) in rec_pair_list:
+        prep_rec1 = rc.prepare_record(r1, 0)
+        prep_rec2 = rc.prepare_record(r2, 1)
+        assert len(prep_rec1) == num_fields
+        assert len(prep_rec2) == num_fields
+        for val in prep_rec1 + prep_rec2:
+          assert val == val.lower()
+        assert rc.compare_prepared(prep_rec1, prep_rec2) == rc.compare(r1, r2)
+        prep_rec_pair_list.append((prep_rec1, prep_rec2))
+
+      assert rc.compare_batch_prepared(prep_rec_pair_list) == weight_array
+      assert rc.prepare_record(['rec-4-org','James','Astley'], 0) == \
+             ('james', 'astley', 'astley', '', '', '')
+
+      # Comparison with a cut-off threshold prunes only record pairs that are
+      # below the threshold, and keeps all others unchanged
+      #
+      max_weight_sum = sum([field_comp.get_max_weight() for (field_comp,
+                            field_name1, field_name2) in field_comp_list])
+
+      for cut_off_threshold in [-1000.0, 0.0, 0.5, 2.0, 10.0,
+                                0.5*max_weight_sum, max_weight_sum, 1000.0]:
+        for k in range(2):  # Second time with measured comparison times
+          (thres_weight_array, pruned_list) = \
+               rc.compare_batch_threshold(prep_rec_pair_list, cut_off_threshold)
+          assert len(thres_weight_array) == len(weight_array)
+          assert len(pruned_list) == len(prep_rec_pair_list)
+
+          for i in range(len(prep_rec_pair_list)):
+            w_vec = list(weight_array[i*num_fields:(i+1)*num_fields])
+            if (pruned_list[i] == True):
+              assert sum(w_vec) < cut_off_threshold, (cut_off_threshold, w_vec)
+            else:
+              assert list(thres_weight_array[i*num_fields:(i+1)*num_fields]) \
+                     == w_vec
+
+        if (cut_off_threshold > max_weight_sum):
+          assert pruned_list == [True]*len(prep_rec_pair_list)
+        if (cut_off_threshold == -1000.0):
+          assert pruned_list == [False]*len(prep_rec_pair_list)
+
+      assert rc.compare_batch_threshold([], 1.0) == (array.array('d'), [])
+      assert rc.num_pruned_rec_pairs > 0
+
+      # Field comparators with and without batch implementation
+      #
+      for (field_comp, field_name1, field_name2) in field_comp_list:
+        val_pair_list = self.exact_string_pairs + \
+                        self.contain_string_pairs + \
+                        [(self.missing_values_list[0], 'peter'),
+                         ('12', '17'), ('12', '12.0'), ('12', 'x1')]
+
+        weight_list = field_comp.compare_batch(val_pair_list)
+
+        assert len(weight_list) == len(val_pair_list)
+        for j in range(len(val_pair_list)):
+          (val1, val2) = val_pair_list[j]
+          assert weight_list[j] == field_comp.compare(val1, val2), \
+                 (field_comp.description, val1, val2, weight_list[j])
+
+        # Each distinct value pair is only compared once
+        #
+        dupl_val_pair_list = val_pair_list*3 + val_pair_list[::-1]
+
+        assert field_comp.compare_batch(dupl_val_pair_list) == \
+               weight_list*3 + weight_list[::-1]
+
+      compare_val_pair_list = []
+      jfc = comparison.FieldComparatorJaro(threshold = 0.0)
+      jaro_compare = jfc.compare
+      def count_compare(val1, val2):
+        compare_val_pair_list.append((val1, val2))
+        return jaro_compare(val1, val2)
+      jfc.compare = count_compare
+
+      weight_list = jfc.compare_batch([('peter','pete'),('paul','peter'),
+                                       ('peter','pete'),('pete','peter'),
+                                       ('peter','pete')])
+      assert len(compare_val_pair_list) == 3
+      assert weight_list[0] == weight_list[2] == weight_list[4]
+      assert weight_list[0] == jaro_compare('peter','pete')
+
 # =============================================================================
 # Start tests when called from command line
 
@@ -1554,6 +1554,88 @@ class TestCase(unittest.TestCase):
       test_ds.finalise()
       test_ds = None
 
+  def testCSVChunks(self):   # - - - - - - - - - - - - - - - - - - - - - - - -
+    """Test reading CSV data sets in chunks"""
+
+    for (rec_ident, header_line) in [('rec_id', True), ('rec-num', True),
+                                     ('rec-num', False)]:
+
+      test_ds = dataset.DataSetCSV(description='A test CSV data set',
+                                   access_mode='read',
+                                   field_list=[('rec_id',0),('gname',1),
+                                               ('surname',2),('streetnumb',3),
+                                               ('address_1',4),
+                                               ('address_2',5),
+                                               ('suburb',6),('postcode',7)],
+                                   rec_ident=rec_ident,
+                                   header_line=header_line,
+                                   file_name='./test-data.csv')
+
+      all_rec_list = list(test_ds.readall())
+
+      for num_chunks in [1, 2, 3, 7, 100]:
+        chunk_list = test_ds.get_chunk_list(num_chunks)
+
+        assert len(chunk_list) >= 1
+        assert len(chunk_list) <= num_chunks
+
+        chunk_rec_list = []
+        for chunk in chunk_list:
+          chunk_rec_list += list(test_ds.readchunk(chunk))
+
+        assert chunk_rec_list == all_rec_list, (num_chunks, rec_ident)
+
+      test_ds.finalise()
+
+    # Records with quoted fields spanning several lines are not split
+    #
+    csv_file = open('./test-chunks.csv', 'w')
+    csv_file.write('rec_id,gname,surname'+os.linesep)
+    for i in range(50):
+      if ((i % 3) == 0):
+        csv_file.write('r%d,"peter%s%d",miller' % (i, os.linesep, i) + \
+                       os.linesep)
+      else:
+        csv_file.write('r%d,paul,"smith, %d"' % (i, i) + os.linesep)
+    csv_file.close()
+
+    for rec_ident in ['rec_id', 'rec-num']:
+      test_ds = dataset.DataSetCSV(description='A test CSV data set',
+                                   access_mode='read',
+                                   field_list=[('rec_id',0),('gname',1),
+                                               ('surname',2)],
+                                   rec_ident=rec_ident,
+                                   header_line=True,
+                                   file_name='./test-chunks.csv')
+
+      all_rec_list = list(test_ds.readall())
+      assert len(all_rec_list) == 50
+
+      for num_chunks in [2, 3, 7, 100]:
+        chunk_list = test_ds.get_chunk_list(num_chunks)
+
+        chunk_rec_list = []
+        for chunk in chunk_list:
+          chunk_rec_list += list(test_ds.readchunk(chunk))
+
+        assert chunk_rec_list == all_rec_list, (num_chunks, rec_ident)
+
+      test_ds.finalise()
+
+    os.remove('./test-chunks.csv')
+
+    # GZIP compressed files can not be split into chunks
+    #
+    test_ds = dataset.DataSetCSV(description='A test CSV data set',
+                                 access_mode='read',
+                                 rec_ident='rec_id',
+                                 header_line=True,
+                                 file_name='./test-data.csv.gz')
+
+    assert test_ds.get_chunk_list(4) == None
+
+    test_ds.finalise()
+
 # =============================================================================
 # Start tests when called from command line
 
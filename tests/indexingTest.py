@@ -1298,6 +1298,46 @@ class TestCase(unittest.TestCase):
 
       prev_w_vec_dict = this_w_vec_dict
 
+  def testAdaptSortBlocks(self):  # - - - - - - - - - - - - - - - - - - - - -
+    """Test AdaptSortingIndex block generation"""
+
+    index_def1 = [['surname','surname',False,False,None,[]]]
+
+    index_val_list = ['aa', 'aaa', 'aab', 'abab', 'bcd', 'bcde', 'peter',
+                      'petra', 'pete', 'x', 'xyz', 'zzzz']
+    index_val_list.sort()
+
+    for str_cmp_thres in [0.1, 0.5, 0.8, 0.9, 1.0]:
+
+      adsort_index = indexing.AdaptSortingIndex(description = \
+                                              'Test Adapt Sorting index',
+                                         dataset1 = self.dataset1,
+                                         dataset2 = self.dataset2,
+                                         rec_comparator = self.rec_comp_link,
+                                         str_cmp_funct = stringcmp.jaro,
+                                         str_cmp_thres = str_cmp_thres,
+                                         sim_cache_size = 5,
+                                         index_def = [index_def1])
+
+      block_list = adsort_index.__get_adaptive_blocks__(index_val_list)
+
+      # Blocks must be non-empty and cover all index key values in order
+      #
+      prev_block_end = 0
+      for (block_start, block_end) in block_list:
+        assert block_start == prev_block_end
+        assert block_end > block_start
+        prev_block_end = block_end
+      assert prev_block_end == len(index_val_list)
+
+      # With a threshold of 1.0 no two different index key values are similar
+      #
+      if (str_cmp_thres == 1.0):
+        assert len(block_list) == len(index_val_list)
+
+      assert len(adsort_index.key_sim_cache) <= 5
+      assert adsort_index.num_key_comp >= len(block_list)
+
   def testAdaptSortIndexDedupl(self):  # - - - - - - - - - - - - - - - - - - -
     """Test AdaptSortingIndex deduplication"""
 
@@ -4776,6 +4816,218 @@ class TestCase(unittest.TestCase):
 
       prev_w_vec_dict = this_w_vec_dict
 
+  def testParallelBuild(self):  # - - - - - - - - - - - - - - - - - - - - - - -
+    """Test parallel build of inverted indices gives the same index"""
+
+    index_def1 = [['surname','surname',False,False,None,[]]]
+    index_def2 = [['given_name','given_name',True,True,4,[]],
+                  ['postcode','postcode',True,False,2,[]]]
+
+    for (index_class, index_args) in \
+        [(indexing.BlockingIndex, {}),
+         (indexing.SortingIndex, {'window_size':3}),
+         (indexing.QGramIndex, {'q':2, 'threshold':0.8}),
+         (indexing.SuffixArrayIndex, {'block_method':(3,4),
+                                      'suffix_method':'allsubstr'}),
+         (indexing.RobustSuffixArrayIndex, {'block_method':(3,4),
+                                    'str_cmp_funct':stringcmp.winkler,
+                                    'str_cmp_thres':0.8})]:
+
+      for (dataset2, rec_comp) in [(self.dataset2, self.rec_comp_link),
+                                   (self.dataset1, self.rec_comp_dedupl)]:
+
+        index_list = []
+
+        for num_proc in [1, 3]:
+          test_index = index_class(description = 'Test parallel build',
+                                   dataset1 = self.dataset1,
+                                   dataset2 = dataset2,
+                                   rec_comparator = rec_comp,
+                                   progress = 2,
+                                   num_processes = num_proc,
+                                   index_def = [index_def1,index_def2],
+                                   **index_args)
+          assert test_index.num_processes == num_proc
+
+          test_index.build()
+          assert test_index.status == 'built'
+          index_list.append(test_index)
+
+        (serial_index, parallel_index) = index_list
+
+        assert serial_index.rec_cache1 == parallel_index.rec_cache1
+        assert serial_index.rec_cache2 == parallel_index.rec_cache2
+        assert serial_index.index1 == parallel_index.index1, index_class
+        assert serial_index.index2 == parallel_index.index2, index_class
+
+        serial_index.compact()
+        parallel_index.compact()
+        assert serial_index.rec_pair_dict == parallel_index.rec_pair_dict
+        assert serial_index.num_rec_pairs == parallel_index.num_rec_pairs
+
+  def testPairFilter(self):  # - - - - - - - - - - - - - - - - - - - - - - - - -
+    """Test Bloom filter based de-duplication of record pairs"""
+
+    index_def1 = [['surname','surname',False,False,None,[]]]
+    index_def2 = [['given_name','given_name',True,True,4,[]],
+                  ['postcode','postcode',True,False,2,[]]]
+
+    for (index_class, index_args) in \
+        [(indexing.BlockingIndex, {}),
+         (indexing.SortingIndex, {'window_size':3}),
+         (indexing.AdaptSortingIndex, {'str_cmp_funct':stringcmp.jaro,
+                                       'str_cmp_thres':0.8}),
+         (indexing.QGramIndex, {'q':2, 'threshold':0.8}),
+         (indexing.CanopyIndex, {'canopy_method':('jaccard','threshold',
+                                                  0.8,0.5), 'q':2}),
+         (indexing.SuffixArrayIndex, {'block_method':(3,4),
+                                      'suffix_method':'allsubstr'}),
+         (indexing.RobustSuffixArrayIndex, {'block_method':(3,4),
+                                    'str_cmp_funct':stringcmp.winkler,
+                                    'str_cmp_thres':0.8})]:
+
+      for (dataset2, rec_comp) in [(self.dataset2, self.rec_comp_link),
+                                   (self.dataset1, self.rec_comp_dedupl)]:
+
+        result_list = []
+
+        for pair_filter_error in [None, 0.0001]:
+          test_index = index_class(description = 'Test pair filter',
+                                   dataset1 = self.dataset1,
+                                   dataset2 = dataset2,
+                                   rec_comparator = rec_comp,
+                                   progress = 2,
+                                   pair_filter_error = pair_filter_error,
+                                   index_def = [index_def1,index_def2],
+                                   **index_args)
+          assert test_index.pair_filter_error == pair_filter_error
+
+          test_index.build()
+          test_index.compact()
+
+          if (pair_filter_error == None):
+            assert test_index.rec_block_list == []
+          else:
+            assert test_index.rec_pair_dict == {}
+            assert test_index.num_rec_pairs == test_index.num_block_rec_pairs
+
+            # Blocks are not kept from one compaction to the next
+            #
+            num_blocks = len(test_index.rec_block_list)
+
+            test_index.build()
+            test_index.compact()
+
+            assert len(test_index.rec_block_list) == num_blocks
+            assert test_index.num_rec_pairs == test_index.num_block_rec_pairs
+
+          assert test_index.num_dupl_rec_pairs == 0
+
+          num_block_rec_pairs = test_index.num_rec_pairs
+
+          [field_names_list, w_vec_dict] = test_index.run()
+
+          assert test_index.num_rec_pairs == len(w_vec_dict)
+          assert test_index.num_rec_pairs <= num_block_rec_pairs
+          result_list.append(w_vec_dict)
+
+        (exact_w_vec_dict, filter_w_vec_dict) = result_list
+
+        for (rec_pair, w_vec) in filter_w_vec_dict.iteritems():
+          assert exact_w_vec_dict[rec_pair] == w_vec, (index_class, rec_pair)
+
+        # Allow for false positives in the Bloom filter
+        #
+        assert len(filter_w_vec_dict) >= 0.99*len(exact_w_vec_dict), \
+               (index_class, len(filter_w_vec_dict), len(exact_w_vec_dict))
+
+  def testLengthFilter(self):  # - - - - - - - - - - - - - - - - - - - - - - -
+    """Test bulk length filtering of record pairs"""
+
+    index_def1 = [['surname','surname',False,False,2,[]]]
+
+    for (dataset2, rec_comp) in [(self.dataset2, self.rec_comp_link),
+                                 (self.dataset1, self.rec_comp_dedupl)]:
+
+      block_index = indexing.BlockingIndex(description = 'Test length filter',
+                                           dataset1 = self.dataset1,
+                                           dataset2 = dataset2,
+                                           rec_comparator = rec_comp,
+                                           progress = 2,
+                                           index_def = [index_def1])
+      block_index.build()
+      block_index.compact()
+
+      [field_names_list, all_w_vec_dict] = block_index.run()
+
+      # Length bounds must give the same result as the filter condition
+      #
+      for length_filter in [0.0, 0.1, 0.2, 0.25, 1.0/3, 0.5, 0.9, 1.0]:
+        for len1 in range(30):
+          (min_len, max_len) = block_index.__get_length_bounds__(len1,
+                                                                 length_filter)
+          for len2 in range(100):
+            if (max(len1, len2) == 0):
+              pass_filter = True
+            else:
+              pass_filter = (float(abs(len1 - len2)) / max(len1, len2) <= \
+                             length_filter)
+            assert pass_filter == (min_len <= len2 <= max_len), \
+                   (len1, len2, length_filter, min_len, max_len)
+
+      # Filter on total record length and on the lengths of the field values
+      #
+      for length_filter_perc in [0, 25, 50, 100, [None, 30, None, 10],
+                                 [0, None, None, None]]:
+
+        [field_names_list, w_vec_dict] = \
+                        block_index.run(length_filter_perc = length_filter_perc)
+
+        assert block_index.num_rec_pairs == len(all_w_vec_dict)
+
+        for (rec_ident1, rec_ident2) in all_w_vec_dict:
+          len_tuple1 = block_index.rec_length_cache1[rec_ident1]
+          if (dataset2 == self.dataset1):
+            len_tuple2 = block_index.rec_length_cache1[rec_ident2]
+          else:
+            len_tuple2 = block_index.rec_length_cache2[rec_ident2]
+
+          assert len(len_tuple1) == 5
+          assert len_tuple1[0] == \
+                 len(''.join(block_index.rec_cache1[rec_ident1]))
+
+          if (isinstance(length_filter_perc, list)):
+            pass_filter = True
+            for i in range(4):
+              if ((length_filter_perc[i] != None) and (len_tuple1[i+1] > 0) \
+                  and (len_tuple2[i+1] > 0)):
+                perc_diff = float(abs(len_tuple1[i+1] - len_tuple2[i+1])) / \
+                            max(len_tuple1[i+1], len_tuple2[i+1])
+                if (perc_diff > length_filter_perc[i] / 100.0):
+                  pass_filter = False
+          else:
+            perc_diff = float(abs(len_tuple1[0] - len_tuple2[0])) / \
+                        max(len_tuple1[0], len_tuple2[0])
+            pass_filter = (perc_diff <= length_filter_perc / 100.0)
+
+          assert ((rec_ident1, rec_ident2) in w_vec_dict) == pass_filter
+
+          if (pass_filter == True):
+            assert w_vec_dict[(rec_ident1, rec_ident2)] == \
+                   all_w_vec_dict[(rec_ident1, rec_ident2)]
+
+      # Record and length caches of a previous build are not used
+      #
+      block_index.rec_cache1['stale-rec'] = ('',)
+      block_index.rec_length_cache1['stale-rec'] = (0, 0)
+
+      block_index.build()
+      assert 'stale-rec' not in block_index.rec_cache1
+      assert block_index.rec_length_cache1 == {}
+
+      block_index.compact()
+      [field_names_list, w_vec_dict] = block_index.run(length_filter_perc = 50)
+      assert 'stale-rec' not in block_index.rec_length_cache1
 
 # =============================================================================
 # Start tests when called from command line
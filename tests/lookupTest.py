@@ -49,6 +49,7 @@
 # =============================================================================
 # Import necessary modules (Python standard modules first, then Febrl modules)
 
+import math
 import os
 import sys
 import unittest
@@ -312,6 +313,19 @@ class TestCase(unittest.TestCase):
                'Location in look-up table "'+f+'" has illegal latitude: '+ \
                str(value[1])
 
+        rad_value = lookup_table.get_radians(key)
+        assert (rad_value[0] == math.radians(value[0])) and \
+               (rad_value[1] == math.radians(value[1])), \
+               'Location in radians in look-up table "'+f+'" is wrong: '+ \
+               str(rad_value)
+        assert (abs(rad_value[2] - math.sin(rad_value[1])) < 0.000001) and \
+               (abs(rad_value[3] - math.cos(rad_value[1])) < 0.000001), \
+               'Sine or cosine of latitude in look-up table "'+f+'" is ' + \
+               'wrong: '+str(rad_value)
+
+      assert (lookup_table.get_radians('xyz1234zyx') == None), \
+             'Look-up table "'+f+'" returns location for unknown key'
+
     # Now load all files into one look-up table
     #
     lookup_table = lookup.GeocodeLookupTable( \
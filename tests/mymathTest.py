@@ -49,6 +49,7 @@
 # =============================================================================
 # Import necessary modules (Python standard modules first, then Febrl modules)
 
+import os
 import sets
 import sys
 import unittest
@@ -260,6 +261,74 @@ class TestCase(unittest.TestCase):
       r2 = mymath.random_expo(i)
       assert (r2 >= 0) and (r2 < i), (i, r2)
 
+  def testBloomFilter(self):  # - - - - - - - - - - - - - - - - - - - - - - -
+    """Test the scalable Bloom filter"""
+
+    for (capacity, error_rate) in [(1000, 0.01), (100, 0.001), (10, 0.05)]:
+      bloom_filter = mymath.BloomFilter(capacity, error_rate)
+
+      key_list = [('rec-%d' % (i), 'rec-%d' % (i+1)) for i in range(2000)]
+
+      for key in key_list:
+        assert bloom_filter.add(key) in [True, False]
+      for key in key_list:  # No false negatives
+        assert key in bloom_filter, key
+        assert bloom_filter.add(key) == True, key
+
+      assert len(bloom_filter) <= len(key_list)
+      assert len(bloom_filter) >= len(key_list)*(1.0-2*error_rate)
+      assert bloom_filter.get_size() > 0
+
+      if (capacity < len(key_list)):  # Filter must have grown
+        assert len(bloom_filter.filter_list) > 1
+
+      num_false_pos = 0
+      for i in range(10000):
+        if (('other-%d' % (i), 'rec-%d' % (i)) in bloom_filter):
+          num_false_pos += 1
+      assert num_false_pos <= 10000*error_rate*2, (num_false_pos, error_rate)
+
+  def testSharedHashTable(self):  # - - - - - - - - - - - - - - - - - - - - -
+    """Test the shared memory hash table"""
+
+    hash_table = mymath.SharedHashTable(100)
+
+    assert len(hash_table) == 0
+    assert hash_table.get(('peter', 'pete')) == None
+
+    key_list = [('rec-%d' % (i), 'rec-%d' % (i+1)) for i in range(50)]
+
+    for (i, key) in enumerate(key_list):
+      assert hash_table.put(key, i/7.0) == False
+    for (i, key) in enumerate(key_list):
+      assert hash_table.get(key) == i/7.0, key
+    assert len(hash_table) == 50
+
+    assert hash_table.put(key_list[0], 0.0) == False  # Update a key
+    assert hash_table.get(key_list[0]) == 0.0
+    assert len(hash_table) == 50
+
+    for i in range(1000):  # Overfill, keys get replaced
+      hash_table.put(('other-%d' % (i), 'rec'), 1.0)
+    assert len(hash_table) == 100
+    for i in range(1000):
+      assert hash_table.get(('other-%d' % (i), 'rec')) in [None, 1.0]
+
+    hash_table.clear()
+    assert len(hash_table) == 0
+    assert hash_table.get(('other-999', 'rec')) == None
+
+    # Values put into the table in a forked process are seen by the parent
+    #
+    hash_table.put('parent', -1.5)
+    pid = os.fork()
+    if (pid == 0):
+      if (hash_table.get('parent') == -1.5):
+        hash_table.put('child', 2.5)
+      os._exit(0)
+    os.waitpid(pid, 0)
+    assert hash_table.get('child') == 2.5
+
 # =============================================================================
 # Start tests when called from command line
 
@@ -49,9 +49,11 @@
 # =============================================================================
 # Import necessary modules (Python standard modules first, then Febrl modules)
 
+import bz2
 import logging
 import sys
 import unittest
+import zlib
 sys.path.append('..')
 
 import stringcmp
@@ -133,6 +135,57 @@ class TestCase(unittest.TestCase):
                '"Jaro" does not return 1.0 if strings are equal: '+str(pair)
 
 
+  def testJaroAssign(self):   # - - - - - - - - - - - - - - - - - - - - - - -
+    """Test bit mask based assignment of Jaro common characters"""
+
+    for pair in self.string_pairs + [['ab', 'ba'], ['a', 'b'], ['abc', 'cab'],
+                                     ['martha', 'marhta'], ['dwayne', 'duane'],
+                                     ['aaaaaaaaaab', 'baaaaaaaaaa']]:
+      (str1, str2) = pair
+
+      # Assignment by marking characters in copies of the strings
+      #
+      halflen = max(len(str1),len(str2)) / 2 - 1
+      ass_list = []
+      work_list = []
+      for (s1, s2) in [(str1, str2), (str2, str1)]:
+        ass = ''
+        workstr = s2
+        for i in range(len(s1)):
+          index = workstr.find(s1[i], max(0,i-halflen),
+                               min(i+halflen+1,len(s2)))
+          if (index > -1):
+            ass += s1[i]
+            workstr = workstr[:index]+chr(1)+workstr[index+1:]
+        ass_list.append(ass)
+        work_list.append(workstr)
+
+      (ass1, ass2, free1, free2) = stringcmp.jaro_assign(str1, str2)
+
+      assert ass1 == ass_list[0], (pair, ass1, ass_list[0])
+      assert ass2 == ass_list[1], (pair, ass2, ass_list[1])
+
+      for (s, free, workstr) in [(str1, free1, work_list[1]),
+                                 (str2, free2, work_list[0])]:
+        for i in range(len(s)):
+          assert ((free >> i) & 1) == (workstr[i] != chr(1)), (pair, i)
+
+      assert (stringcmp.jaro_assign(str1, str2,
+                                    stringcmp.jaro_profile(str1),
+                                    stringcmp.jaro_profile(str2)) == \
+              (ass1, ass2, free1, free2))
+
+    assert stringcmp.jaro_profile('anna') == {'a':9, 'n':6}
+
+    # Length based check for minimum threshold
+    #
+    assert stringcmp.jaro('peter', 'petersonian', 0.85) == 0.0
+    assert stringcmp.jaro('peter', 'petersonian', 0.7) == \
+           stringcmp.jaro('peter', 'petersonian')
+    assert stringcmp.winkler('pe', 'petersonian', 0.9) == 0.0
+    assert stringcmp.winkler('peter', 'petersonian', 0.8) == \
+           stringcmp.winkler('peter', 'petersonian')
+
   def testWinkler(self):  # - - - - - - - - - - - - - - - - - - - - - - - - - -
     """Test 'Winkler' approximate string comparator"""
 
@@ -206,6 +259,45 @@ class TestCase(unittest.TestCase):
                '"Bigram" does not return 1.0 if strings are equal: '+str(pair)
 
 
+  def testQGramProfiles(self):   # - - - - - - - - - - - - - - - - - - - - - -
+    """Test q-gram, positional q-gram and s-gram profiles"""
+
+    assert stringcmp.qgram_profile('peter', 2, False) == ['er','et','pe','te']
+    assert len(stringcmp.qgram_profile('peter', 3, True)) == 7
+    assert stringcmp.posqgram_profile('aaa', 2, False) == \
+           ([('aa',0),('aa',1)], {'aa':[0,1]})
+    assert stringcmp.sgram_profile('abc', [[0],[1]], False) == [['ab','bc'],
+                                                                ['ac']]
+
+    for pair in self.string_pairs:
+
+      for q in [1,2,3]:
+        qgram_list1 = [pair[0][i:i+q] for i in range(len(pair[0])-(q-1))]
+        qgram_list2 = [pair[1][i:i+q] for i in range(len(pair[1])-(q-1))]
+
+        common = 0  # Count common q-grams by removing them from a list
+        for q_gram in qgram_list1:
+          if (q_gram in qgram_list2):
+            common += 1
+            qgram_list2.remove(q_gram)
+
+        assert common == stringcmp.count_common_sorted( \
+                                   stringcmp.qgram_profile(pair[0], q, False),
+                                   stringcmp.qgram_profile(pair[1], q, False))
+
+        # Positional q-grams with the same position must be common
+        #
+        pos_common = stringcmp.count_common_posqgrams( \
+                                 stringcmp.posqgram_profile(pair[0], q, True),
+                                 stringcmp.posqgram_profile(pair[1], q, True),
+                                 0)
+        num_same = 0
+        for i in range(min(len(pair[0]), len(pair[1]))-(q-1)):
+          if (pair[0][i:i+q] == pair[1][i:i+q]):
+            num_same += 1
+        assert pos_common >= num_same, (pair, q, pos_common, num_same)
+        assert pos_common <= common + 2*(q-1)  # Plus padding q-grams
+
   def testBagDist(self):   # - - - - - - - - - - - - - - - - - - - - - - - - -
     """Test 'BagDist' approximate string comparator"""
 
@@ -279,6 +371,182 @@ class TestCase(unittest.TestCase):
                '"EditDist" does not return 1.0 if strings are equal: '+ \
                str(pair)
 
+  def testEditDistBitParallel(self):   # - - - - - - - - - - - - - - - - - - -
+    """Test bit-parallel edit distance against dynamic programming"""
+
+    long_str = 'abcdefghijklmnopqrstuvwxyz'*3  # Longer than a machine word
+
+    for pair in self.string_pairs + [[long_str, long_str[1:]+'x'],
+                                     ['sydney', 'sydeny'], ['ab', 'ba']]:
+      (str1, str2) = pair
+
+      for transpose in [False, True]:
+
+        # Full distance matrix
+        #
+        d = [range(len(str1)+1)]
+        for i in range(1, len(str2)+1):
+          row = [i]+len(str1)*[0]
+          for j in range(1, len(str1)+1):
+            row[j] = min(d[i-1][j]+1, row[j-1]+1,
+                         d[i-1][j-1]+int(str1[j-1] != str2[i-1]))
+            if ((transpose == True) and (i > 1) and (j > 1) and \
+                (str1[j-2] == str2[i-1]) and (str1[j-1] == str2[i-2])):
+              row[j] = min(row[j], d[i-2][j-2]+1)
+          d.append(row)
+
+        for max_dist in [None, 0, 1.5, 3, 20]:
+          (dist, exceeded) = stringcmp.editdist_bitparallel(str1, str2,
+                                                            transpose, max_dist)
+          assert dist == d[-1][-1], (pair, transpose, dist, d[-1][-1])
+          if (max_dist == None):
+            assert exceeded == False
+          else:
+            assert exceeded == (min(d[-1]) > max_dist), (pair, max_dist)
+
+    assert stringcmp.editdist_bitparallel('sydney', 'sydeny')[0] == 2
+    assert stringcmp.editdist_bitparallel('sydney', 'sydeny', True)[0] == 1
+    assert stringcmp.editdist_bitparallel('', 'peter', False, 4) == (5, True)
+
+
+  def testThresholdEarlyExit(self):   # - - - - - - - - - - - - - - - - - - -
+    """Test threshold based early exits of the dynamic programming comparators
+    """
+
+    assert stringcmp.count_common_chars('peter', 'pete') == 4
+    assert stringcmp.count_common_chars('anna', 'nana') == 4
+    assert stringcmp.count_common_chars('abc', 'xyz') == 0
+    assert stringcmp.count_common_chars('', 'xyz') == 0
+
+    approx_matches = {'a':0, 'b':5, 'd':1, 'e':0, 'g':2, 'i':0, 'j':2, 'l':3,
+                      'm':4, 'n':4, 'o':0, 'p':5, 'r':3, 't':1, 'u':0, 'v':5}
+
+    for pair in self.string_pairs + [['christine', 'kristina'],
+                                     ['abcdefgh', 'abxxxxxcdefgh']]:
+      (str1, str2) = pair
+
+      if (str1 != '') and (str2 != '') and (str1 != str2):
+
+        # Smith-Waterman with full gap loops
+        #
+        n, m = len(str1), len(str2)
+        d = [[0]*(m+1) for i in range(n+1)]
+        best_score = 0
+        for i in range(1,n+1):
+          for j in range(1,m+1):
+            if (str1[i-1] == str2[j-1]):
+              match = d[i-1][j-1]+5
+            elif (approx_matches.get(str1[i-1],-1) >= 0) and \
+                 (approx_matches.get(str1[i-1]) == \
+                  approx_matches.get(str2[j-1],-2)):
+              match = d[i-1][j-1]+2
+            else:
+              match = d[i-1][j-1]-5
+            insert = max([0]+[d[i-k][j]-5-k for k in range(1,i)])
+            delete = max([0]+[d[i][j-l]-5-l for l in range(1,j)])
+            d[i][j] = max(match, insert, delete, 0)
+            best_score = max(best_score, d[i][j])
+
+        assert stringcmp.swdist(str1, str2, 'longest') == \
+               float(best_score) / float(5*max(n,m)), (pair, best_score)
+
+      for funct in [stringcmp.swdist, stringcmp.lcs, stringcmp.editex]:
+        full_value = funct(str1, str2)
+
+        for min_threshold in [0.1, 0.5, 0.75, 0.9]:
+          value = funct(str1, str2, min_threshold=min_threshold)
+
+          if (full_value >= min_threshold):
+            assert value == full_value, (funct, pair, min_threshold, value)
+          else:
+            assert value in [0.0, full_value], (funct, pair, min_threshold)
+
+    assert stringcmp.swdist('peter', 'paul', min_threshold=0.8) == 0.0
+    assert stringcmp.lcs('abcd', 'abxy', min_threshold=0.8) == 0.0
+    assert stringcmp.editex('peter', 'xyz', min_threshold=0.5) == 0.0
+
+  def testBatchStringcmp(self):   # - - - - - - - - - - - - - - - - - - - - - -
+    """Test batch comparison of lists of string pairs"""
+
+    str_list1 = [pair[0] for pair in self.string_pairs] + \
+                ['', 'abc', '', 'x', 'martha', 'dixon', 'aaaaaaaaaab']
+    str_list2 = [pair[1] for pair in self.string_pairs] + \
+                ['', 'abc', 'abc', 'y', 'marhta', 'dicksonx', 'baaaaaaaaaa']
+
+    for cmp_method in ['jaro', 'winkler', 'editdist', 'bagdist', 'qgram1avrg',
+                       'qgram2Pshort', 'qgram3long', 'swdistavrg']:
+      for min_threshold in [None, 0.5, 0.8]:
+        for chunk_size in [5, 10000]:
+
+          batch_list = stringcmp.batch_stringcmp(cmp_method, str_list1,
+                                                 str_list2, min_threshold,
+                                                 chunk_size)
+          assert len(batch_list) == len(str_list1)
+
+          for i in range(len(str_list1)):
+            approx_str_value = stringcmp.do_stringcmp(cmp_method,
+                                                      str_list1[i],
+                                                      str_list2[i],
+                                                      min_threshold)[0]
+
+            assert abs(batch_list[i] - approx_str_value) < 0.000001, \
+                   (cmp_method, min_threshold, str_list1[i], str_list2[i],
+                    batch_list[i], approx_str_value)
+
+    assert stringcmp.batch_stringcmp('jaro', [], []) == []
+
+  def testBatchFunctions(self):   # - - - - - - - - - - - - - - - - - - - - - -
+    """Test the NumPy array based batch comparison functions"""
+
+    if (stringcmp.imp_numpy == False):
+      self.skipTest('NumPy module is not available')
+
+    str_list1 = [pair[0] for pair in self.string_pairs] + \
+                ['', 'abc', '', 'x', 'martha', 'dixon', 'aaaaaaaaaab']
+    str_list2 = [pair[1] for pair in self.string_pairs] + \
+                ['', 'abc', 'abc', 'y', 'marhta', 'dicksonx', 'baaaaaaaaaa']
+
+    # Functions with the arguments before and after the minimum threshold
+    #
+    funct_list = [(stringcmp.batch_jaro,     stringcmp.jaro,     [], []),
+                  (stringcmp.batch_winkler,  stringcmp.winkler,  [], []),
+                  (stringcmp.batch_editdist, stringcmp.editdist, [], []),
+                  (stringcmp.batch_bagdist,  stringcmp.bagdist,  [], [])]
+
+    for q in [1, 2, 3]:
+      for common_divisor in ['average', 'shortest', 'longest']:
+        for padded in [True, False]:
+          funct_list.append((stringcmp.batch_qgram, stringcmp.qgram,
+                             [q, common_divisor], [padded]))
+
+    for (batch_funct, funct, arg_list1, arg_list2) in funct_list:
+      for min_threshold in [None, 0.5, 0.8]:
+
+        batch_list = batch_funct(*([str_list1, str_list2] + arg_list1 + \
+                                   [min_threshold] + arg_list2))
+
+        assert len(batch_list) == len(str_list1)
+
+        for i in range(len(str_list1)):
+          approx_str_value = funct(*([str_list1[i], str_list2[i]] + \
+                                     arg_list1 + [min_threshold] + arg_list2))
+
+          assert abs(batch_list[i] - approx_str_value) < 0.000001, \
+                 (batch_funct.__name__, arg_list1, arg_list2, min_threshold,
+                  str_list1[i], str_list2[i], batch_list[i],
+                  approx_str_value)
+
+    # Minimum thresholds must be between 0 and 1
+    #
+    for batch_funct in [stringcmp.batch_jaro, stringcmp.batch_editdist,
+                        stringcmp.batch_qgram]:
+      for min_threshold in [0.0, 1.0, 1.5]:
+        try:
+          batch_funct(['peter'], ['pete'], min_threshold = min_threshold)
+        except Exception:
+          pass
+        else:
+          assert False, (batch_funct.__name__, min_threshold)
 
   def testSeqMatch(self):   # - - - - - - - - - - - - - - - - - - - - - - - - -
     """Test 'SeqMatch' approximate string comparator"""
@@ -346,6 +614,39 @@ class TestCase(unittest.TestCase):
                '"Compression" does not return 1.0 if strings are equal: '+ \
                str(pair)
 
+    # Compressed lengths of single strings are cached
+    #
+    for compressor in ['zlib', 'bz2']:
+      for pair in self.string_pairs:
+        for s in pair:
+          if (compressor == 'zlib'):
+            assert stringcmp.compressed_len(s, compressor) == \
+                   len(zlib.compress(s))
+          else:
+            assert stringcmp.compressed_len(s, compressor) == \
+                   len(bz2.compress(s))
+          assert (compressor, s) in stringcmp.compressed_len_cache
+
+    stringcmp.compressed_len_cache.clear()
+    assert stringcmp.compression('peter', 'pete', 'bz2') == \
+           stringcmp.compression('peter', 'pete', 'bz2')
+    assert len(stringcmp.compressed_len_cache) == 2
+
+  def testTokenSim(self):   # - - - - - - - - - - - - - - - - - - - - - - - - -
+    """Test the cached token similarities"""
+
+    stringcmp.token_sim_cache.clear()
+
+    for pair in self.string_pairs:
+      for comp_funct in [stringcmp.jaro, stringcmp.winkler]:
+        sim = stringcmp.token_sim(comp_funct, pair[0], pair[1])
+
+        assert sim == comp_funct(pair[0], pair[1]), \
+               'Cached token similarity differs for: '+str(pair)
+        assert sim == stringcmp.token_sim(comp_funct, pair[1], pair[0]), \
+               'Cached token similarity not symmetric for: '+str(pair)
+
+    assert len(stringcmp.token_sim_cache) <= 4*len(self.string_pairs)
 
   def testLCS(self):   # - - - - - - - - - - - - - - - - - - - - - - - - - - -
     """Test 'LCS' approximate string comparator"""
@@ -379,6 +680,23 @@ class TestCase(unittest.TestCase):
         assert (approx_str_value == 1.0), \
                '"LCS" does not return 1.0 if strings are equal: '+str(pair)
 
+    # Extraction of single longest common substrings
+    #
+    for (str1, str2, lcs_tuple) in \
+      [('prap',       'papr',         ('ap', 2, 'pr', 'pr')),
+       ('papr',       'prap',         ('pr', 2, 'pa', 'ap')),
+       ('abcab',      'xab',          ('ab', 2, 'cab', 'x')),
+       ('peter',      'sydney',       ('e', 1, 'pter', 'sydny')),
+       ('abZcd',      'Zabcd',        ('ab', 2, 'Zcd', 'Zcd')),
+       ('gondiwindi', 'gondiwindiro', ('gondiwindi', 10, '', 'ro')),
+       ('peter',      'xyz',          ('', 0, 'peter', 'xyz')),
+       ('',           'peter',        ('', 0, '', 'peter'))]:
+      assert stringcmp.do_lcs(str1, str2) == lcs_tuple, (str1, str2)
+
+    assert stringcmp.do_lcs('peter', 'sydney', 2) == \
+           ('', 0, 'peter', 'sydney')
+    assert stringcmp.do_lcs('abZcd', 'Zabcd', 2) == ('ab', 2, 'Zcd', 'Zcd')
+
 
   def testOntoLCS(self):   # - - - - - - - - - - - - - - - - - - - - - - - - -
     """Test 'OntoLCS' approximate string comparator"""
@@ -455,6 +773,107 @@ class TestCase(unittest.TestCase):
       assert (approx_str_value_permwinkler >= approx_str_value_winkler), \
              '"PermWinkler" value smaller than "Winkler" value for:'+str(pair)
 
+  def testAssignWinkler(self):  # - - - - - - - - - - - - - - - - - - - - - - -
+    """Test 'AssignWinkler' approximate string comparator"""
+
+    for pair in self.string_pairs:
+
+      approx_str_value = stringcmp.assignwinkler(pair[0],pair[1])
+
+      assert (isinstance(approx_str_value,float)), \
+             '"AssignWinkler" does not return a floating point number for:'+ \
+             str(pair)
+
+      assert (approx_str_value >= 0.0), \
+             '"AssignWinkler" returns a negative number for:'+str(pair)
+
+      assert (approx_str_value <= 1.0), \
+             '"AssignWinkler" returns a number larger than 1.0 for:'+str(pair)
+
+      approx_str_value_1 = stringcmp.assignwinkler(pair[0],pair[1])
+      approx_str_value_2 = stringcmp.assignwinkler(pair[1],pair[0])
+
+      assert (approx_str_value_1 == approx_str_value_2), \
+             '"AssignWinkler" returns different values for pair and ' + \
+             'swapped pair: '+str(pair)+': '+str(approx_str_value_1)+', '+ \
+             str(approx_str_value_2)
+
+      # Check for value 1.0 if the strings are the same
+      #
+      if (pair[0] == pair[1]):
+
+        assert (approx_str_value == 1.0), \
+               '"AssignWinkler" does not return 1.0 if strings are equal: '+ \
+               str(pair)
+
+      # AssignWinkler only compares some of the permutations of words
+      #
+      assert (approx_str_value >= stringcmp.winkler(pair[0],pair[1])), \
+             '"AssignWinkler" value smaller than "Winkler" value for:'+ \
+             str(pair)
+
+      assert (approx_str_value <= stringcmp.permwinkler(pair[0],pair[1])), \
+             '"AssignWinkler" value larger than "PermWinkler" value for:'+ \
+             str(pair)
+
+    # Strings with up to three words give the same values as PermWinkler
+    #
+    for pair in [['louise marie',      'marie louise'    ],
+                 ['mighty joe',        'joe mighty'      ],
+                 ['jake eickhoff',     'eickhoff jae'    ],
+                 ['kim lim zhao',      'lim zhau kim'    ],
+                 ['peter john miller', 'miller jon peter'],
+                 ['street road john',  'mary street road'],
+                 ['park miller peter', 'john peter mary' ],
+                 ['peter',             'john peter mary' ]]:
+      assert stringcmp.assignwinkler(pair[0],pair[1]) == \
+             stringcmp.permwinkler(pair[0],pair[1]), pair
+
+    for pair in self.string_pairs:
+      if ((len(pair[0].split(' ')) <= 3) and (len(pair[1].split(' ')) <= 3)):
+        assert stringcmp.assignwinkler(pair[0],pair[1]) == \
+               stringcmp.permwinkler(pair[0],pair[1]), pair
+
+    # Many words (a greedy assignment is used for more than 8 words)
+    #
+    str1 = 'the quick brown fox jumps over the lazy dog and cat'
+    str2 = 'cat and dog the lazy over jumps fox brwn quick the'
+
+    approx_str_value = stringcmp.assignwinkler(str1, str2)
+    assert (approx_str_value > 0.9) and (approx_str_value < 1.0)
+    assert approx_str_value == stringcmp.assignwinkler(str2, str1)
+    assert stringcmp.assignwinkler(str1, ' '.join(reversed(str1.split()))) \
+           == 1.0
+
+  def testEditexCosts(self):  # - - - - - - - - - - - - - - - - - - - - - - - -
+    """Test the table driven editex costs"""
+
+    for char1 in 'abcdefghijklmnopqrstuvwxyz{ 1':
+      for char2 in 'abcdefghijklmnopqrstuvwxyz{ 1':
+        index = (ord(char1) << 8) | ord(char2)
+
+        assert stringcmp.editex_char_costs(char1, char2) == \
+               (stringcmp.editex_sub_cost_table[index],
+                stringcmp.editex_del_cost_table[index]), (char1, char2)
+
+    for pair in self.string_pairs:
+      (costs, max_costs) = stringcmp.editex_costs(pair[0], pair[1])
+
+      assert (costs >= 0) and (costs <= max_costs), pair
+      assert (costs, max_costs) == stringcmp.editex_costs(pair[1], pair[0])
+
+      if ((pair[0] != '') and (pair[1] != '')):
+        w = 1.0 - float(costs) / max_costs
+        assert w == stringcmp.editex(pair[0], pair[1]), pair
+
+    assert stringcmp.editex_costs('peter', 'peter') == (0, 15.0)
+    assert stringcmp.editex_costs('peter', 'xyz', 0.5) == (None, 15.0)
+
+    # Characters outside the cost tables are handled without the tables
+    #
+    assert stringcmp.editex(u'm\xfcller', u'muller') == \
+           stringcmp.editex(u'm\xfcller', 'mxller')
+
 # =============================================================================
 # Start tests when called from command line
 